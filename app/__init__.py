@@ -1,10 +1,22 @@
 from flask import Flask
 
+from lib.telemetry import configure_logging
+
+configure_logging()
+
+# Refuses to start with an unknown hierarchy expansion mode rather than failing every request
+from app.usecases.hierarchy_expansion import expansion_mode
+expansion_mode()
+
 app = Flask(__name__)
 
 # Register the v1 API blueprint
 from app.api.v1 import api_v1
 app.register_blueprint(api_v1)
 
+# Expose /metrics and time every request
+from app import monitoring
+monitoring.init_app(app)
+
 # Remove the old routes import
-# from app import routes 
\ No newline at end of file
+# from app import routes
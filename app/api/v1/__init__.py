@@ -5,4 +5,4 @@ api_v1 = Blueprint('api_v1', __name__, url_prefix='/v1')
 
 # Import the routes to register them with the blueprint
 # These imports need to be after the Blueprint definition
-from . import generate_game, customize_game 
\ No newline at end of file
+from . import storage, artifacts, cached_results, generate_game, generate_game_batch, customize_game, jobs 
\ No newline at end of file
@@ -0,0 +1,354 @@
+from flask import request, jsonify, make_response, url_for, send_file, Response
+import json
+import logging
+import os
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import api_v1 # Import the blueprint
+from lib.artifacts import get_artifact_store, ARTIFACT_FILES
+from lib.result_cache import ResultRecorder
+from lib.storage import artifact_name, signed_url_ttl, purge_expired_objects
+from lib.telemetry import span, count_bytes
+from lib.workspaces import (
+    collect_workspace,
+    read_workspace_results,
+    iter_workspace_bundle,
+    encode_collected_results,
+    cleanup_workspace,
+    ARTIFACT_PATH_KEYS,
+)
+from .storage import require_storage_backend, signed_url
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_MODE_BASE64 = "base64"
+RESPONSE_MODE_MANIFEST = "manifest"
+RESPONSE_MODE_MULTIPART = "multipart"
+RESPONSE_MODE_STORAGE = "storage"
+RESPONSE_MODES = (RESPONSE_MODE_BASE64, RESPONSE_MODE_MANIFEST, RESPONSE_MODE_MULTIPART, RESPONSE_MODE_STORAGE)
+
+# Bytes read from disk per chunk when streaming multipart responses.
+CHUNK_SIZE = 64 * 1024
+
+# An artifact entry of a response: (response key, file name shown to the
+# client, file name in the artifact store, failure message if it is required).
+ArtifactSpec = Tuple[str, str, str, Optional[str]]
+
+# Seconds a client is asked to wait when no workspace can be allocated.
+WORKSPACE_RETRY_AFTER_SECONDS = 30
+
+# Stored artifact file names and the result keys holding their paths.
+STORED_PATH_KEYS = (("icon.png", "icon_path"), ("splash.png", "splash_path"), ("bundle.zip", "bundle_path"))
+
+
+def get_response_mode() -> str:
+    """Reads the `response_mode` query parameter (default: base64).
+
+    Raises:
+        ValueError: If the mode is not one of RESPONSE_MODES, or is storage
+            while object storage is not configured.
+    """
+    response_mode = request.args.get("response_mode", RESPONSE_MODE_BASE64)
+    if response_mode not in RESPONSE_MODES:
+        raise ValueError(f"Invalid response_mode '{response_mode}', expected one of: {', '.join(RESPONSE_MODES)}")
+    if response_mode == RESPONSE_MODE_STORAGE:
+        require_storage_backend()
+    return response_mode
+
+
+def workspace_capacity_response(e: Exception):
+    """Answers 503 with Retry-After while the workspaces are at their global quota."""
+    response = make_response(jsonify({"error": str(e), "retry_after": WORKSPACE_RETRY_AFTER_SECONDS}), 503)
+    response.headers["Retry-After"] = str(WORKSPACE_RETRY_AFTER_SECONDS)
+    return response
+
+
+def workspace_quota_response(e: Exception, uploaded: bool):
+    """Answers a workspace over its per-workspace quota.
+
+    Args:
+        e: The WorkspaceQuotaError.
+        uploaded: True if the uploaded game alone exceeded the quota (413),
+            False if the run's output outgrew it (507).
+    """
+    if uploaded:
+        logger.warning("Upload exceeds the workspace quota: %s", e)
+        return make_response(jsonify({"error": str(e)}), 413)
+    logger.error("Workspace outgrew its quota: %s", e)
+    return make_response(jsonify({"error": f"The generated game exceeds the workspace quota. {e}"}), 507)
+
+
+def crew_definition_error_response(e: Exception):
+    """Answers 500 when the crew definitions are broken: a server fault, never the client's."""
+    logger.exception("Invalid crew definitions: %s", e)
+    return make_response(jsonify({"error": "Server error: the crew definitions are invalid."}), 500)
+
+
+def collect_artifacts(workspace_path: str) -> Tuple[str, dict]:
+    """Collects a finished workspace into a new artifact set.
+
+    Returns:
+        The artifact id and the collect_workspace results.
+    """
+    store = get_artifact_store()
+    artifact_id, artifact_dir = store.create()
+    try:
+        return artifact_id, collect_workspace(workspace_path, artifact_dir)
+    except Exception:
+        store.discard(artifact_id)
+        raise
+
+
+def build_manifest_response(final_results: dict, artifacts: List[ArtifactSpec], files: dict, **extra) -> dict:
+    """Builds a response whose file objects describe files instead of embedding them.
+
+    Args:
+        final_results: Status, message and metadata of the finished workspace.
+        artifacts: The response's ArtifactSpec entries.
+        files: Stored name to a dict of extra file object fields (such as
+            "size" and "url") for every file that was produced.
+    """
+    response_data = {}
+    failure_message = None
+    for response_key, file_name, stored_name, required_message in artifacts:
+        response_data[response_key] = {"name": file_name, "type": ARTIFACT_FILES[stored_name]}
+        if stored_name in files:
+            response_data[response_key].update(files[stored_name])
+        elif required_message and failure_message is None:
+            failure_message = required_message
+
+    response_data["status"] = final_results["status"].lower() if final_results["status"] else "failed"
+    response_data["message"] = final_results["message"]
+    response_data.update(extra)
+    response_data["suggested_name"] = final_results.get("suggested_name") or ""
+    if failure_message and response_data["status"] == "success":
+        response_data["status"] = "failed"
+        response_data["message"] = failure_message
+    return response_data
+
+
+def manifest_data(final_results: dict, artifact_id: str, artifacts: List[ArtifactSpec], **extra) -> dict:
+    """Builds the manifest for a stored artifact set, with download URLs."""
+    store = get_artifact_store()
+    files = {}
+    for _, _, stored_name, _ in artifacts:
+        file_path = store.path_for(artifact_id, stored_name)
+        if file_path:
+            files[stored_name] = {
+                "size": os.path.getsize(file_path),
+                "url": url_for("api_v1.download_artifact", artifact_id=artifact_id, name=stored_name, _external=True),
+            }
+    return build_manifest_response(final_results, artifacts, files, **extra)
+
+
+def manifest_response(final_results: dict, artifact_id: str, artifacts: List[ArtifactSpec], **extra):
+    """Returns the manifest JSON for a stored artifact set, with download URLs."""
+    return jsonify(manifest_data(final_results, artifact_id, artifacts, **extra))
+
+
+def store_artifacts(artifact_id: str) -> Dict[str, dict]:
+    """Uploads a stored artifact set to object storage and discards it.
+
+    Returns:
+        Stored name to {"object": object name, "size": bytes} for every
+        file that was produced.
+    """
+    backend = require_storage_backend()
+    purge_expired_objects(backend)
+    store = get_artifact_store()
+    objects = {}
+    try:
+        for stored_name, _ in STORED_PATH_KEYS:
+            file_path = store.path_for(artifact_id, stored_name)
+            if not file_path:
+                continue
+            name = artifact_name(artifact_id, stored_name)
+            with span("storage.upload"):
+                backend.upload_file(file_path, name, ARTIFACT_FILES[stored_name])
+            objects[stored_name] = {"object": name, "size": os.path.getsize(file_path)}
+            count_bytes("storage.upload", objects[stored_name]["size"])
+    finally:
+        store.discard(artifact_id)
+    return objects
+
+
+def storage_manifest_data(final_results: dict, objects: Dict[str, dict], artifacts: List[ArtifactSpec], **extra) -> dict:
+    """Builds the manifest for an artifact set uploaded by store_artifacts(), with signed download URLs.
+
+    Each file also carries its object reference, which a later request can
+    pass back (e.g. as `game_bundle_ref`) without downloading the file.
+    """
+    backend = require_storage_backend()
+    files = {
+        stored_name: {
+            "size": stored["size"],
+            "url": signed_url(stored["object"]),
+            "object": backend.reference(stored["object"]),
+            "expires_in": signed_url_ttl(),
+        }
+        for stored_name, stored in objects.items()
+    }
+    return build_manifest_response(final_results, artifacts, files, **extra)
+
+
+def _read_chunks(file_path: str):
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _multipart_response(
+    response_data: dict,
+    sources: dict,
+    artifacts: List[ArtifactSpec],
+    on_close: Callable[[], None],
+    on_complete: Optional[Callable[[], None]] = None,
+) -> Response:
+    """Streams `response_data` as the JSON part followed by one part per produced artifact.
+
+    Args:
+        response_data: The JSON summary sent as the first part.
+        sources: Stored name to a callable returning the file's byte chunks.
+        artifacts: The response's ArtifactSpec entries, in part order.
+        on_close: Releases the artifact sources once the response is done.
+        on_complete: Called once every part was produced, before on_close.
+    """
+    boundary = uuid.uuid4().hex
+
+    def generate():
+        try:
+            yield (
+                f"--{boundary}\r\n"
+                "Content-Type: application/json\r\n"
+                "Content-Disposition: inline; name=\"result\"\r\n\r\n"
+            ).encode("utf-8")
+            yield json.dumps(response_data).encode("utf-8")
+            for response_key, file_name, stored_name, _ in artifacts:
+                if stored_name not in sources:
+                    continue
+                yield (
+                    f"\r\n--{boundary}\r\n"
+                    f"Content-Type: {ARTIFACT_FILES[stored_name]}\r\n"
+                    f"Content-Disposition: attachment; name=\"{response_key}\"; filename=\"{file_name}\"\r\n\r\n"
+                ).encode("utf-8")
+                yield from sources[stored_name]()
+            if on_complete:
+                on_complete()
+            yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+        finally:
+            on_close()
+
+    response = Response(generate(), content_type=f"multipart/mixed; boundary={boundary}")
+    # Also covers clients that disconnect before the body starts streaming.
+    response.call_on_close(on_close)
+    return response
+
+
+def workspace_multipart_response(
+    workspace_path: str, artifacts: List[ArtifactSpec], recorder: Optional[ResultRecorder] = None, **extra,
+) -> Response:
+    """Streams a finished workspace as a multipart/mixed body and removes it afterwards.
+
+    The first part is the JSON summary; the icon and splash are read from
+    disk in CHUNK_SIZE pieces and the bundle zip is compressed straight into
+    the response, so no artifact is ever materialized in full. A recorder
+    copies the streamed artifacts into the result cache, which keeps them
+    once the whole body was produced.
+    """
+    final_results = read_workspace_results(workspace_path)
+    sources = {}
+    files = {}
+    for stored_name, path_key in (("icon.png", "icon_path"), ("splash.png", "splash_path")):
+        if final_results[path_key]:
+            sources[stored_name] = lambda file_path=final_results[path_key]: _read_chunks(file_path)
+            files[stored_name] = {"size": os.path.getsize(final_results[path_key])}
+    sources["bundle.zip"] = lambda: iter_workspace_bundle(workspace_path)
+    files["bundle.zip"] = {}
+    if recorder is not None:
+        sources = {
+            stored_name: lambda stored_name=stored_name, source=source: recorder.tee(stored_name, source())
+            for stored_name, source in sources.items()
+        }
+
+    def on_close():
+        cleanup_workspace(workspace_path)
+        if recorder is not None:
+            recorder.discard()
+
+    response_data = build_manifest_response(final_results, artifacts, files, **extra)
+    return _multipart_response(
+        response_data, sources, artifacts, on_close,
+        on_complete=(lambda: record_result(recorder, final_results)) if recorder is not None else None,
+    )
+
+
+def record_result(recorder: ResultRecorder, final_results: dict) -> None:
+    """Stores a recorded result in the result cache if it succeeded, and discards the recording otherwise.
+
+    Only complete successes are worth replaying; anything else is retried.
+    Errors storing the result are logged, not raised.
+    """
+    if final_results.get("status") != "SUCCESS":
+        recorder.discard()
+        return
+    cached_results = {
+        key: value for key, value in final_results.items()
+        if key not in ARTIFACT_PATH_KEYS and not key.endswith("_base64Data")
+    }
+    try:
+        with span("cache.store"):
+            recorder.commit(cached_results)
+        logger.info("Stored result in cache", extra={"cache_key": recorder.key})
+    except Exception as e:
+        logger.error("Error storing result in cache: %s", e)
+
+
+def artifact_results(artifact_id: str, final_results: dict) -> dict:
+    """Returns `final_results` with its artifact paths pointing into the given artifact set."""
+    store = get_artifact_store()
+    results = dict(final_results)
+    for stored_name, path_key in STORED_PATH_KEYS:
+        results[path_key] = store.path_for(artifact_id, stored_name)
+    return results
+
+
+def encode_artifacts(artifact_id: str, final_results: dict) -> dict:
+    """Base64 encodes a stored artifact set into finalize_workspace results and discards it."""
+    try:
+        return encode_collected_results(artifact_results(artifact_id, final_results))
+    finally:
+        get_artifact_store().discard(artifact_id)
+
+
+def artifact_multipart_response(artifact_id: str, final_results: dict, artifacts: List[ArtifactSpec], **extra) -> Response:
+    """Streams a stored artifact set as a multipart/mixed body and discards it afterwards."""
+    store = get_artifact_store()
+    sources = {}
+    files = {}
+    for stored_name, _ in STORED_PATH_KEYS:
+        file_path = store.path_for(artifact_id, stored_name)
+        if file_path:
+            sources[stored_name] = lambda file_path=file_path: _read_chunks(file_path)
+            files[stored_name] = {"size": os.path.getsize(file_path)}
+
+    response_data = build_manifest_response(final_results, artifacts, files, **extra)
+    return _multipart_response(response_data, sources, artifacts, lambda: store.discard(artifact_id))
+
+
+@api_v1.route('/artifacts/<artifact_id>/<name>', methods=['GET'])
+def download_artifact(artifact_id, name):
+    file_path = get_artifact_store().path_for(artifact_id, name)
+    if not file_path:
+        return make_response(jsonify({"error": "Artifact not found or expired."}), 404)
+    return send_file(
+        file_path,
+        mimetype=ARTIFACT_FILES[name],
+        as_attachment=True,
+        download_name=name,
+        conditional=True,
+        max_age=0,
+    )
@@ -0,0 +1,243 @@
+from flask import request, jsonify, make_response
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import api_v1 # Import the blueprint
+from lib.artifacts import get_artifact_store
+from lib.call_cache import CallCacheError
+from lib.result_cache import get_result_cache, hash_stream, make_cache_key, ResultRecorder
+from lib.techiecrews import get_registry
+from lib.telemetry import span
+from lib.workspaces import ARTIFACT_PATH_KEYS, finalize_workspace, cleanup_workspace
+from .artifacts import (
+    collect_artifacts,
+    artifact_results,
+    encode_artifacts,
+    manifest_response,
+    artifact_multipart_response,
+    workspace_multipart_response,
+    record_result,
+    store_artifacts,
+    storage_manifest_data,
+    ArtifactSpec,
+    RESPONSE_MODE_BASE64,
+    RESPONSE_MODE_MULTIPART,
+    RESPONSE_MODE_STORAGE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Request header that skips the cache lookup; the fresh result still refreshes the entry.
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_BYPASS = "BYPASS"
+
+
+def cache_bypassed() -> bool:
+    """True if the client sent `X-Cache-Bypass: 1` or `Cache-Control: no-cache`."""
+    if request.headers.get(CACHE_BYPASS_HEADER, "").strip().lower() in ("1", "true", "yes"):
+        return True
+    cache_control = request.headers.get("Cache-Control", "").lower()
+    return any(directive.strip() in ("no-cache", "no-store") for directive in cache_control.split(","))
+
+
+def call_cache_error_response(e: CallCacheError):
+    """Answers 503 for a request that replay mode (GAME_GENERATOR_CALL_CACHE=replay) cannot serve offline."""
+    logger.warning("Call cache cannot replay the request: %s", e)
+    return make_response(jsonify({"error": f"The call cache cannot replay this request: {e}"}), 503)
+
+
+def result_cache_key(kind: str, request_text: str, uploads: Optional[Dict[str, object]] = None) -> Optional[str]:
+    """Returns the result cache key of a request, or None when the cache is disabled.
+
+    Args:
+        kind: The operation, e.g. "generate_game".
+        request_text: The client's request text.
+        uploads: Form field name to FileStorage (or None) for the uploaded files.
+            Their streams are hashed and rewound.
+    """
+    if get_result_cache() is None:
+        return None
+    with span("cache.key"):
+        input_digests = {
+            field: hash_stream(upload.stream)
+            for field, upload in (uploads or {}).items()
+            if upload
+        }
+    return make_cache_key(kind, request_text, input_digests, get_registry().fingerprint())
+
+
+def cached_artifacts(cache_key: str) -> Optional[Tuple[str, dict]]:
+    """Copies a cached result into a new artifact set.
+
+    Returns:
+        The artifact id and collect_workspace-style results, or None on a miss.
+    """
+    store = get_artifact_store()
+    artifact_id, artifact_dir = store.create()
+    try:
+        with span("cache.lookup"):
+            cached_results = get_result_cache().get(cache_key, artifact_dir)
+    except Exception:
+        store.discard(artifact_id)
+        raise
+    if cached_results is None:
+        store.discard(artifact_id)
+        return None
+    logger.info("Result cache hit", extra={"cache_key": cache_key})
+    return artifact_id, artifact_results(artifact_id, cached_results)
+
+
+def collect_and_cache(cache_key: Optional[str], workspace_path: str) -> Tuple[str, dict]:
+    """Collects a finished workspace into a new artifact set and stores successes in the result cache.
+
+    Returns:
+        The artifact id and the collect_workspace results.
+    """
+    artifact_id, final_results = collect_artifacts(workspace_path)
+    cache = get_result_cache() if cache_key else None
+    # Only complete successes are worth replaying; anything else is retried.
+    if cache is not None and final_results.get("status") == "SUCCESS" and final_results.get("bundle_path"):
+        try:
+            cached_results = {key: value for key, value in final_results.items() if key not in ARTIFACT_PATH_KEYS}
+            with span("cache.store"):
+                cache.put(cache_key, get_artifact_store().directory_for(artifact_id), cached_results)
+            logger.info("Stored result in cache", extra={"cache_key": cache_key})
+        except Exception as e:
+            logger.error("Error storing result in cache: %s", e)
+    return artifact_id, final_results
+
+
+def lookup_cached_artifacts(cache_key: Optional[str], use_cache: bool) -> Tuple[Optional[Tuple[str, dict]], Optional[str]]:
+    """Looks a request up in the result cache.
+
+    Args:
+        cache_key: The request's result_cache_key, or None to skip the cache.
+        use_cache: False if the client bypassed the cache lookup.
+
+    Returns:
+        The cached artifact id and results (None unless the cache had them)
+        and the cache status (HIT, MISS, BYPASS, or None without a cache).
+    """
+    cache = get_result_cache() if cache_key else None
+    if cache is None:
+        return None, None
+    if not use_cache:
+        cache.record_bypass()
+        return None, CACHE_BYPASS
+    cached = cached_artifacts(cache_key)
+    return cached, CACHE_HIT if cached is not None else CACHE_MISS
+
+
+def produce_artifacts(cache_key: Optional[str], use_cache: bool, run: Callable[[], str]) -> Tuple[str, dict, Optional[str]]:
+    """Returns the artifact set of a request, from the result cache or by running it.
+
+    Args:
+        cache_key: The request's result_cache_key, or None to skip the cache.
+        use_cache: False if the client bypassed the cache lookup.
+        run: Produces a finished workspace and returns its path; it owns the
+            workspace until it returns.
+
+    Returns:
+        The artifact id, collect_workspace-style results and the cache status
+        (HIT, MISS, BYPASS, or None without a cache).
+    """
+    cached, cache_status = lookup_cached_artifacts(cache_key, use_cache)
+    if cached is not None:
+        return cached[0], cached[1], cache_status
+
+    artifact_id, final_results = collect_and_cache(cache_key, run())
+    return artifact_id, final_results, cache_status
+
+
+def artifact_response(
+    response_mode: str,
+    artifact_id: str,
+    final_results: dict,
+    artifacts: List[ArtifactSpec],
+    build_response: Callable[[dict], dict],
+    cache_status: Optional[str] = None,
+    **extra,
+):
+    """Serves a produced artifact set in the requested response mode.
+
+    base64 and multipart responses discard the artifact set once they are
+    built, storage responses once it is uploaded to object storage; manifest
+    responses leave it to expire in the artifact store.
+    """
+    if response_mode == RESPONSE_MODE_BASE64:
+        response = jsonify(build_response(encode_artifacts(artifact_id, final_results)))
+    elif response_mode == RESPONSE_MODE_MULTIPART:
+        response = artifact_multipart_response(artifact_id, final_results, artifacts, **extra)
+    elif response_mode == RESPONSE_MODE_STORAGE:
+        response = jsonify(storage_manifest_data(final_results, store_artifacts(artifact_id), artifacts, **extra))
+    else:
+        response = manifest_response(final_results, artifact_id, artifacts, **extra)
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    return response
+
+
+def workspace_response(
+    response_mode: str,
+    workspace_path: str,
+    artifacts: List[ArtifactSpec],
+    build_response: Callable[[dict], dict],
+    cache_key: Optional[str] = None,
+    cache_status: Optional[str] = None,
+    **extra,
+):
+    """Serves a finished workspace in the requested response mode and consumes it.
+
+    multipart and base64 responses are built straight from the workspace,
+    as without a cache; the artifacts they stream are recorded on the way
+    and become a result cache entry once the whole result was produced.
+    manifest and storage responses collect the workspace into an artifact
+    set, which the cache links to.
+
+    Args:
+        cache_key: The request's result_cache_key, or None to skip the cache.
+        cache_status: Sent as the X-Cache header.
+    """
+    cache = get_result_cache() if cache_key else None
+    recorder = None
+    try:
+        if response_mode in (RESPONSE_MODE_MULTIPART, RESPONSE_MODE_BASE64) and cache is not None:
+            recorder = ResultRecorder(cache, cache_key)
+        if response_mode == RESPONSE_MODE_MULTIPART:
+            # The response owns the workspace and the recorder from here on
+            response = workspace_multipart_response(workspace_path, artifacts, recorder, **extra)
+        elif response_mode == RESPONSE_MODE_BASE64:
+            try:
+                final_results = finalize_workspace(workspace_path, recorder)
+                if recorder is not None and final_results.get("bundle_base64Data") is not None:
+                    record_result(recorder, final_results)
+            finally:
+                if recorder is not None:
+                    recorder.discard()
+            response = jsonify(build_response(final_results))
+        else:
+            artifact_id, final_results = collect_and_cache(cache_key, workspace_path)
+            response = artifact_response(response_mode, artifact_id, final_results, artifacts, build_response, **extra)
+    except Exception:
+        cleanup_workspace(workspace_path)
+        if recorder is not None:
+            recorder.discard()
+        raise
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    return response
+
+
+@api_v1.route('/cache/stats', methods=['GET'])
+def result_cache_stats():
+    cache = get_result_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    stats["enabled"] = True
+    return jsonify(stats)
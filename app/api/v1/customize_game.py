@@ -1,95 +1,178 @@
 from flask import request, jsonify, make_response
-import traceback
-import shutil
+import logging
 
 from . import api_v1 # Import the blueprint
-from lib.workspaces import initialize_workspace, prepare_workspace, finalize_workspace
-from app.usecases.customize_game import customize_game as customize_game_use_case
+from lib.workspaces import initialize_workspace, prepare_workspace, cleanup_workspace
+from lib.workspace_pool import WorkspaceCapacityError, WorkspaceQuotaError
+from lib.techiecrews import CrewDefinitionError
+from lib.call_cache import CallCacheError
+from app.usecases.customize_game import (
+    customize_game as customize_game_use_case,
+    default_customize_mode,
+    CUSTOMIZE_MODES,
+)
+from .artifacts import (
+    get_response_mode,
+    workspace_capacity_response,
+    workspace_quota_response,
+    crew_definition_error_response,
+)
+from .cached_results import (
+    result_cache_key,
+    cache_bypassed,
+    lookup_cached_artifacts,
+    artifact_response,
+    workspace_response,
+    call_cache_error_response,
+)
+from .storage import request_fields, request_files
+
+logger = logging.getLogger(__name__)
+
+CUSTOMIZE_GAME_ARTIFACTS = [
+    ("modified_icon", "modified_icon.png", "icon.png", "Failed to generate modified icon."),
+    ("modified_splash", "modified_splash.png", "splash.png", "Failed to generate modified splash screen."),
+    ("modified_bundle", "modified_bundle.zip", "bundle.zip", "Failed to generate modified game bundle zip."),
+]
+
+def build_customize_game_response(final_results: dict) -> dict:
+    """Builds the CustomizeGameResponse payload from finalize_workspace results."""
+    response_data = {
+        "modified_icon": {
+            "name": "modified_icon.png",
+            "type": "image/png",
+            "base64Data": final_results["icon_base64Data"]
+        },
+        "modified_splash": {
+            "name": "modified_splash.png",
+            "type": "image/png",
+            "base64Data": final_results["splash_base64Data"]
+        },
+        "modified_bundle": {
+            "name": "modified_bundle.zip",
+            "type": "application/zip",
+            "base64Data": final_results["bundle_base64Data"]
+        },
+        "status": final_results["status"].lower() if final_results["status"] else "failed",
+        "message": final_results["message"],
+        "suggested_name": final_results["suggested_name"]
+    }
+
+    # Ensure required fields have data, even if empty, to match schema
+    if not response_data["modified_icon"]["base64Data"]:
+         response_data["modified_icon"]["base64Data"] = "" # Icon is required
+         if response_data["status"] == "success":
+             response_data["status"] = "failed"
+             response_data["message"] = "Failed to generate modified icon."
+    if not response_data["modified_splash"]["base64Data"]:
+         response_data["modified_splash"]["base64Data"] = "" # Splash is required
+         if response_data["status"] == "success":
+             response_data["status"] = "failed"
+             response_data["message"] = "Failed to generate modified splash screen."
+    if not response_data["modified_bundle"]["base64Data"]:
+         response_data["modified_bundle"]["base64Data"] = "" # Bundle is required
+         if response_data["status"] == "success":
+             response_data["status"] = "failed"
+             response_data["message"] = "Failed to generate modified game bundle zip."
+    if "suggested_name" not in final_results or not final_results["suggested_name"]:
+         response_data["suggested_name"] = ""
+
+    return response_data
+
+def get_customize_mode() -> str:
+    """Reads the optional `mode` field of the form or JSON body (default: default_customize_mode()).
+
+    Raises:
+        ValueError: If the mode is not one of CUSTOMIZE_MODES.
+    """
+    mode = request_fields().get("mode") or default_customize_mode()
+    if mode not in CUSTOMIZE_MODES:
+        raise ValueError(f"Invalid mode '{mode}', expected one of: {', '.join(CUSTOMIZE_MODES)}")
+    return mode
+
+def has_game_bundle(fields) -> bool:
+    """True if the request uploads a game bundle or references one in object storage."""
+    return 'game_bundle' in request.files or bool(fields.get('game_bundle_ref'))
+
+def customize_cache_kind(mode: str) -> str:
+    """Returns the result cache kind of a customization; the two modes produce different results."""
+    return f"customize_game.{mode}"
 
 @api_v1.route('/customize_game', methods=['POST'])
 def customize_game():
-    if 'game_bundle' not in request.files or 'request' not in request.form:
-         return make_response(jsonify({"error": "Missing required form fields: 'game_bundle', 'request'"}), 400)
+    fields = request_fields()
+    if not has_game_bundle(fields) or 'request' not in fields:
+         return make_response(jsonify({"error": "Missing required fields: 'game_bundle' (or 'game_bundle_ref'), 'request'"}), 400)
 
-    game_icon = request.files.get('game_icon')
-    game_splash = request.files.get('game_splash')
-    game_bundle = request.files['game_bundle']
-    modification_request = request.form['request']
+    modification_request = fields['request']
+
+    try:
+        response_mode = get_response_mode()
+        mode = get_customize_mode()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
 
     workspace_path = None
+    prepared = False
     try:
-        # 1. Initialize workspace
+        # Uploaded, or fetched from object storage when sent as `<field>_ref`
+        files = request_files(fields)
+        game_bundle, game_icon, game_splash = files['game_bundle'], files['game_icon'], files['game_splash']
+
+        # 1. Serve the artifacts from the result cache when it has them
+        cache_key = result_cache_key(
+            customize_cache_kind(mode), modification_request,
+            {"game_bundle": game_bundle, "game_icon": game_icon, "game_splash": game_splash},
+        )
+        cached, cache_status = lookup_cached_artifacts(cache_key, not cache_bypassed())
+        if cached is not None:
+            return artifact_response(
+                response_mode, cached[0], cached[1], CUSTOMIZE_GAME_ARTIFACTS,
+                build_customize_game_response, cache_status,
+            )
+
+        # 2. Initialize workspace
         workspace_path = initialize_workspace()
 
-        # 2. Prepare workspace (unzip bundle, place assets)
+        # 3. Prepare workspace (unzip bundle, place assets)
         prepare_workspace(workspace_path, game_bundle, game_icon, game_splash)
+        prepared = True
+
+        # 4. Call the use case (placeholder for actual customization)
+        customize_game_use_case(workspace_path, modification_request, mode=mode)
+
+        # 5. Stream, encode, store or upload the artifacts, recording them in the result cache
+        finished_path, workspace_path = workspace_path, None
+        return workspace_response(
+            response_mode, finished_path, CUSTOMIZE_GAME_ARTIFACTS, build_customize_game_response,
+            cache_key, cache_status,
+        )
+
+    except WorkspaceQuotaError as e:
+        return workspace_quota_response(e, uploaded=not prepared)
+
+    except CrewDefinitionError as e:
+        return crew_definition_error_response(e)
 
-        # 3. Call the use case (placeholder for actual customization)
-        customize_game_use_case(workspace_path, modification_request)
-
-        # 4. Finalize workspace (collect results, zip, cleanup)
-        final_results = finalize_workspace(workspace_path)
-        workspace_path = None # Mark as cleaned up
-
-        # 5. Construct the response based on schema
-        response_data = {
-            "modified_icon": {
-                "name": "modified_icon.png",
-                "type": "image/png",
-                "base64Data": final_results["icon_base64Data"]
-            },
-            "modified_splash": {
-                "name": "modified_splash.png",
-                "type": "image/png",
-                "base64Data": final_results["splash_base64Data"]
-            },
-            "modified_bundle": {
-                "name": "modified_bundle.zip",
-                "type": "application/zip",
-                "base64Data": final_results["bundle_base64Data"]
-            },
-            "status": final_results["status"].lower() if final_results["status"] else "failed",
-            "message": final_results["message"],
-            "suggested_name": final_results["suggested_name"]
-        }
-
-        # Ensure required fields have data, even if empty, to match schema
-        if not response_data["modified_icon"]["base64Data"]:
-             response_data["modified_icon"]["base64Data"] = "" # Icon is required
-             if response_data["status"] == "success":
-                 response_data["status"] = "failed"
-                 response_data["message"] = "Failed to generate modified icon."
-        if not response_data["modified_splash"]["base64Data"]:
-             response_data["modified_splash"]["base64Data"] = "" # Splash is required
-             if response_data["status"] == "success":
-                 response_data["status"] = "failed"
-                 response_data["message"] = "Failed to generate modified splash screen."
-        if not response_data["modified_bundle"]["base64Data"]:
-             response_data["modified_bundle"]["base64Data"] = "" # Bundle is required
-             if response_data["status"] == "success":
-                 response_data["status"] = "failed"
-                 response_data["message"] = "Failed to generate modified game bundle zip."
-        if "suggested_name" not in final_results or not final_results["suggested_name"]:
-             response_data["suggested_name"] = ""
-
-        return jsonify(response_data)
-    
     except ValueError as e:
-        # Catch errors specifically from prepare_workspace (e.g., bad zip)
-        print(f"Input error during game customization: {e}")
-        traceback.print_exc()
+        if prepared:
+            # Raised while customizing the game, not by the request's input
+            logger.exception("Error during game customization: %s", e)
+            return make_response(jsonify({"error": "Server error during game customization."}), 500)
+        # Catch errors from request_files and prepare_workspace (e.g., bad zip or storage reference)
+        logger.warning("Input error during game customization: %s", e)
         return make_response(jsonify({"error": str(e)}), 400)
 
+    except WorkspaceCapacityError as e:
+        return workspace_capacity_response(e)
+
+    except CallCacheError as e:
+        return call_cache_error_response(e)
+
     except Exception as e:
-        print(f"Error during game customization: {e}")
-        traceback.print_exc() # Log the full traceback
+        logger.exception("Error during game customization: %s", e) # Log the full traceback
         return make_response(jsonify({"error": "Server error during game customization."}), 500)
 
     finally:
         # Ensure cleanup even if errors occurred before finalization
-        if workspace_path and shutil.os.path.exists(workspace_path):
-            try:
-                shutil.rmtree(workspace_path)
-                print(f"Cleaned up workspace due to error or incomplete finalization: {workspace_path}")
-            except Exception as cleanup_e:
-                print(f"Error during final workspace cleanup: {cleanup_e}") 
\ No newline at end of file
+        cleanup_workspace(workspace_path) 
\ No newline at end of file
@@ -1,11 +1,74 @@
 from flask import request, jsonify, make_response
 import uuid
-import traceback
-import shutil
+import logging
 
 from . import api_v1 # Import the blueprint
-from lib.workspaces import initialize_workspace, finalize_workspace
+from lib.workspaces import initialize_workspace, cleanup_workspace
+from lib.workspace_pool import WorkspaceCapacityError, WorkspaceQuotaError
+from lib.techiecrews import CrewDefinitionError
+from lib.call_cache import CallCacheError
 from app.usecases.generate_game import generate_game as generate_game_use_case
+from .artifacts import (
+    get_response_mode,
+    workspace_capacity_response,
+    workspace_quota_response,
+    crew_definition_error_response,
+)
+from .cached_results import (
+    result_cache_key,
+    cache_bypassed,
+    lookup_cached_artifacts,
+    artifact_response,
+    workspace_response,
+    call_cache_error_response,
+)
+
+logger = logging.getLogger(__name__)
+
+GENERATE_GAME_ARTIFACTS = [
+    ("generated_icon", "generated_icon.png", "icon.png", None),
+    ("generated_splash", "generated_splash.png", "splash.png", None),
+    ("generated_bundle", "generated_bundle.zip", "bundle.zip", "Failed to generate game bundle zip."),
+]
+
+def build_generate_game_response(final_results: dict) -> dict:
+    """Builds the GenerateGameResponse payload from finalize_workspace results."""
+    response_data = {
+        "generated_icon": {
+            "name": "generated_icon.png",
+            "type": "image/png",
+            "base64Data": final_results["icon_base64Data"]
+        },
+        "generated_splash": {
+            "name": "generated_splash.png",
+            "type": "image/png",
+            "base64Data": final_results["splash_base64Data"]
+        },
+        "generated_bundle": {
+            "name": "generated_bundle.zip",
+            "type": "application/zip",
+            "base64Data": final_results["bundle_base64Data"]
+        },
+        "status": final_results["status"].lower() if final_results["status"] else "failed",
+        "message": final_results["message"],
+        "generation_id": str(uuid.uuid4()),
+        "suggested_name": final_results["suggested_name"]
+    }
+
+    # Ensure required fields have data, even if empty, to match schema
+    if not response_data["generated_icon"]["base64Data"]:
+         response_data["generated_icon"]["base64Data"] = ""
+    if not response_data["generated_splash"]["base64Data"]:
+         response_data["generated_splash"]["base64Data"] = ""
+    if not response_data["generated_bundle"]["base64Data"]:
+         response_data["generated_bundle"]["base64Data"] = "" # Or handle as error depending on logic
+         if response_data["status"] == "success": # Bundle is required for success
+             response_data["status"] = "failed"
+             response_data["message"] = "Failed to generate game bundle zip."
+    if "suggested_name" not in final_results or not final_results["suggested_name"]:
+         response_data["suggested_name"] = ""
+
+    return response_data
 
 @api_v1.route('/generate_game', methods=['POST'])
 def generate_game():
@@ -18,66 +81,51 @@ def generate_game():
     if not game_request:
         return make_response(jsonify({"error": "Missing 'request' field"}), 400)
 
+    try:
+        response_mode = get_response_mode()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
     workspace_path = None
     try:
-        # 1. Initialize workspace
+        # 1. Serve the artifacts from the result cache when it has them
+        cache_key = result_cache_key("generate_game", game_request)
+        cached, cache_status = lookup_cached_artifacts(cache_key, not cache_bypassed())
+        if cached is not None:
+            return artifact_response(
+                response_mode, cached[0], cached[1], GENERATE_GAME_ARTIFACTS,
+                build_generate_game_response, cache_status, generation_id=str(uuid.uuid4()),
+            )
+
+        # 2. Initialize workspace
         workspace_path = initialize_workspace()
 
-        # 2. Call the use case (placeholder for actual generation)
+        # 3. Call the use case (placeholder for actual generation)
         generate_game_use_case(workspace_path, game_request)
 
-        # 3. Finalize workspace (collect results, zip, cleanup)
-        final_results = finalize_workspace(workspace_path)
-        workspace_path = None # Mark as cleaned up
-        
-        # 4. Construct the response based on schema
-        response_data = {
-            "generated_icon": {
-                "name": "generated_icon.png",
-                "type": "image/png",
-                "base64Data": final_results["icon_base64Data"]
-            },
-            "generated_splash": {
-                "name": "generated_splash.png",
-                "type": "image/png",
-                "base64Data": final_results["splash_base64Data"]
-            },
-            "generated_bundle": {
-                "name": "generated_bundle.zip",
-                "type": "application/zip",
-                "base64Data": final_results["bundle_base64Data"]
-            },
-            "status": final_results["status"].lower() if final_results["status"] else "failed",
-            "message": final_results["message"],
-            "generation_id": str(uuid.uuid4()),
-            "suggested_name": final_results["suggested_name"]
-        }
-
-        # Ensure required fields have data, even if empty, to match schema
-        if not response_data["generated_icon"]["base64Data"]:
-             response_data["generated_icon"]["base64Data"] = ""
-        if not response_data["generated_splash"]["base64Data"]:
-             response_data["generated_splash"]["base64Data"] = ""
-        if not response_data["generated_bundle"]["base64Data"]:
-             response_data["generated_bundle"]["base64Data"] = "" # Or handle as error depending on logic
-             if response_data["status"] == "success": # Bundle is required for success
-                 response_data["status"] = "failed"
-                 response_data["message"] = "Failed to generate game bundle zip."
-        if "suggested_name" not in final_results or not final_results["suggested_name"]:
-             response_data["suggested_name"] = ""
-
-        return jsonify(response_data)
+        # 4. Stream, encode, store or upload the artifacts, recording them in the result cache
+        finished_path, workspace_path = workspace_path, None
+        return workspace_response(
+            response_mode, finished_path, GENERATE_GAME_ARTIFACTS, build_generate_game_response,
+            cache_key, cache_status, generation_id=str(uuid.uuid4()),
+        )
+
+    except WorkspaceCapacityError as e:
+        return workspace_capacity_response(e)
+
+    except WorkspaceQuotaError as e:
+        return workspace_quota_response(e, uploaded=False)
+
+    except CrewDefinitionError as e:
+        return crew_definition_error_response(e)
+
+    except CallCacheError as e:
+        return call_cache_error_response(e)
 
     except Exception as e:
-        print(f"Error during game generation: {e}")
-        traceback.print_exc() # Log the full traceback
+        logger.exception("Error during game generation: %s", e) # Log the full traceback
         return make_response(jsonify({"error": "Server error during game generation."}), 500)
 
     finally:
         # Ensure cleanup even if errors occurred before finalization
-        if workspace_path and shutil.os.path.exists(workspace_path):
-            try:
-                shutil.rmtree(workspace_path)
-                print(f"Cleaned up workspace due to error or incomplete finalization: {workspace_path}")
-            except Exception as cleanup_e:
-                print(f"Error during final workspace cleanup: {cleanup_e}") 
\ No newline at end of file
+        cleanup_workspace(workspace_path) 
\ No newline at end of file
@@ -0,0 +1,193 @@
+from flask import request, jsonify, make_response, Response, stream_with_context
+import json
+import logging
+import os
+import uuid
+from typing import List
+
+from . import api_v1 # Import the blueprint
+from lib.artifacts import get_artifact_store
+from lib.result_cache import get_result_cache
+from lib.workspace_pool import WorkspaceCapacityError
+from app.usecases.generate_game_batch import generate_game_batch, BatchGame
+from .generate_game import build_generate_game_response, GENERATE_GAME_ARTIFACTS
+from .artifacts import (
+    get_response_mode,
+    encode_artifacts,
+    manifest_data,
+    store_artifacts,
+    storage_manifest_data,
+    RESPONSE_MODE_BASE64,
+    RESPONSE_MODE_MULTIPART,
+    RESPONSE_MODE_STORAGE,
+    WORKSPACE_RETRY_AFTER_SECONDS,
+)
+from .cached_results import (
+    result_cache_key,
+    cache_bypassed,
+    cached_artifacts,
+    collect_and_cache,
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_BYPASS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def max_batch_games() -> int:
+    """Returns how many games one batch may ask for (env GAME_GENERATOR_BATCH_MAX_GAMES, default 16)."""
+    return int(os.environ.get("GAME_GENERATOR_BATCH_MAX_GAMES", "16"))
+
+
+def _strings(value, field: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+        raise ValueError(f"'{field}' must be a list of non-empty strings")
+    return value
+
+
+def parse_batch(data: dict) -> List[BatchGame]:
+    """Reads the games of a batch request body.
+
+    The body holds a `request` with optional `variants`, a `requests` list
+    whose entries are strings or such objects, or both. Each variant is one
+    game; a request without variants is one game. Games are tagged with
+    (request index, variant index or None), `request` coming first.
+
+    Raises:
+        ValueError: If the body is malformed or asks for too many games.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    entries = []
+    if data.get("request") is not None:
+        entries.append({"request": data["request"], "variants": data.get("variants")})
+    elif data.get("variants") is not None:
+        raise ValueError("'variants' requires a 'request'")
+    requests = data.get("requests")
+    if requests is not None:
+        if not isinstance(requests, list):
+            raise ValueError("'requests' must be a list")
+        entries.extend(entry if isinstance(entry, dict) else {"request": entry} for entry in requests)
+    if not entries:
+        raise ValueError("Missing 'request' or 'requests' field")
+
+    games = []
+    for index, entry in enumerate(entries):
+        game_request = entry.get("request")
+        if not isinstance(game_request, str) or not game_request:
+            raise ValueError(f"Request {index} has no 'request' text")
+        variants = entry.get("variants")
+        if variants is None:
+            games.append(BatchGame(game_request, tag=(index, None)))
+            continue
+        for variant_index, variant in enumerate(_strings(variants, "variants")):
+            games.append(BatchGame(game_request, variant, tag=(index, variant_index)))
+    if len(games) > max_batch_games():
+        raise ValueError(f"A batch may generate at most {max_batch_games()} games, got {len(games)}")
+    return games
+
+
+def _game_cache_key(game: BatchGame):
+    if game.variant is None:
+        # Shared with POST /v1/generate_game
+        return result_cache_key("generate_game", game.request)
+    return result_cache_key("generate_game.variant", json.dumps([game.request, game.variant]))
+
+
+def _game_fields(game: BatchGame) -> dict:
+    index, variant_index = game.tag
+    return {"index": index, "variant_index": variant_index, "request": game.request, "variant": game.variant}
+
+
+def _result_line(game: BatchGame, response_mode: str, artifact_id: str, final_results: dict, cache_status) -> dict:
+    if response_mode == RESPONSE_MODE_BASE64:
+        body = build_generate_game_response(encode_artifacts(artifact_id, final_results))
+    elif response_mode == RESPONSE_MODE_STORAGE:
+        body = storage_manifest_data(
+            final_results, store_artifacts(artifact_id), GENERATE_GAME_ARTIFACTS, generation_id=str(uuid.uuid4()),
+        )
+    else:
+        body = manifest_data(final_results, artifact_id, GENERATE_GAME_ARTIFACTS, generation_id=str(uuid.uuid4()))
+    return {**_game_fields(game), "cache_status": cache_status, **body}
+
+
+def _error_line(game: BatchGame, error: Exception) -> dict:
+    line = {**_game_fields(game), "status": "failed"}
+    if isinstance(error, WorkspaceCapacityError):
+        line.update(message=str(error), retry_after=WORKSPACE_RETRY_AFTER_SECONDS)
+    else:
+        line["message"] = "Server error during game generation."
+    return line
+
+
+@api_v1.route('/generate_game/batch', methods=['POST'])
+def generate_game_batch_route():
+    if not request.is_json:
+        return make_response(jsonify({"error": "Request must be JSON"}), 400)
+    try:
+        games = parse_batch(request.get_json())
+        response_mode = get_response_mode()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    if response_mode == RESPONSE_MODE_MULTIPART:
+        return make_response(jsonify({"error": "response_mode 'multipart' is not supported for batches"}), 400)
+
+    cache_keys = {game.tag: _game_cache_key(game) for game in games}
+    use_cache = not cache_bypassed()
+    cache_status = None
+    if get_result_cache() is not None:
+        cache_status = CACHE_MISS if use_cache else CACHE_BYPASS
+
+    def finish(game: BatchGame, workspace_path: str):
+        return collect_and_cache(cache_keys[game.tag], workspace_path)
+
+    def discard(value) -> None:
+        # Collected after the client went away; the result cache keeps its own copy
+        get_artifact_store().discard(value[0])
+
+    def generate():
+        statuses = []
+
+        def emit(line: dict) -> bytes:
+            statuses.append(line["status"])
+            return (json.dumps(line) + "\n").encode("utf-8")
+
+        # Cached games are answered first; only the others are generated
+        misses = []
+        for game in games:
+            cached = cached_artifacts(cache_keys[game.tag]) if use_cache and cache_keys[game.tag] else None
+            if cached is None:
+                misses.append(game)
+            else:
+                yield emit(_result_line(game, response_mode, cached[0], cached[1], CACHE_HIT))
+        if cache_status == CACHE_BYPASS:
+            for _ in games:
+                get_result_cache().record_bypass()
+
+        results = generate_game_batch(misses, finish, discard)
+        try:
+            for result in results:
+                if result.error is not None:
+                    yield emit(_error_line(result.game, result.error))
+                    continue
+                try:
+                    artifact_id, final_results = result.value
+                    line = _result_line(result.game, response_mode, artifact_id, final_results, cache_status)
+                except Exception as e:
+                    logger.exception("Error serving batch result: %s", e)
+                    line = _error_line(result.game, e)
+                yield emit(line)
+        finally:
+            # On a client disconnect (GeneratorExit at a yield) this cancels the
+            # games not yet started and releases their workspaces and artifacts
+            results.close()
+
+        summary = {"done": True, "games": len(statuses)}
+        summary.update((status, statuses.count(status)) for status in ("success", "partial_success", "failed"))
+        yield (json.dumps(summary) + "\n").encode("utf-8")
+
+    response = Response(stream_with_context(generate()), content_type="application/x-ndjson")
+    # Lets reverse proxies pass every line on as soon as it is written.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
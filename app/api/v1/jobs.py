@@ -0,0 +1,487 @@
+from flask import request, jsonify, make_response, url_for, Response, stream_with_context
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Optional
+
+from . import api_v1 # Import the blueprint
+from lib.jobs import (
+    get_job_queue,
+    Job,
+    QueueFullError,
+    JOB_SUCCEEDED,
+    JOB_FAILED,
+    TERMINAL_STATUSES,
+)
+from lib.checkpoints import get_checkpoint_store
+from lib.workspaces import initialize_workspace, prepare_workspace, renew_workspace, cleanup_workspace
+from lib.workspace_pool import WorkspaceCapacityError, WorkspaceQuotaError
+from app.usecases.generate_game import generate_game as generate_game_use_case
+from app.usecases.customize_game import customize_game as customize_game_use_case
+from app.usecases.pipeline import STAGE_NAMES, next_stage, previous_stage
+from .generate_game import build_generate_game_response, GENERATE_GAME_ARTIFACTS
+from .customize_game import (
+    build_customize_game_response,
+    get_customize_mode,
+    has_game_bundle,
+    customize_cache_kind,
+    CUSTOMIZE_GAME_ARTIFACTS,
+)
+from .artifacts import (
+    get_response_mode,
+    encode_artifacts,
+    manifest_data,
+    store_artifacts,
+    storage_manifest_data,
+    workspace_capacity_response,
+    workspace_quota_response,
+    RESPONSE_MODE_BASE64,
+    RESPONSE_MODE_MULTIPART,
+    RESPONSE_MODE_STORAGE,
+)
+from .cached_results import result_cache_key, cache_bypassed, produce_artifacts
+from .storage import request_fields, request_files
+
+logger = logging.getLogger(__name__)
+
+# Seconds a client is asked to wait before resubmitting when the queue is full.
+RETRY_AFTER_SECONDS = 30
+
+# Milliseconds an event stream client waits before reconnecting.
+EVENTS_RETRY_MS = 5000
+
+# Seconds a client is asked to wait when all event stream slots are taken.
+EVENTS_RETRY_AFTER_SECONDS = 10
+
+# Each open event stream holds a server thread; this counts them.
+_event_streams = 0
+_event_streams_lock = threading.Lock()
+
+# Use case and response builder of every job kind.
+JOB_KINDS = {
+    "generate_game": (generate_game_use_case, build_generate_game_response),
+    "customize_game": (customize_game_use_case, build_customize_game_response),
+}
+
+
+def _job_result(
+    artifact_id: str,
+    final_results: dict,
+    cache_status: Optional[str],
+    response_mode: str,
+    build_response,
+    **extra,
+) -> dict:
+    """Turns a job's artifact set into what the result endpoint serves.
+
+    Manifest results keep the artifacts on disk; storage results upload
+    them to object storage as the job finishes. Their download URLs are
+    built when the result is fetched, inside a request context, so signed
+    URLs are fresh.
+    """
+    if response_mode == RESPONSE_MODE_BASE64:
+        return {
+            "response_mode": response_mode,
+            "body": build_response(encode_artifacts(artifact_id, final_results)),
+            "cache_status": cache_status,
+        }
+    if response_mode == RESPONSE_MODE_STORAGE:
+        return {
+            "response_mode": response_mode,
+            "objects": store_artifacts(artifact_id),
+            "final_results": final_results,
+            "extra": extra,
+            "cache_status": cache_status,
+        }
+    return {
+        "response_mode": response_mode,
+        "artifact_id": artifact_id,
+        "final_results": final_results,
+        "extra": extra,
+        "cache_status": cache_status,
+    }
+
+
+def _run_generate_game(job: Job, game_request: str, response_mode: str, cache_key: Optional[str], use_cache: bool) -> dict:
+    def run():
+        workspace_path = initialize_workspace()
+        try:
+            generate_game_use_case(
+                workspace_path, game_request,
+                checkpoint_id=job.checkpoint_id, before_stage=lambda stage: job.raise_if_cancelled(),
+            )
+            job.raise_if_cancelled()
+            finished_path, workspace_path = workspace_path, None # Consumed by produce_artifacts
+            return finished_path
+        finally:
+            cleanup_workspace(workspace_path)
+
+    job.raise_if_cancelled()
+    artifact_id, final_results, cache_status = produce_artifacts(cache_key, use_cache, run)
+    return _job_result(
+        artifact_id, final_results, cache_status, response_mode, build_generate_game_response,
+        generation_id=str(uuid.uuid4()),
+    )
+
+
+def _run_customize_game(
+    job: Job,
+    workspace_path: str,
+    modification_request: str,
+    mode: str,
+    response_mode: str,
+    cache_key: Optional[str],
+    use_cache: bool,
+) -> dict:
+    def run():
+        nonlocal workspace_path
+        customize_game_use_case(
+            workspace_path, modification_request, mode=mode,
+            checkpoint_id=job.checkpoint_id, before_stage=lambda stage: job.raise_if_cancelled(),
+        )
+        job.raise_if_cancelled()
+        finished_path, workspace_path = workspace_path, None # Consumed by produce_artifacts
+        return finished_path
+
+    try:
+        job.raise_if_cancelled()
+        # Prepared when the job was submitted: its age counts from now, not from its time in the queue
+        renew_workspace(workspace_path)
+        artifact_id, final_results, cache_status = produce_artifacts(cache_key, use_cache, run)
+        return _job_result(artifact_id, final_results, cache_status, response_mode, build_customize_game_response)
+    finally:
+        # Still set if the result came from the cache or the job failed
+        cleanup_workspace(workspace_path)
+
+
+def _run_resumed(job: Job, start_stage: str, request_text: str, response_mode: str) -> dict:
+    use_case, build_response = JOB_KINDS[job.kind]
+
+    def run():
+        workspace_path = initialize_workspace()
+        try:
+            use_case(
+                workspace_path, request_text,
+                checkpoint_id=job.checkpoint_id, start_stage=start_stage,
+                before_stage=lambda stage: job.raise_if_cancelled(),
+            )
+            job.raise_if_cancelled()
+            finished_path, workspace_path = workspace_path, None # Consumed by produce_artifacts
+            return finished_path
+        finally:
+            cleanup_workspace(workspace_path)
+
+    job.raise_if_cancelled()
+    # A resumed run depends on the stored stages, not only on its inputs, so
+    # it is neither served from nor stored in the result cache.
+    artifact_id, final_results, cache_status = produce_artifacts(None, False, run)
+    extra = {"generation_id": str(uuid.uuid4())} if job.kind == "generate_game" else {}
+    return _job_result(artifact_id, final_results, cache_status, response_mode, build_response, **extra)
+
+
+def _get_job_response_mode() -> str:
+    response_mode = get_response_mode()
+    if response_mode == RESPONSE_MODE_MULTIPART:
+        raise ValueError("response_mode 'multipart' is not supported for jobs; use 'manifest' instead.")
+    return response_mode
+
+
+def _job_status_body(job: Job) -> dict:
+    body = job.to_dict()
+    body["status_url"] = url_for("api_v1.get_job", job_id=job.id)
+    body["result_url"] = url_for("api_v1.get_job_result", job_id=job.id)
+    body["retry_url"] = url_for("api_v1.retry_job", job_id=job.id)
+    body["events_url"] = url_for("api_v1.stream_job_events", job_id=job.id)
+    body["checkpoint_stages"] = get_checkpoint_store().stages(job.checkpoint_id)
+    return body
+
+
+def _accepted(job: Job):
+    response = make_response(jsonify(_job_status_body(job)), 202)
+    response.headers["Location"] = url_for("api_v1.get_job", job_id=job.id)
+    return response
+
+
+def _queue_full(e: QueueFullError):
+    response = make_response(jsonify({"error": str(e), "retry_after": RETRY_AFTER_SECONDS}), 429)
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+@api_v1.route('/jobs/generate_game', methods=['POST'])
+def submit_generate_game():
+    if not request.is_json:
+        return make_response(jsonify({"error": "Request must be JSON"}), 400)
+
+    data = request.get_json()
+    game_request = data.get('request')
+
+    if not game_request:
+        return make_response(jsonify({"error": "Missing 'request' field"}), 400)
+
+    try:
+        response_mode = _get_job_response_mode()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    cache_key = result_cache_key("generate_game", game_request)
+    use_cache = not cache_bypassed()
+    try:
+        job = get_job_queue().submit(
+            "generate_game",
+            lambda job: _run_generate_game(job, game_request, response_mode, cache_key, use_cache),
+        )
+    except QueueFullError as e:
+        return _queue_full(e)
+    return _accepted(job)
+
+
+@api_v1.route('/jobs/customize_game', methods=['POST'])
+def submit_customize_game():
+    fields = request_fields()
+    if not has_game_bundle(fields) or 'request' not in fields:
+         return make_response(jsonify({"error": "Missing required fields: 'game_bundle' (or 'game_bundle_ref'), 'request'"}), 400)
+
+    modification_request = fields['request']
+
+    try:
+        response_mode = _get_job_response_mode()
+        mode = get_customize_mode()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    workspace_path = None
+    try:
+        # The uploads only live for the duration of this request, so the
+        # workspace is prepared here and handed over to the job.
+        files = request_files(fields)
+        game_bundle, game_icon, game_splash = files['game_bundle'], files['game_icon'], files['game_splash']
+        cache_key = result_cache_key(
+            customize_cache_kind(mode), modification_request,
+            {"game_bundle": game_bundle, "game_icon": game_icon, "game_splash": game_splash},
+        )
+        use_cache = not cache_bypassed()
+        workspace_path = initialize_workspace()
+        prepare_workspace(workspace_path, game_bundle, game_icon, game_splash)
+
+        prepared_path = workspace_path
+        job = get_job_queue().submit(
+            "customize_game",
+            lambda job: _run_customize_game(
+                job, prepared_path, modification_request, mode, response_mode, cache_key, use_cache,
+            ),
+            on_discard=lambda: cleanup_workspace(prepared_path),
+        )
+        workspace_path = None # Owned by the job now
+        return _accepted(job)
+
+    except QueueFullError as e:
+        return _queue_full(e)
+
+    except WorkspaceCapacityError as e:
+        return workspace_capacity_response(e)
+
+    except WorkspaceQuotaError as e:
+        return workspace_quota_response(e, uploaded=True)
+
+    except ValueError as e:
+        logger.warning("Input error during game customization: %s", e)
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    except Exception as e:
+        logger.exception("Error submitting game customization job: %s", e)
+        return make_response(jsonify({"error": "Server error during game customization."}), 500)
+
+    finally:
+        cleanup_workspace(workspace_path)
+
+
+@api_v1.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return make_response(jsonify({"error": f"Unknown job: {job_id}"}), 404)
+    return jsonify(_job_status_body(job))
+
+
+def _job_result_body(job: Job) -> dict:
+    """Returns the response body of a succeeded job, as the synchronous endpoint would."""
+    result = job.result
+    if result["response_mode"] == RESPONSE_MODE_BASE64:
+        return result["body"]
+    artifacts = GENERATE_GAME_ARTIFACTS if job.kind == "generate_game" else CUSTOMIZE_GAME_ARTIFACTS
+    if result["response_mode"] == RESPONSE_MODE_STORAGE:
+        return storage_manifest_data(result["final_results"], result["objects"], artifacts, **result["extra"])
+    return manifest_data(result["final_results"], result["artifact_id"], artifacts, **result["extra"])
+
+
+@api_v1.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return make_response(jsonify({"error": f"Unknown job: {job_id}"}), 404)
+    if job.status == JOB_SUCCEEDED:
+        response = jsonify(_job_result_body(job))
+        if job.result["cache_status"]:
+            response.headers["X-Cache"] = job.result["cache_status"]
+        return response
+    if job.status not in TERMINAL_STATUSES:
+        return make_response(jsonify(_job_status_body(job)), 202)
+    status_code = 500 if job.status == JOB_FAILED else 409
+    return make_response(jsonify({"error": job.error, "status": job.status}), status_code)
+
+
+@api_v1.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Starts a new job from the last checkpointed stage of a finished job.
+
+    The optional JSON body may name the stage to start from (`from_stage`,
+    e.g. "html5" to rebuild the game from a stored hierarchy) and a
+    replacement `request`.
+    """
+    source_job = get_job_queue().get(job_id)
+    if source_job is None:
+        return make_response(jsonify({"error": f"Unknown job: {job_id}"}), 404)
+    if source_job.status not in TERMINAL_STATUSES:
+        return make_response(jsonify({"error": f"Job {job_id} is still {source_job.status}."}), 409)
+
+    checkpoint_id = source_job.checkpoint_id
+    checkpoint = get_checkpoint_store().info(checkpoint_id)
+    if checkpoint is None:
+        return make_response(jsonify({"error": f"No checkpoint stored for job {job_id}."}), 404)
+
+    data = request.get_json(silent=True) or {}
+    start_stage = data.get("from_stage") or next_stage(checkpoint["stages"])
+    if start_stage is None:
+        return make_response(jsonify({
+            "error": "All stages completed; pass 'from_stage' to run a stage again.",
+            "stages": STAGE_NAMES,
+        }), 409)
+    if start_stage not in STAGE_NAMES:
+        return make_response(jsonify({"error": f"Unknown stage '{start_stage}'.", "stages": STAGE_NAMES}), 400)
+    if previous_stage(start_stage) not in checkpoint["stages"]:
+        return make_response(jsonify({
+            "error": f"Stage '{start_stage}' cannot start: '{previous_stage(start_stage)}' has no checkpoint.",
+        }), 409)
+
+    try:
+        response_mode = _get_job_response_mode()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+
+    request_text = data.get("request") or checkpoint["request"]
+    try:
+        job = get_job_queue().submit(
+            checkpoint["kind"],
+            lambda job: _run_resumed(job, start_stage, request_text, response_mode),
+            checkpoint_id=checkpoint_id,
+        )
+    except QueueFullError as e:
+        return _queue_full(e)
+    return _accepted(job)
+
+
+def max_event_streams() -> int:
+    """Returns how many event streams may be open at once in this process.
+
+    Environment:
+        GAME_GENERATOR_EVENTS_MAX_STREAMS: The limit (default: half of
+            GAME_GENERATOR_THREADS, so the other threads keep serving the API).
+    """
+    default = max(1, int(os.environ.get("GAME_GENERATOR_THREADS", "8")) // 2)
+    return int(os.environ.get("GAME_GENERATOR_EVENTS_MAX_STREAMS", str(default)))
+
+
+def _open_event_stream() -> bool:
+    global _event_streams
+    with _event_streams_lock:
+        if _event_streams >= max_event_streams():
+            return False
+        _event_streams += 1
+        return True
+
+
+def _close_event_stream() -> None:
+    global _event_streams
+    with _event_streams_lock:
+        _event_streams -= 1
+
+
+@api_v1.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Streams a job's progress as Server-Sent Events until it finishes.
+
+    Every event the job published is replayed first, or only those after the
+    `Last-Event-ID` header (or `last_event_id` query parameter) of a
+    reconnecting client. Once the job is finished a final `result` event
+    carries the job status and, for succeeded jobs, the result body.
+    Comment lines keep idle connections open every
+    GAME_GENERATOR_EVENTS_HEARTBEAT seconds (default 15).
+
+    A stream holds a server thread while it is open, so at most
+    max_event_streams() are served at once; beyond that clients get 503 with
+    Retry-After and can poll the status URL instead.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return make_response(jsonify({"error": f"Unknown job: {job_id}"}), 404)
+    if not _open_event_stream():
+        response = make_response(jsonify({
+            "error": "Too many open event streams; retry later or poll the status URL.",
+            "status_url": url_for("api_v1.get_job", job_id=job.id),
+            "retry_after": EVENTS_RETRY_AFTER_SECONDS,
+        }), 503)
+        response.headers["Retry-After"] = str(EVENTS_RETRY_AFTER_SECONDS)
+        return response
+    released = threading.Event()
+
+    def release():
+        # Called when the body is exhausted and again when the response closes
+        if not released.is_set():
+            released.set()
+            _close_event_stream()
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or 0)
+    except ValueError:
+        last_id = 0
+    heartbeat = float(os.environ.get("GAME_GENERATOR_EVENTS_HEARTBEAT", "15"))
+
+    def generate():
+        nonlocal last_id
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            while True:
+                events, closed = job.progress.events_after(last_id, heartbeat)
+                for event in events:
+                    yield event.to_sse()
+                    last_id = event.id
+                if closed:
+                    break
+                if not events:
+                    yield ": keep-alive\n\n"
+            body = _job_status_body(job)
+            if job.status == JOB_SUCCEEDED:
+                body["result"] = _job_result_body(job)
+                body["cache_status"] = job.result["cache_status"]
+            # No id: a client reconnecting after the result replays nothing but the result
+            yield f"event: result\ndata: {json.dumps(body)}\n\n"
+        finally:
+            release()
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    # Also covers clients that disconnect before the body starts streaming.
+    response.call_on_close(release)
+    response.headers["Cache-Control"] = "no-cache"
+    # Lets reverse proxies pass every event on as soon as it is written.
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@api_v1.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return make_response(jsonify({"error": f"Unknown job: {job_id}"}), 404)
+    return jsonify(_job_status_body(job))
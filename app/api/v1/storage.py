@@ -0,0 +1,186 @@
+from flask import request, jsonify, make_response, send_file
+import logging
+import mimetypes
+import posixpath
+import tempfile
+from typing import Dict, Mapping, Optional
+from urllib.parse import urljoin
+
+from werkzeug.datastructures import FileStorage
+
+from . import api_v1 # Import the blueprint
+from lib.archives import bundle_limits
+from lib.storage import (
+    get_storage_backend,
+    purge_expired_objects,
+    signed_url_ttl,
+    upload_name,
+    LocalStorageBackend,
+    StorageBackend,
+    StorageObjectNotFound,
+)
+from lib.telemetry import span, count_bytes
+
+logger = logging.getLogger(__name__)
+
+# Files a request may send as uploads or as `<field>_ref` object references.
+INPUT_FILE_FIELDS = ("game_bundle", "game_icon", "game_splash")
+
+# Bytes of a fetched object kept in memory before it spills to a temporary file.
+SPOOL_BYTES = 8 * 1024 * 1024
+
+
+def require_storage_backend() -> StorageBackend:
+    """Returns the configured StorageBackend.
+
+    Raises:
+        ValueError: If object storage is not configured.
+    """
+    backend = get_storage_backend()
+    if backend is None:
+        raise ValueError("Object storage is not configured on this server (GAME_GENERATOR_STORAGE).")
+    return backend
+
+
+def signed_url(name: str, method: str = "GET", content_type: Optional[str] = None) -> str:
+    """Returns an absolute signed URL for an object; host-relative URLs get the request's host."""
+    url = require_storage_backend().signed_url(name, method, signed_url_ttl(), content_type)
+    return urljoin(request.host_url, url) if url.startswith("/") else url
+
+
+def request_fields() -> Mapping[str, str]:
+    """Returns the form fields of the request, or its JSON body when it sends one."""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        return data if isinstance(data, dict) else {}
+    return request.form
+
+
+def open_object(reference: str) -> FileStorage:
+    """Fetches a stored object into a FileStorage, as if the client had uploaded it.
+
+    The object is copied into a spooled temporary file, which stays in
+    memory up to SPOOL_BYTES.
+
+    Raises:
+        ValueError: If storage is not configured, or the object is invalid,
+            missing or larger than the bundle size limit.
+    """
+    backend = require_storage_backend()
+    name = backend.object_name(reference)
+    size = backend.size(name)
+    if size is None:
+        raise ValueError(f"Storage object not found: {reference}")
+    max_bytes = bundle_limits().max_archive_bytes
+    if size > max_bytes:
+        raise ValueError(f"Storage object {reference} is larger than {max_bytes} bytes.")
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    try:
+        with span("storage.download"):
+            backend.download(name, spooled)
+    except StorageObjectNotFound:
+        spooled.close()
+        raise ValueError(f"Storage object not found: {reference}") from None
+    except Exception:
+        spooled.close()
+        raise
+    count_bytes("storage.download", size)
+    spooled.seek(0)
+    filename = posixpath.basename(name)
+    return FileStorage(
+        stream=spooled, filename=filename, content_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+    )
+
+
+def request_files(fields: Mapping[str, str]) -> Dict[str, Optional[FileStorage]]:
+    """Returns the INPUT_FILE_FIELDS of a request, uploaded or fetched from storage.
+
+    Each file is either a multipart upload under its field name or an object
+    reference in the `<field>_ref` field (see POST /v1/storage/uploads).
+
+    Raises:
+        ValueError: If a file is sent both ways or its reference cannot be fetched.
+    """
+    files = {}
+    for field in INPUT_FILE_FIELDS:
+        reference = fields.get(f"{field}_ref")
+        if reference and field in request.files:
+            raise ValueError(f"Send either '{field}' or '{field}_ref', not both.")
+        files[field] = open_object(reference) if reference else request.files.get(field)
+    return files
+
+
+@api_v1.route('/storage/uploads', methods=['POST'])
+def create_upload():
+    """Reserves an object for a client upload and returns a signed URL to PUT it to.
+
+    The JSON body may name the `filename` and its `content_type`; the PUT
+    must send that Content-Type. The returned `object` is what the client
+    passes back, e.g. as `game_bundle_ref`.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename") or "game_bundle.zip"
+    content_type = data.get("content_type") or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    try:
+        backend = require_storage_backend()
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 404)
+    purge_expired_objects(backend)
+    name = upload_name(filename)
+    return jsonify({
+        "object": backend.reference(name),
+        "upload_url": signed_url(name, "PUT", content_type),
+        "method": "PUT",
+        "headers": {"Content-Type": content_type},
+        "expires_in": signed_url_ttl(),
+    })
+
+
+def _local_object(name: str, method: str) -> Optional[LocalStorageBackend]:
+    """Returns the local backend if the request carries a valid signature for `method` on `name`."""
+    backend = get_storage_backend()
+    if not isinstance(backend, LocalStorageBackend):
+        return None
+    try:
+        backend.object_name(name)
+    except ValueError:
+        return None
+    if request.args.get("method", "").upper() != method:
+        return None
+    if not backend.verify(name, method, request.args.get("expires", ""), request.args.get("signature", "")):
+        return None
+    return backend
+
+
+@api_v1.route('/storage/objects/<path:name>', methods=['PUT'])
+def put_storage_object(name):
+    """Receives an upload to a signed URL of the local storage backend."""
+    backend = _local_object(name, "PUT")
+    if backend is None:
+        return make_response(jsonify({"error": "Invalid or expired signature."}), 403)
+    try:
+        with span("storage.upload"):
+            size = backend.write(name, request.stream, max_bytes=bundle_limits().max_archive_bytes)
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 413)
+    count_bytes("storage.upload", size)
+    logger.info("Stored object", extra={"object": name, "size": size})
+    return make_response("", 200)
+
+
+@api_v1.route('/storage/objects/<path:name>', methods=['GET'])
+def get_storage_object(name):
+    """Serves a download from a signed URL of the local storage backend."""
+    backend = _local_object(name, "GET")
+    if backend is None:
+        return make_response(jsonify({"error": "Invalid or expired signature."}), 403)
+    if backend.size(name) is None:
+        return make_response(jsonify({"error": "Object not found."}), 404)
+    return send_file(
+        backend.path_for(name),
+        mimetype=mimetypes.guess_type(name)[0] or "application/octet-stream",
+        as_attachment=True,
+        download_name=posixpath.basename(name),
+        conditional=True,
+        max_age=0,
+    )
@@ -0,0 +1,93 @@
+from flask import Flask, Response, request
+import time
+
+from lib.call_cache import get_call_cache
+from lib.jobs import get_job_queue
+from lib.result_cache import get_result_cache
+from lib.workspace_pool import get_workspace_manager
+from lib.telemetry import registry, start_request_timings, finish_request_timings, telemetry_enabled
+
+REQUEST_SECONDS = registry.histogram(
+    "game_generator_request_seconds", "Duration of HTTP requests until the response is returned.",
+)
+
+
+def _job_samples():
+    return [({"status": status}, count) for status, count in get_job_queue().status_counts().items()]
+
+
+def _result_cache_samples():
+    cache = get_result_cache()
+    if cache is None:
+        return []
+    return [({"event": event}, count) for event, count in cache.stats().items()]
+
+
+def _call_cache_samples():
+    cache = get_call_cache()
+    if cache is None:
+        return []
+    return [({"event": event}, count) for event, count in cache.stats().items()]
+
+
+def _workspace_samples():
+    stats = get_workspace_manager().stats()
+    return [({"state": "active"}, stats["active"]), ({"state": "ready"}, stats["ready"])]
+
+
+def _workspace_usage_samples():
+    stats = get_workspace_manager().stats()
+    return [({"unit": "bytes"}, stats["bytes"]), ({"unit": "files"}, stats["files"])]
+
+
+def _server_timing(timings, total_seconds: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def init_app(app: Flask) -> None:
+    """Adds the /metrics endpoint and per-request timing to the Flask app.
+
+    Every response carries a Server-Timing header with the spans recorded
+    while it was produced (streamed bodies are timed until their first byte).
+    """
+    registry.callback(
+        "game_generator_jobs", "Jobs tracked by the job queue, by status.", _job_samples,
+    )
+    registry.callback(
+        "game_generator_result_cache_events_total", "Result cache lookups and maintenance, by event.",
+        _result_cache_samples, metric_type="counter",
+    )
+    registry.callback(
+        "game_generator_call_cache_events_total", "LLM and tool call cache lookups and maintenance, by event.",
+        _call_cache_samples, metric_type="counter",
+    )
+    registry.callback(
+        "game_generator_workspaces", "Workspaces in use and kept ready, by state.", _workspace_samples,
+    )
+    registry.callback(
+        "game_generator_workspace_usage", "Bytes and files held by the active workspaces.", _workspace_usage_samples,
+    )
+
+    @app.before_request
+    def _start_timing():
+        request.environ["game_generator.start"] = time.perf_counter()
+        start_request_timings()
+
+    @app.after_request
+    def _finish_timing(response):
+        timings = finish_request_timings()
+        start = request.environ.get("game_generator.start")
+        if start is None or not telemetry_enabled():
+            return response
+        elapsed = time.perf_counter() - start
+        REQUEST_SECONDS.observe(
+            elapsed, endpoint=request.endpoint or "unknown", method=request.method, status=response.status_code,
+        )
+        response.headers["Server-Timing"] = _server_timing(timings, elapsed)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
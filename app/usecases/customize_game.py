@@ -1,18 +1,166 @@
+import logging
 import os
+from typing import Callable, List, Optional
 
-from lib.techiecrews import get_crew
+from lib import progress
+from lib.checkpoints import get_checkpoint_store
+from lib.hierarchy import HIERARCHY_FILE, parse_hierarchy, select_components, changed_components
+from lib.telemetry import registry
+from .pipeline import run_pipeline, STAGES, INCREMENTAL_STAGES, STAGE_HTML5
 
-def customize_game(workspace_path: str, request: str):
-    """Placeholder function to customize game assets in the workspace.
+logger = logging.getLogger(__name__)
+
+GAME_FILE = "game.html"
+
+# `incremental` edits the affected parts of the uploaded game with the patch
+# crews and falls back to `full`, which regenerates the game from scratch.
+MODE_INCREMENTAL = "incremental"
+MODE_FULL = "full"
+CUSTOMIZE_MODES = (MODE_INCREMENTAL, MODE_FULL)
+
+CUSTOMIZE_RUNS_TOTAL = registry.counter(
+    "game_generator_customize_runs_total", "Customizations by the mode requested and the mode that ran.",
+)
+
+
+def default_customize_mode() -> str:
+    """Returns the mode used when a request names none (env GAME_GENERATOR_CUSTOMIZE_MODE, default full)."""
+    return os.environ.get("GAME_GENERATOR_CUSTOMIZE_MODE", MODE_FULL)
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _decode(content: Optional[bytes]) -> str:
+    return (content or b"").decode("utf-8", errors="replace")
+
+
+def _restore(path: str, content: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def plan_incremental(workspace_path: str, request: str) -> Optional[List[str]]:
+    """Returns the outer hierarchy components an incremental run would edit.
+
+    Returns:
+        The component keys, or None if the workspace lacks a parsable
+        game_hierarchy.xml or game.html, or the request cannot be scoped to a
+        few components.
+    """
+    hierarchy = _read(os.path.join(workspace_path, HIERARCHY_FILE))
+    if not hierarchy or not _read(os.path.join(workspace_path, GAME_FILE)):
+        return None
+    root = parse_hierarchy(_decode(hierarchy))
+    if root is None:
+        return None
+    return select_components(root, request) or None
+
+
+class _PatchRejected(Exception):
+    """Stops an incremental run whose hierarchy patch went out of scope."""
+
+
+def _hierarchy_problem(original_hierarchy: bytes, workspace_path: str, components: List[str]) -> Optional[str]:
+    """Checks the patched game_hierarchy.xml; returns what is wrong with it, or None."""
+    patched = parse_hierarchy(_decode(_read(os.path.join(workspace_path, HIERARCHY_FILE))))
+    if patched is None:
+        return "the patched game_hierarchy.xml is missing or invalid"
+    out_of_scope = set(changed_components(parse_hierarchy(_decode(original_hierarchy)), patched)) - set(components)
+    if out_of_scope:
+        return f"the patch changed components outside its scope: {', '.join(sorted(out_of_scope))}"
+    return None
+
+
+def customize_game(
+    workspace_path: str,
+    request: str,
+    checkpoint_id: Optional[str] = None,
+    start_stage: Optional[str] = None,
+    before_stage: Optional[Callable[[str], None]] = None,
+    mode: Optional[str] = None,
+) -> str:
+    """Customizes the game in the workspace.
 
     Assumes the workspace is already prepared with existing game files.
 
+    In incremental mode the request is matched against the outer components
+    of the bundle's game_hierarchy.xml. The patch crews then rewrite only
+    those components and the matching code in game.html. The full pipeline
+    runs instead when the bundle has no usable hierarchy, the request touches
+    too much of it, or the patch changed components outside its scope.
+
     Args:
         workspace_path: The path to the temporary workspace directory.
         request: The text description of the modifications requested.
+        checkpoint_id: Checkpoints the workspace after each stage under this id.
+        start_stage: Resumes from the checkpoint of the stage before this one,
+            with the mode and components chosen when the run started.
+        before_stage: Called with the stage name before each stage runs.
+        mode: MODE_INCREMENTAL or MODE_FULL (default: default_customize_mode()).
+
+    Returns:
+        The mode that produced the result.
     """
-    hierarchy_crew = get_crew("hierarchy_crew_v2", workspace_path)
-    html5_crew = get_crew("html5_crew", workspace_path)
+    mode = mode or default_customize_mode()
+    if start_stage is not None:
+        info = (get_checkpoint_store().info(checkpoint_id) if checkpoint_id else None) or {}
+        components = info.get("components") or []
+        run_pipeline(
+            workspace_path, request, "customize_game",
+            checkpoint_id=checkpoint_id, start_stage=start_stage, before_stage=before_stage,
+            stages=INCREMENTAL_STAGES if components else STAGES,
+            inputs={"components": ", ".join(components)} if components else None,
+        )
+        return MODE_INCREMENTAL if components else MODE_FULL
+
+    components = plan_incremental(workspace_path, request) if mode == MODE_INCREMENTAL else None
+    if components:
+        hierarchy_path = os.path.join(workspace_path, HIERARCHY_FILE)
+        game_path = os.path.join(workspace_path, GAME_FILE)
+        original_hierarchy, original_game = _read(hierarchy_path), _read(game_path)
+        logger.info("Customizing incrementally", extra={"components": components, "workspace": workspace_path})
+        progress.report("customize.plan", mode=MODE_INCREMENTAL, components=components)
+
+        def check_stage(stage: str) -> None:
+            # The hierarchy patch is checked before game.html is edited from it.
+            if stage == STAGE_HTML5:
+                problem = _hierarchy_problem(original_hierarchy, workspace_path, components)
+                if problem:
+                    raise _PatchRejected(problem)
+            if before_stage:
+                before_stage(stage)
+
+        try:
+            run_pipeline(
+                workspace_path, request, "customize_game",
+                checkpoint_id=checkpoint_id, before_stage=check_stage,
+                stages=INCREMENTAL_STAGES, inputs={"components": ", ".join(components)},
+                mode=MODE_INCREMENTAL, components=components,
+            )
+            if not _read(game_path):
+                raise _PatchRejected("the patched game.html is missing or empty")
+            CUSTOMIZE_RUNS_TOTAL.inc(requested=mode, ran=MODE_INCREMENTAL)
+            return MODE_INCREMENTAL
+        except _PatchRejected as e:
+            logger.warning("Falling back to the full pipeline: %s", e, extra={"workspace": workspace_path})
+            progress.report("customize.fallback", reason=str(e))
+        _restore(hierarchy_path, original_hierarchy)
+        _restore(game_path, original_game)
+        # The full run starts a new checkpoint: a retry must not resume from the rejected patch's stages
+        if checkpoint_id:
+            get_checkpoint_store().discard(checkpoint_id)
 
-    hierarchy_crew.kickoff(inputs={"request": request})
-    html5_crew.kickoff(inputs={"request": request})
\ No newline at end of file
+    progress.report("customize.plan", mode=MODE_FULL, components=[])
+    run_pipeline(
+        workspace_path, request, "customize_game",
+        checkpoint_id=checkpoint_id, before_stage=before_stage,
+        mode=MODE_FULL, components=[],
+    )
+    CUSTOMIZE_RUNS_TOTAL.inc(requested=mode, ran=MODE_FULL)
+    return MODE_FULL
@@ -1,15 +1,25 @@
-from lib.techiecrews import get_crew
+from typing import Callable, Optional
 
+from .pipeline import run_pipeline
 
-def generate_game(workspace_path: str, request: str):
+
+def generate_game(
+    workspace_path: str,
+    request: str,
+    checkpoint_id: Optional[str] = None,
+    start_stage: Optional[str] = None,
+    before_stage: Optional[Callable[[str], None]] = None,
+):
     """Placeholder function to generate game assets in the workspace.
 
     Args:
         workspace_path: The path to the temporary workspace directory.
         request: The text description of the game to generate.
+        checkpoint_id: Checkpoints the workspace after each stage under this id.
+        start_stage: Resumes from the checkpoint of the stage before this one.
+        before_stage: Called with the stage name before each stage runs.
     """
-    hierarchy_crew = get_crew("hierarchy_crew_v2", workspace_path)
-    html5_crew = get_crew("html5_crew", workspace_path)
-
-    hierarchy_crew.kickoff(inputs={"request": request})
-    html5_crew.kickoff(inputs={"request": request})
\ No newline at end of file
+    run_pipeline(
+        workspace_path, request, "generate_game",
+        checkpoint_id=checkpoint_id, start_stage=start_stage, before_stage=before_stage,
+    )
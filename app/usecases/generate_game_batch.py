@@ -0,0 +1,246 @@
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from lib.telemetry import registry
+from lib.workspaces import initialize_workspace, clone_workspace, cleanup_workspace
+from .pipeline import run_pipeline, STAGES, STAGE_HIERARCHY, STAGE_HTML5
+
+logger = logging.getLogger(__name__)
+
+# The hierarchy stage shared by the variants of one request, and the stage
+# each variant then runs in its own copy of the workspace.
+HIERARCHY_STAGES = [stage for stage in STAGES if stage[0] == STAGE_HIERARCHY]
+VARIANT_STAGES = [(STAGE_HTML5, "html5_variant_crew")]
+
+BATCH_GAMES_TOTAL = registry.counter(
+    "game_generator_batch_games_total", "Games generated by batch requests, by kind and outcome.",
+)
+
+
+class BatchCancelled(Exception):
+    """Stops the remaining games of a batch whose client went away."""
+
+
+@dataclass
+class BatchGame:
+    """One game of a batch.
+
+    Games with the same request and a variant share one hierarchy stage;
+    games without a variant run the whole pipeline on their own.
+    """
+
+    request: str
+    variant: Optional[str] = None
+    # Anything the caller needs to recognize the game's result.
+    tag: Any = None
+
+
+@dataclass
+class BatchResult:
+    """The outcome of one game: what `finish` returned, or the error that stopped it."""
+
+    game: BatchGame
+    value: Any = None
+    error: Optional[Exception] = None
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_batch_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide pool running the stages of all batches.
+
+    Environment:
+        GAME_GENERATOR_BATCH_CONCURRENCY: Crew stages of all batches running at once (default 4).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("GAME_GENERATOR_BATCH_CONCURRENCY", "4")),
+                thread_name_prefix="batch",
+            )
+        return _executor
+
+
+def _count(game: BatchGame, outcome: str) -> None:
+    BATCH_GAMES_TOTAL.inc(kind="variant" if game.variant is not None else "request", outcome=outcome)
+
+
+class _Batch:
+    def __init__(self, finish: Callable[[BatchGame, str], Any], discard: Optional[Callable[[Any], None]] = None):
+        self.finish = finish
+        self.discard = discard
+        self.results: "queue.Queue[BatchResult]" = queue.Queue()
+        self.cancelled = threading.Event()
+        # Every submitted task with its games and the workspace it was handed,
+        # so close() can take back the tasks that never started.
+        self._tasks: List[Tuple[Future, List[BatchGame], Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, games: List[BatchGame], *args, workspace_path: Optional[str] = None) -> None:
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._tasks.append((get_batch_executor().submit(fn, *args), games, workspace_path))
+                return
+        cleanup_workspace(workspace_path)
+        for game in games:
+            _count(game, "cancelled")
+
+    def raise_if_cancelled(self, stage: Optional[str] = None) -> None:
+        if self.cancelled.is_set():
+            raise BatchCancelled()
+
+    def fail(self, game: BatchGame, error: Exception) -> None:
+        cancelled = isinstance(error, BatchCancelled)
+        if not cancelled:
+            logger.error("Batch game failed: %s", error, extra={"request": game.request, "variant": game.variant})
+        _count(game, "cancelled" if cancelled else "failed")
+        self.results.put(BatchResult(game, error=error))
+
+    def complete(self, game: BatchGame, workspace_path: str) -> None:
+        """Hands a finished workspace to `finish`, which owns it from then on."""
+        value = self.finish(game, workspace_path)
+        with self._lock:
+            if not self.cancelled.is_set():
+                _count(game, "succeeded")
+                self.results.put(BatchResult(game, value=value))
+                return
+        # Finished after the client went away: nobody will fetch it
+        _count(game, "cancelled")
+        self._discard(value)
+
+    def _discard(self, value: Any) -> None:
+        if self.discard is None:
+            return
+        try:
+            self.discard(value)
+        except Exception as e:
+            logger.error("Error discarding a batch result: %s", e)
+
+    def close(self) -> None:
+        """Stops the batch: cancels the tasks that have not started, releasing
+        their workspaces, and discards the results nobody fetched."""
+        with self._lock:
+            self.cancelled.set()
+            tasks, self._tasks = self._tasks, []
+        cancelled = 0
+        for future, games, workspace_path in tasks:
+            if future.cancel():
+                cancelled += len(games)
+                cleanup_workspace(workspace_path)
+                for game in games:
+                    _count(game, "cancelled")
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result.error is None:
+                self._discard(result.value)
+        if cancelled:
+            logger.info("Cancelled the games of a closed batch that had not started", extra={"games": cancelled})
+
+    def run_game(self, game: BatchGame) -> None:
+        workspace_path = None
+        try:
+            self.raise_if_cancelled()
+            workspace_path = initialize_workspace()
+            run_pipeline(workspace_path, game.request, "generate_game", before_stage=self.raise_if_cancelled)
+            self.raise_if_cancelled()
+            finished_path, workspace_path = workspace_path, None
+            self.complete(game, finished_path)
+        except Exception as e:
+            self.fail(game, e)
+        finally:
+            cleanup_workspace(workspace_path)
+
+    def run_hierarchy(self, games: List[BatchGame]) -> None:
+        """Runs the shared hierarchy stage, then queues one html5 stage per variant in a copy of it."""
+        workspace_path = None
+        pending = list(games)
+        try:
+            self.raise_if_cancelled()
+            workspace_path = initialize_workspace()
+            run_pipeline(
+                workspace_path, games[0].request, "generate_game",
+                before_stage=self.raise_if_cancelled, stages=HIERARCHY_STAGES,
+            )
+            # Copied up front, so the shared workspace can go before the variants run
+            while pending:
+                self.raise_if_cancelled()
+                clone = clone_workspace(workspace_path)
+                game = pending.pop(0)
+                self.submit(self.run_variant, [game], game, clone, workspace_path=clone)
+        except Exception as e:
+            for game in pending:
+                self.fail(game, e)
+        finally:
+            cleanup_workspace(workspace_path)
+
+    def run_variant(self, game: BatchGame, workspace_path: str) -> None:
+        try:
+            run_pipeline(
+                workspace_path, game.request, "generate_game",
+                before_stage=self.raise_if_cancelled, stages=VARIANT_STAGES, inputs={"variant": game.variant},
+            )
+            self.raise_if_cancelled()
+            finished_path, workspace_path = workspace_path, None
+            self.complete(game, finished_path)
+        except Exception as e:
+            self.fail(game, e)
+        finally:
+            cleanup_workspace(workspace_path)
+
+
+def generate_game_batch(
+    games: List[BatchGame],
+    finish: Callable[[BatchGame, str], Any],
+    discard: Optional[Callable[[Any], None]] = None,
+) -> Iterator[BatchResult]:
+    """Generates several games and yields each result as soon as it is done.
+
+    The variants of a request share one run of the hierarchy stage: its
+    workspace is copied once per variant and each copy runs the html5 stage
+    with the variant as input. Games of every batch in the process share the
+    pool from get_batch_executor(), so its size bounds how many crews run.
+
+    Closing the iterator early (e.g. when the client disconnects) stops the
+    games that have not finished: games not yet started are taken off the
+    pool and their workspaces released, running ones end at the next stage
+    boundary, and results that finish or wait unfetched are passed to
+    `discard`.
+
+    Args:
+        games: The games to generate.
+        finish: Called in a worker thread with each game and its finished
+            workspace, which it must consume (e.g. collect_artifacts); its
+            return value becomes the result's value.
+        discard: Called with the value of each result finished but never
+            yielded, to release what `finish` produced.
+
+    Yields:
+        One BatchResult per game, in completion order.
+    """
+    batch = _Batch(finish, discard)
+    shared: Dict[str, List[BatchGame]] = {}
+    for game in games:
+        if game.variant is None:
+            batch.submit(batch.run_game, [game], game)
+        else:
+            shared.setdefault(game.request, []).append(game)
+    for variants in shared.values():
+        logger.info("Sharing the hierarchy stage", extra={"request": variants[0].request, "variants": len(variants)})
+        batch.submit(batch.run_hierarchy, variants, variants)
+
+    try:
+        for _ in games:
+            yield batch.results.get()
+    finally:
+        batch.close()
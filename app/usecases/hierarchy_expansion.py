@@ -0,0 +1,216 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional
+import xml.etree.ElementTree as ET
+
+from lib import progress
+from lib.hierarchy import (
+    HIERARCHY_FILE,
+    parse_hierarchy,
+    game_components,
+    parse_component,
+    merge_components,
+    serialize_hierarchy,
+)
+from lib.telemetry import registry, span
+from lib.workspace_pool import get_workspace_manager
+
+logger = logging.getLogger(__name__)
+
+# Runs the whole hierarchy stage as one crew, as before the stage was split.
+SINGLE_CREW = "hierarchy_crew_v2"
+# Writes the outer components of the <Game> element.
+OUTLINE_CREW = "hierarchy_outline_crew"
+# Expands one outer component into COMPONENT_FILE.
+COMPONENT_CREW = "hierarchy_component_crew"
+# Validates the merged hierarchy and adds the implementation notes.
+REVIEW_CREW = "hierarchy_review_crew"
+# Expands every outer component in one agent loop, then reviews.
+INNER_LAYERS_CREW = "hierarchy_inner_layers_crew"
+
+COMPONENT_FILE = "game_hierarchy_component.xml"
+
+EXPANSION_PARALLEL = "parallel"
+EXPANSION_CREW = "crew"
+EXPANSION_MODES = (EXPANSION_CREW, EXPANSION_PARALLEL)
+
+HIERARCHY_COMPONENTS_TOTAL = registry.counter(
+    "game_generator_hierarchy_components_total", "Outer hierarchy components expanded on their own, by outcome.",
+)
+
+RunCrew = Callable[[str, str, Dict[str, str]], None]
+
+
+class ExpansionModeError(Exception):
+    """Raised when GAME_GENERATOR_HIERARCHY_EXPANSION names no expansion mode.
+
+    Not a ValueError: it is a server setting, never the client's input.
+    """
+
+
+def expansion_mode() -> str:
+    """Returns how the hierarchy stage runs (env GAME_GENERATOR_HIERARCHY_EXPANSION).
+
+    'crew' (default) runs the single hierarchy_crew_v2 crew; 'parallel'
+    expands the outer components concurrently. The app checks the setting
+    at startup.
+
+    Raises:
+        ExpansionModeError: If the setting is not one of EXPANSION_MODES.
+    """
+    mode = os.environ.get("GAME_GENERATOR_HIERARCHY_EXPANSION", EXPANSION_CREW).lower()
+    if mode not in EXPANSION_MODES:
+        raise ExpansionModeError(
+            f"Unsupported GAME_GENERATOR_HIERARCHY_EXPANSION: {mode}, expected one of: {', '.join(EXPANSION_MODES)}"
+        )
+    return mode
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_expansion_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide pool expanding hierarchy components.
+
+    Environment:
+        GAME_GENERATOR_HIERARCHY_CONCURRENCY: Components of all generations
+            expanded at once (default 4).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("GAME_GENERATOR_HIERARCHY_CONCURRENCY", "4")),
+                thread_name_prefix="hierarchy",
+            )
+        return _executor
+
+
+def _checked(run_crew: RunCrew, before_crew: Callable[[], None]) -> RunCrew:
+    def checked_run_crew(crew_name: str, workspace_path: str, crew_inputs: Dict[str, str]) -> None:
+        before_crew()
+        run_crew(crew_name, workspace_path, crew_inputs)
+    return checked_run_crew
+
+
+def _expand_component(
+    run_crew: RunCrew, hierarchy_text: str, key: str, element: ET.Element, crew_inputs: Dict[str, str],
+) -> Optional[ET.Element]:
+    """Runs the component crew in a scratch workspace holding a copy of the outline.
+
+    Returns:
+        The expanded component, or None if the crew did not write one.
+    """
+    scratch_path = get_workspace_manager().acquire()
+    started = time.perf_counter()
+    try:
+        with open(os.path.join(scratch_path, HIERARCHY_FILE), "w", encoding="utf-8") as f:
+            f.write(hierarchy_text)
+        inputs = {**crew_inputs, "component": key, "component_xml": ET.tostring(element, encoding="unicode")}
+        with span("hierarchy.component"):
+            run_crew(COMPONENT_CREW, scratch_path, inputs)
+        component_path = os.path.join(scratch_path, COMPONENT_FILE)
+        expanded = None
+        if os.path.exists(component_path):
+            with open(component_path, "r", encoding="utf-8") as f:
+                expanded = parse_component(f.read(), key)
+    finally:
+        get_workspace_manager().release(scratch_path)
+    if expanded is None:
+        logger.warning("Component crew wrote no component", extra={"component": key})
+    else:
+        progress.report("hierarchy.component.completed", component=key, seconds=round(time.perf_counter() - started, 3))
+    return expanded
+
+
+def expand_hierarchy(
+    workspace_path: str,
+    crew_inputs: Dict[str, str],
+    run_crew: RunCrew,
+    executor: Optional[ThreadPoolExecutor] = None,
+    before_crew: Optional[Callable[[], None]] = None,
+) -> None:
+    """Runs the hierarchy stage as the single hierarchy crew, or with the
+    outer components expanded concurrently (see expansion_mode()).
+
+    In parallel mode the outline crew writes the outer components of game_hierarchy.xml.
+    Each component is then expanded by its own component crew, in a scratch
+    workspace holding a copy of the outline, on a pool shared by every
+    generation in the process. The expanded components replace the outline's
+    in document order, whatever order they finish in, and the review crew
+    validates the merged file.
+
+    An outline that cannot be parsed or has a single component, and any
+    component that fails, fall back to the inner layers crew, which expands
+    what is left in one agent loop.
+
+    Args:
+        workspace_path: The workspace of the pipeline.
+        crew_inputs: The inputs passed to every crew.
+        run_crew: Runs a crew in a workspace (see pipeline.run_crew).
+        executor: The pool expanding the components; defaults to
+            get_expansion_executor().
+        before_crew: Called before every crew; it may raise to stop the
+            stage (e.g. for a cancelled or timed-out job). Components that
+            fail because of it end the stage instead of falling back.
+    """
+    if before_crew is not None:
+        run_crew = _checked(run_crew, before_crew)
+
+    if expansion_mode() == EXPANSION_CREW:
+        run_crew(SINGLE_CREW, workspace_path, crew_inputs)
+        return
+
+    run_crew(OUTLINE_CREW, workspace_path, crew_inputs)
+    hierarchy_path = os.path.join(workspace_path, HIERARCHY_FILE)
+    hierarchy_text = ""
+    if os.path.exists(hierarchy_path):
+        with open(hierarchy_path, "r", encoding="utf-8") as f:
+            hierarchy_text = f.read()
+    root = parse_hierarchy(hierarchy_text)
+    components = game_components(root) if root is not None else {}
+    if len(components) < 2:
+        logger.info("Expanding the hierarchy in one crew", extra={"workspace": workspace_path, "components": len(components)})
+        run_crew(INNER_LAYERS_CREW, workspace_path, crew_inputs)
+        return
+
+    logger.info("Expanding hierarchy components", extra={"workspace": workspace_path, "components": len(components)})
+    progress.report("hierarchy.expanding", components=list(components))
+    executor = executor or get_expansion_executor()
+    # Each unit gets its own copy of the context, which carries the progress stream.
+    futures: Dict[str, Future] = {
+        key: executor.submit(
+            contextvars.copy_context().run, _expand_component, run_crew, hierarchy_text, key, element, crew_inputs,
+        )
+        for key, element in components.items()
+    }
+    expanded: Dict[str, ET.Element] = {}
+    failed: List[str] = []
+    for key, future in futures.items():
+        try:
+            element = future.result()
+        except Exception as e:
+            if before_crew is not None:
+                before_crew() # A stopped pipeline ends the stage here
+            logger.error("Error expanding component %s: %s", key, e, extra={"component": key})
+            element = None
+        if element is None:
+            failed.append(key)
+            progress.report("hierarchy.component.failed", component=key)
+        else:
+            expanded[key] = element
+        HIERARCHY_COMPONENTS_TOTAL.inc(outcome="failed" if element is None else "expanded")
+
+    merge_components(root, expanded)
+    with open(hierarchy_path, "w", encoding="utf-8") as f:
+        f.write(serialize_hierarchy(root))
+    if failed:
+        logger.warning("Expanding the remaining components in one crew", extra={"workspace": workspace_path, "failed": failed})
+        run_crew(INNER_LAYERS_CREW, workspace_path, crew_inputs)
+    else:
+        run_crew(REVIEW_CREW, workspace_path, crew_inputs)
@@ -0,0 +1,126 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lib import techiecrews, progress
+from lib.checkpoints import get_checkpoint_store
+from lib.telemetry import span, instrument_crew, record_crew_usage
+from lib.workspace_pool import get_workspace_manager
+from .hierarchy_expansion import expand_hierarchy
+
+logger = logging.getLogger(__name__)
+
+# The workspace as handed to the pipeline, before any crew ran.
+STAGE_PREPARED = "prepared"
+STAGE_HIERARCHY = "hierarchy"
+STAGE_HTML5 = "html5"
+
+# Runs the hierarchy stage as several crews, expanding components in parallel.
+HIERARCHY_EXPANSION = "hierarchy_expansion"
+
+# Pipeline stages in execution order and the crew each one runs.
+STAGES = [
+    (STAGE_HIERARCHY, HIERARCHY_EXPANSION),
+    (STAGE_HTML5, "html5_crew"),
+]
+STAGE_NAMES = [stage for stage, _ in STAGES]
+
+# The same stages run by the smaller crews that edit an existing game in place.
+INCREMENTAL_STAGES = [
+    (STAGE_HIERARCHY, "hierarchy_patch_crew"),
+    (STAGE_HTML5, "html5_patch_crew"),
+]
+
+
+def previous_stage(stage: str) -> str:
+    """Returns the stage whose checkpoint `stage` starts from."""
+    index = STAGE_NAMES.index(stage)
+    return STAGE_NAMES[index - 1] if index else STAGE_PREPARED
+
+
+def next_stage(completed_stages: List[str]) -> Optional[str]:
+    """Returns the first stage without a checkpoint, or None if all of them completed."""
+    for stage in STAGE_NAMES:
+        if stage not in completed_stages:
+            return stage
+    return None
+
+
+def run_crew(crew_name: str, workspace_path: str, crew_inputs: Dict[str, str]) -> None:
+    """Builds a crew bound to the workspace and runs it with telemetry and progress reports."""
+    crew = techiecrews.get_crew(crew_name, workspace_path)
+    instrument_crew(crew_name, crew)
+    progress.instrument_crew(crew_name, crew)
+    with span("crew.kickoff", crew=crew_name):
+        crew.kickoff(inputs=crew_inputs)
+    record_crew_usage(crew_name, crew)
+
+
+# Stages that run more than one crew, by the name used in place of a crew name.
+# Each runner gets the workspace, the crew inputs and a check to call before
+# every crew (None if the pipeline has no before_stage).
+STAGE_RUNNERS: Dict[str, Callable[[str, Dict[str, str], Optional[Callable[[], None]]], None]] = {
+    HIERARCHY_EXPANSION: lambda workspace_path, crew_inputs, before_crew: expand_hierarchy(
+        workspace_path, crew_inputs, run_crew, before_crew=before_crew,
+    ),
+}
+
+
+def run_pipeline(
+    workspace_path: str,
+    request: str,
+    kind: str,
+    checkpoint_id: Optional[str] = None,
+    start_stage: Optional[str] = None,
+    before_stage: Optional[Callable[[str], None]] = None,
+    stages: List[Tuple[str, str]] = STAGES,
+    inputs: Optional[Dict[str, str]] = None,
+    **info,
+) -> None:
+    """Runs the crew stages in the workspace, checkpointing after each one.
+
+    Args:
+        workspace_path: The path to the temporary workspace directory.
+        request: The text passed to every crew.
+        kind: The use case running the pipeline, recorded with the checkpoint.
+        checkpoint_id: Saves a checkpoint of the workspace before the first
+            stage and after every stage under this id. None disables checkpoints.
+        start_stage: Resumes at this stage: the (empty) workspace is first
+            restored from the checkpoint of the stage before it.
+        before_stage: Called with the stage name before each stage runs,
+            and before each crew of a stage in STAGE_RUNNERS; it may raise to
+            stop the pipeline (e.g. a cancelled or timed-out job).
+        stages: The (stage, crew name) pairs to run, named as in STAGES; a
+            crew name may also be a key of STAGE_RUNNERS.
+        inputs: Crew inputs besides the request.
+        **info: Values recorded with the checkpoint when starting fresh.
+    """
+    store = get_checkpoint_store() if checkpoint_id else None
+    if start_stage is None:
+        start_index = 0
+        if store:
+            store.save(checkpoint_id, STAGE_PREPARED, workspace_path, kind=kind, request=request, **info)
+    else:
+        start_index = STAGE_NAMES.index(start_stage)
+        if not checkpoint_id:
+            raise ValueError("Resuming a pipeline requires a checkpoint_id.")
+        store.restore(checkpoint_id, previous_stage(start_stage), workspace_path)
+
+    crew_inputs = {"request": request, **(inputs or {})}
+    for stage, crew_name in stages[start_index:]:
+        if before_stage:
+            before_stage(stage)
+        logger.info("Running stage", extra={"stage": stage, "crew": crew_name, "workspace": workspace_path})
+        progress.report("stage.started", stage=stage, crew=crew_name)
+        started = time.perf_counter()
+        with span("stage", stage=stage):
+            runner = STAGE_RUNNERS.get(crew_name)
+            if runner is None:
+                run_crew(crew_name, workspace_path, crew_inputs)
+            else:
+                runner(workspace_path, crew_inputs, (lambda: before_stage(stage)) if before_stage else None)
+        progress.report("stage.completed", stage=stage, crew=crew_name, seconds=round(time.perf_counter() - started, 3))
+        # Stops a crew that filled its workspace before the next stage or checkpoint copies it
+        get_workspace_manager().check_quota(workspace_path)
+        if store:
+            store.save(checkpoint_id, stage, workspace_path)
@@ -0,0 +1,200 @@
+"""Benchmark of output bundle compression on representative generated games.
+
+Builds game directories shaped like the bundles finalize_workspace packs
+(game.html, game_hierarchy.xml, scripts, and already-compressed images and
+sounds) and zips each one with:
+
+    legacy    zipfile, every file deflated at the default level
+    policy    lib.archives.iter_directory_zip on one thread
+    parallel  lib.archives.iter_directory_zip on --threads threads
+
+Reported per game and mode: CPU seconds of the process (all threads), wall
+seconds, output size, and whether the output is byte-identical to the first
+policy run. Text is generated from a fixed seed and media is random bytes,
+which compress about as poorly as real PNG and MP3 data.
+
+Usage:
+    python -m benchmarks.compression --repeat 5 --output baseline.json
+    python -m benchmarks.compression --compare baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from lib.archives import CompressionPolicy, compression_policy, iter_directory_zip
+
+MODES = ("legacy", "policy", "parallel")
+KB = 1024
+
+# name: (html KB, script KB per file, scripts, images, image KB, sounds, sound KB)
+GAMES = {
+    "small": (64, 0, 0, 0, 0, 0, 0),
+    "assets": (256, 128, 4, 8, 256, 4, 1024),
+    "large": (2048, 2048, 4, 16, 1024, 8, 2048),
+}
+
+
+def _text(rng: random.Random, size: int, line: str) -> str:
+    words = ["<div>", "score", "player", "level", "enemy", "</div>", "update()", "render()", "ctx.drawImage"]
+    chunks = []
+    length = 0
+    while length < size:
+        chunk = f"{line} {rng.choice(words)}({rng.randrange(10 ** 4)}, {rng.choice(words)});\n"
+        chunks.append(chunk)
+        length += len(chunk)
+    return "".join(chunks)[:size]
+
+
+def make_game(path: str, name: str, seed: int = 0) -> int:
+    """Writes the named game into `path`; returns its size in bytes."""
+    html_kb, script_kb, scripts, images, image_kb, sounds, sound_kb = GAMES[name]
+    rng = random.Random(f"{seed}:{name}")
+    files = {
+        "game.html": _text(rng, html_kb * KB, "    ").encode(),
+        "game_hierarchy.xml": _text(rng, 16 * KB, "<Component>").encode(),
+    }
+    for i in range(scripts):
+        files[f"js/module{i}.js"] = _text(rng, script_kb * KB, "  const").encode()
+    for i in range(images):
+        files[f"assets/image{i}.png"] = b"\x89PNG\r\n\x1a\n" + rng.randbytes(image_kb * KB - 8)
+    for i in range(sounds):
+        files[f"sounds/sound{i}.mp3"] = b"ID3" + rng.randbytes(sound_kb * KB - 3)
+    for file_name, content in files.items():
+        file_path = os.path.join(path, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content)
+    return sum(len(content) for content in files.values())
+
+
+def _legacy_zip(source_dir: str) -> bytes:
+    """Zips the way bundles were packed before the compression policy."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for root, _, files in os.walk(source_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                zipf.write(file_path, os.path.relpath(file_path, source_dir))
+    return sink.digest()
+
+
+class _Sink:
+    """Counts and hashes zip output without keeping it."""
+
+    def __init__(self):
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        self._hash.update(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def digest(self):
+        return self.size, self._hash.hexdigest()
+
+
+def _policy_zip(source_dir: str, policy: CompressionPolicy):
+    sink = _Sink()
+    for chunk in iter_directory_zip(source_dir, policy=policy):
+        sink.write(chunk)
+    return sink.digest()
+
+
+def measure(source_dir: str, mode: str, threads: int, repeat: int) -> dict:
+    policy = compression_policy()
+    policy.threads = threads if mode == "parallel" else 1
+    policy.parallel_min_bytes = 0
+    best = None
+    for _ in range(repeat):
+        cpu, wall = time.process_time(), time.perf_counter()
+        size, digest = _legacy_zip(source_dir) if mode == "legacy" else _policy_zip(source_dir, policy)
+        run = {"cpu_s": time.process_time() - cpu, "wall_s": time.perf_counter() - wall}
+        if best is None or run["wall_s"] < best["wall_s"]:
+            best = run
+    best.update(mode=mode, threads=policy.threads, size=size, sha256=digest)
+    return best
+
+
+def _result_key(result: dict) -> tuple:
+    return result["game"], result["mode"]
+
+
+def print_results(results, baseline=None) -> None:
+    baseline_by_key = {_result_key(result): result for result in (baseline or {}).get("results", [])}
+    header = (f"{'game':<7} {'mode':<9} {'thr':>3} {'input MB':>9} {'output MB':>10} {'ratio':>6} "
+              f"{'CPU s':>7} {'wall s':>7} {'same':>5}")
+    if baseline_by_key:
+        header += f" {'CPU Δ':>8} {'size Δ':>8}"
+    print(header)
+    for result in results:
+        line = (f"{result['game']:<7} {result['mode']:<9} {result['threads']:>3} "
+                f"{result['input_bytes'] / KB / KB:>9.2f} {result['size'] / KB / KB:>10.2f} "
+                f"{result['size'] / result['input_bytes']:>6.3f} {result['cpu_s']:>7.3f} {result['wall_s']:>7.3f} "
+                f"{'yes' if result['identical'] else 'no':>5}")
+        previous = baseline_by_key.get(_result_key(result))
+        if previous:
+            line += (f" {(result['cpu_s'] / previous['cpu_s'] - 1) * 100:>+7.1f}%"
+                     f" {(result['size'] / previous['size'] - 1) * 100:>+7.1f}%")
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", nargs="+", choices=list(GAMES), default=list(GAMES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--threads", type=int, default=4, help="Threads of the parallel mode.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is reported.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Print changes against a JSON file written by --output.")
+    args = parser.parse_args(argv)
+
+    results = []
+    for game in args.games:
+        source_dir = tempfile.mkdtemp()
+        try:
+            input_bytes = make_game(source_dir, game)
+            reference = None
+            for mode in args.modes:
+                result = measure(source_dir, mode, args.threads, args.repeat)
+                if mode != "legacy":
+                    reference = reference or result["sha256"]
+                result.update(game=game, input_bytes=input_bytes, identical=result["sha256"] == reference)
+                results.append(result)
+        finally:
+            shutil.rmtree(source_dir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Benchmark of the context the html5 specialists read and write per generation.
+
+Builds a synthetic game_hierarchy.xml of --components outer components
+(players, screens, controls, scoring, sound, rules, ...) and a game.html
+with one marked section per component, then replays what each specialist
+agent of html5_crew reads and writes during one generation, in two modes:
+
+    full    every specialist reads the whole game_hierarchy.xml and
+            game.html with read_file and saves its work by rewriting
+            game.html with write_file
+    pruned  every specialist reads its role's context with
+            read_hierarchy_sections (its components plus a summary of the
+            rest), lists and reads the game.html sections of its
+            components and saves one section with write_game_section
+
+Reported per component count and mode: tokens read (tool output fed to the
+model) and written (tool input the model generates) over all specialists,
+estimated at 4 characters per token; the wall time of the tool calls
+themselves; and the model time those tokens cost at --prefill-rate and
+--decode-rate tokens per second. No model is called, so the model time is
+an estimate; the token counts are exact up to the characters-per-token
+ratio.
+
+Usage:
+    python -m benchmarks.context_pruning --output baseline.json
+    python -m benchmarks.context_pruning --compare baseline.json --components 8 16 32
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from lib import game_sections
+from lib.hierarchy import HIERARCHY_FILE
+from lib.hierarchy_index import load_index
+
+MODES = ("full", "pruned")
+
+CHARS_PER_TOKEN = 4
+
+# The html5_crew specialists and the role whose context each one reads.
+SPECIALISTS = {
+    "html5_game_engineer": "mechanics",
+    "html5_game_ui_engineer": "ui",
+    "html5_game_uinput_engineer": "input",
+    "html5_game_logic_engineer": "logic",
+    "html5_game_rules_engineer": "rules",
+    "html5_sound_engineer": "sound",
+    "html5_sound_integrator_agent": "sound",
+}
+# Specialists that only read the hierarchy (the sound engineer downloads assets).
+HIERARCHY_ONLY = ("html5_sound_engineer",)
+
+# Outer component tags, cycled through for larger hierarchies.
+COMPONENT_TAGS = [
+    "Player", "MainMenu", "Controls", "ScoreSystem", "Enemies", "HUD", "SoundEffects", "Rules",
+    "Levels", "PauseScreen", "TouchControls", "Timer", "Obstacles", "GameOverScreen", "Music", "Tutorial",
+    "PowerUps", "Background", "Collectibles", "Settings",
+]
+_WORDS = "moves jumps spawns shows updates plays fades grows blinks counts resets scrolls".split()
+
+
+def _hierarchy(rng: random.Random, components: int, component_bytes: int) -> str:
+    parts = []
+    for index in range(components):
+        tag = COMPONENT_TAGS[index % len(COMPONENT_TAGS)]
+        if index >= len(COMPONENT_TAGS):
+            tag = f"{tag}{index // len(COMPONENT_TAGS) + 1}"
+        layers = "".join(
+            f"    <Layer{layer}><Description>The {tag} {rng.choice(_WORDS)} when {rng.choice(_WORDS)} "
+            f"{rng.randrange(1000)} times.</Description></Layer{layer}>\n"
+            for layer in range(max(1, component_bytes // 90))
+        )
+        parts.append(f"  <{tag}>\n    <Description>The {tag} of the game.</Description>\n{layers}  </{tag}>\n")
+    return (
+        "<Metadata><Title>Benchmark Game</Title><Genre>Arcade</Genre></Metadata>\n"
+        f"<Game>\n  <Description>A benchmark game.</Description>\n{''.join(parts)}</Game>\n"
+    )
+
+
+def _game_html(workspace_path: str, section_bytes: int) -> None:
+    """Writes a game.html with one script section per outer component of the hierarchy."""
+    index = load_index(workspace_path)
+    html = ""
+    for key in index.components:
+        line = f"  {key.lower()}.update(state); // {'x' * 40}\n"
+        html = game_sections.replace_section(html, _section_name(key), line * max(1, section_bytes // len(line)))
+    with open(os.path.join(workspace_path, game_sections.GAME_FILE), "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def _section_name(component_key: str) -> str:
+    return component_key.lower().replace("[", "-").replace("]", "")
+
+
+def _read_file(workspace_path: str, name: str) -> str:
+    with open(os.path.join(workspace_path, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _generation(workspace_path: str, mode: str) -> dict:
+    """Replays the specialists' reads and writes; returns characters read and written."""
+    read_chars = write_chars = 0
+    for specialist, role in SPECIALISTS.items():
+        if mode == "full":
+            read_chars += len(_read_file(workspace_path, HIERARCHY_FILE))
+            if specialist in HIERARCHY_ONLY:
+                continue
+            html = _read_file(workspace_path, game_sections.GAME_FILE)
+            read_chars += len(html)
+            written = html.replace("</body>", f"<!-- {role} done -->\n</body>")
+            with open(os.path.join(workspace_path, game_sections.GAME_FILE), "w", encoding="utf-8") as f:
+                f.write(written)
+            write_chars += len(written)
+            continue
+        index = load_index(workspace_path)
+        keys = index.role_components(role)
+        read_chars += len(index.role_context(role) or _read_file(workspace_path, HIERARCHY_FILE))
+        if specialist in HIERARCHY_ONLY:
+            continue
+        html = game_sections.read_game(workspace_path)
+        read_chars += len(game_sections.outline(html))
+        sections = {section.name: html[section.start:section.end] for section in game_sections.find_sections(html)}
+        for key in keys:
+            read_chars += len(sections.get(_section_name(key), ""))
+        content = "// done"
+        if keys:
+            content = sections[_section_name(keys[0])] + content
+        game_sections.write_section(workspace_path, _section_name(keys[0]) if keys else f"{role}-work", content)
+        write_chars += len(content)
+    return {"read_chars": read_chars, "write_chars": write_chars}
+
+
+def measure(mode: str, components: int, component_bytes: int, section_bytes: int, repeat: int, rates: tuple) -> dict:
+    prefill_rate, decode_rate = rates
+    best = None
+    chars = None
+    for _ in range(repeat):
+        workspace_path = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(workspace_path, HIERARCHY_FILE), "w", encoding="utf-8") as f:
+                f.write(_hierarchy(random.Random(components), components, component_bytes))
+            _game_html(workspace_path, section_bytes)
+            started = time.perf_counter()
+            chars = _generation(workspace_path, mode)
+            wall = time.perf_counter() - started
+        finally:
+            shutil.rmtree(workspace_path, ignore_errors=True)
+        if best is None or wall < best:
+            best = wall
+    read_tokens = chars["read_chars"] / CHARS_PER_TOKEN
+    write_tokens = chars["write_chars"] / CHARS_PER_TOKEN
+    return {
+        "mode": mode,
+        "components": components,
+        "read_tokens": round(read_tokens),
+        "write_tokens": round(write_tokens),
+        "tool_ms": best * 1000,
+        "model_s": read_tokens / prefill_rate + write_tokens / decode_rate,
+    }
+
+
+def _result_key(result: dict) -> tuple:
+    return result["components"], result["mode"]
+
+
+def print_results(results, baseline=None) -> None:
+    baseline_by_key = {_result_key(result): result for result in (baseline or {}).get("results", [])}
+    header = (f"{'comps':>5} {'mode':<7} {'read tok':>9} {'write tok':>10} {'tool ms':>8} "
+              f"{'model s':>8} {'tokens':>7} {'model':>7}")
+    if baseline_by_key:
+        header += f" {'model Δ':>8}"
+    print(header)
+    for result in results:
+        line = (f"{result['components']:>5} {result['mode']:<7} {result['read_tokens']:>9} "
+                f"{result['write_tokens']:>10} {result['tool_ms']:>8.2f} {result['model_s']:>8.1f} "
+                f"{result['token_share']:>6.0%} {result['model_share']:>6.0%}")
+        previous = baseline_by_key.get(_result_key(result))
+        if previous:
+            line += f" {(result['model_s'] / previous['model_s'] - 1) * 100:>+7.1f}%"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--components", nargs="+", type=int, default=[4, 8, 16], help="Outer components per hierarchy.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--component-bytes", type=int, default=1500, help="Hierarchy bytes per component.")
+    parser.add_argument("--section-bytes", type=int, default=2500, help="game.html bytes per component section.")
+    parser.add_argument("--prefill-rate", type=float, default=2000, help="Input tokens per second the model reads.")
+    parser.add_argument("--decode-rate", type=float, default=60, help="Output tokens per second the model writes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest tool time is reported.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Print changes against a JSON file written by --output.")
+    args = parser.parse_args(argv)
+
+    rates = (args.prefill_rate, args.decode_rate)
+    results = []
+    for components in args.components:
+        reference = None
+        for mode in args.modes:
+            result = measure(mode, components, args.component_bytes, args.section_bytes, args.repeat, rates)
+            reference = reference or result
+            tokens = result["read_tokens"] + result["write_tokens"]
+            result.update(
+                token_share=tokens / (reference["read_tokens"] + reference["write_tokens"]),
+                model_share=result["model_s"] / reference["model_s"],
+            )
+            results.append(result)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
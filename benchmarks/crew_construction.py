@@ -0,0 +1,65 @@
+"""Benchmark for crew construction.
+
+Compares building a crew's agent and task pools from scratch on every call
+(what `get_crew` did before the registry) with handing out copies from the
+process-level CrewRegistry.
+
+Usage:
+    python -m benchmarks.crew_construction --iterations 50
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import time
+
+import lib.techiecrews as techiecrews
+from lib.workspaces import initialize_workspace
+
+
+def _time_calls(func, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples: list) -> None:
+    print(f"{label:<24} mean {statistics.mean(samples):8.2f} ms   "
+          f"median {statistics.median(samples):8.2f} ms   max {max(samples):8.2f} ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20, help="Crews built per variant.")
+    args = parser.parse_args(argv)
+
+    workspace_path = initialize_workspace()
+    try:
+        def uncached():
+            tools = techiecrews.bind_tools(techiecrews.all_tools(), workspace_path)
+            techiecrews._build_pools(tools)
+
+        # Imported up front, so the load time covers the definitions only
+        techiecrews.load_runtime()
+        registry = techiecrews.CrewRegistry()
+        start = time.perf_counter()
+        registry.load()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        before = _time_calls(uncached, args.iterations)
+        after = _time_calls(lambda: registry.instantiate(workspace_path), args.iterations)
+    finally:
+        shutil.rmtree(workspace_path, ignore_errors=True)
+
+    print(f"Registry load (once per process): {load_ms:.2f} ms")
+    _report("eager_load_all per crew", before)
+    _report("registry copy per crew", after)
+    print(f"Speedup: {statistics.mean(before) / statistics.mean(after):.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""A deterministic stand-in for the LLM crews, for offline benchmarks.
+
+`install(FakeCrewConfig(...))` replaces `lib.techiecrews.get_crew`, so the
+use cases, routes and jobs run unchanged while every crew only sleeps and
+writes fixed-size files:
+
+    hierarchy_crew_v2  game_hierarchy.xml
+    hierarchy_outline_crew
+                       game_hierarchy.xml with `hierarchy_components`
+                       outer components
+    hierarchy_component_crew
+                       game_hierarchy_component.xml, the component named
+                       by the `component` input, expanded
+    hierarchy_inner_layers_crew
+                       game_hierarchy.xml with every component expanded,
+                       after one component delay per component
+    html5_crew         game.html, external/icon.png, external/splash.png,
+                       external/result and external/metadata.json
+    html5_patch_crew   the same, after the shorter patch delay
+    html5_variant_crew the same as html5_crew, seeded with the variant
+
+hierarchy_review_crew only waits. hierarchy_patch_crew only waits too: it
+leaves game_hierarchy.xml as it is, which the incremental customization
+accepts as an in-scope patch. Every
+crew reports one completed task to its `task_callback`, like a crew with a
+single task.
+
+File content is derived from a fixed seed, so two runs with the same
+configuration produce byte-identical workspaces.
+"""
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+
+from lib import techiecrews
+
+
+@dataclass
+class FakeCrewConfig:
+    """Delays in seconds and file sizes in bytes of the fake crews."""
+
+    hierarchy_delay: float = 0.05
+    outline_delay: float = 0.01
+    component_delay: float = 0.02
+    review_delay: float = 0.01
+    html5_delay: float = 0.1
+    hierarchy_patch_delay: float = 0.01
+    html5_patch_delay: float = 0.02
+    hierarchy_bytes: int = 16 * 1024
+    hierarchy_components: int = 4
+    html_bytes: int = 64 * 1024
+    image_bytes: int = 32 * 1024
+    seed: int = 0
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.successful_requests = 1
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached_prompt_tokens = 0
+
+
+def _text(rng: random.Random, size: int, line: str) -> str:
+    """Returns `size` bytes of markup-like ASCII text."""
+    words = ["<div>", "score", "player", "level", "enemy", "</div>", "update()", "render()"]
+    chunks = []
+    length = 0
+    while length < size:
+        chunk = f"{line} {rng.choice(words)} {rng.randrange(10 ** 6)}\n"
+        chunks.append(chunk)
+        length += len(chunk)
+    return "".join(chunks)[:size]
+
+
+def _component(rng: random.Random, index: int, size: int) -> str:
+    """Returns outer component `index` with about `size` bytes of inner layers."""
+    tag = f"Component{index}"
+    inner = "".join(
+        f"  <Part>{rng.choice(['score', 'player', 'level', 'enemy'])} {rng.randrange(10 ** 6)}</Part>\n"
+        for _ in range(size // 32)
+    )
+    return f"<{tag}>\n  <Description>Outer component {index}.</Description>\n{inner}</{tag}>"
+
+
+class _TaskOutput:
+    def __init__(self, name: str):
+        self.name = name
+        self.agent = None
+
+
+class FakeCrew:
+    """Writes what the named crew would write, after the configured delay."""
+
+    step_callback = None
+    task_callback = None
+
+    def __init__(self, crew_name: str, workspace_path: str, config: FakeCrewConfig):
+        self.crew_name = crew_name
+        self.workspace_path = workspace_path
+        self.config = config
+        self.usage_metrics = None
+
+    def kickoff(self, inputs: dict) -> str:
+        result = self._run(inputs)
+        if self.task_callback is not None:
+            self.task_callback(_TaskOutput(f"{self.crew_name} task"))
+        return result
+
+    def _run(self, inputs: dict) -> str:
+        config = self.config
+        seed = f"{config.seed}:{self.crew_name}"
+        if inputs.get("variant"):
+            seed += f":{inputs['variant']}"
+        rng = random.Random(seed)
+        if self.crew_name == "hierarchy_crew_v2":
+            time.sleep(config.hierarchy_delay)
+            content = _text(rng, config.hierarchy_bytes, "<Component>")
+            with open(os.path.join(self.workspace_path, "game_hierarchy.xml"), "w", encoding="utf-8") as f:
+                f.write(f"<Game>\n{content}</Game>\n")
+            self.usage_metrics = _Usage(len(inputs.get("request", "")) // 4 + 500, config.hierarchy_bytes // 4)
+            return "hierarchy written"
+
+        if self.crew_name in ("hierarchy_outline_crew", "hierarchy_inner_layers_crew"):
+            expand = self.crew_name == "hierarchy_inner_layers_crew"
+            components = config.hierarchy_components
+            time.sleep(config.component_delay * components + config.review_delay if expand else config.outline_delay)
+            size = config.hierarchy_bytes // max(1, components) if expand else 0
+            body = "\n".join(_component(random.Random(f"{seed}:{i}"), i, size) for i in range(components))
+            with open(os.path.join(self.workspace_path, "game_hierarchy.xml"), "w", encoding="utf-8") as f:
+                f.write(f"<Metadata><Title>Benchmark Game</Title></Metadata>\n<Game>\n{body}\n</Game>\n")
+            self.usage_metrics = _Usage(len(inputs.get("request", "")) // 4 + 500, config.hierarchy_bytes // 4)
+            return "hierarchy written"
+
+        if self.crew_name == "hierarchy_component_crew":
+            time.sleep(config.component_delay)
+            index = int(inputs["component"].replace("Component", ""))
+            size = config.hierarchy_bytes // max(1, config.hierarchy_components)
+            # Seeded like the inner layers crew, so both write the same hierarchy
+            content = _component(random.Random(f"{config.seed}:hierarchy_inner_layers_crew:{index}"), index, size)
+            with open(os.path.join(self.workspace_path, "game_hierarchy_component.xml"), "w", encoding="utf-8") as f:
+                f.write(content)
+            self.usage_metrics = _Usage(config.hierarchy_bytes // 4, size // 4)
+            return "component written"
+
+        if self.crew_name == "hierarchy_review_crew":
+            time.sleep(config.review_delay)
+            self.usage_metrics = _Usage(config.hierarchy_bytes // 4, config.hierarchy_bytes // 16)
+            return "hierarchy reviewed"
+
+        if self.crew_name == "hierarchy_patch_crew":
+            time.sleep(config.hierarchy_patch_delay)
+            self.usage_metrics = _Usage(config.hierarchy_bytes // 4, config.hierarchy_bytes // 16)
+            return "hierarchy patched"
+
+        time.sleep(config.html5_patch_delay if self.crew_name == "html5_patch_crew" else config.html5_delay)
+        with open(os.path.join(self.workspace_path, "game.html"), "w", encoding="utf-8") as f:
+            f.write(_text(rng, config.html_bytes, "<p>"))
+        external_path = os.path.join(self.workspace_path, "external")
+        os.makedirs(external_path, exist_ok=True)
+        for name in ("icon.png", "splash.png"):
+            with open(os.path.join(external_path, name), "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\n" + rng.randbytes(max(0, config.image_bytes - 8)))
+        with open(os.path.join(external_path, "result"), "w", encoding="utf-8") as f:
+            f.write("SUCCESS\nGenerated by the benchmark crew.\n")
+        with open(os.path.join(external_path, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump({"suggested_name": "Benchmark Game"}, f)
+        self.usage_metrics = _Usage(config.hierarchy_bytes // 4, config.html_bytes // 4)
+        return "game written"
+
+
+def install(config: FakeCrewConfig) -> None:
+    """Routes every `lib.techiecrews.get_crew` call to a FakeCrew."""
+    techiecrews.get_crew = lambda crew_name, workspace_path: FakeCrew(crew_name, workspace_path, config)
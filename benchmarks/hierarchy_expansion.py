@@ -0,0 +1,139 @@
+"""Benchmark of the hierarchy stage with parallel component expansion.
+
+Runs the hierarchy stage on the fake crews of benchmarks.fake_crew, where
+the outline, each component expansion and the review only sleep for their
+configured delay, in two modes:
+
+    sequential  hierarchy_inner_layers_crew expands every component in one
+                loop, as the single hierarchy crew does
+    parallel    app.usecases.hierarchy_expansion.expand_hierarchy on a pool
+                of --concurrency threads
+
+Reported per component count and mode: stage wall seconds and whether the
+merged game_hierarchy.xml has the same components as the sequential run.
+The delays stand in for LLM latency, so the speedup is bounded by the
+number of components and the concurrency, not by the CPUs of this machine.
+
+Usage:
+    python -m benchmarks.hierarchy_expansion --output baseline.json
+    python -m benchmarks.hierarchy_expansion --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_crew import FakeCrewConfig, install
+from lib.hierarchy import HIERARCHY_FILE, parse_hierarchy, game_components, _canonical
+
+MODES = ("sequential", "parallel")
+
+
+def _components(workspace_path: str) -> list:
+    with open(os.path.join(workspace_path, HIERARCHY_FILE), "r", encoding="utf-8") as f:
+        root = parse_hierarchy(f.read())
+    return [_canonical(element) for element in game_components(root).values()]
+
+
+def measure(mode: str, components: int, concurrency: int, delay: float, repeat: int) -> dict:
+    install(FakeCrewConfig(component_delay=delay, hierarchy_components=components))
+    # Imported after install() so the pipeline runs the fake crews
+    from app.usecases.hierarchy_expansion import expand_hierarchy, INNER_LAYERS_CREW, OUTLINE_CREW
+    from app.usecases.pipeline import run_crew
+
+    inputs = {"request": "A benchmark game"}
+    best = None
+    hierarchy = None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(repeat):
+            workspace_path = tempfile.mkdtemp()
+            try:
+                started = time.perf_counter()
+                if mode == "sequential":
+                    run_crew(OUTLINE_CREW, workspace_path, inputs)
+                    run_crew(INNER_LAYERS_CREW, workspace_path, inputs)
+                else:
+                    expand_hierarchy(workspace_path, inputs, run_crew, executor=executor)
+                wall = time.perf_counter() - started
+                hierarchy = _components(workspace_path)
+            finally:
+                shutil.rmtree(workspace_path, ignore_errors=True)
+            if best is None or wall < best:
+                best = wall
+    return {
+        "mode": mode, "components": components, "concurrency": concurrency if mode == "parallel" else 1,
+        "wall_s": best, "hierarchy": hierarchy,
+    }
+
+
+def _result_key(result: dict) -> tuple:
+    return result["components"], result["mode"]
+
+
+def print_results(results, baseline=None) -> None:
+    baseline_by_key = {_result_key(result): result for result in (baseline or {}).get("results", [])}
+    header = f"{'comps':>5} {'mode':<11} {'conc':>4} {'wall s':>7} {'speedup':>8} {'same':>5}"
+    if baseline_by_key:
+        header += f" {'wall Δ':>8}"
+    print(header)
+    for result in results:
+        line = (f"{result['components']:>5} {result['mode']:<11} {result['concurrency']:>4} "
+                f"{result['wall_s']:>7.3f} {result['speedup']:>7.2f}x {'yes' if result['identical'] else 'no':>5}")
+        previous = baseline_by_key.get(_result_key(result))
+        if previous:
+            line += f" {(result['wall_s'] / previous['wall_s'] - 1) * 100:>+7.1f}%"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--components", nargs="+", type=int, default=[2, 4, 8], help="Outer components per hierarchy.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--concurrency", type=int, default=4, help="Components expanded at once in parallel mode.")
+    parser.add_argument("--delay", type=float, default=0.2, help="Seconds each component expansion takes.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is reported.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Print changes against a JSON file written by --output.")
+    args = parser.parse_args(argv)
+    # expand_hierarchy runs the single hierarchy crew unless parallel expansion is enabled
+    os.environ["GAME_GENERATOR_HIERARCHY_EXPANSION"] = "parallel"
+
+    results = []
+    for components in args.components:
+        reference = None
+        sequential_wall = None
+        for mode in args.modes:
+            result = measure(mode, components, args.concurrency, args.delay, args.repeat)
+            reference = reference or result["hierarchy"]
+            sequential_wall = sequential_wall or result["wall_s"]
+            result.update(identical=result.pop("hierarchy") == reference, speedup=sequential_wall / result["wall_s"])
+            results.append(result)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
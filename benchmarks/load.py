@@ -0,0 +1,343 @@
+"""Throughput benchmark of the /v1 endpoints against the fake crew.
+
+Drives POST /v1/generate_game and POST /v1/customize_game at several
+concurrency levels, once through the Flask test client (in-process, no
+sockets) and once through a real threaded WSGI server on localhost. The
+crews are replaced by benchmarks.fake_crew, so the numbers measure the
+server's own overhead plus the configured crew delays.
+
+Reported per transport, endpoint and concurrency level: p50/p95/p99
+latency, requests/sec, errors and the peak RSS sampled while the level ran.
+The result cache is disabled (every request would hit it after the first
+one) unless --cache is given. The uploaded bundle carries a game.html and
+game_hierarchy.xml, so --customize-mode incremental (the default) runs the
+patch crews and --customize-mode full the full pipeline.
+
+Usage:
+    python -m benchmarks.load --concurrency 1 4 16 --requests 64 --output baseline.json
+    python -m benchmarks.load --compare baseline.json
+"""
+import argparse
+import http.client
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+TRANSPORTS = ("testclient", "wsgi")
+ENDPOINTS = ("generate_game", "customize_game")
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class RssSampler:
+    """Samples the resident set size of this process in a background thread.
+
+    Falls back to getrusage's lifetime peak where /proc is unavailable.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _current(self) -> int:
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * self._page_size
+        except OSError:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_bytes = self._current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._current())
+
+
+BUNDLE_HIERARCHY = """<Metadata><name>Benchmark Game</name></Metadata>
+<Game>
+  <Description>A platformer.</Description>
+  <Player><Description>The player character, a blue square.</Description></Player>
+  <Level><Description>Platforms, coins and spikes.</Description></Level>
+  <Scoring><Description>Coins add points to the score.</Description></Scoring>
+  <Menu><Description>Start and game over screens.</Description></Menu>
+</Game>
+"""
+
+
+def make_bundle(size_bytes: int) -> bytes:
+    """Returns a game bundle zip with an index.html, a previously generated
+    game.html and game_hierarchy.xml, and `size_bytes` of assets."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("game/index.html", "<html><body>benchmark</body></html>")
+        zipf.writestr("game/game.html", "<html><body><canvas></canvas></body></html>")
+        zipf.writestr("game/game_hierarchy.xml", BUNDLE_HIERARCHY)
+        zipf.writestr("game/assets/data.bin", os.urandom(size_bytes), zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+def _multipart_body(fields: dict, files: dict):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode("utf-8")
+        )
+    for name, (file_name, data, content_type) in files.items():
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{file_name}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Workload:
+    """Builds the request of each endpoint; every call gets a distinct request text."""
+
+    def __init__(self, bundle: bytes, image: bytes, response_mode: str, customize_mode: str):
+        self.bundle = bundle
+        self.image = image
+        self.response_mode = response_mode
+        self.customize_mode = customize_mode
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def request(self, endpoint: str):
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        path = f"/v1/{endpoint}?response_mode={self.response_mode}"
+        if endpoint == "generate_game":
+            text = f"Benchmark game #{number}: a platformer with coins and spikes."
+            return path, json.dumps({"request": text}).encode("utf-8"), "application/json"
+        body, content_type = _multipart_body(
+            {"request": f"Benchmark change #{number}: make the player red.", "mode": self.customize_mode},
+            {
+                "game_bundle": ("bundle.zip", self.bundle, "application/zip"),
+                "game_icon": ("icon.png", self.image, "image/png"),
+                "game_splash": ("splash.png", self.image, "image/png"),
+            },
+        )
+        return path, body, content_type
+
+
+def _test_client_sender(app):
+    local = threading.local()
+
+    def send(path: str, body: bytes, content_type: str):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        response = client.post(path, data=body, content_type=content_type)
+        response.get_data() # Drain streamed bodies
+        return response.status_code
+
+    return send
+
+
+def _wsgi_sender(host: str, port: int):
+    local = threading.local()
+
+    def send(path: str, body: bytes, content_type: str):
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection(host, port, timeout=600)
+        try:
+            connection.request("POST", path, body=body, headers={"Content-Type": content_type})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            local.connection = None
+            raise
+
+    return send
+
+
+def run_level(send, workload: Workload, endpoint: str, concurrency: int, total_requests: int) -> dict:
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one_request(_):
+        nonlocal errors
+        path, body, content_type = workload.request(endpoint)
+        start = time.perf_counter()
+        try:
+            status = send(path, body, content_type)
+        except Exception:
+            status = None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status != 200:
+                errors += 1
+
+    with RssSampler() as rss, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        list(executor.map(one_request, range(total_requests)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "rps": total_requests / wall,
+        "peak_rss_mb": rss.peak_bytes / (1024 * 1024),
+    }
+
+
+def _result_key(result: dict) -> tuple:
+    return (result["transport"], result["endpoint"], result.get("response_mode"),
+            result.get("customize_mode"), result["concurrency"])
+
+
+def print_results(results, baseline=None) -> None:
+    baseline_by_key = {_result_key(result): result for result in (baseline or {}).get("results", [])}
+    header = (f"{'transport':<11} {'endpoint':<15} {'conc':>4} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'req/s':>8} {'errors':>6} {'RSS MB':>7}")
+    if baseline_by_key:
+        header += f" {'p95 Δ':>8} {'req/s Δ':>8}"
+    print(header)
+    for result in results:
+        line = (f"{result['transport']:<11} {result['endpoint']:<15} {result['concurrency']:>4} "
+                f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                f"{result['rps']:>8.2f} {result['errors']:>6} {result['peak_rss_mb']:>7.1f}")
+        previous = baseline_by_key.get(_result_key(result))
+        if previous:
+            line += (f" {(result['p95_ms'] / previous['p95_ms'] - 1) * 100:>+7.1f}%"
+                     f" {(result['rps'] / previous['rps'] - 1) * 100:>+7.1f}%")
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level.")
+    parser.add_argument("--response-mode", default="base64", choices=("base64", "manifest", "multipart"))
+    parser.add_argument("--customize-mode", default="incremental", choices=("incremental", "full"))
+    parser.add_argument(
+        "--hierarchy-delay", type=float, default=0.05,
+        help="Seconds the fake single hierarchy crew takes (GAME_GENERATOR_HIERARCHY_EXPANSION=crew).",
+    )
+    parser.add_argument(
+        "--component-delay", type=float, default=0.02,
+        help="Seconds the fake crew takes to expand one component (GAME_GENERATOR_HIERARCHY_EXPANSION=parallel).",
+    )
+    parser.add_argument("--html5-delay", type=float, default=0.1, help="Seconds the fake html5 crew takes.")
+    parser.add_argument("--html-kb", type=int, default=64, help="Size of the generated game.html.")
+    parser.add_argument("--image-kb", type=int, default=32, help="Size of each generated and uploaded image.")
+    parser.add_argument("--bundle-kb", type=int, default=512, help="Size of the uploaded customize bundle.")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Print changes against a JSON file written by --output.")
+    args = parser.parse_args(argv)
+
+    # Must be set before the app and its singletons are imported.
+    os.environ.setdefault("GAME_GENERATOR_LOG_LEVEL", "WARNING")
+    if not args.cache:
+        os.environ["GAME_GENERATOR_RESULT_CACHE_BYTES"] = "0"
+
+    from werkzeug.serving import make_server
+    from app import app
+    from benchmarks.fake_crew import FakeCrewConfig, install
+
+    crew_config = FakeCrewConfig(
+        hierarchy_delay=args.hierarchy_delay,
+        component_delay=args.component_delay,
+        html5_delay=args.html5_delay,
+        html_bytes=args.html_kb * 1024,
+        image_bytes=args.image_kb * 1024,
+    )
+    install(crew_config)
+    workload = Workload(
+        make_bundle(args.bundle_kb * 1024), os.urandom(args.image_kb * 1024), args.response_mode, args.customize_mode,
+    )
+
+    results = []
+    for transport in args.transports:
+        server = None
+        if transport == "wsgi":
+            logging.getLogger("werkzeug").setLevel(logging.WARNING) # No access log per request
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            send = _wsgi_sender("127.0.0.1", server.server_port)
+        else:
+            send = _test_client_sender(app)
+        try:
+            for endpoint in args.endpoints:
+                # One unmeasured request loads the crew registry and warms caches.
+                path, body, content_type = workload.request(endpoint)
+                send(path, body, content_type)
+                for concurrency in args.concurrency:
+                    result = run_level(send, workload, endpoint, concurrency, args.requests)
+                    result["transport"] = transport
+                    result["response_mode"] = args.response_mode
+                    if endpoint == "customize_game":
+                        result["customize_mode"] = args.customize_mode
+                    results.append(result)
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "crew": vars(crew_config),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Benchmark of worker startup: import time and time to first request.
+
+Each run starts a fresh interpreter that plays a gunicorn master and forks
+one worker, which then serves a POST /v1/generate_game through the Flask
+test client. The crews are built for real (techies runtime, crew
+definitions, agent and task pools) and then replaced by the instant
+crews of benchmarks.fake_crew, so no LLM is called. Modes:
+
+    lazy     the worker imports the app and builds the runtime on its
+             first request (plain `gunicorn app:app`)
+    warm     the worker imports the app and warms up before serving
+             (gunicorn.conf.py with GAME_GENERATOR_PRELOAD=0)
+    preload  the master imports the app and warms up before forking
+             (gunicorn.conf.py)
+
+Reported per mode: seconds spent in the master before forking, from the
+fork until the worker is ready, from then until the first response, the
+total from fork to first response (what each new worker costs on a
+scale-out), and the second request for comparison. --importtime lists the
+packages whose modules take longest to import with the app.
+
+Usage:
+    python -m benchmarks.startup --repeat 5 --output baseline.json
+    python -m benchmarks.startup --compare baseline.json --importtime 10
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+MODES = ("lazy", "warm", "preload")
+
+
+def _install_crews() -> None:
+    """Builds every requested crew for real, then hands out an instant fake."""
+    from benchmarks.fake_crew import FakeCrew, FakeCrewConfig
+    from lib import techiecrews
+
+    config = FakeCrewConfig(
+        hierarchy_delay=0, outline_delay=0, component_delay=0, review_delay=0, html5_delay=0,
+        hierarchy_patch_delay=0, html5_patch_delay=0,
+    )
+    build_crew = techiecrews.get_crew
+
+    def get_crew(crew_name, workspace_path):
+        build_crew(crew_name, workspace_path)
+        return FakeCrew(crew_name, workspace_path, config)
+
+    techiecrews.get_crew = get_crew
+
+
+def _request(client) -> float:
+    started = time.perf_counter()
+    response = client.post("/v1/generate_game", json={"request": "A startup benchmark game"})
+    if response.status_code != 200:
+        raise RuntimeError(f"generate_game answered {response.status_code}")
+    return time.perf_counter() - started
+
+
+def run_mode(mode: str) -> dict:
+    """Plays master and worker for one mode; must run in a fresh interpreter."""
+    started = time.perf_counter()
+    if mode == "preload":
+        from app import app  # noqa: F401
+        from lib.techiecrews import warm_up
+        warm_up()
+    master_s = time.perf_counter() - started
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        result = {}
+        try:
+            forked = time.perf_counter()
+            from app import app
+            if mode == "warm":
+                from lib.techiecrews import warm_up
+                warm_up()
+            ready = time.perf_counter()
+            _install_crews()
+            client = app.test_client()
+            result = {
+                "ready_s": ready - forked,
+                "first_request_s": _request(client),
+                "second_request_s": _request(client),
+            }
+        except Exception as e:
+            result = {"error": str(e)}
+        finally:
+            os.write(write_fd, json.dumps(result).encode("utf-8"))
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        result = json.loads(f.read() or b"{}")
+    os.waitpid(pid, 0)
+    if "error" in result:
+        raise RuntimeError(f"Worker failed: {result['error']}")
+    result.update(mode=mode, master_s=master_s, to_first_response_s=result["ready_s"] + result["first_request_s"])
+    return result
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("GAME_GENERATOR_LOG_LEVEL", "WARNING")
+    env["GAME_GENERATOR_RESULT_CACHE_BYTES"] = "0"
+    return env
+
+
+def measure(mode: str, repeat: int) -> dict:
+    """Runs a mode `repeat` times in fresh interpreters; reports the fastest run."""
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--run", mode],
+            env=_child_env(), capture_output=True, text=True, check=True,
+        ).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        if best is None or run["to_first_response_s"] < best["to_first_response_s"]:
+            best = run
+    return best
+
+
+def import_times(top: int) -> list:
+    """Returns the `top` packages whose modules take longest to import under `import app`.
+
+    Each package is charged the import time of its own modules (excluding
+    the modules they import from other packages).
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        env=_child_env(), capture_output=True, text=True, check=True,
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            package = name.strip().split(".")[0]
+            totals[package] = totals.get(package, 0) + int(own) / 1e6
+    packages = [{"package": package, "import_s": seconds} for package, seconds in totals.items()]
+    packages.sort(key=lambda package: package["import_s"], reverse=True)
+    return packages[:top]
+
+
+def print_results(results, baseline=None) -> None:
+    baseline_by_mode = {result["mode"]: result for result in (baseline or {}).get("results", [])}
+    header = f"{'mode':<8} {'master s':>9} {'ready s':>8} {'first s':>8} {'to first s':>11} {'second s':>9}"
+    if baseline_by_mode:
+        header += f" {'to first Δ':>11}"
+    print(header)
+    for result in results:
+        line = (f"{result['mode']:<8} {result['master_s']:>9.3f} {result['ready_s']:>8.3f} "
+                f"{result['first_request_s']:>8.3f} {result['to_first_response_s']:>11.3f} "
+                f"{result['second_request_s']:>9.3f}")
+        previous = baseline_by_mode.get(result["mode"])
+        if previous:
+            line += f" {(result['to_first_response_s'] / previous['to_first_response_s'] - 1) * 100:>+10.1f}%"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the fastest is reported.")
+    parser.add_argument("--importtime", type=int, default=0, help="List this many slowest imports of the app.")
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Print changes against a JSON file written by --output.")
+    args = parser.parse_args(argv)
+
+    if args.run:
+        print(json.dumps(run_mode(args.run)))
+        return 0
+
+    results = [measure(mode, args.repeat) for mode in args.modes]
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    imports = import_times(args.importtime) if args.importtime else []
+    if imports:
+        print()
+        print(f"{'package':<40} {'import s':>9}")
+        for package in imports:
+            print(f"{package['package']:<40} {package['import_s']:>9.3f}")
+
+    if args.output:
+        report = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "run")},
+            "results": results,
+            "imports": imports,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
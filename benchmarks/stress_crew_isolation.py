@@ -0,0 +1,128 @@
+"""Stress check for concurrent crew construction.
+
+Runs N fake crews in parallel threads through the real `lib.techiecrews.get_crew`
+and verifies that every file a crew writes lands in its own workspace.
+
+The techies agent/task loaders and the Crew class are replaced with fakes and
+the registry reads a one-crew definition set, so no LLM is called. The fake
+`get_all_tools()` returns one shared set of tool instances, mirroring techies,
+which is exactly what used to leak between workspaces.
+
+Usage:
+    python -m benchmarks.stress_crew_isolation --crews 64 --writes 20
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lib.techiecrews as techiecrews
+from lib.workspaces import initialize_workspace
+
+
+class SharedWriteTool:
+    """Stands in for a techies file tool: writes relative to `base_dir`."""
+
+    name = "write_file"
+
+    def __init__(self):
+        self.base_dir = None
+
+    def run(self, file_path: str, content: str) -> None:
+        base_dir = self.base_dir
+        # Widen the window between reading base_dir and writing the file.
+        time.sleep(random.uniform(0, 0.002))
+        with open(os.path.join(base_dir, file_path), "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+class FakeAgent:
+    def __init__(self, tools):
+        self.tools = tools
+
+
+class FakeCrew:
+    def __init__(self, crew_name, agent_pool, task_pool, introduce_only=False):
+        self.crew_name = crew_name
+        self.writer = agent_pool["writer"].tools["write_file"]
+
+    def kickoff(self, inputs):
+        for index in range(inputs["writes"]):
+            self.writer.run(f"{inputs['owner']}_{index}.txt", inputs["owner"])
+            time.sleep(random.uniform(0, 0.001))
+
+
+_SHARED_TOOLS = {"write_file": SharedWriteTool()}
+
+_DEFINITIONS = {
+    "crews.yml": "stress_crew:\n  agents: [writer]\n  tasks: [write]\n",
+    "agents.yml": "writer:\n  tools: [write_file]\n",
+    "tasks.yml": "write:\n  agent: writer\n",
+}
+
+
+def _install_fakes(runtime_dir: str) -> None:
+    os.makedirs(os.path.join(runtime_dir, "stress_crew"))
+    for file_name, content in _DEFINITIONS.items():
+        with open(os.path.join(runtime_dir, "stress_crew", file_name), "w", encoding="utf-8") as f:
+            f.write(content)
+    techiecrews.load_runtime()
+    techiecrews._registry = techiecrews.CrewRegistry(runtime_dir=runtime_dir)
+    techiecrews.get_all_tools = lambda: _SHARED_TOOLS
+    techiecrews.Agent.eager_load_all = classmethod(lambda cls, tools: {"writer": FakeAgent(tools)})
+    techiecrews.Task.eager_load_all = classmethod(lambda cls, agent_pool: {})
+    techiecrews.Crew = FakeCrew
+
+
+def _run_one(owner: str, writes: int, barrier: threading.Barrier) -> tuple:
+    workspace_path = initialize_workspace()
+    crew = techiecrews.get_crew("stress_crew", workspace_path)
+    barrier.wait()
+    crew.kickoff(inputs={"owner": owner, "writes": writes})
+    return owner, workspace_path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--crews", type=int, default=32, help="Number of parallel crews.")
+    parser.add_argument("--writes", type=int, default=20, help="Files written by each crew.")
+    args = parser.parse_args(argv)
+
+    runtime_dir = tempfile.mkdtemp()
+    _install_fakes(runtime_dir)
+    barrier = threading.Barrier(args.crews)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.crews) as pool:
+        futures = [
+            pool.submit(_run_one, f"crew{index}", args.writes, barrier)
+            for index in range(args.crews)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    misplaced = 0
+    try:
+        for owner, workspace_path in results:
+            for file_name in os.listdir(workspace_path):
+                if not file_name.startswith(f"{owner}_"):
+                    misplaced += 1
+            expected = {f"{owner}_{index}.txt" for index in range(args.writes)}
+            missing = expected - set(os.listdir(workspace_path))
+            misplaced += len(missing)
+    finally:
+        for _, workspace_path in results:
+            shutil.rmtree(workspace_path, ignore_errors=True)
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+
+    total = args.crews * args.writes
+    print(f"{args.crews} crews, {total} writes in {elapsed:.2f}s: {misplaced} misplaced")
+    return 1 if misplaced else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Benchmark for the bundle extraction and packaging pipeline.
+
+Compares the previous temp-file pipeline (save the upload, extract into a
+second directory, move, zip into a temp file and read it back) with the
+streaming one in lib/archives for several bundle sizes. Every measurement
+runs in a fresh subprocess so its peak RSS is not polluted by earlier runs.
+
+Modes measured per size:
+    legacy     prepare_workspace + base64 finalize_workspace as they were
+    base64     prepare_workspace + finalize_workspace (in-memory zip)
+    multipart  prepare_workspace + iter_workspace_bundle (zip streamed to a sink)
+
+Usage:
+    python -m benchmarks.zip_pipeline --sizes 1 50 500
+"""
+import argparse
+import base64
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from werkzeug.datastructures import FileStorage
+
+from lib.workspaces import initialize_workspace, prepare_workspace, finalize_workspace, iter_workspace_bundle, cleanup_workspace
+
+MODES = ("legacy", "base64", "multipart")
+MB = 1024 * 1024
+
+
+def _legacy_prepare(tempdir: str, game_bundle: FileStorage) -> None:
+    os.makedirs(os.path.join(tempdir, "external"), exist_ok=True)
+    bundle_zip_path = os.path.join(tempdir, "_bundle.zip")
+    game_bundle.save(bundle_zip_path)
+    extraction_tempdir = tempfile.mkdtemp()
+    try:
+        with zipfile.ZipFile(bundle_zip_path, 'r') as zip_ref:
+            zip_ref.extractall(extraction_tempdir)
+        for root, _, files in os.walk(extraction_tempdir):
+            if "index.html" in files:
+                content_root_dir = root
+                break
+        for item_name in os.listdir(content_root_dir):
+            shutil.move(os.path.join(content_root_dir, item_name), tempdir)
+    finally:
+        shutil.rmtree(extraction_tempdir)
+        os.remove(bundle_zip_path)
+
+
+def _legacy_finalize(tempdir: str) -> str:
+    shutil.rmtree(os.path.join(tempdir, "external"))
+    output_zip_path = os.path.join(tempfile.gettempdir(), f"{os.path.basename(tempdir)}_bundle.zip")
+    try:
+        with zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for root, _, files in os.walk(tempdir):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    zipf.write(file_path, os.path.relpath(file_path, tempdir))
+        with open(output_zip_path, "rb") as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+    finally:
+        os.remove(output_zip_path)
+        shutil.rmtree(tempdir)
+
+
+def make_bundle(path: str, size_mb: int) -> None:
+    """Writes a bundle of roughly `size_mb` MB: a small HTML root plus 1 MB assets,
+    a quarter of them compressible text and the rest random (media-like) bytes."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("game/index.html", "<html><body>benchmark</body></html>")
+        zipf.writestr("__MACOSX/game/._index.html", b"\0" * 64)
+        for index in range(max(1, size_mb)):
+            if index % 4 == 0:
+                data = (f"// asset {index}\n" + "function f(){return 42;}\n" * 40000)[:MB].encode()
+                zipf.writestr(f"game/js/asset{index}.js", data)
+            else:
+                zipf.writestr(f"game/media/asset{index}.bin", os.urandom(MB), zipfile.ZIP_STORED)
+
+
+def _child(mode: str, bundle_path: str) -> dict:
+    with open(bundle_path, "rb") as stream:
+        upload = FileStorage(stream=stream, filename="bundle.zip")
+        start = time.perf_counter()
+        workspace_path = initialize_workspace()
+        try:
+            if mode == "legacy":
+                _legacy_prepare(workspace_path, upload)
+            else:
+                prepare_workspace(workspace_path, upload)
+            os.makedirs(os.path.join(workspace_path, "external"), exist_ok=True)
+            if mode == "legacy":
+                payload_bytes = len(_legacy_finalize(workspace_path))
+            elif mode == "base64":
+                payload_bytes = len(finalize_workspace(workspace_path)["bundle_base64Data"])
+            else:
+                payload_bytes = sum(len(chunk) for chunk in iter_workspace_bundle(workspace_path))
+                cleanup_workspace(workspace_path)
+        finally:
+            cleanup_workspace(workspace_path)
+        elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"seconds": elapsed, "peak_rss_mb": peak_kb / 1024, "payload_bytes": payload_bytes}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 500], help="Bundle sizes in MB.")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "BUNDLE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        # Keep the report parseable: the pipeline itself prints progress lines.
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                result = _child(*args.child)
+            finally:
+                sys.stdout = stdout
+        print(json.dumps(result))
+        return 0
+
+    print(f"{'size':>6} {'mode':<10} {'wall s':>8} {'peak RSS MB':>12} {'payload MB':>11}")
+    for size_mb in args.sizes:
+        bundle_dir = tempfile.mkdtemp()
+        bundle_path = os.path.join(bundle_dir, "bundle.zip")
+        try:
+            make_bundle(bundle_path, size_mb)
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.zip_pipeline", "--child", mode, bundle_path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{size_mb:>4}MB {mode:<10} {result['seconds']:>8.2f} "
+                      f"{result['peak_rss_mb']:>12.1f} {result['payload_bytes'] / MB:>11.1f}")
+        finally:
+            shutil.rmtree(bundle_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Gunicorn settings: `gunicorn -c gunicorn.conf.py app:app`.
+
+With preload_app the master imports the app and warms up the crew runtime
+(lib.techiecrews.warm_up) once before forking, so workers start serving at
+once and share the loaded runtime copy-on-write. Without it, every worker
+warms up after importing the app and before taking its first request.
+"""
+import gc
+import os
+
+bind = os.environ.get("GAME_GENERATOR_BIND", "0.0.0.0:5001")
+# Jobs submitted to /v1/jobs live in an in-process queue and job store
+# (lib.jobs), so this must stay 1: with more workers a job is known only to
+# the worker that accepted it, and its status, events and cancel routes
+# answer 404 on every other worker. The threads serve polls while jobs run.
+workers = int(os.environ.get("GAME_GENERATOR_WORKERS", "1"))
+# Every open job event stream holds one of these threads; the app serves at
+# most GAME_GENERATOR_EVENTS_MAX_STREAMS of them (default: half the threads).
+threads = int(os.environ.get("GAME_GENERATOR_THREADS", "8"))
+preload_app = os.environ.get("GAME_GENERATOR_PRELOAD", "1") == "1"
+
+_warm_up = os.environ.get("GAME_GENERATOR_WARM_UP", "1") == "1"
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    if preload_app and _warm_up:
+        from lib.techiecrews import warm_up
+        warm_up()
+        # Keeps the collector from touching (and so copying) the warmed-up
+        # objects' pages in the workers.
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not preload_app and _warm_up:
+        from lib.techiecrews import warm_up
+        warm_up()
@@ -0,0 +1,561 @@
+import collections
+import io
+import logging
+import os
+import posixpath
+import shutil
+import struct
+import tempfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from lib.telemetry import count_bytes
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when extracting members or streaming archives.
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class BundleLimits:
+    """Bounds on an uploaded bundle, checked against its central directory before extraction.
+
+    A limit of 0 disables that check.
+    """
+
+    max_archive_bytes: int = 100 * 1024 ** 2
+    max_uncompressed_bytes: int = 256 * 1024 ** 2
+    max_entries: int = 5000
+    max_ratio: float = 100.0
+    # Members smaller than this may compress better than max_ratio (e.g. padded text).
+    ratio_min_bytes: int = 1024 ** 2
+
+
+def bundle_limits() -> BundleLimits:
+    """Returns the bundle limits configured in the environment.
+
+    Environment:
+        GAME_GENERATOR_BUNDLE_MAX_BYTES: Size of the zip upload (default 100 MiB).
+        GAME_GENERATOR_BUNDLE_MAX_UNCOMPRESSED_BYTES: Bytes extracted from a bundle (default 256 MiB).
+        GAME_GENERATOR_BUNDLE_MAX_ENTRIES: Entries in the central directory (default 5000).
+        GAME_GENERATOR_BUNDLE_MAX_RATIO: Uncompressed to compressed size of a member and of
+            the whole extraction (default 100).
+    """
+    defaults = BundleLimits()
+    return BundleLimits(
+        max_archive_bytes=int(os.environ.get("GAME_GENERATOR_BUNDLE_MAX_BYTES", defaults.max_archive_bytes)),
+        max_uncompressed_bytes=int(os.environ.get(
+            "GAME_GENERATOR_BUNDLE_MAX_UNCOMPRESSED_BYTES", defaults.max_uncompressed_bytes,
+        )),
+        max_entries=int(os.environ.get("GAME_GENERATOR_BUNDLE_MAX_ENTRIES", defaults.max_entries)),
+        max_ratio=float(os.environ.get("GAME_GENERATOR_BUNDLE_MAX_RATIO", defaults.max_ratio)),
+    )
+
+
+def _seekable(stream: BinaryIO) -> BinaryIO:
+    """Returns `stream` if zipfile can read it in place, else a spooled copy."""
+    try:
+        if stream.seekable():
+            stream.seek(0)
+            return stream
+    except (AttributeError, OSError):
+        pass
+    spooled = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    shutil.copyfileobj(stream, spooled, CHUNK_SIZE)
+    spooled.seek(0)
+    return spooled
+
+
+def _member_parts(relative_name: str) -> Tuple[str, ...]:
+    """Splits an archive member name into path parts, refusing paths that escape their directory."""
+    parts = tuple(part for part in relative_name.split("/") if part not in ("", "."))
+    if not parts or ".." in parts or ":" in parts[0]:
+        raise ValueError(f"Invalid game bundle format: unsafe member path '{relative_name}'.")
+    return parts
+
+
+def _safe_join(base_dir: str, relative_name: str) -> str:
+    """Joins an archive member name onto `base_dir`, refusing paths that escape it."""
+    return os.path.join(base_dir, *_member_parts(relative_name))
+
+
+def find_content_root(names: Iterable[str], marker: str = "index.html") -> str:
+    """Picks the directory of the shallowest `marker` file among archive member names.
+
+    Returns:
+        The root as an archive path prefix ("" for the archive root, else ending in "/").
+
+    Raises:
+        ValueError: If no member is named `marker`.
+    """
+    candidates = [name for name in names if posixpath.basename(name) == marker]
+    if not candidates:
+        raise ValueError(f"Game bundle does not contain an '{marker}' file.")
+    root = posixpath.dirname(min(candidates, key=lambda name: (name.count("/"), name)))
+    return f"{root}/" if root else ""
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    position = stream.tell()
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(position)
+    return size
+
+
+def inspect_bundle(
+    zip_ref: zipfile.ZipFile, limits: BundleLimits, archive_bytes: int = 0,
+) -> Tuple[str, List[zipfile.ZipInfo]]:
+    """Plans an extraction from the central directory alone, without decompressing anything.
+
+    Args:
+        zip_ref: The opened bundle.
+        limits: The bounds the bundle must respect.
+        archive_bytes: Size of the zip file, if known.
+
+    Returns:
+        The content root (see find_content_root) and the file members under it.
+
+    Raises:
+        ValueError: If the bundle has no index.html, breaks one of the limits,
+            or has a member path that is unsafe or names a file as a directory.
+    """
+    infos = zip_ref.infolist()
+    if limits.max_archive_bytes and archive_bytes > limits.max_archive_bytes:
+        raise ValueError(
+            f"Game bundle is too large: {archive_bytes} bytes, the limit is {limits.max_archive_bytes}."
+        )
+    if limits.max_entries and len(infos) > limits.max_entries:
+        raise ValueError(f"Game bundle has too many entries: {len(infos)}, the limit is {limits.max_entries}.")
+
+    files = [member for member in infos if not member.is_dir()]
+    root = find_content_root(member.filename for member in files)
+    members = [member for member in files if member.filename.startswith(root)]
+    # Rejects unsafe paths, and files that another member needs as a directory
+    # (`a` and `a/b`), before anything is written
+    paths = {_member_parts(member.filename[len(root):]): member.filename for member in members}
+    for parts in paths:
+        for depth in range(1, len(parts)):
+            conflict = paths.get(parts[:depth])
+            if conflict is not None:
+                raise ValueError(
+                    f"Invalid game bundle format: '{conflict}' is both a file and the directory of "
+                    f"'{paths[parts]}'."
+                )
+
+    uncompressed = sum(member.file_size for member in members)
+    compressed = sum(member.compress_size for member in members)
+    if limits.max_uncompressed_bytes and uncompressed > limits.max_uncompressed_bytes:
+        raise ValueError(
+            f"Game bundle expands to {uncompressed} bytes, the limit is {limits.max_uncompressed_bytes}."
+        )
+    if limits.max_ratio:
+        for member in members:
+            if member.file_size >= limits.ratio_min_bytes and \
+                    member.file_size > limits.max_ratio * max(member.compress_size, 1):
+                raise ValueError(
+                    f"Game bundle member '{member.filename}' has a suspicious compression ratio "
+                    f"({member.file_size} bytes from {member.compress_size})."
+                )
+        if uncompressed >= limits.ratio_min_bytes and uncompressed > limits.max_ratio * max(compressed, 1):
+            raise ValueError(
+                f"Game bundle has a suspicious compression ratio ({uncompressed} bytes from {compressed})."
+            )
+    return root, members
+
+
+def extract_bundle(stream: BinaryIO, target_dir: str, limits: Optional[BundleLimits] = None) -> List[str]:
+    """Extracts a zip bundle straight from `stream`, re-rooted at its index.html directory.
+
+    The central directory is inspected first (see inspect_bundle), so
+    oversized archives, archives with too many entries and zip bombs are
+    rejected before anything is written. Only the members under the content
+    root are then copied, in chunks, to their final location. zipfile stops
+    each member at its declared size and checks its CRC, so the inspected
+    sizes also bound what is written.
+
+    Args:
+        stream: A binary stream holding the zip file (seekable streams are read in place).
+        target_dir: The directory that receives the content.
+        limits: Bounds on the bundle (default: bundle_limits()).
+
+    Returns:
+        The relative paths of the extracted files.
+
+    Raises:
+        ValueError: If the stream is not a zip file, has no index.html,
+            breaks a limit, has a corrupt member, or a member path would
+            escape `target_dir`.
+    """
+    limits = limits or bundle_limits()
+    stream = _seekable(stream)
+    archive_bytes = _stream_size(stream)
+    try:
+        zip_ref = zipfile.ZipFile(stream, 'r')
+    except zipfile.BadZipFile:
+        raise ValueError("Invalid game bundle format: Not a valid zip file.")
+
+    extracted = []
+    extracted_bytes = 0
+    with zip_ref:
+        try:
+            root, members = inspect_bundle(zip_ref, limits, archive_bytes)
+        except ValueError as e:
+            logger.warning("Rejected game bundle: %s", e)
+            raise
+        logger.info("Identified game content root", extra={"root": root or "/", "members": len(members)})
+        for member in members:
+            relative_name = member.filename[len(root):]
+            target_path = _safe_join(target_dir, relative_name)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            try:
+                with zip_ref.open(member) as source, open(target_path, "wb") as target:
+                    shutil.copyfileobj(source, target, CHUNK_SIZE)
+            except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+                # Corrupt data, unsupported compression or encryption
+                raise ValueError(f"Invalid game bundle format: cannot extract '{member.filename}': {e}")
+            extracted.append(relative_name)
+            extracted_bytes += member.file_size
+    count_bytes("bundle.extract", extracted_bytes)
+    return extracted
+
+
+# Extensions of already-compressed formats, which deflate cannot shrink.
+STORED_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif",
+    ".mp3", ".ogg", ".oga", ".opus", ".m4a", ".aac", ".flac", ".mp4", ".webm",
+    ".woff", ".woff2", ".zip", ".gz", ".br", ".bz2", ".xz", ".7z",
+})
+
+# Bytes of a file compressed as one independent deflate segment. Segments
+# are compressed in parallel and concatenated, so the output does not
+# depend on the number of threads.
+SEGMENT_SIZE = 1024 * 1024
+
+# Timestamp of every archived file, so identical trees give identical zips.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+_DOS_DATE = (1 << 5) | 1 # 1980-01-01
+_DOS_TIME = 0
+_EXTERNAL_ATTR = 0o100644 << 16 # Regular file, rw-r--r--
+_ZIP_VERSION = 20
+_MADE_BY_UNIX = 3
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+# Trees whose files add up to more than this need zip64 records.
+_ZIP32_MAX_BYTES = 0xFFFFFFFF - 64 * 1024 ** 2
+_ZIP32_MAX_ENTRIES = 0xFFFF
+
+
+@dataclass
+class CompressionPolicy:
+    """Chooses how each file of an output bundle is compressed.
+
+    Files with a stored extension or smaller than `min_deflate_bytes` are
+    stored. Others are deflated at `levels[extension]` (0 stores), at
+    `large_file_level` from `large_file_bytes` on, else at `default_level`.
+    """
+
+    default_level: int = 6
+    levels: Dict[str, int] = field(default_factory=dict)
+    stored_extensions: FrozenSet[str] = STORED_EXTENSIONS
+    min_deflate_bytes: int = 128
+    large_file_bytes: int = 16 * 1024 ** 2
+    large_file_level: int = 1
+    # Threads compressing segments; bundles below parallel_min_bytes use the calling thread.
+    threads: int = 1
+    parallel_min_bytes: int = 4 * 1024 ** 2
+
+    def method_for(self, name: str, size: int) -> Tuple[int, int]:
+        """Returns the zipfile compression method and deflate level of a file."""
+        extension = posixpath.splitext(name)[1].lower()
+        if extension in self.stored_extensions or size < self.min_deflate_bytes:
+            return zipfile.ZIP_STORED, 0
+        if extension in self.levels:
+            level = self.levels[extension]
+        elif size >= self.large_file_bytes:
+            level = self.large_file_level
+        else:
+            level = self.default_level
+        return (zipfile.ZIP_DEFLATED, level) if level > 0 else (zipfile.ZIP_STORED, 0)
+
+
+def compression_policy() -> CompressionPolicy:
+    """Returns the compression policy configured in the environment.
+
+    Environment:
+        GAME_GENERATOR_ZIP_LEVEL: Default deflate level (default 6).
+        GAME_GENERATOR_ZIP_LEVELS: Per-extension levels, e.g. ".html=9,.wav=1" (0 stores).
+        GAME_GENERATOR_ZIP_STORED_EXTENSIONS: Comma-separated extensions to store,
+            replacing STORED_EXTENSIONS.
+        GAME_GENERATOR_ZIP_THREADS: Compression threads (default: CPU count, at most 4).
+        GAME_GENERATOR_ZIP_PARALLEL_MIN_BYTES: Smallest bundle compressed in parallel (default 4 MiB).
+    """
+    defaults = CompressionPolicy()
+    levels = {}
+    for item in os.environ.get("GAME_GENERATOR_ZIP_LEVELS", "").split(","):
+        if "=" in item:
+            extension, level = item.split("=", 1)
+            levels[extension.strip().lower()] = int(level)
+    stored = os.environ.get("GAME_GENERATOR_ZIP_STORED_EXTENSIONS")
+    return CompressionPolicy(
+        default_level=int(os.environ.get("GAME_GENERATOR_ZIP_LEVEL", defaults.default_level)),
+        levels=levels,
+        stored_extensions=(
+            frozenset(item.strip().lower() for item in stored.split(",") if item.strip())
+            if stored is not None else defaults.stored_extensions
+        ),
+        threads=int(os.environ.get("GAME_GENERATOR_ZIP_THREADS", min(4, os.cpu_count() or 1))),
+        parallel_min_bytes=int(os.environ.get("GAME_GENERATOR_ZIP_PARALLEL_MIN_BYTES", defaults.parallel_min_bytes)),
+    )
+
+
+# One pool per thread count: requests share the pool of the configured
+# policy, and a policy with other threads (e.g. a benchmark) gets its own.
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executor_lock = threading.Lock()
+
+
+def _compression_executor(threads: int) -> ThreadPoolExecutor:
+    """Returns the process-wide compression pool of `threads` threads, shared by all requests to bound CPU use."""
+    with _executor_lock:
+        executor = _executors.get(threads)
+        if executor is None:
+            executor = _executors[threads] = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix=f"zip{threads}",
+            )
+        return executor
+
+
+def _iter_files(source_dir: str, exclude: Iterable[str]) -> Iterator[tuple]:
+    """Yields (path, arcname) of the files under `source_dir`, sorted by arcname."""
+    excluded = set(exclude)
+    found = []
+    for root, dirs, files in os.walk(source_dir):
+        if root == source_dir:
+            dirs[:] = [name for name in dirs if name not in excluded]
+            files = [name for name in files if name not in excluded]
+        for file in files:
+            file_path = os.path.join(root, file)
+            # Arcname determines the path inside the zip file
+            found.append((file_path, os.path.relpath(file_path, source_dir).replace(os.sep, "/")))
+    return iter(sorted(found, key=lambda item: item[1]))
+
+
+class _Member:
+    def __init__(self, path: str, arcname: str, size: int, method: int, level: int):
+        self.path = path
+        self.name = arcname.encode("utf-8")
+        self.size = size
+        self.method = method
+        self.level = level
+        self.flags = 0 if arcname.isascii() else _FLAG_UTF8
+        if method == zipfile.ZIP_DEFLATED:
+            # CRC and sizes follow the data, so deflated files are read once
+            self.flags |= _FLAG_DATA_DESCRIPTOR
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        self.offset = 0
+
+    def local_header(self) -> bytes:
+        known = not self.flags & _FLAG_DATA_DESCRIPTOR
+        return struct.pack(
+            "<4s2B4HL2L2H", b"PK\x03\x04", _ZIP_VERSION, 0, self.flags, self.method, _DOS_TIME, _DOS_DATE,
+            self.crc if known else 0, self.size if known else 0, self.size if known else 0, len(self.name), 0,
+        ) + self.name
+
+    def data_descriptor(self) -> bytes:
+        return struct.pack("<4s3L", b"PK\x07\x08", self.crc, self.compress_size, self.file_size)
+
+    def central_header(self) -> bytes:
+        return struct.pack(
+            "<4s4B4HL2L5H2L", b"PK\x01\x02", _ZIP_VERSION, _MADE_BY_UNIX, _ZIP_VERSION, 0, self.flags,
+            self.method, _DOS_TIME, _DOS_DATE, self.crc, self.compress_size, self.file_size, len(self.name),
+            0, 0, 0, 0, _EXTERNAL_ATTR, self.offset,
+        ) + self.name
+
+
+def _deflate_segment(data: bytes, level: int, final: bool) -> bytes:
+    """Deflates one segment as raw deflate data that can be concatenated with the next one."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _file_crc(path: str) -> Tuple[int, int]:
+    crc = 0
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return crc, size
+
+
+def _iter_deterministic_zip(members: List[_Member], policy: CompressionPolicy) -> Iterator[bytes]:
+    """Writes the zip records of `members` in order, deflating segments on the compression pool.
+
+    At most a few segments per thread are compressed ahead of the output.
+    """
+    parallel = policy.threads > 1 and sum(member.size for member in members) >= policy.parallel_min_bytes
+    executor = _compression_executor(policy.threads) if parallel else None
+    lookahead = policy.threads * 2 if parallel else 0
+    pending = collections.deque()
+    position = 0
+
+    def emit() -> bytes:
+        nonlocal position
+        kind, member, payload = pending.popleft()
+        if kind == "header":
+            member.offset = position
+            data = member.local_header()
+        elif kind == "descriptor":
+            data = member.data_descriptor()
+        else:
+            data = payload.result() if isinstance(payload, Future) else payload
+            member.compress_size += len(data)
+        position += len(data)
+        return data
+
+    for member in members:
+        if member.method == zipfile.ZIP_STORED:
+            member.crc, member.size = _file_crc(member.path)
+            member.file_size = member.size
+        pending.append(("header", member, None))
+        with open(member.path, "rb") as source:
+            if member.method == zipfile.ZIP_STORED:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    pending.append(("data", member, chunk))
+                    while len(pending) > lookahead:
+                        yield emit()
+                continue
+            segment = source.read(SEGMENT_SIZE)
+            while True:
+                next_segment = source.read(SEGMENT_SIZE)
+                final = not next_segment
+                member.crc = zlib.crc32(segment, member.crc)
+                member.file_size += len(segment)
+                if executor:
+                    payload = executor.submit(_deflate_segment, segment, member.level, final)
+                else:
+                    payload = _deflate_segment(segment, member.level, final)
+                pending.append(("data", member, payload))
+                while len(pending) > lookahead:
+                    yield emit()
+                if final:
+                    break
+                segment = next_segment
+        pending.append(("descriptor", member, None))
+    while pending:
+        yield emit()
+
+    central_directory = b"".join(member.central_header() for member in members)
+    yield central_directory + struct.pack(
+        "<4s4H2LH", b"PK\x05\x06", 0, 0, len(members), len(members), len(central_directory), position, 0,
+    )
+
+
+def _coalesce(chunks: Iterator[bytes], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Joins small pieces (such as headers) into chunks of at least `size` bytes."""
+    buffered = []
+    buffered_bytes = 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        buffered_bytes += len(chunk)
+        if buffered_bytes >= size:
+            yield b"".join(buffered)
+            buffered = []
+            buffered_bytes = 0
+    if buffered:
+        yield b"".join(buffered)
+
+
+class _ChunkSink(io.RawIOBase):
+    """An unseekable writable that buffers zip output until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_zip64(members: List[_Member], policy: CompressionPolicy) -> Iterator[bytes]:
+    """Writes trees too large for a plain zip with zipfile's zip64 support, on the calling thread."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED, compresslevel=policy.default_level) as zipf:
+        for member in members:
+            zinfo = zipfile.ZipInfo(member.name.decode("utf-8"), ZIP_DATE_TIME)
+            zinfo.compress_type = member.method
+            # ZipFile.open() ignores the archive's compresslevel and reads the
+            # level off the ZipInfo (`compress_level` from Python 3.13, which
+            # keeps `_compresslevel` as an alias).
+            zinfo._compresslevel = member.level if member.method == zipfile.ZIP_DEFLATED else None
+            zinfo.external_attr = _EXTERNAL_ATTR
+            with open(member.path, "rb") as source, zipf.open(zinfo, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def iter_directory_zip(
+    source_dir: str, exclude: Iterable[str] = (), policy: Optional[CompressionPolicy] = None,
+) -> Iterator[bytes]:
+    """Yields a deterministic zip of `source_dir` chunk by chunk as it is compressed.
+
+    Members are sorted by name and carry a fixed timestamp and mode, so the
+    same files always give the same bytes (and the same hash). Each file is
+    stored or deflated as the policy says; large bundles are deflated on a
+    thread pool, one SEGMENT_SIZE segment per task. Only a few segments are
+    held in memory at a time, so the archive can be written straight into a
+    streamed response.
+
+    Args:
+        source_dir: Directory whose content is archived.
+        exclude: Top-level entries of `source_dir` to leave out.
+        policy: How files are compressed (default: compression_policy()).
+    """
+    policy = policy or compression_policy()
+    members = []
+    for file_path, arcname in _iter_files(source_dir, exclude):
+        size = os.path.getsize(file_path)
+        members.append(_Member(file_path, arcname, size, *policy.method_for(arcname, size)))
+    if sum(member.size for member in members) > _ZIP32_MAX_BYTES or len(members) > _ZIP32_MAX_ENTRIES:
+        return _iter_zip64(members, policy)
+    return _coalesce(_iter_deterministic_zip(members, policy))
+
+
+def write_directory_zip(
+    source_dir: str, fileobj: BinaryIO, exclude: Iterable[str] = (), policy: Optional[CompressionPolicy] = None,
+) -> None:
+    """Zips the files under `source_dir` into `fileobj` (see iter_directory_zip).
+
+    `fileobj` may be any writable binary object, including unseekable ones
+    such as a response stream.
+
+    Args:
+        source_dir: Directory whose content is archived.
+        fileobj: Destination of the zip data.
+        exclude: Top-level entries of `source_dir` to leave out.
+        policy: How files are compressed (default: compression_policy()).
+    """
+    for chunk in iter_directory_zip(source_dir, exclude, policy):
+        fileobj.write(chunk)
@@ -0,0 +1,98 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# File names collect_workspace writes into an artifact directory.
+ARTIFACT_FILES = {
+    "icon.png": "image/png",
+    "splash.png": "image/png",
+    "bundle.zip": "application/zip",
+}
+
+
+class ArtifactStore:
+    """Keeps finalized artifacts on disk so they can be streamed to clients.
+
+    Each artifact set lives in `root/<artifact_id>/` and is removed once it is
+    older than `ttl` seconds (checked whenever a new set is created) or when
+    the caller discards it explicitly.
+
+    Args:
+        root: Directory holding the artifact sets.
+        ttl: Seconds an artifact set stays downloadable.
+    """
+
+    def __init__(self, root: str, ttl: float = 3600):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+
+    def create(self) -> Tuple[str, str]:
+        """Creates an empty artifact directory.
+
+        Returns:
+            The artifact id and the directory path.
+        """
+        self.purge_expired()
+        artifact_id = uuid.uuid4().hex
+        artifact_dir = os.path.join(self.root, artifact_id)
+        os.makedirs(artifact_dir)
+        return artifact_id, artifact_dir
+
+    def directory_for(self, artifact_id: str) -> str:
+        return os.path.join(self.root, artifact_id)
+
+    def path_for(self, artifact_id: str, name: str) -> Optional[str]:
+        """Returns the path of a stored artifact file, or None if it does not exist."""
+        if name not in ARTIFACT_FILES:
+            return None
+        try:
+            uuid.UUID(hex=artifact_id)
+        except ValueError:
+            return None
+        file_path = os.path.join(self.directory_for(artifact_id), name)
+        return file_path if os.path.isfile(file_path) else None
+
+    def discard(self, artifact_id: str) -> None:
+        shutil.rmtree(self.directory_for(artifact_id), ignore_errors=True)
+
+    def purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.root):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    logger.info("Removed expired artifacts", extra={"path": entry.path})
+            except FileNotFoundError:
+                continue
+
+
+_artifact_store: Optional[ArtifactStore] = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Returns the process-wide ArtifactStore.
+
+    Environment:
+        GAME_GENERATOR_ARTIFACT_DIR: Artifact root (default <tmp>/game-generator-artifacts).
+        GAME_GENERATOR_ARTIFACT_TTL: Seconds artifacts stay downloadable (default 3600).
+    """
+    global _artifact_store
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore(
+                root=os.environ.get(
+                    "GAME_GENERATOR_ARTIFACT_DIR",
+                    os.path.join(tempfile.gettempdir(), "game-generator-artifacts"),
+                ),
+                ttl=float(os.environ.get("GAME_GENERATOR_ARTIFACT_TTL", "3600")),
+            )
+        return _artifact_store
@@ -0,0 +1,262 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Serve recorded calls and record the others.
+MODE_CACHE = "cache"
+# Serve recorded calls only; any other call fails, so a run needs no network.
+MODE_REPLAY = "replay"
+MODE_OFF = "off"
+MODES = (MODE_OFF, MODE_CACHE, MODE_REPLAY)
+
+KIND_LLM = "llm"
+KIND_TOOL = "tool"
+
+# Tools whose answer depends only on their arguments. The workspace file
+# tools and save_sound read or change the workspace, so they always run.
+CACHEABLE_TOOLS = ("read_examples_html", "search_sound")
+
+# Marks methods already wrapped, e.g. a tool shared by several agents.
+_WRAPPED = "_call_cache_wrapped"
+
+
+class CallCacheError(Exception):
+    """Raised in replay mode when a crew would have to call a model or tool it cannot replay."""
+
+
+class CallCacheMiss(CallCacheError, LookupError):
+    """Raised in replay mode for a call that was never recorded."""
+
+
+class CallCacheUnsupported(CallCacheError):
+    """Raised in replay mode for an LLM client or cacheable tool the call cache cannot wrap."""
+
+
+def call_key(kind: str, name: str, payload: Any) -> str:
+    """Returns the SHA-256 addressing a call of `kind` (llm or tool) by its name and arguments."""
+    data = json.dumps({"kind": kind, "name": name, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class CallCache:
+    """A size-bounded, LRU-evicted SQLite store of LLM and tool call results.
+
+    Results are stored as text under the key from call_key(), with the time
+    of their last use, which drives eviction.
+
+    Args:
+        path: The SQLite database file.
+        max_bytes: Total size of the stored results before the least recently
+            used are evicted.
+        replay: Answer only from the store and never record.
+    """
+
+    def __init__(self, path: str, max_bytes: int, replay: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "key TEXT PRIMARY KEY, kind TEXT, name TEXT, value TEXT, size INTEGER, created_at REAL, used_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS calls_used_at ON calls (used_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns a stored result and marks it as recently used, or None on a miss."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM calls WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE calls SET used_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, kind: str, name: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO calls VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, name, value, len(value.encode("utf-8")), now, now),
+            )
+            self.stores += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drops the least recently used results until under max_bytes. Caller holds _lock."""
+        total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM calls").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM calls ORDER BY used_at"):
+            if total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total_bytes -= size
+        self._db.executemany("DELETE FROM calls WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def call(self, kind: str, name: str, payload: Any, function: Callable[[], Any]) -> Any:
+        """Returns the recorded result of a call, running and recording it on a miss.
+
+        Only text results are recorded; others are returned as they are.
+
+        Raises:
+            CallCacheMiss: In replay mode, if the call was never recorded.
+        """
+        key = call_key(kind, name, payload)
+        value = self.get(key)
+        if value is not None:
+            return value
+        if self.replay:
+            raise CallCacheMiss(f"No recorded {kind} call of {name} ({key[:12]})")
+        result = function()
+        if isinstance(result, str):
+            self.put(key, kind, name, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+_call_cache: Optional[CallCache] = None
+_call_cache_lock = threading.Lock()
+
+
+def call_cache_mode() -> str:
+    """Returns the call cache mode (env GAME_GENERATOR_CALL_CACHE: off, cache or replay)."""
+    mode = os.environ.get("GAME_GENERATOR_CALL_CACHE", MODE_OFF).lower()
+    if mode not in MODES:
+        raise ValueError(f"Unsupported GAME_GENERATOR_CALL_CACHE: {mode}")
+    return mode
+
+
+def get_call_cache() -> Optional[CallCache]:
+    """Returns the process-wide CallCache, or None when it is off.
+
+    Environment:
+        GAME_GENERATOR_CALL_CACHE: off (default), cache or replay.
+        GAME_GENERATOR_CALL_CACHE_PATH: The SQLite file (default <tmp>/game-generator-call-cache.sqlite3).
+        GAME_GENERATOR_CALL_CACHE_BYTES: Size bound of the stored results (default 1 GiB).
+    """
+    global _call_cache
+    mode = call_cache_mode()
+    if mode == MODE_OFF:
+        return None
+    with _call_cache_lock:
+        if _call_cache is None:
+            _call_cache = CallCache(
+                path=os.environ.get(
+                    "GAME_GENERATOR_CALL_CACHE_PATH",
+                    os.path.join(tempfile.gettempdir(), "game-generator-call-cache.sqlite3"),
+                ),
+                max_bytes=int(os.environ.get("GAME_GENERATOR_CALL_CACHE_BYTES", str(1024 ** 3))),
+                replay=mode == MODE_REPLAY,
+            )
+        return _call_cache
+
+
+def _wrap(owner: Any, attribute: str, wrapper: Callable[[Callable], Callable]) -> bool:
+    """Replaces `owner.attribute` by its cached version; returns False if the owner has no such method or refuses it."""
+    method = getattr(owner, attribute, None)
+    if method is None:
+        return False
+    if getattr(method, _WRAPPED, False):
+        return True
+    wrapped = functools.wraps(method)(wrapper(method))
+    setattr(wrapped, _WRAPPED, True)
+    try:
+        setattr(owner, attribute, wrapped)
+    except Exception:
+        logger.debug("%s does not accept a cached %s", type(owner).__name__, attribute)
+        return False
+    return True
+
+
+def _llm_model(llm: Any) -> str:
+    return str(getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__)
+
+
+def _cached_llm(cache: CallCache, llm: Any) -> Callable[[Callable], Callable]:
+    def wrapper(call):
+        def cached_call(messages, *args, callbacks=None, **kwargs):
+            # Calls that pass tools or functions may run them; they are not replayable.
+            if args or any(value is not None for value in kwargs.values()):
+                if cache.replay:
+                    raise CallCacheMiss(f"LLM calls of {_llm_model(llm)} that pass tools or functions cannot be replayed")
+                return call(messages, *args, callbacks=callbacks, **kwargs)
+            payload = {
+                "model": _llm_model(llm),
+                "messages": messages,
+                "temperature": getattr(llm, "temperature", None),
+                "stop": getattr(llm, "stop", None),
+            }
+            return cache.call(KIND_LLM, _llm_model(llm), payload, lambda: call(messages, callbacks=callbacks))
+        return cached_call
+    return wrapper
+
+
+def _cached_tool(cache: CallCache, name: str) -> Callable[[Callable], Callable]:
+    def wrapper(run):
+        def cached_run(*args, **kwargs):
+            return cache.call(KIND_TOOL, name, {"args": args, "kwargs": kwargs}, lambda: run(*args, **kwargs))
+        return cached_run
+    return wrapper
+
+
+def _tool_name(tool: Any) -> str:
+    return str(getattr(tool, "name", "") or "").strip().lower().replace(" ", "_")
+
+
+def install(agent_pool: Dict[str, Any]) -> None:
+    """Routes the LLM calls and cacheable tool calls of a crew's agents through the call cache.
+
+    Wraps `llm.call` and the `_run` of CACHEABLE_TOOLS on the agents of one
+    crew instance; does nothing when the cache is off. In cache mode, LLM
+    clients without a `call` method, or that refuse the wrapper, keep calling
+    the model; in replay mode they fail the crew, so a replayed run never
+    reaches the network through them.
+
+    Args:
+        agent_pool: The agents of a crew, freshly copied for it (see
+            CrewRegistry.get_crew), so the prototypes stay unwrapped.
+
+    Raises:
+        CallCacheUnsupported: In replay mode, if an agent's LLM client or
+            cacheable tool cannot be wrapped.
+    """
+    cache = get_call_cache()
+    if cache is None:
+        return
+    for agent_name, agent in agent_pool.items():
+        llm = getattr(agent, "llm", None)
+        wrapped = llm is not None and not isinstance(llm, str) and _wrap(llm, "call", _cached_llm(cache, llm))
+        if not wrapped and cache.replay:
+            raise CallCacheUnsupported(f"The LLM client of agent {agent_name} ({type(llm).__name__}) cannot be replayed")
+        for tool in getattr(agent, "tools", None) or []:
+            name = _tool_name(tool)
+            if name in CACHEABLE_TOOLS and not _wrap(tool, "_run", _cached_tool(cache, name)) and cache.replay:
+                raise CallCacheUnsupported(f"The {name} tool of agent {agent_name} cannot be replayed")
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from lib.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+_INFO_FILE = "checkpoint.json"
+
+
+class CheckpointStore:
+    """Keeps copies of a workspace as it was after each pipeline stage.
+
+    A checkpoint `root/<checkpoint_id>/` holds one directory per completed
+    stage plus a checkpoint.json with the stage order and the caller's info
+    (such as the request that started the pipeline). Stages are copied, not
+    linked, because later stages rewrite workspace files in place.
+
+    Args:
+        root: Directory holding the checkpoints.
+        ttl: Seconds a checkpoint is kept after its last save.
+    """
+
+    def __init__(self, root: str, ttl: float = 86400):
+        self.root = root
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _checkpoint_dir(self, checkpoint_id: str) -> Optional[str]:
+        try:
+            uuid.UUID(checkpoint_id)
+        except ValueError:
+            return None
+        return os.path.join(self.root, checkpoint_id)
+
+    def info(self, checkpoint_id: str) -> Optional[dict]:
+        """Returns the checkpoint.json content, or None if the checkpoint does not exist."""
+        checkpoint_dir = self._checkpoint_dir(checkpoint_id)
+        if checkpoint_dir is None:
+            return None
+        try:
+            with open(os.path.join(checkpoint_dir, _INFO_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stages(self, checkpoint_id: str) -> List[str]:
+        """Returns the saved stages in the order they completed."""
+        info = self.info(checkpoint_id)
+        return info["stages"] if info else []
+
+    def save(self, checkpoint_id: str, stage: str, workspace_path: str, **info) -> None:
+        """Copies `workspace_path` as the checkpoint of `stage`, replacing an older copy.
+
+        Args:
+            checkpoint_id: A UUID string identifying the pipeline run.
+            stage: Name of the stage that just completed.
+            workspace_path: The workspace to copy.
+            **info: Values recorded in checkpoint.json (kept from earlier saves otherwise).
+        """
+        self.purge_expired()
+        checkpoint_dir = self._checkpoint_dir(checkpoint_id)
+        if checkpoint_dir is None:
+            raise ValueError(f"Invalid checkpoint id: {checkpoint_id}")
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        staging_dir = os.path.join(checkpoint_dir, f".staging-{uuid.uuid4().hex}")
+        try:
+            with span("checkpoint.save", stage=stage):
+                shutil.copytree(workspace_path, staging_dir)
+            with self._lock:
+                stage_dir = os.path.join(checkpoint_dir, stage)
+                shutil.rmtree(stage_dir, ignore_errors=True)
+                os.rename(staging_dir, stage_dir)
+                stored = self.info(checkpoint_id) or {"stages": [], "created_at": time.time()}
+                stored.update(info)
+                stored["stages"] = [name for name in stored["stages"] if name != stage] + [stage]
+                stored["updated_at"] = time.time()
+                info_path = os.path.join(checkpoint_dir, _INFO_FILE)
+                with open(f"{info_path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(stored, f)
+                os.replace(f"{info_path}.tmp", info_path)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        logger.info("Saved checkpoint", extra={"checkpoint_id": checkpoint_id, "stage": stage})
+
+    def restore(self, checkpoint_id: str, stage: str, workspace_path: str) -> None:
+        """Copies the checkpoint of `stage` into the (empty) workspace.
+
+        Raises:
+            KeyError: If the stage has no checkpoint.
+        """
+        if stage not in self.stages(checkpoint_id):
+            raise KeyError(f"No checkpoint for stage '{stage}' of {checkpoint_id}")
+        with span("checkpoint.restore", stage=stage):
+            shutil.copytree(os.path.join(self.root, checkpoint_id, stage), workspace_path, dirs_exist_ok=True)
+        logger.info("Restored checkpoint", extra={
+            "checkpoint_id": checkpoint_id, "stage": stage, "workspace": workspace_path,
+        })
+
+    def discard(self, checkpoint_id: str) -> None:
+        checkpoint_dir = self._checkpoint_dir(checkpoint_id)
+        if checkpoint_dir:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    def purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.root):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    logger.info("Removed expired checkpoint", extra={"path": entry.path})
+            except FileNotFoundError:
+                continue
+
+
+_checkpoint_store: Optional[CheckpointStore] = None
+_checkpoint_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    """Returns the process-wide CheckpointStore.
+
+    Environment:
+        GAME_GENERATOR_CHECKPOINT_DIR: Checkpoint root (default <tmp>/game-generator-checkpoints).
+        GAME_GENERATOR_CHECKPOINT_TTL: Seconds checkpoints are kept (default 86400).
+    """
+    global _checkpoint_store
+    with _checkpoint_store_lock:
+        if _checkpoint_store is None:
+            _checkpoint_store = CheckpointStore(
+                root=os.environ.get(
+                    "GAME_GENERATOR_CHECKPOINT_DIR",
+                    os.path.join(tempfile.gettempdir(), "game-generator-checkpoints"),
+                ),
+                ttl=float(os.environ.get("GAME_GENERATOR_CHECKPOINT_TTL", "86400")),
+            )
+        return _checkpoint_store
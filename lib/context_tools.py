@@ -0,0 +1,149 @@
+import os
+from typing import Dict, Type
+
+# crewai comes with the techies runtime, so lib.techiecrews.load_runtime()
+# imports this module along with it. Like the techies file tools, these
+# tools work in `base_dir`, which CrewRegistry rebinds to each workspace.
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from lib import game_sections
+from lib.hierarchy import HIERARCHY_FILE
+from lib.hierarchy_index import load_index, context_pruning_enabled, ROLES
+from lib.telemetry import registry
+
+CONTEXT_CHARS_TOTAL = registry.counter(
+    "game_generator_context_chars_total",
+    "Characters returned by the context tools (served) and in the whole files they read from (full), by tool.",
+)
+
+# Paths returned for one type selector, e.g. "Button".
+MAX_TYPE_SECTIONS = 20
+
+
+def _served(tool: str, result: str, full: str) -> str:
+    CONTEXT_CHARS_TOTAL.inc(len(result), tool=tool, kind="served")
+    CONTEXT_CHARS_TOTAL.inc(len(full), tool=tool, kind="full")
+    return result
+
+
+def _read_hierarchy(base_dir: str) -> str:
+    try:
+        with open(os.path.join(base_dir, HIERARCHY_FILE), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+class ReadHierarchySectionsInput(BaseModel):
+    role: str = Field("", description=f"Your role, one of: {', '.join(ROLES)}. Returns the sections of that role.")
+    sections: str = Field(
+        "", description="Comma-separated component keys (e.g. 'Player, Screen[2]'), paths (e.g. 'Game/Player/Movement') or element types.",
+    )
+
+
+class ReadHierarchySectionsTool(BaseTool):
+    name: str = "read_hierarchy_sections"
+    description: str = (
+        "Reads the parts of game_hierarchy.xml you need: pass your `role` to get the components of that role "
+        "in full plus a one-line summary of every other component, or `sections` to get specific components "
+        "or elements. Without arguments, returns the metadata and the summary of all components."
+    )
+    args_schema: Type[BaseModel] = ReadHierarchySectionsInput
+    base_dir: str = ""
+
+    def _run(self, role: str = "", sections: str = "") -> str:
+        full = _read_hierarchy(self.base_dir)
+        if not full:
+            return f"{HIERARCHY_FILE} does not exist."
+        index = load_index(self.base_dir)
+        if index is None or not context_pruning_enabled():
+            return _served(self.name, full, full)
+        if sections:
+            parts = []
+            for selector in (part.strip() for part in sections.split(",")):
+                paths = index.find(selector) if selector else []
+                if not paths:
+                    parts.append(f"<!-- No section '{selector}'. Components: {', '.join(index.components)} -->")
+                    continue
+                parts += [index.section(path) for path in paths[:MAX_TYPE_SECTIONS]]
+                if len(paths) > MAX_TYPE_SECTIONS:
+                    parts.append(f"<!-- {len(paths) - MAX_TYPE_SECTIONS} more '{selector}' elements: ask for them by path -->")
+            return _served(self.name, "\n".join(parts) + "\n", full)
+        if role:
+            role = role.strip().lower()
+            if role not in ROLES:
+                return f"Unknown role '{role}', expected one of: {', '.join(ROLES)}"
+            # A role no component matches gets the whole hierarchy rather than nothing
+            return _served(self.name, index.role_context(role) or full, full)
+        return _served(self.name, index.context([], "the whole game"), full)
+
+
+class ListGameSectionsInput(BaseModel):
+    pass
+
+
+class ListGameSectionsTool(BaseTool):
+    name: str = "list_game_sections"
+    description: str = (
+        "Lists the sections of game.html: every inline <style> and <script> element and every section "
+        "marked with section comments, with its kind, line range, size and first line."
+    )
+    args_schema: Type[BaseModel] = ListGameSectionsInput
+    base_dir: str = ""
+
+    def _run(self) -> str:
+        html = game_sections.read_game(self.base_dir)
+        if not html:
+            return "game.html does not exist yet; write_game_section creates it."
+        return _served(self.name, game_sections.outline(html) or "game.html has no sections.", html)
+
+
+class ReadGameSectionInput(BaseModel):
+    section: str = Field(..., description="The section name from list_game_sections, e.g. 'hud' or 'script[1]'.")
+
+
+class ReadGameSectionTool(BaseTool):
+    name: str = "read_game_section"
+    description: str = "Reads one section of game.html by its name from list_game_sections."
+    args_schema: Type[BaseModel] = ReadGameSectionInput
+    base_dir: str = ""
+
+    def _run(self, section: str) -> str:
+        html = game_sections.read_game(self.base_dir)
+        content = game_sections.read_section(html, section.strip())
+        if content is None:
+            return f"game.html has no section '{section}'. Sections:\n{game_sections.outline(html)}"
+        return _served(self.name, content, html)
+
+
+class WriteGameSectionInput(BaseModel):
+    section: str = Field(..., description="An existing section name, or a new name (letters, digits, '_', '.', '-').")
+    content: str = Field(..., description="The complete new content of the section, without its marker comments.")
+    kind: str = Field(
+        game_sections.KIND_SCRIPT,
+        description="For a new section: 'html' (markup), 'style' (CSS) or 'script' (JavaScript).",
+    )
+
+
+class WriteGameSectionTool(BaseTool):
+    name: str = "write_game_section"
+    description: str = (
+        "Replaces the content of one section of game.html, or adds a new marked section, leaving the rest "
+        "of the file untouched. Returns the updated section list."
+    )
+    args_schema: Type[BaseModel] = WriteGameSectionInput
+    base_dir: str = ""
+
+    def _run(self, section: str, content: str, kind: str = game_sections.KIND_SCRIPT) -> str:
+        try:
+            sections = game_sections.write_section(self.base_dir, section.strip(), content, kind.strip().lower())
+        except ValueError as e:
+            return str(e)
+        return f"Saved section '{section}' of game.html. Sections:\n{sections}"
+
+
+def get_context_tools() -> Dict[str, BaseTool]:
+    """Returns new instances of the context tools by name."""
+    tools = [ReadHierarchySectionsTool(), ListGameSectionsTool(), ReadGameSectionTool(), WriteGameSectionTool()]
+    return {tool.name: tool for tool in tools}
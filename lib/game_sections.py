@@ -0,0 +1,207 @@
+import os
+import re
+import threading
+from typing import List, NamedTuple, Optional
+
+GAME_FILE = "game.html"
+
+KIND_HTML = "html"
+KIND_STYLE = "style"
+KIND_SCRIPT = "script"
+KINDS = (KIND_HTML, KIND_STYLE, KIND_SCRIPT)
+
+# Named sections are delimited by marker comments: <!-- section: hud -->
+# ... <!-- /section: hud --> in markup, /* section: hud */ ... /* /section: hud */
+# in CSS and JavaScript.
+_SECTION_NAME = re.compile(r"^[A-Za-z][\w.-]*$")
+_OPEN_MARKER = re.compile(r"(?:<!--|/\*)\s*section:\s*([A-Za-z][\w.-]*)\s*(?:-->|\*/)")
+_OPEN_ELEMENT = re.compile(r"<(script|style)\b([^>]*)>", re.IGNORECASE)
+_CLOSE_ELEMENT = {
+    KIND_STYLE: re.compile(r"</style\s*>", re.IGNORECASE),
+    KIND_SCRIPT: re.compile(r"</script\s*>", re.IGNORECASE),
+}
+_SRC = re.compile(r"\bsrc\s*=", re.IGNORECASE)
+_ID = re.compile(r"\bid\s*=\s*[\"']?([\w-]+)", re.IGNORECASE)
+
+# Characters of a section's first line shown in the outline.
+OUTLINE_TEXT = 60
+
+EMPTY_DOCUMENT = "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n</head>\n<body>\n</body>\n</html>\n"
+
+_write_lock = threading.Lock()
+
+
+class GameSection(NamedTuple):
+    """A section of game.html: `start` and `end` delimit its content."""
+    name: str
+    kind: str
+    start: int
+    end: int
+
+
+class _Element(NamedTuple):
+    """An inline <style> or <script> element: `start` and `end` delimit its content."""
+    kind: str
+    attributes: str
+    start: int
+    end: int
+
+
+def _close_marker(name: str) -> re.Pattern:
+    return re.compile(r"(?:<!--|/\*)\s*/section:\s*" + re.escape(name) + r"\s*(?:-->|\*/)")
+
+
+def _inline_elements(html: str) -> List[_Element]:
+    elements = []
+    position = 0
+    while True:
+        opening = _OPEN_ELEMENT.search(html, position)
+        if opening is None:
+            return elements
+        kind = opening.group(1).lower()
+        closing = _CLOSE_ELEMENT[kind].search(html, opening.end())
+        if closing is None:
+            return elements
+        if not _SRC.search(opening.group(2)):
+            elements.append(_Element(kind, opening.group(2), opening.end(), closing.start()))
+        position = closing.end()
+
+
+def find_sections(html: str) -> List[GameSection]:
+    """Returns the addressable sections of game.html in document order.
+
+    Every inline `<style>` and `<script>` element is a section, named
+    `script#<id>` when it has an id and `script[<n>]` otherwise (counting
+    from 1). Marker comments add named sections of markup, CSS or
+    JavaScript, which may sit inside those elements.
+    """
+    elements = _inline_elements(html)
+    sections = []
+    counts = {KIND_STYLE: 0, KIND_SCRIPT: 0}
+    for element in elements:
+        counts[element.kind] += 1
+        element_id = _ID.search(element.attributes)
+        name = f"{element.kind}#{element_id.group(1)}" if element_id else f"{element.kind}[{counts[element.kind]}]"
+        sections.append(GameSection(name, element.kind, element.start, element.end))
+    for match in _OPEN_MARKER.finditer(html):
+        close = _close_marker(match.group(1)).search(html, match.end())
+        if close is None:
+            continue
+        kind = KIND_HTML
+        for element in elements:
+            if element.start <= match.start() < element.end:
+                kind = element.kind
+        sections.append(GameSection(match.group(1), kind, match.end(), close.start()))
+    sections.sort(key=lambda section: section.start)
+    return sections
+
+
+def get_section(html: str, name: str) -> Optional[GameSection]:
+    for section in find_sections(html):
+        if section.name == name:
+            return section
+    return None
+
+
+def read_section(html: str, name: str) -> Optional[str]:
+    """Returns the content of a section, or None if game.html has no such section."""
+    section = get_section(html, name)
+    return html[section.start:section.end] if section else None
+
+
+def _marked(name: str, kind: str, content: str) -> str:
+    if kind == KIND_HTML:
+        return f"<!-- section: {name} -->\n{content}\n<!-- /section: {name} -->\n"
+    return f"/* section: {name} */\n{content}\n/* /section: {name} */\n"
+
+
+def _insert_at(html: str, pattern: str, text: str, last: bool = False) -> Optional[str]:
+    matches = list(re.finditer(pattern, html, re.IGNORECASE))
+    if not matches:
+        return None
+    position = (matches[-1] if last else matches[0]).start()
+    return html[:position] + text + html[position:]
+
+
+def _add_section(html: str, name: str, kind: str, content: str) -> str:
+    marked = _marked(name, kind, content)
+    if kind in (KIND_STYLE, KIND_SCRIPT):
+        # Into the last inline element of the kind, or a new element
+        elements = [element for element in _inline_elements(html) if element.kind == kind]
+        if elements:
+            position = elements[-1].end
+            return html[:position] + ("" if html[:position].endswith("\n") else "\n") + marked + html[position:]
+        element = f"<{kind}>\n{marked}</{kind}>\n"
+        closing = "</head>" if kind == KIND_STYLE else "</body>"
+        return _insert_at(html, closing, element, last=True) or html + element
+    # Markup goes before the first script in the body, so scripts find it
+    body = re.search(r"<body\b[^>]*>", html, re.IGNORECASE)
+    if body:
+        script = re.compile(r"<script\b", re.IGNORECASE).search(html, body.end())
+        if script:
+            return html[:script.start()] + marked + html[script.start():]
+    return _insert_at(html, "</body>", marked, last=True) or html + marked
+
+
+def replace_section(html: str, name: str, content: str, kind: str = KIND_SCRIPT) -> str:
+    """Returns game.html with the content of a section replaced, adding the section if it is new.
+
+    Args:
+        html: The document; an empty one starts from EMPTY_DOCUMENT.
+        name: An existing section, or the name of a new marker section.
+        content: The section's new content.
+        kind: Where a new section goes: html (markup, before the body's
+            first script), style or script (into the last inline element
+            of that kind, or a new one).
+
+    Raises:
+        ValueError: For a new section with an invalid name or kind.
+    """
+    html = html or EMPTY_DOCUMENT
+    section = get_section(html, name)
+    if section is not None:
+        return html[:section.start] + "\n" + content.strip("\n") + "\n" + html[section.end:]
+    if not _SECTION_NAME.match(name):
+        raise ValueError(f"Invalid section name '{name}': use letters, digits, '_', '.' or '-'")
+    if kind not in KINDS:
+        raise ValueError(f"Invalid section kind '{kind}', expected one of: {', '.join(KINDS)}")
+    return _add_section(html, name, kind, content.strip("\n"))
+
+
+def outline(html: str) -> str:
+    """Returns one line per section: name, kind, line range, size and first line."""
+    lines = []
+    for section in find_sections(html):
+        first_line = html.count("\n", 0, section.start) + 1
+        last_line = first_line + html.count("\n", section.start, section.end)
+        content = html[section.start:section.end]
+        text = next((line.strip() for line in content.splitlines() if line.strip()), "")
+        if len(text) > OUTLINE_TEXT:
+            text = text[:OUTLINE_TEXT] + "..."
+        lines.append(f"{section.name} ({section.kind}, lines {first_line}-{last_line}, {len(content)} chars): {text}")
+    return "\n".join(lines)
+
+
+def read_game(workspace_path: str) -> str:
+    """Returns the workspace's game.html, or "" if it does not exist yet."""
+    try:
+        with open(os.path.join(workspace_path, GAME_FILE), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def write_section(workspace_path: str, name: str, content: str, kind: str = KIND_SCRIPT) -> str:
+    """Replaces or adds a section of the workspace's game.html (see replace_section).
+
+    Returns:
+        The new outline of game.html.
+    """
+    path = os.path.join(workspace_path, GAME_FILE)
+    with _write_lock:
+        html = replace_section(read_game(workspace_path), name, content, kind)
+        partial_path = f"{path}.partial"
+        with open(partial_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(partial_path, path)
+    return outline(html)
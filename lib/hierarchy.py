@@ -0,0 +1,222 @@
+import logging
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+HIERARCHY_FILE = "game_hierarchy.xml"
+
+# Words that say how to change something rather than what to change.
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "onto", "are", "was", "were", "its",
+    "make", "change", "changes", "set", "use", "add", "adds", "remove", "replace", "update", "modify",
+    "please", "should", "would", "could", "can", "more", "less", "some", "all", "any", "also", "new",
+    "instead", "than", "then", "when", "each", "every", "our", "your", "game", "description",
+}
+
+# Terms found in a component's tag names weigh more than terms in its text.
+TAG_WEIGHT = 3
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*$", re.MULTILINE)
+_DECLARATION = re.compile(r"<\?xml[^>]*\?>")
+_UNQUOTED_ATTRIBUTE = re.compile(r"(<[^<>!?/][^<>]*?\s[\w:.-]+)=([^\s\"'<>]+)")
+_BARE_AMPERSAND = re.compile(r"&(?!(?:[a-zA-Z]+|#[0-9]+|#x[0-9a-fA-F]+);)")
+_CAMEL_CASE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_WORD = re.compile(r"[a-zA-Z][a-zA-Z0-9]+")
+
+
+def _repair(text: str) -> str:
+    """Fixes the XML slips the crews make most often: code fences, unquoted
+    attribute values (`repeat=true`) and bare ampersands."""
+    text = _FENCE.sub("", _DECLARATION.sub("", text))
+    previous = None
+    while previous != text:
+        previous, text = text, _UNQUOTED_ATTRIBUTE.sub(r'\1="\2"', text)
+    return _BARE_AMPERSAND.sub("&amp;", text)
+
+
+def parse_hierarchy(text: str) -> Optional[ET.Element]:
+    """Parses a game_hierarchy.xml document.
+
+    The file holds `<Metadata>` and `<Game>` as siblings, so they are parsed
+    under a synthetic `<Hierarchy>` root.
+
+    Returns:
+        The synthetic root, or None if the text is not XML or has no `<Game>`.
+    """
+    try:
+        root = ET.fromstring(f"<Hierarchy>{_repair(text)}</Hierarchy>")
+    except ET.ParseError as e:
+        logger.info("Could not parse game hierarchy: %s", e)
+        return None
+    if root.find("Game") is None and root.find(".//Game") is None:
+        return None
+    return root
+
+
+def game_components(root: ET.Element) -> Dict[str, ET.Element]:
+    """Returns the outer components (the children of `<Game>`) by component key.
+
+    The key is the tag, suffixed with `[n]` when several siblings share it,
+    e.g. "Player" or "Screen[2]".
+    """
+    game = root.find("Game")
+    if game is None:
+        game = root.find(".//Game")
+    children = [child for child in game if child.tag.lower() != "description"]
+    totals: Dict[str, int] = {}
+    for child in children:
+        totals[child.tag] = totals.get(child.tag, 0) + 1
+    components = {}
+    seen: Dict[str, int] = {}
+    for child in children:
+        seen[child.tag] = seen.get(child.tag, 0) + 1
+        key = f"{child.tag}[{seen[child.tag]}]" if totals[child.tag] > 1 else child.tag
+        components[key] = child
+    return components
+
+
+def component_tag(key: str) -> str:
+    """Returns the tag of a component key, e.g. "Screen" for "Screen[2]"."""
+    return key.split("[", 1)[0]
+
+
+def parse_component(text: str, key: str) -> Optional[ET.Element]:
+    """Parses one outer component written on its own.
+
+    The text should hold just the component's element; a whole hierarchy
+    is accepted too, in which case the component with the same key is taken.
+
+    Returns:
+        The component element, or None if the text is not XML or lacks it.
+    """
+    try:
+        root = ET.fromstring(f"<Hierarchy>{_repair(text)}</Hierarchy>")
+    except ET.ParseError as e:
+        logger.info("Could not parse component %s: %s", key, e)
+        return None
+    element = root.find(component_tag(key))
+    if element is None and root.find(".//Game") is not None:
+        element = game_components(root).get(key)
+    return element
+
+
+def merge_components(root: ET.Element, expanded: Dict[str, ET.Element]) -> List[str]:
+    """Replaces outer components of a hierarchy in place, keeping their positions.
+
+    Args:
+        root: A hierarchy from parse_hierarchy.
+        expanded: New elements by component key; other components are kept.
+
+    Returns:
+        The keys of the replaced components, in document order.
+    """
+    game = root.find("Game")
+    if game is None:
+        game = root.find(".//Game")
+    replaced = []
+    for key, element in game_components(root).items():
+        new_element = expanded.get(key)
+        if new_element is None:
+            continue
+        new_element.tail = element.tail
+        game[list(game).index(element)] = new_element
+        replaced.append(key)
+    return replaced
+
+
+def serialize_hierarchy(root: ET.Element) -> str:
+    """Writes a hierarchy from parse_hierarchy back as game_hierarchy.xml text."""
+    copy = ET.fromstring(ET.tostring(root, encoding="unicode"))
+    ET.indent(copy)
+    parts = []
+    for child in copy:
+        child.tail = None
+        parts.append(ET.tostring(child, encoding="unicode"))
+    return "\n".join(parts) + "\n"
+
+
+def normalize_term(word: str) -> str:
+    """Lowercases a word and drops the "s" of a plural longer than four letters."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return word
+
+
+def _terms(text: str) -> Set[str]:
+    return {normalize_term(word) for word in _WORD.findall(text)} - _STOPWORDS
+
+
+def tag_terms(element: ET.Element) -> Set[str]:
+    """Returns the terms of the tag names (split at camel case) and attributes below `element`."""
+    terms = set()
+    for node in element.iter():
+        terms |= {normalize_term(word) for word in _CAMEL_CASE.findall(node.tag) if len(word) > 2}
+        terms |= _terms(" ".join(f"{name} {value}" for name, value in node.attrib.items()))
+    return terms - _STOPWORDS
+
+
+def text_terms(element: ET.Element) -> Set[str]:
+    """Returns the terms of the text below `element`."""
+    return _terms(" ".join(element.itertext()))
+
+
+def score_terms(terms: Set[str], element_tag_terms: Set[str], element_text_terms: Set[str]) -> int:
+    """Scores how many of `terms` a component's tag and text terms hold, tag terms weighing TAG_WEIGHT."""
+    return TAG_WEIGHT * len(terms & element_tag_terms) + len(terms & element_text_terms)
+
+
+def select_components(root: ET.Element, request: str, max_share: float = 0.5) -> List[str]:
+    """Picks the outer components a modification request is about.
+
+    Each component is scored by the request terms found in its tag names
+    (weighted) and in its text; the components scoring at least half of the
+    best score are selected.
+
+    Args:
+        root: A hierarchy from parse_hierarchy.
+        request: The modification request.
+        max_share: Largest share of the components an edit may touch;
+            broader requests select nothing.
+
+    Returns:
+        The selected component keys in document order, or an empty list when
+        the request matches no component or too many of them.
+    """
+    components = game_components(root)
+    request_terms = _terms(request)
+    if not components or not request_terms:
+        return []
+    scores = {
+        key: score_terms(request_terms, tag_terms(element), text_terms(element))
+        for key, element in components.items()
+    }
+    best = max(scores.values())
+    if best == 0:
+        return []
+    selected = [key for key, score in scores.items() if score * 2 >= best]
+    if len(selected) > max(1, int(len(components) * max_share)):
+        return []
+    return selected
+
+
+def _canonical(element: ET.Element) -> str:
+    """Serializes an element ignoring indentation and surrounding whitespace."""
+    copy = ET.fromstring(ET.tostring(element, encoding="unicode"))
+    for node in copy.iter():
+        node.text = node.text.strip() if node.text else None
+        node.tail = None
+    return ET.tostring(copy, encoding="unicode")
+
+
+def changed_components(before: ET.Element, after: ET.Element) -> List[str]:
+    """Returns the keys of outer components of `before` that `after` changed or dropped."""
+    after_components = game_components(after)
+    changed = []
+    for key, element in game_components(before).items():
+        other = after_components.get(key)
+        if other is None or _canonical(other) != _canonical(element):
+            changed.append(key)
+    return changed
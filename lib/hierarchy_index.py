@@ -0,0 +1,219 @@
+import logging
+import os
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from lib.hierarchy import (
+    HIERARCHY_FILE,
+    parse_hierarchy,
+    game_components,
+    normalize_term,
+    tag_terms,
+    text_terms,
+    score_terms,
+)
+
+logger = logging.getLogger(__name__)
+
+# Terms of the components each html5 specialist works on, matched like
+# select_components() matches a request.
+ROLE_TERMS = {
+    "ui": "screen menu hud button display overlay layout panel title label theme style visual color background font",
+    "input": "input control key keyboard touch mouse click tap swipe gesture joystick pointer drag",
+    "logic": "logic score scoring point rule level timer state win lose condition progress health life live spawn",
+    "mechanics": "player enemy entity physics movement collision sprite character obstacle item world board grid card tile",
+    "sound": "sound audio music sfx effect volume",
+    "rules": "rule instruction tutorial help objective goal guide",
+}
+ROLES = tuple(ROLE_TERMS)
+
+# Characters of a component's description kept in the summary of the others.
+SUMMARY_TEXT = 80
+# Child tags listed per component in the summary.
+SUMMARY_CHILDREN = 8
+
+# Parsed hierarchies kept by load_index().
+_INDEX_CACHE_SIZE = 64
+
+
+def _role_terms(role: str) -> set:
+    return {normalize_term(word) for word in ROLE_TERMS[role].split()}
+
+
+def _sibling_keys(parent: ET.Element) -> List[Tuple[str, ET.Element]]:
+    """Returns the children of `parent` keyed as game_components() keys them."""
+    children = list(parent)
+    totals: Dict[str, int] = {}
+    for child in children:
+        totals[child.tag] = totals.get(child.tag, 0) + 1
+    seen: Dict[str, int] = {}
+    keyed = []
+    for child in children:
+        seen[child.tag] = seen.get(child.tag, 0) + 1
+        keyed.append((f"{child.tag}[{seen[child.tag]}]" if totals[child.tag] > 1 else child.tag, child))
+    return keyed
+
+
+class HierarchyIndex:
+    """An in-memory index of a parsed game_hierarchy.xml.
+
+    Every element is addressable by its path, the keys of its ancestors
+    below the root joined by "/" (e.g. "Game/Player/Movement" or
+    "Game/Screen[2]"), and by its type, the tag. The outer components (the
+    children of `<Game>`) are what the role contexts include or summarize.
+
+    Args:
+        root: A hierarchy from parse_hierarchy.
+    """
+
+    def __init__(self, root: ET.Element):
+        self.root = root
+        self.paths: Dict[str, ET.Element] = OrderedDict()
+        self.types: Dict[str, List[str]] = {}
+        self._sections: Dict[str, str] = {}
+        self._index(root, "")
+        self.components = game_components(root)
+        # Tag and text terms of each outer component, for role_components()
+        self._terms = {key: (tag_terms(element), text_terms(element)) for key, element in self.components.items()}
+        self._game_path = next(path for path, element in self.paths.items() if element is self._game())
+
+    def _game(self) -> ET.Element:
+        game = self.root.find("Game")
+        return game if game is not None else self.root.find(".//Game")
+
+    def _index(self, parent: ET.Element, prefix: str) -> None:
+        for key, child in _sibling_keys(parent):
+            path = f"{prefix}{key}"
+            self.paths[path] = child
+            self.types.setdefault(child.tag, []).append(path)
+            self._index(child, f"{path}/")
+
+    @classmethod
+    def from_text(cls, text: str) -> Optional["HierarchyIndex"]:
+        """Indexes a game_hierarchy.xml document, or returns None if it cannot be parsed."""
+        root = parse_hierarchy(text)
+        return cls(root) if root is not None else None
+
+    def component_path(self, key: str) -> str:
+        return f"{self._game_path}/{key}"
+
+    def find(self, selector: str) -> List[str]:
+        """Returns the paths a selector addresses: a path, an outer component key or a type (tag)."""
+        selector = selector.strip().strip("/")
+        if selector in self.paths:
+            return [selector]
+        if selector in self.components:
+            return [self.component_path(selector)]
+        return list(self.types.get(selector, []))
+
+    def section(self, path: str) -> str:
+        """Returns the XML of the element at `path`."""
+        if path not in self._sections:
+            copy = ET.fromstring(ET.tostring(self.paths[path], encoding="unicode"))
+            copy.tail = None
+            ET.indent(copy)
+            self._sections[path] = ET.tostring(copy, encoding="unicode")
+        return self._sections[path]
+
+    def metadata(self) -> str:
+        """Returns the `<Metadata>` element and the game's description, if any."""
+        parts = []
+        metadata = self.root.find("Metadata")
+        if metadata is not None:
+            parts.append(self.section(next(path for path, element in self.paths.items() if element is metadata)))
+        description = self._game().find("Description")
+        if description is None:
+            description = self._game().find("description")
+        if description is not None and (description.text or "").strip():
+            parts.append(f"<Description>{description.text.strip()}</Description>")
+        return "\n".join(parts)
+
+    def role_components(self, role: str) -> List[str]:
+        """Returns the keys of the outer components relevant to a specialist role, in document order.
+
+        Raises:
+            KeyError: If the role is not one of ROLES.
+        """
+        terms = _role_terms(role)
+        return [
+            key for key, (component_tag_terms, component_text_terms) in self._terms.items()
+            if score_terms(terms, component_tag_terms, component_text_terms) > 0
+        ]
+
+    def summary(self, exclude: Iterable[str] = ()) -> str:
+        """Returns one line per outer component not in `exclude`: its key, child tags and description."""
+        excluded = set(exclude)
+        lines = []
+        for key, element in self.components.items():
+            if key in excluded:
+                continue
+            children = [child.tag for child in element if child.tag.lower() != "description"]
+            line = key
+            if children:
+                more = f", +{len(children) - SUMMARY_CHILDREN}" if len(children) > SUMMARY_CHILDREN else ""
+                line += f" [{', '.join(children[:SUMMARY_CHILDREN])}{more}]"
+            description = element.find("Description")
+            text = " ".join(((description.text if description is not None else None) or "").split())
+            if not text:
+                text = " ".join(" ".join(element.itertext()).split())
+            if text:
+                line += f": {text[:SUMMARY_TEXT]}{'...' if len(text) > SUMMARY_TEXT else ''}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def context(self, keys: List[str], label: str) -> str:
+        """Returns the metadata, the full XML of the given outer components and a summary of the others."""
+        parts = [f"<!-- game_hierarchy.xml sections for {label}; the other components are summarized below -->"]
+        metadata = self.metadata()
+        if metadata:
+            parts.append(metadata)
+        parts += [self.section(self.component_path(key)) for key in keys]
+        # "--" may not appear inside an XML comment.
+        summary = self.summary(exclude=keys).replace("--", "-")
+        if summary:
+            parts.append(f"<!-- Other components (read_hierarchy_sections with their key for details):\n{summary}\n-->")
+        return "\n".join(parts) + "\n"
+
+    def role_context(self, role: str) -> Optional[str]:
+        """Returns the context of a specialist role, or None if no component is relevant to it."""
+        keys = self.role_components(role)
+        return self.context(keys, f"the {role} role") if keys else None
+
+
+_index_cache: "OrderedDict[Tuple[str, int, int], Optional[HierarchyIndex]]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def load_index(workspace_path: str) -> Optional[HierarchyIndex]:
+    """Returns the index of a workspace's game_hierarchy.xml, parsing it once per version.
+
+    Indexes are cached by path, modification time and size, so every agent
+    and tool read of the same file shares one parse.
+
+    Returns:
+        The index, or None if the file is missing or cannot be parsed.
+    """
+    path = os.path.abspath(os.path.join(workspace_path, HIERARCHY_FILE))
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+    with open(path, "r", encoding="utf-8") as f:
+        index = HierarchyIndex.from_text(f.read())
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def context_pruning_enabled() -> bool:
+    """True unless GAME_GENERATOR_CONTEXT_PRUNING is 0, which serves agents the whole files."""
+    return os.environ.get("GAME_GENERATOR_CONTEXT_PRUNING", "1") != "0"
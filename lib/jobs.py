@@ -0,0 +1,321 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from lib.progress import ProgressStream, reporting_to
+from lib.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_TIMED_OUT = "timed_out"
+
+TERMINAL_STATUSES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED, JOB_TIMED_OUT)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobCancelledError(Exception):
+    """Raised inside a job function once the job has been cancelled or timed out."""
+
+
+class Job:
+    """A unit of work tracked by the JobQueue.
+
+    The job function receives the Job itself so that long running work can call
+    `raise_if_cancelled()` between steps; a running crew cannot be interrupted,
+    so cancellation and timeouts take effect at the next checkpoint. The job
+    routes pass it to the pipeline as `before_stage`, which runs before every
+    stage and every crew of the hierarchy stage.
+
+    Status changes and whatever the job reports while it runs are published
+    to `progress`, which is closed once the job is finished.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        func: Callable[["Job"], Any],
+        timeout: Optional[float] = None,
+        on_discard: Optional[Callable[[], None]] = None,
+        checkpoint_id: Optional[str] = None,
+    ):
+        self.id = str(uuid.uuid4())
+        # Jobs that start a pipeline checkpoint under their own id; retries
+        # keep resuming the checkpoints of the job they retry.
+        self.checkpoint_id = checkpoint_id or self.id
+        self.kind = kind
+        self.func = func
+        self.timeout = timeout
+        self.on_discard = on_discard
+        self.status = JOB_QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self.progress = ProgressStream()
+        self.progress.publish("job.queued", job_id=self.id, kind=kind)
+
+    @property
+    def deadline(self) -> Optional[float]:
+        if self.timeout is None or self.started_at is None:
+            return None
+        return self.started_at + self.timeout
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise JobCancelledError(f"Job {self.id} was {self.status}.")
+
+    def _transition(self, status: str, **fields: Any) -> Optional[str]:
+        """Moves the job to a new status unless it already reached a terminal one.
+
+        Returns:
+            The previous status, or None if the job was already finished.
+        """
+        with self._lock:
+            previous = self.status
+            if previous in TERMINAL_STATUSES:
+                return None
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if status in TERMINAL_STATUSES:
+                self.finished_at = time.time()
+                if status in (JOB_CANCELLED, JOB_TIMED_OUT):
+                    self._cancel_event.set()
+            self.progress.publish(f"job.{status}", job_id=self.id, error=self.error)
+            if status in TERMINAL_STATUSES:
+                self.progress.close()
+            return previous
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "checkpoint_id": self.checkpoint_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """A bounded in-process queue drained by a fixed pool of worker threads.
+
+    Args:
+        max_workers: Number of jobs that may run at the same time.
+        max_queue_size: Number of jobs that may wait for a worker before
+            `submit` starts raising QueueFullError (0 for no limit).
+            Cancelled jobs stop counting at once, even before a worker takes
+            them off the queue.
+        job_timeout: Seconds a job may run before it is marked as timed out.
+            None disables the timeout.
+        retention: Seconds a finished job (and its result) is kept around.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue_size: int = 16,
+        job_timeout: Optional[float] = None,
+        retention: float = 3600,
+    ):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.job_timeout = job_timeout
+        self.retention = retention
+        # Unbounded: cancelled jobs stay in it until a worker skips them, so
+        # submit() bounds the jobs still queued instead.
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._jobs: Dict[str, Job] = {}
+        self._jobs_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        for index in range(max_workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        watchdog = threading.Thread(target=self._watchdog, name="job-watchdog", daemon=True)
+        watchdog.start()
+        self._threads.append(watchdog)
+
+    def submit(
+        self,
+        kind: str,
+        func: Callable[[Job], Any],
+        on_discard: Optional[Callable[[], None]] = None,
+        checkpoint_id: Optional[str] = None,
+    ) -> Job:
+        """Queues `func` for execution and returns the tracking Job immediately.
+
+        Args:
+            kind: A short label for the job type (e.g. "generate_game").
+            func: Called with the Job on a worker thread; its return value
+                becomes the job result.
+            on_discard: Called if the job is cancelled before it starts, so
+                resources prepared at submit time can be released.
+            checkpoint_id: Stage checkpoints the job resumes from and writes
+                to (default: the job's own id).
+
+        Raises:
+            QueueFullError: If the queue is at capacity.
+        """
+        job = Job(kind, func, timeout=self.job_timeout, on_discard=on_discard, checkpoint_id=checkpoint_id)
+        with self._jobs_lock:
+            self._prune_finished()
+            if 0 < self.max_queue_size <= self._queued_count():
+                raise QueueFullError(f"Job queue is full ({self.max_queue_size} pending jobs).")
+            self._jobs[job.id] = job
+            self._queue.put_nowait(job)
+        logger.info("Queued job", extra={"job_id": job.id, "kind": kind})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancels a job. Queued jobs never start; running jobs stop at their next checkpoint."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        previous = job._transition(JOB_CANCELLED, error="Job was cancelled.")
+        if previous is not None:
+            logger.info("Cancelled job", extra={"job_id": job.id})
+            if previous == JOB_QUEUED:
+                self._discard(job)
+        return job
+
+    def pending_count(self) -> int:
+        """Returns the number of jobs waiting for a worker, not counting cancelled ones."""
+        with self._jobs_lock:
+            return self._queued_count()
+
+    def status_counts(self) -> Dict[str, int]:
+        """Returns the number of tracked jobs per status."""
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING) + TERMINAL_STATUSES}
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        for _ in range(self.max_workers):
+            self._queue.put(None)
+
+    def _discard(self, job: Job) -> None:
+        if job.on_discard is None:
+            return
+        try:
+            job.on_discard()
+        except Exception as e:
+            logger.error("Error discarding job %s: %s", job.id, e)
+
+    def _worker(self) -> None:
+        while not self._stopping.is_set():
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job) -> None:
+        if not job._transition(JOB_RUNNING, started_at=time.time()):
+            # Cancelled while waiting in the queue; on_discard already ran.
+            return
+        logger.info("Started job", extra={"job_id": job.id, "kind": job.kind})
+        try:
+            with span("job", kind=job.kind), reporting_to(job.progress):
+                result = job.func(job)
+        except JobCancelledError:
+            logger.info("Job stopped", extra={"job_id": job.id, "status": job.status})
+            return
+        except Exception as e:
+            logger.exception("Error running job %s: %s", job.id, e)
+            job._transition(JOB_FAILED, error=str(e) or type(e).__name__)
+            return
+        if job._transition(JOB_SUCCEEDED, result=result):
+            logger.info("Finished job", extra={
+                "job_id": job.id, "kind": job.kind, "seconds": round(job.finished_at - job.started_at, 3),
+            })
+        else:
+            logger.info("Discarding result of finished job", extra={"job_id": job.id, "status": job.status})
+
+    def _watchdog(self) -> None:
+        while not self._stopping.wait(1.0):
+            now = time.time()
+            with self._jobs_lock:
+                running = [job for job in self._jobs.values() if job.status == JOB_RUNNING]
+            for job in running:
+                deadline = job.deadline
+                if deadline is not None and now > deadline:
+                    if job._transition(JOB_TIMED_OUT, error=f"Job exceeded the {job.timeout:g}s timeout."):
+                        logger.warning("Job timed out", extra={"job_id": job.id})
+
+    def _queued_count(self) -> int:
+        """Counts the jobs waiting for a worker. Caller holds _jobs_lock."""
+        return sum(1 for job in self._jobs.values() if job.status == JOB_QUEUED)
+
+    def _prune_finished(self) -> None:
+        """Drops finished jobs older than the retention window. Caller holds _jobs_lock."""
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    value = float(value)
+    return value if value > 0 else None
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the process-wide JobQueue, creating it from the environment on first use.
+
+    Environment:
+        GAME_GENERATOR_JOB_WORKERS: Concurrent jobs (default 2).
+        GAME_GENERATOR_JOB_QUEUE_SIZE: Pending jobs before HTTP 429 (default 16).
+        GAME_GENERATOR_JOB_TIMEOUT: Per-job timeout in seconds, 0 to disable (default 1800).
+        GAME_GENERATOR_JOB_RETENTION: Seconds finished jobs are kept (default 3600).
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                max_workers=int(os.environ.get("GAME_GENERATOR_JOB_WORKERS", "2")),
+                max_queue_size=int(os.environ.get("GAME_GENERATOR_JOB_QUEUE_SIZE", "16")),
+                job_timeout=_env_float("GAME_GENERATOR_JOB_TIMEOUT", 1800),
+                retention=_env_float("GAME_GENERATOR_JOB_RETENTION", 3600) or 0,
+            )
+        return _job_queue
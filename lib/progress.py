@@ -0,0 +1,175 @@
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Longest text (task descriptions, tester reports) copied into an event.
+MAX_TEXT = 300
+
+# crewai's delegation tools; their input names the coworker by role.
+_DELEGATION_TOOLS = ("delegate work to coworker", "ask question to coworker")
+# Agents whose delegated answers are reported as verdicts.
+_TESTER_ROLE = re.compile(r"tester|quality assurance", re.IGNORECASE)
+# How the tester and reviewer agents approve a game (see their goals).
+_APPROVAL = "complete and playable"
+
+
+@dataclass
+class ProgressEvent:
+    id: int
+    event: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    time: float = 0.0
+
+    def to_sse(self) -> str:
+        """Formats the event as a Server-Sent Events message."""
+        payload = json.dumps({**self.data, "time": self.time})
+        return f"id: {self.id}\nevent: {self.event}\ndata: {payload}\n\n"
+
+
+class ProgressStream:
+    """The progress events of one generation, kept for late and reconnecting readers.
+
+    Events are numbered from 1, so a reader passes the last id it saw to
+    continue where it stopped. Only the newest `max_events` are kept.
+
+    Args:
+        max_events: Events kept for replay.
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self._events: "collections.deque[ProgressEvent]" = collections.deque(maxlen=max_events)
+        self._next_id = 1
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def closed(self) -> bool:
+        with self._condition:
+            return self._closed
+
+    def publish(self, event: str, **data: Any) -> None:
+        """Appends an event and wakes the readers; ignored once the stream is closed."""
+        with self._condition:
+            if self._closed:
+                return
+            self._events.append(ProgressEvent(self._next_id, event, data, time.time()))
+            self._next_id += 1
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """Marks the end of the stream: the generation finished one way or another."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def events_after(self, last_id: int, timeout: float) -> Tuple[List[ProgressEvent], bool]:
+        """Waits up to `timeout` seconds for events newer than `last_id`.
+
+        Returns:
+            The new events (possibly none) and whether the stream is closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._next_id - 1 > last_id, timeout)
+            return [event for event in self._events if event.id > last_id], self._closed
+
+
+_current: "contextvars.ContextVar[Optional[ProgressStream]]" = contextvars.ContextVar("progress", default=None)
+
+
+@contextlib.contextmanager
+def reporting_to(stream: Optional[ProgressStream]) -> Iterator[None]:
+    """Sends the report() calls of the current thread to `stream` until the block exits."""
+    token = _current.set(stream)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def report(event: str, **data: Any) -> None:
+    """Publishes an event to the stream of the running generation, if it has one."""
+    stream = _current.get()
+    if stream is not None:
+        stream.publish(event, **data)
+
+
+def _text(value: Any) -> str:
+    text = " ".join(str(value or "").split())
+    return text if len(text) <= MAX_TEXT else text[:MAX_TEXT - 1] + "…"
+
+
+def _tool_input(step: Any) -> Dict[str, Any]:
+    tool_input = getattr(step, "tool_input", None)
+    if isinstance(tool_input, str):
+        try:
+            tool_input = json.loads(tool_input)
+        except ValueError:
+            return {}
+    return tool_input if isinstance(tool_input, dict) else {}
+
+
+def _report_step(stream: ProgressStream, crew_name: str, step: Any) -> None:
+    """Reports delegations to coworkers and their answers, singling out the tester's verdict."""
+    tool = str(getattr(step, "tool", "") or "").strip().lower()
+    if tool not in _DELEGATION_TOOLS:
+        return
+    tool_input = _tool_input(step)
+    coworker = str(tool_input.get("coworker", ""))
+    result = getattr(step, "result", None)
+    if result is None:
+        stream.publish(
+            "delegation.started", crew=crew_name, coworker=coworker,
+            task=_text(tool_input.get("task") or tool_input.get("question")),
+        )
+        return
+    stream.publish("delegation.completed", crew=crew_name, coworker=coworker, result=_text(result))
+    if _TESTER_ROLE.search(coworker):
+        stream.publish(
+            "tester.verdict", crew=crew_name, coworker=coworker,
+            approved=_APPROVAL in str(result).lower(), verdict=_text(result),
+        )
+
+
+def _report_task(stream: ProgressStream, crew_name: str, output: Any) -> None:
+    agent = getattr(output, "agent", None)
+    stream.publish(
+        "task.completed", crew=crew_name,
+        task=_text(getattr(output, "name", None) or getattr(output, "description", None)),
+        agent=_text(getattr(agent, "role", agent)),
+    )
+
+
+def instrument_crew(crew_name: str, crew) -> None:
+    """Chains progress reports onto a crew's step and task callbacks.
+
+    Does nothing unless the current thread reports to a stream, so crews
+    run outside a tracked generation keep their callbacks as they are. The
+    callbacks publish to that stream from whichever thread calls them.
+    """
+    stream = _current.get()
+    if stream is None:
+        return
+    for attribute, hook in (("step_callback", _report_step), ("task_callback", _report_task)):
+        previous = getattr(crew, attribute, None)
+
+        def callback(output=None, *args, previous=previous, hook=hook, **kwargs):
+            if previous is not None:
+                previous(output, *args, **kwargs)
+            try:
+                hook(stream, crew_name, output)
+            except Exception as e:
+                logger.debug("Error reporting crew progress: %s", e)
+
+        try:
+            setattr(crew, attribute, callback)
+        except Exception:
+            logger.debug("Crew %s does not accept %s", crew_name, attribute)
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from typing import BinaryIO, Dict, Iterator, Optional
+
+# Bytes read per chunk when hashing uploads.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_RESULTS_FILE = "results.json"
+
+
+def hash_stream(stream: BinaryIO) -> str:
+    """Returns the SHA-256 of a seekable stream and rewinds it for the next reader."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def normalize_request(request_text: str) -> str:
+    """Normalizes Unicode and whitespace so trivially different resubmissions share a key."""
+    return " ".join(unicodedata.normalize("NFC", request_text).split())
+
+
+def make_cache_key(kind: str, request_text: str, input_digests: Dict[str, str], fingerprint: str) -> str:
+    """Builds the content address of a result.
+
+    Args:
+        kind: The operation, e.g. "generate_game".
+        request_text: The client's request; normalized before hashing.
+        input_digests: Upload field name to SHA-256 for every uploaded file.
+        fingerprint: Fingerprint of the crew definitions that produce the result.
+    """
+    payload = json.dumps(
+        {
+            "kind": kind,
+            "request": normalize_request(request_text),
+            "inputs": input_digests,
+            "crews": fingerprint,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ResultCache:
+    """A size-bounded, LRU-evicted, on-disk cache of finalized artifacts.
+
+    Each entry is a directory `root/<key>/` holding the artifact files and a
+    results.json with the finalize results. The directory's mtime records the
+    last use and drives LRU eviction; the creation time stored in
+    results.json drives the TTL. Files are hard-linked in and out where the
+    filesystem allows it, so hits cost no copy.
+
+    Args:
+        root: Directory holding the entries.
+        max_bytes: Total size the entries may occupy before the least recently
+            used ones are evicted.
+        ttl: Seconds an entry stays valid.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bypasses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str, target_dir: str) -> Optional[dict]:
+        """Looks up an entry, links its files into `target_dir` and marks it as recently used.
+
+        The files are linked while the lock is held, so a concurrent put()
+        cannot evict the entry halfway.
+
+        Returns:
+            The entry's finalize results, or None on a miss.
+        """
+        entry_dir = self._entry_dir(key)
+        with self._lock:
+            try:
+                with open(os.path.join(entry_dir, _RESULTS_FILE), "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            if time.time() - stored["created_at"] > self.ttl:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                self.misses += 1
+                self.evictions += 1
+                return None
+            copy_entry_files(entry_dir, target_dir)
+            os.utime(entry_dir)
+            self.hits += 1
+        return stored["results"]
+
+    def record_bypass(self) -> None:
+        """Counts a lookup the client asked to skip."""
+        with self._lock:
+            self.bypasses += 1
+
+    def put(self, key: str, source_dir: str, final_results: dict) -> None:
+        """Stores the artifact files of `source_dir` (top-level files only) under `key`."""
+        staging_dir = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        try:
+            for entry in os.scandir(source_dir):
+                if entry.is_file():
+                    _link_or_copy(entry.path, os.path.join(staging_dir, entry.name))
+            with open(os.path.join(staging_dir, _RESULTS_FILE), "w", encoding="utf-8") as f:
+                json.dump({"created_at": time.time(), "results": final_results}, f)
+            with self._lock:
+                entry_dir = self._entry_dir(key)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.rename(staging_dir, entry_dir)
+                self.stores += 1
+                self._evict()
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _evict(self) -> None:
+        """Drops expired entries, then least recently used ones until under max_bytes. Caller holds _lock."""
+        entries = []
+        total_bytes = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(child.stat().st_size for child in os.scandir(entry.path) if child.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+            total_bytes += size
+        entries.sort()
+        cutoff = time.time() - self.ttl
+        for last_used, size, entry_dir in entries:
+            if total_bytes <= self.max_bytes and last_used >= cutoff:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "bypasses": self.bypasses,
+            }
+
+
+class ResultRecorder:
+    """Records the artifacts of a result while they are streamed to the client.
+
+    The files are written to a hidden staging directory of the cache and only
+    become an entry when commit() is called for a complete result, so a
+    stream that fails or is abandoned halfway leaves nothing behind.
+
+    Args:
+        cache: The cache receiving the entry.
+        key: The entry's cache key.
+    """
+
+    def __init__(self, cache: ResultCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.directory = tempfile.mkdtemp(prefix=".recording-", dir=cache.root)
+
+    def add_file(self, name: str, file_path: str) -> None:
+        """Records an artifact that exists as a file."""
+        _link_or_copy(file_path, os.path.join(self.directory, name))
+
+    def tee(self, name: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Yields `chunks` unchanged while recording them as the artifact `name`."""
+        with open(os.path.join(self.directory, name), "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+
+    def commit(self, final_results: dict) -> None:
+        """Stores the recorded files with their finalize results and discards the staging directory."""
+        try:
+            self.cache.put(self.key, self.directory, final_results)
+        finally:
+            self.discard()
+
+    def discard(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def copy_entry_files(entry_dir: str, target_dir: str) -> None:
+    """Links (or copies) the artifact files of a cache entry into `target_dir`."""
+    for entry in os.scandir(entry_dir):
+        if entry.is_file() and entry.name != _RESULTS_FILE:
+            _link_or_copy(entry.path, os.path.join(target_dir, entry.name))
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Returns the process-wide ResultCache, or None when it is disabled.
+
+    Environment:
+        GAME_GENERATOR_RESULT_CACHE_BYTES: Size bound in bytes, 0 disables the cache (default 2 GiB).
+        GAME_GENERATOR_RESULT_CACHE_TTL: Seconds an entry stays valid (default 86400).
+        GAME_GENERATOR_RESULT_CACHE_DIR: Entry root (default <tmp>/game-generator-result-cache).
+    """
+    global _result_cache
+    max_bytes = int(os.environ.get("GAME_GENERATOR_RESULT_CACHE_BYTES", str(2 * 1024 ** 3)))
+    if max_bytes <= 0:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                root=os.environ.get(
+                    "GAME_GENERATOR_RESULT_CACHE_DIR",
+                    os.path.join(tempfile.gettempdir(), "game-generator-result-cache"),
+                ),
+                max_bytes=max_bytes,
+                ttl=float(os.environ.get("GAME_GENERATOR_RESULT_CACHE_TTL", "86400")),
+            )
+        return _result_cache
@@ -0,0 +1,410 @@
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import posixpath
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger(__name__)
+
+STORAGE_LOCAL = "local"
+STORAGE_GCS = "gcs"
+STORAGE_BACKENDS = (STORAGE_LOCAL, STORAGE_GCS)
+
+# Bytes copied per chunk between files and the local store.
+CHUNK_SIZE = 64 * 1024
+
+# Top-level prefixes of the objects the server creates and accepts references to.
+UPLOADS_PREFIX = "uploads"
+ARTIFACTS_PREFIX = "artifacts"
+OBJECT_PREFIXES = (UPLOADS_PREFIX, ARTIFACTS_PREFIX)
+
+# File under the local backend's root holding its generated signing key.
+LOCAL_SECRET_FILE = ".signing-key"
+
+# Seconds between two sweeps for expired objects.
+PURGE_INTERVAL = 600
+
+
+class StorageError(Exception):
+    """Raised when the object store cannot be reached or refuses an operation."""
+
+
+class StorageObjectNotFound(StorageError, LookupError):
+    """Raised for an object that does not exist (or no longer exists)."""
+
+
+class StorageBackend:
+    """Object storage holding client uploads and finalized artifacts.
+
+    Objects are addressed by slash-separated names. Clients never talk to the
+    server about the bytes: they upload to and download from signed URLs, and
+    the server reads and writes the objects directly.
+    """
+
+    def upload_file(self, local_path: str, name: str, content_type: str) -> None:
+        """Writes a local file to the object `name`, replacing any previous one."""
+        raise NotImplementedError
+
+    def download(self, name: str, fileobj: BinaryIO) -> None:
+        """Writes the object `name` into `fileobj`.
+
+        Raises:
+            StorageObjectNotFound: If the object does not exist.
+        """
+        raise NotImplementedError
+
+    def size(self, name: str) -> Optional[int]:
+        """Returns the size of the object `name` in bytes, or None if it does not exist."""
+        raise NotImplementedError
+
+    def delete(self, name: str) -> None:
+        """Removes the object `name`; missing objects are ignored."""
+        raise NotImplementedError
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        """Yields the name and last modification time (epoch seconds) of every object under `prefix`."""
+        raise NotImplementedError
+
+    def purge_expired(self, max_age: float) -> int:
+        """Deletes the uploads and artifacts last modified more than `max_age` seconds ago.
+
+        Returns:
+            The number of objects deleted.
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        for prefix in OBJECT_PREFIXES:
+            for name, updated in list(self.list_objects(f"{prefix}/")):
+                if updated < cutoff:
+                    self.delete(name)
+                    removed += 1
+        return removed
+
+    def signed_url(self, name: str, method: str = "GET", expires_in: int = 900, content_type: Optional[str] = None) -> str:
+        """Returns a URL granting `method` (GET or PUT) on the object for `expires_in` seconds.
+
+        Args:
+            content_type: For PUT, the Content-Type the client must send.
+        """
+        raise NotImplementedError
+
+    def reference(self, name: str) -> str:
+        """Returns the reference clients pass back for an object, e.g. in `game_bundle_ref`."""
+        return name
+
+    def object_name(self, reference: str) -> str:
+        """Returns the object name of a client's reference.
+
+        Accepts the plain name or the reference() form.
+
+        Raises:
+            ValueError: If the reference is empty, leaves the store's namespace
+                or names an object outside OBJECT_PREFIXES.
+        """
+        name = (reference or "").strip()
+        prefix = self.reference("")
+        if prefix and name.startswith(prefix):
+            name = name[len(prefix):]
+        parts = name.split("/")
+        if (
+            "\\" in name or len(parts) < 2 or parts[0] not in OBJECT_PREFIXES
+            or any(part in ("", ".", "..") for part in parts)
+        ):
+            raise ValueError(f"Invalid storage object reference: '{reference}'")
+        return name
+
+
+class LocalStorageBackend(StorageBackend):
+    """Keeps objects as files under `root`, served by the /v1/storage/objects routes.
+
+    Meant for development, offline tests and single-host deployments; it
+    signs its URLs with HMAC-SHA256 the way a cloud store would, so clients
+    use it exactly as they would use GCS.
+
+    Args:
+        root: Directory holding the objects.
+        secret: Key signing the URLs; workers sharing the objects need the same
+            one (see local_secret()).
+        base_url: Scheme and host prefixed to signed URLs, e.g. "http://localhost:5001".
+            Empty for host-relative URLs.
+    """
+
+    def __init__(self, root: str, secret: bytes, base_url: str = ""):
+        self.root = root
+        self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.root, *self.object_name(name).split("/"))
+
+    def upload_file(self, local_path: str, name: str, content_type: str) -> None:
+        with open(local_path, "rb") as f:
+            self.write(name, f)
+
+    def write(self, name: str, stream: BinaryIO, max_bytes: Optional[int] = None) -> int:
+        """Writes an object from a stream, atomically, and returns its size.
+
+        Raises:
+            ValueError: If the stream holds more than `max_bytes`.
+        """
+        object_path = self.path_for(name)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(object_path), prefix=".partial-")
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if max_bytes is not None and written > max_bytes:
+                        raise ValueError(f"Object is larger than {max_bytes} bytes")
+                    f.write(chunk)
+            os.replace(partial_path, object_path)
+            partial_path = None
+        finally:
+            if partial_path:
+                os.remove(partial_path)
+        return written
+
+    def download(self, name: str, fileobj: BinaryIO) -> None:
+        try:
+            with open(self.path_for(name), "rb") as f:
+                shutil.copyfileobj(f, fileobj, CHUNK_SIZE)
+        except FileNotFoundError:
+            raise StorageObjectNotFound(f"Storage object not found: {name}") from None
+
+    def size(self, name: str) -> Optional[int]:
+        object_path = self.path_for(name)
+        return os.path.getsize(object_path) if os.path.isfile(object_path) else None
+
+    def delete(self, name: str) -> None:
+        object_path = self.path_for(name)
+        try:
+            os.remove(object_path)
+        except FileNotFoundError:
+            pass
+        # Drops the object's directory, e.g. uploads/<token>/, once it is empty
+        try:
+            os.rmdir(os.path.dirname(object_path))
+        except OSError:
+            pass
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        top = os.path.join(self.root, *prefix.strip("/").split("/"))
+        for dirpath, _, filenames in os.walk(top):
+            relative_dir = os.path.relpath(dirpath, self.root).replace(os.sep, "/")
+            for filename in filenames:
+                try:
+                    updated = os.path.getmtime(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    continue
+                yield f"{relative_dir}/{filename}", updated
+
+    def signature(self, name: str, method: str, expires: int) -> str:
+        message = f"{method.upper()}\n{name}\n{expires}".encode("utf-8")
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, name: str, method: str, expires: str, signature: str) -> bool:
+        """True if `signature` grants `method` on the object and has not expired."""
+        try:
+            if int(expires) < time.time():
+                return False
+        except ValueError:
+            return False
+        return hmac.compare_digest(self.signature(name, method, int(expires)), signature or "")
+
+    def signed_url(self, name: str, method: str = "GET", expires_in: int = 900, content_type: Optional[str] = None) -> str:
+        name = self.object_name(name)
+        expires = int(time.time()) + expires_in
+        query = urlencode({"method": method.upper(), "expires": expires, "signature": self.signature(name, method, expires)})
+        return f"{self.base_url}/v1/storage/objects/{quote(name)}?{query}"
+
+
+class GCSStorageBackend(StorageBackend):
+    """Keeps objects in a Google Cloud Storage bucket and hands out V4 signed URLs.
+
+    Signing needs credentials that can sign, e.g. a service account key or
+    a service account with the Token Creator role on itself.
+
+    Args:
+        bucket: The bucket name.
+        project: The Google Cloud project of the client (default: from the environment).
+    """
+
+    def __init__(self, bucket: str, project: Optional[str] = None):
+        # Imported here: the GCS client is slow to import and optional for the server
+        from google.cloud import storage
+        from google.cloud.exceptions import NotFound
+
+        self._not_found = NotFound
+        self._bucket = storage.Client(project=project).bucket(bucket)
+        self.bucket_name = bucket
+
+    def reference(self, name: str) -> str:
+        return f"gs://{self.bucket_name}/{name}"
+
+    def upload_file(self, local_path: str, name: str, content_type: str) -> None:
+        self._bucket.blob(name).upload_from_filename(local_path, content_type=content_type)
+
+    def download(self, name: str, fileobj: BinaryIO) -> None:
+        try:
+            self._bucket.blob(name).download_to_file(fileobj)
+        except self._not_found:
+            raise StorageObjectNotFound(f"Storage object not found: {name}") from None
+
+    def size(self, name: str) -> Optional[int]:
+        blob = self._bucket.get_blob(name)
+        return blob.size if blob is not None else None
+
+    def delete(self, name: str) -> None:
+        try:
+            self._bucket.blob(name).delete()
+        except self._not_found:
+            pass
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        for blob in self._bucket.list_blobs(prefix=prefix):
+            yield blob.name, blob.updated.timestamp()
+
+    def signed_url(self, name: str, method: str = "GET", expires_in: int = 900, content_type: Optional[str] = None) -> str:
+        return self._bucket.blob(name).generate_signed_url(
+            version="v4",
+            method=method.upper(),
+            expiration=datetime.timedelta(seconds=expires_in),
+            content_type=content_type,
+        )
+
+
+def upload_name(filename: str) -> str:
+    """Returns a fresh object name for a client upload of `filename`."""
+    base = posixpath.basename((filename or "").replace("\\", "/"))
+    safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in base).lstrip(".") or "upload"
+    return f"{UPLOADS_PREFIX}/{secrets.token_hex(16)}/{safe}"
+
+
+def artifact_name(artifact_id: str, stored_name: str) -> str:
+    """Returns the object name of a finalized artifact file."""
+    return f"{ARTIFACTS_PREFIX}/{artifact_id}/{stored_name}"
+
+
+def local_secret(root: str) -> bytes:
+    """Returns the signing key of a local backend: GAME_GENERATOR_STORAGE_SECRET, or one kept under `root`.
+
+    The generated key is written once to LOCAL_SECRET_FILE (outside the
+    object prefixes, so it is never served), and every process using the
+    same root, including after a restart, signs with it.
+    """
+    secret = os.environ.get("GAME_GENERATOR_STORAGE_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    os.makedirs(root, exist_ok=True)
+    secret_path = os.path.join(root, LOCAL_SECRET_FILE)
+    try:
+        fd = os.open(secret_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process created it; wait until its key is written
+        for _ in range(50):
+            with open(secret_path, "rb") as f:
+                key = f.read()
+            if key:
+                return key
+            time.sleep(0.1)
+        raise StorageError(f"Storage signing key {secret_path} is empty")
+    key = secrets.token_hex(32).encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    logger.info("Generated storage signing key", extra={"path": secret_path})
+    return key
+
+
+def signed_url_ttl() -> int:
+    """Returns the seconds signed URLs stay valid (env GAME_GENERATOR_STORAGE_URL_TTL, default 900)."""
+    return int(os.environ.get("GAME_GENERATOR_STORAGE_URL_TTL", "900"))
+
+
+def object_ttl() -> float:
+    """Returns the seconds uploads and artifacts are kept (env GAME_GENERATOR_STORAGE_OBJECT_TTL, default 86400; 0 keeps them)."""
+    return float(os.environ.get("GAME_GENERATOR_STORAGE_OBJECT_TTL", "86400"))
+
+
+_last_purge: Optional[float] = None
+_purge_lock = threading.Lock()
+
+
+def purge_expired_objects(backend: StorageBackend) -> None:
+    """Deletes expired uploads and artifacts in a background thread, at most once per PURGE_INTERVAL."""
+    global _last_purge
+    max_age = object_ttl()
+    if max_age <= 0:
+        return
+    with _purge_lock:
+        if _last_purge is not None and time.monotonic() - _last_purge < PURGE_INTERVAL:
+            return
+        _last_purge = time.monotonic()
+
+    def purge():
+        try:
+            removed = backend.purge_expired(max_age)
+            if removed:
+                logger.info("Removed expired storage objects", extra={"objects": removed})
+        except Exception as e:
+            logger.error("Error removing expired storage objects: %s", e)
+
+    threading.Thread(target=purge, name="storage-purge", daemon=True).start()
+
+
+_storage_backend: Optional[StorageBackend] = None
+_storage_backend_lock = threading.Lock()
+
+
+def get_storage_backend() -> Optional[StorageBackend]:
+    """Returns the process-wide StorageBackend, or None when object storage is not configured.
+
+    Environment:
+        GAME_GENERATOR_STORAGE: Empty (default, disabled), local or gcs.
+        GAME_GENERATOR_STORAGE_BUCKET: The bucket of the gcs backend.
+        GAME_GENERATOR_STORAGE_DIR: Object root of the local backend (default <tmp>/game-generator-storage).
+        GAME_GENERATOR_STORAGE_SECRET: Key signing the local backend's URLs
+            (default: generated once and kept in the storage directory).
+        GAME_GENERATOR_STORAGE_BASE_URL: Scheme and host of the local backend's
+            signed URLs (default: host-relative URLs).
+
+    Raises:
+        ValueError: If the backend is unknown or the gcs backend has no bucket.
+    """
+    global _storage_backend
+    kind = os.environ.get("GAME_GENERATOR_STORAGE", "").lower()
+    if not kind:
+        return None
+    if kind not in STORAGE_BACKENDS:
+        raise ValueError(f"Unsupported GAME_GENERATOR_STORAGE: {kind}")
+    with _storage_backend_lock:
+        if _storage_backend is None:
+            if kind == STORAGE_GCS:
+                bucket = os.environ.get("GAME_GENERATOR_STORAGE_BUCKET")
+                if not bucket:
+                    raise ValueError("GAME_GENERATOR_STORAGE=gcs requires GAME_GENERATOR_STORAGE_BUCKET")
+                _storage_backend = GCSStorageBackend(bucket, project=os.environ.get("GOOGLE_CLOUD_PROJECT"))
+            else:
+                root = os.environ.get(
+                    "GAME_GENERATOR_STORAGE_DIR",
+                    os.path.join(tempfile.gettempdir(), "game-generator-storage"),
+                )
+                _storage_backend = LocalStorageBackend(
+                    root=root,
+                    secret=local_secret(root),
+                    base_url=os.environ.get("GAME_GENERATOR_STORAGE_BASE_URL", ""),
+                )
+            logger.info("Using object storage", extra={"backend": kind})
+        return _storage_backend
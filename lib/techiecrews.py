@@ -1,17 +1,281 @@
+import copy
+import glob
+import hashlib
+import logging
 import os
+import threading
+from typing import Dict, Optional, Tuple
 
-from techies.tools import get_all_tools
-from techies.agent import Agent
-from techies.task import Task
-from techies.crew import Crew
+import yaml
 
-def get_crew(crew_name:str, workspace_path:str):
-    os.environ["TECHIES_RUNTIME"] = os.path.dirname(__file__) + "/essential-crew"
+from lib import call_cache
+from lib.telemetry import registry, span
+
+# techies resolves crew definitions through TECHIES_RUNTIME. It is set once at
+# import time, never per request, so concurrent crews never observe a change.
+TECHIES_RUNTIME = os.path.join(os.path.dirname(__file__), "essential-crew")
+os.environ["TECHIES_RUNTIME"] = TECHIES_RUNTIME
+
+logger = logging.getLogger(__name__)
+
+CREW_INSTANTIATIONS_TOTAL = registry.counter(
+    "game_generator_crew_instantiations_total",
+    "Crews instantiated, by method: copied from the prototype pools or built from the definitions.",
+)
+
+# The techies runtime pulls in crewai and langchain, which take most of the
+# app's import time, so load_runtime() imports it on first use (or in a
+# pre-fork master, see warm_up()) instead of at import.
+get_all_tools = None
+get_context_tools = None
+Agent = None
+Task = None
+Crew = None
+_runtime_lock = threading.Lock()
+
+
+def load_runtime() -> None:
+    """Imports the techies runtime into this module; later calls do nothing.
+
+    Names that are already set, e.g. replaced by a benchmark, are kept.
+    """
+    global get_all_tools, get_context_tools, Agent, Task, Crew
+    with _runtime_lock:
+        if None not in (get_all_tools, get_context_tools, Agent, Task, Crew):
+            return
+        with span("techies.import"):
+            from techies import tools, agent, task, crew
+            from lib import context_tools
+        get_all_tools = get_all_tools or tools.get_all_tools
+        get_context_tools = get_context_tools or context_tools.get_context_tools
+        Agent = Agent or agent.Agent
+        Task = Task or task.Task
+        Crew = Crew or crew.Crew
+
+
+class CrewDefinitionError(ValueError):
+    """Raised when the crew, agent or task definitions are inconsistent."""
+
+
+def all_tools() -> dict:
+    """Returns the techies tools and the context tools of lib.context_tools by name."""
+    return {**get_all_tools(), **get_context_tools()}
+
+
+def bind_tools(tools: dict, workspace_path: str) -> dict:
+    """Returns private copies of `tools` rooted at `workspace_path`.
+
+    `get_all_tools()` hands out shared instances, so assigning `base_dir` on them
+    would redirect the file writes of every other crew in the process.
+    """
+    bound_tools = {}
+    for name, tool in tools.items():
+        bound_tool = copy.copy(tool)
+        bound_tool.base_dir = workspace_path
+        bound_tools[name] = bound_tool
+    return bound_tools
+
+
+def load_definitions(runtime_dir: str = TECHIES_RUNTIME) -> Dict[str, dict]:
+    """Parses every crews.yml, agents.yml and tasks.yml under `runtime_dir`.
+
+    Keys starting with an underscore only hold YAML anchors and are skipped.
+
+    Returns:
+        A dict with "crews", "agents" and "tasks" mappings of name to definition.
+    """
+    definitions = {"crews": {}, "agents": {}, "tasks": {}}
+    for kind in definitions:
+        for path in sorted(glob.glob(os.path.join(runtime_dir, "*", f"{kind}.yml"))):
+            with open(path, "r", encoding="utf-8") as f:
+                entries = yaml.safe_load(f) or {}
+            for name, definition in entries.items():
+                if not name.startswith("_"):
+                    definitions[kind][name] = definition
+    return definitions
+
+
+def definitions_fingerprint(runtime_dir: str = TECHIES_RUNTIME) -> str:
+    """Returns a SHA-256 over the path and content of every YAML file under `runtime_dir`.
+
+    Any edit to a crew, agent or task definition changes the fingerprint, so
+    results produced by the old definitions can be told apart.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(runtime_dir, "*", "*.yml"))):
+        digest.update(os.path.relpath(path, runtime_dir).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def validate_definitions(definitions: Dict[str, dict], tool_names) -> None:
+    """Checks that every crew, task and agent reference resolves.
+
+    Raises:
+        CrewDefinitionError: Listing every unresolved reference.
+    """
+    agents, tasks = definitions["agents"], definitions["tasks"]
+    problems = []
+    for crew_name, crew in definitions["crews"].items():
+        problems += [f"crew {crew_name}: unknown agent {name}" for name in crew.get("agents", []) if name not in agents]
+        problems += [f"crew {crew_name}: unknown task {name}" for name in crew.get("tasks", []) if name not in tasks]
+    for task_name, task in tasks.items():
+        if task.get("agent") not in agents:
+            problems.append(f"task {task_name}: unknown agent {task.get('agent')}")
+    for agent_name, agent in agents.items():
+        problems += [f"agent {agent_name}: unknown tool {name}" for name in agent.get("tools", []) if name not in tool_names]
+    if problems:
+        raise CrewDefinitionError("Invalid crew definitions: " + "; ".join(problems))
 
-    tools = get_all_tools()
-    for tool in tools.values():
-        tool.base_dir = workspace_path
 
+def _build_pools(tools: dict) -> Tuple[dict, dict]:
     agent_pool = Agent.eager_load_all(tools)
     task_pool = Task.eager_load_all(agent_pool)
-    return Crew(crew_name, agent_pool=agent_pool, task_pool=task_pool, introduce_only=False)
\ No newline at end of file
+    return agent_pool, task_pool
+
+
+class CrewRegistry:
+    """Loads the agent and task pools once and hands out per-workspace copies.
+
+    The pools are built on first use (or by `load()` at startup) against a
+    private set of tools. Each `get_crew` call deep-copies them, rebinding the
+    copied tools to the requested workspace, which skips re-reading and
+    re-validating the YAML under `essential-crew/` for every crew. The
+    definitions fingerprint is likewise hashed once, not per request.
+
+    Args:
+        runtime_dir: Directory holding the crew definitions.
+        reload_on_change: Reload the definitions when a YAML file's mtime
+            changes. Meant for development; it stats every file per crew.
+    """
+
+    def __init__(self, runtime_dir: str = TECHIES_RUNTIME, reload_on_change: bool = False):
+        self.runtime_dir = runtime_dir
+        self.reload_on_change = reload_on_change
+        self.definitions: Optional[Dict[str, dict]] = None
+        self._tools: Optional[dict] = None
+        self._agent_pool: Optional[dict] = None
+        self._task_pool: Optional[dict] = None
+        self._mtimes: Dict[str, float] = {}
+        self._copyable = True
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self._fingerprint_mtimes: Optional[Dict[str, float]] = None
+        # Not _lock: hashing the YAML must not wait for a crew being copied or loaded
+        self._fingerprint_lock = threading.Lock()
+
+    def _definition_mtimes(self) -> Dict[str, float]:
+        paths = glob.glob(os.path.join(self.runtime_dir, "*", "*.yml"))
+        return {path: os.path.getmtime(path) for path in paths}
+
+    def load(self) -> None:
+        """(Re)loads and validates the definitions and rebuilds the prototype pools."""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        load_runtime()
+        mtimes = self._definition_mtimes()
+        # The prototype tools point at os.devnull so a copy that somehow missed
+        # rebinding fails loudly instead of writing next to the definitions.
+        tools = bind_tools(all_tools(), os.devnull)
+        definitions = load_definitions(self.runtime_dir)
+        validate_definitions(definitions, tools.keys())
+        self._agent_pool, self._task_pool = _build_pools(tools)
+        self._tools = tools
+        self.definitions = definitions
+        self._mtimes = mtimes
+        self._copyable = True
+        logger.info("Loaded crew definitions", extra={
+            "crews": len(definitions["crews"]),
+            "agents": len(definitions["agents"]),
+            "tasks": len(definitions["tasks"]),
+        })
+
+    def fingerprint(self) -> str:
+        """Returns the definitions_fingerprint of the definitions, hashed on first use.
+
+        With reload_on_change it is hashed again whenever a YAML file's mtime changes.
+        """
+        with self._fingerprint_lock:
+            mtimes = self._definition_mtimes() if self.reload_on_change else None
+            if self._fingerprint is None or mtimes != self._fingerprint_mtimes:
+                self._fingerprint = definitions_fingerprint(self.runtime_dir)
+                self._fingerprint_mtimes = mtimes
+            return self._fingerprint
+
+    def _ensure_loaded(self) -> None:
+        if self._agent_pool is None:
+            self._load()
+        elif self.reload_on_change and self._definition_mtimes() != self._mtimes:
+            logger.info("Crew definitions changed, reloading", extra={"runtime_dir": self.runtime_dir})
+            self._load()
+
+    def instantiate(self, workspace_path: str) -> Tuple[dict, dict]:
+        """Returns agent and task pools whose tools are bound to `workspace_path`."""
+        with self._lock:
+            self._ensure_loaded()
+            if self._copyable:
+                memo = {}
+                try:
+                    agent_pool, task_pool = copy.deepcopy((self._agent_pool, self._task_pool), memo)
+                except Exception as e:
+                    # Some agent attribute (an LLM client, a lock) refuses to be
+                    # copied; build fresh pools from now on.
+                    logger.warning("Crew pools cannot be copied, loading them per crew instead: %s", e, exc_info=True)
+                    self._copyable = False
+                else:
+                    for tool in self._tools.values():
+                        tool_copy = memo.get(id(tool))
+                        if tool_copy is not None:
+                            tool_copy.base_dir = workspace_path
+                    CREW_INSTANTIATIONS_TOTAL.inc(method="copy")
+                    return agent_pool, task_pool
+            CREW_INSTANTIATIONS_TOTAL.inc(method="build")
+            return _build_pools(bind_tools(all_tools(), workspace_path))
+
+    def get_crew(self, crew_name: str, workspace_path: str):
+        with self._lock:
+            self._ensure_loaded()
+        if crew_name not in self.definitions["crews"]:
+            raise CrewDefinitionError(f"Unknown crew: {crew_name}")
+        with span("crew.instantiate", crew=crew_name):
+            agent_pool, task_pool = self.instantiate(workspace_path)
+        call_cache.install(agent_pool)
+        return Crew(crew_name, agent_pool=agent_pool, task_pool=task_pool, introduce_only=False)
+
+
+_registry: Optional[CrewRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> CrewRegistry:
+    """Returns the process-wide CrewRegistry.
+
+    Environment:
+        GAME_GENERATOR_CREW_RELOAD: Set to 1 to reload the crew definitions
+            whenever a YAML file under essential-crew/ changes.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CrewRegistry(reload_on_change=os.environ.get("GAME_GENERATOR_CREW_RELOAD") == "1")
+        return _registry
+
+
+def get_crew(crew_name:str, workspace_path:str):
+    return get_registry().get_crew(crew_name, workspace_path)
+
+
+def warm_up() -> None:
+    """Imports the techies runtime and loads the tools and crew definitions.
+
+    Meant for a pre-fork master (see gunicorn.conf.py): forked workers then
+    share the loaded runtime and prototype pools copy-on-write, and their
+    first request builds crews from them right away. Starts no threads.
+    """
+    with span("warm_up"):
+        get_registry().load()
+    logger.info("Crew runtime warmed up")
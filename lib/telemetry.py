@@ -0,0 +1,352 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds of the span duration histogram buckets, in seconds. Crews run
+# for minutes, file operations for milliseconds.
+SPAN_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Attributes every LogRecord has; anything else was passed through `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """A monotonically increasing Prometheus counter with labels."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram with labels and fixed buckets."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = SPAN_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # Per label set: bucket counts (non-cumulative), sum and count.
+        self._values: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """A metric whose samples are read from a callback at scrape time.
+
+    The callback returns a list of (labels, value) pairs. It suits values that
+    another component already tracks, such as queue lengths (`gauge`) or the
+    result cache statistics (`counter`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        collect: Callable[[], List[Tuple[Dict[str, object], float]]],
+        metric_type: str = "gauge",
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.collect = collect
+        self.metric_type = metric_type
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            samples = self.collect()
+        except Exception:
+            logging.getLogger(__name__).exception("Error collecting metric %s", self.name)
+            samples = []
+        for labels, value in samples:
+            lines.append(f"{self.name}{_format_labels(_label_key(labels))} {value:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = SPAN_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, help_text, buckets))
+
+    def callback(self, name: str, help_text: str, collect, metric_type: str = "gauge") -> CallbackMetric:
+        """Registers (or replaces) a CallbackMetric."""
+        metric = CallbackMetric(name, help_text, collect, metric_type)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+SPAN_SECONDS = registry.histogram(
+    "game_generator_span_seconds", "Duration of instrumented operations.",
+)
+BYTES_TOTAL = registry.counter(
+    "game_generator_bytes_total", "Bytes processed, by operation.",
+)
+LLM_REQUESTS_TOTAL = registry.counter(
+    "game_generator_llm_requests_total", "LLM requests reported by the crews.",
+)
+LLM_TOKENS_TOTAL = registry.counter(
+    "game_generator_llm_tokens_total", "LLM tokens reported by the crews, by token type.",
+)
+AGENT_STEPS_TOTAL = registry.counter(
+    "game_generator_agent_steps_total", "Agent iterations reported by the crews.",
+)
+TASKS_TOTAL = registry.counter(
+    "game_generator_tasks_total", "Crew tasks completed.",
+)
+
+
+# GAME_GENERATOR_TELEMETRY=0 turns spans and counters into no-ops.
+_enabled = os.environ.get("GAME_GENERATOR_TELEMETRY", "1") != "0"
+
+
+def telemetry_enabled() -> bool:
+    return _enabled
+
+# Spans finished during the current request, for the Server-Timing header.
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None,
+)
+
+
+def start_request_timings() -> None:
+    """Starts collecting the spans of the current request."""
+    _request_timings.set([] if _enabled else None)
+
+
+def finish_request_timings() -> List[Tuple[str, float]]:
+    """Stops collecting and returns (span name, seconds) summed per span name, in first-seen order."""
+    timings = _request_timings.get() or []
+    _request_timings.set(None)
+    totals: Dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return list(totals.items())
+
+
+def record_span(name: str, seconds: float, **labels) -> None:
+    """Records a finished span in the histogram and in the current request's timings."""
+    if not _enabled:
+        return
+    SPAN_SECONDS.observe(seconds, span=name, **labels)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((".".join([name, *map(str, labels.values())]), seconds))
+
+
+@contextlib.contextmanager
+def span(name: str, **labels) -> Iterator[None]:
+    """Times the enclosed block as the span `name`.
+
+    Labels become histogram labels, so they must have a small set of values
+    (e.g. the crew name, never a workspace path).
+    """
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, **labels)
+
+
+def count_bytes(operation: str, amount: int) -> None:
+    if _enabled:
+        BYTES_TOTAL.inc(amount, operation=operation)
+
+
+def _usage_value(usage, name: str) -> int:
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value if isinstance(value, (int, float)) else 0
+
+
+def record_crew_usage(crew_name: str, crew) -> None:
+    """Records the LLM request and token counts a crew reports after kickoff.
+
+    crewai exposes them as `crew.usage_metrics` (an object or, in older
+    releases, a dict); crews without it are skipped.
+    """
+    if not _enabled:
+        return
+    usage = getattr(crew, "usage_metrics", None)
+    if usage is None:
+        return
+    LLM_REQUESTS_TOTAL.inc(_usage_value(usage, "successful_requests"), crew=crew_name)
+    for token_type in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+        LLM_TOKENS_TOTAL.inc(_usage_value(usage, token_type), crew=crew_name, type=token_type.rsplit("_", 1)[0])
+
+
+def instrument_crew(crew_name: str, crew) -> None:
+    """Hooks step and task callbacks into a crew where it accepts them.
+
+    Agent iterations are counted per crew; each completed task records a
+    `crew.task` span measured from the previous task's completion.
+    """
+    if not _enabled:
+        return
+    last_task_end = [time.perf_counter()]
+
+    def step_callback(*_args, **_kwargs):
+        AGENT_STEPS_TOTAL.inc(crew=crew_name)
+
+    def task_callback(output=None, *_args, **_kwargs):
+        now = time.perf_counter()
+        TASKS_TOTAL.inc(crew=crew_name)
+        record_span("crew.task", now - last_task_end[0], crew=crew_name)
+        last_task_end[0] = now
+
+    for attribute, callback in (("step_callback", step_callback), ("task_callback", task_callback)):
+        if getattr(crew, attribute, None) is not None:
+            continue # Keep callbacks the crew definition configured
+        try:
+            setattr(crew, attribute, callback)
+        except Exception:
+            logging.getLogger(__name__).debug("Crew %s does not accept %s", crew_name, attribute)
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as JSON lines or as text followed by key=value fields.
+
+    Fields come from the `extra` argument of the logging call.
+    """
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        message = record.getMessage()
+        if self.json_output:
+            entry = {
+                "time": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": message,
+            }
+            entry.update(fields)
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        text = f"{self.formatTime(record)} {record.levelname} {record.name}: {message}"
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+_logging_configured = False
+
+
+def configure_logging() -> None:
+    """Sets up the `app` and `lib` loggers once per process.
+
+    Environment:
+        GAME_GENERATOR_LOG_LEVEL: Minimum level (default INFO); WARNING keeps the
+            per-request paths quiet.
+        GAME_GENERATOR_LOG_FORMAT: "text" (default) or "json".
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output=os.environ.get("GAME_GENERATOR_LOG_FORMAT") == "json"))
+    level = os.environ.get("GAME_GENERATOR_LOG_LEVEL", "INFO").upper()
+    for name in ("app", "lib"):
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(handler)
+        logger.propagate = False
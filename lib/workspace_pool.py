@@ -0,0 +1,331 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_OWNER_SUFFIX = ".owner"
+
+
+class WorkspaceQuotaError(ValueError):
+    """Raised when a workspace holds more bytes or files than one workspace may."""
+
+
+class WorkspaceCapacityError(Exception):
+    """Raised when a workspace is requested while all workspaces together are at their quota."""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Exists, owned by another user
+    return True
+
+
+def directory_usage(path: str) -> Tuple[int, int]:
+    """Returns the bytes and the number of files below `path`."""
+    total_bytes = 0
+    total_files = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total_bytes += os.lstat(os.path.join(dir_path, file_name)).st_size
+            except FileNotFoundError:
+                continue
+            total_files += 1
+    return total_bytes, total_files
+
+
+class WorkspaceManager:
+    """Hands out workspace directories from one root and bounds their disk use.
+
+    The root holds three directories:
+
+        ready/   empty workspaces created ahead of time by the janitor
+        active/  workspaces in use, each with a `<name>.owner` file recording
+                 the owning process id and creation time
+        trash/   released workspaces waiting to be deleted
+
+    Releasing a workspace only renames it into trash/; the janitor thread
+    deletes it, refills ready/ and removes active workspaces whose owner
+    process is gone or that are older than `max_age`, such as those left by a
+    killed worker. Several processes may share the root: directories are
+    claimed by renaming them.
+
+    Quotas are checked when a workspace is requested (the total of all
+    active workspaces) and whenever `check_quota` is called (the workspace
+    itself), i.e. after uploads are unpacked and after every crew stage.
+
+    Args:
+        root: Directory holding the workspaces, e.g. a tmpfs mount.
+        pool_size: Empty workspaces kept ready.
+        max_bytes: Bytes one workspace may hold (0 disables the check).
+        max_files: Files one workspace may hold (0 disables the check).
+        total_max_bytes: Bytes all active workspaces may hold (0 disables the check).
+        total_max_files: Files all active workspaces may hold (0 disables the check).
+        max_age: Seconds after which an active workspace counts as abandoned.
+        janitor_interval: Seconds between janitor sweeps; 0 disables the
+            janitor thread (call `sweep()` instead).
+    """
+
+    def __init__(
+        self,
+        root: str,
+        pool_size: int = 4,
+        max_bytes: int = 512 * 1024 ** 2,
+        max_files: int = 10000,
+        total_max_bytes: int = 8 * 1024 ** 3,
+        total_max_files: int = 200000,
+        max_age: float = 7200,
+        janitor_interval: float = 60,
+    ):
+        self.root = root
+        self.pool_size = pool_size
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.total_max_bytes = total_max_bytes
+        self.total_max_files = total_max_files
+        self.max_age = max_age
+        self.ready_dir = os.path.join(root, "ready")
+        self.active_dir = os.path.join(root, "active")
+        self.trash_dir = os.path.join(root, "trash")
+        for path in (self.ready_dir, self.active_dir, self.trash_dir):
+            os.makedirs(path, exist_ok=True)
+        # Last measured (bytes, files) per active workspace, of every process.
+        self._usage: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._janitor = None
+        if janitor_interval > 0:
+            self._janitor = threading.Thread(
+                target=self._run_janitor, args=(janitor_interval,), name="workspace-janitor", daemon=True,
+            )
+            self._janitor.start()
+
+    def owns(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.active_dir)
+
+    def totals(self) -> Tuple[int, int]:
+        """Returns the bytes and files of all active workspaces, as last measured."""
+        with self._lock:
+            return sum(usage[0] for usage in self._usage.values()), sum(usage[1] for usage in self._usage.values())
+
+    def acquire(self) -> str:
+        """Returns an empty workspace directory owned by this process.
+
+        Raises:
+            WorkspaceCapacityError: If the active workspaces are at the global quota.
+        """
+        total_bytes, total_files = self.totals()
+        if (self.total_max_bytes and total_bytes >= self.total_max_bytes) or \
+                (self.total_max_files and total_files >= self.total_max_files):
+            raise WorkspaceCapacityError(
+                f"Workspaces hold {total_bytes} bytes in {total_files} files, at the configured limit."
+            )
+        path = self._claim_ready()
+        if path is None:
+            path = tempfile.mkdtemp(dir=self.active_dir)
+        self._mark(path)
+        with self._lock:
+            self._usage[path] = (0, 0)
+        self._wake.set() # Refill the pool
+        return path
+
+    def _mark(self, path: str) -> None:
+        with open(path + _OWNER_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "created_at": time.time()}, f)
+
+    def renew(self, path: str) -> None:
+        """Restarts the maximum age of an active workspace, e.g. when the job
+        it was prepared for leaves the queue and starts running."""
+        if self.owns(path) and os.path.isdir(path):
+            self._mark(path)
+
+    def _claim_ready(self) -> Optional[str]:
+        try:
+            names = os.listdir(self.ready_dir)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            path = os.path.join(self.active_dir, name)
+            try:
+                # Until the owner file exists, the janitor judges the workspace by its mtime.
+                os.utime(os.path.join(self.ready_dir, name))
+                os.rename(os.path.join(self.ready_dir, name), path)
+            except OSError:
+                continue # Claimed by another thread or process
+            return path
+        return None
+
+    def release(self, path: str) -> None:
+        """Hands a workspace back; its files are deleted by the janitor."""
+        if not self.owns(path):
+            shutil.rmtree(path)
+            return
+        with self._lock:
+            self._usage.pop(path, None)
+        os.rename(path, os.path.join(self.trash_dir, f"{os.path.basename(path)}-{uuid.uuid4().hex}"))
+        try:
+            os.remove(path + _OWNER_SUFFIX)
+        except FileNotFoundError:
+            pass
+        self._wake.set()
+
+    def check_quota(self, path: str) -> Tuple[int, int]:
+        """Measures a workspace and records its usage toward the global quota.
+
+        Returns:
+            The workspace's bytes and files.
+
+        Raises:
+            WorkspaceQuotaError: If the workspace exceeds the per-workspace quota.
+        """
+        used_bytes, used_files = directory_usage(path)
+        if self.owns(path):
+            with self._lock:
+                self._usage[path] = (used_bytes, used_files)
+        if self.max_bytes and used_bytes > self.max_bytes:
+            raise WorkspaceQuotaError(f"Workspace holds {used_bytes} bytes, more than the limit of {self.max_bytes}.")
+        if self.max_files and used_files > self.max_files:
+            raise WorkspaceQuotaError(f"Workspace holds {used_files} files, more than the limit of {self.max_files}.")
+        return used_bytes, used_files
+
+    def _abandoned(self, path: str, now: float) -> bool:
+        try:
+            with open(path + _OWNER_SUFFIX, "r", encoding="utf-8") as f:
+                owner = json.load(f)
+            pid, created_at = int(owner["pid"]), float(owner["created_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # Not yet marked by acquire(), or the marker is damaged: judge by age alone.
+            try:
+                return now - os.stat(path).st_mtime > self.max_age
+            except FileNotFoundError:
+                return False
+        return not _pid_alive(pid) or now - created_at > self.max_age
+
+    def sweep(self) -> Dict[str, int]:
+        """Deletes released and abandoned workspaces, refills the pool and re-measures usage.
+
+        Returns:
+            The number of workspaces removed, by reason, and created for the pool.
+        """
+        removed = {"released": 0, "abandoned": 0, "pooled": 0}
+        for entry in os.scandir(self.trash_dir):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed["released"] += 1
+
+        now = time.time()
+        with self._lock:
+            known = set(self._usage)
+        usage = {}
+        for entry in os.scandir(self.active_dir):
+            if entry.name.endswith(_OWNER_SUFFIX):
+                if not os.path.exists(entry.path[:-len(_OWNER_SUFFIX)]):
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                continue
+            if not entry.is_dir():
+                continue
+            if self._abandoned(entry.path, now):
+                logger.warning("Removing abandoned workspace", extra={"workspace": entry.path})
+                shutil.rmtree(entry.path, ignore_errors=True)
+                try:
+                    os.remove(entry.path + _OWNER_SUFFIX)
+                except FileNotFoundError:
+                    pass
+                removed["abandoned"] += 1
+                continue
+            usage[entry.path] = directory_usage(entry.path)
+        with self._lock:
+            self._merge_usage(known, usage)
+
+        missing = self.pool_size - len(os.listdir(self.ready_dir))
+        for _ in range(max(0, missing)):
+            os.mkdir(os.path.join(self.ready_dir, uuid.uuid4().hex), 0o700)
+            removed["pooled"] += 1
+        return removed
+
+    def _merge_usage(self, known: Set[str], usage: Dict[str, Tuple[int, int]]) -> None:
+        """Folds a sweep's measurements into _usage. Caller holds _lock.
+
+        `known` are the workspaces tracked when the sweep started. Those the
+        sweep no longer found are dropped; workspaces acquired while it ran
+        are kept, and those released while it ran are not added back.
+        """
+        for path in known - set(usage):
+            self._usage.pop(path, None)
+        for path, measured in usage.items():
+            if path in self._usage or (path not in known and os.path.isdir(path)):
+                self._usage[path] = measured
+
+    def stats(self) -> Dict[str, int]:
+        total_bytes, total_files = self.totals()
+        with self._lock:
+            active = len(self._usage)
+        return {
+            "active": active,
+            "ready": len(os.listdir(self.ready_dir)),
+            "bytes": total_bytes,
+            "files": total_files,
+        }
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    def _run_janitor(self, interval: float) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("Error sweeping workspaces: %s", e)
+            self._wake.wait(interval)
+            self._wake.clear()
+
+
+_workspace_manager: Optional[WorkspaceManager] = None
+_workspace_manager_lock = threading.Lock()
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    """Returns the process-wide WorkspaceManager, starting its janitor on first use.
+
+    Environment:
+        GAME_GENERATOR_WORKSPACE_DIR: Workspace root, e.g. on tmpfs (default <tmp>/game-generator-workspaces).
+        GAME_GENERATOR_WORKSPACE_POOL_SIZE: Empty workspaces kept ready (default 4).
+        GAME_GENERATOR_WORKSPACE_MAX_BYTES: Bytes per workspace, 0 for no limit (default 512 MiB).
+        GAME_GENERATOR_WORKSPACE_MAX_FILES: Files per workspace, 0 for no limit (default 10000).
+        GAME_GENERATOR_WORKSPACES_MAX_BYTES: Bytes of all workspaces, 0 for no limit (default 8 GiB).
+        GAME_GENERATOR_WORKSPACES_MAX_FILES: Files of all workspaces, 0 for no limit (default 200000).
+        GAME_GENERATOR_WORKSPACE_MAX_AGE: Seconds before a workspace counts as abandoned (default 7200).
+        GAME_GENERATOR_WORKSPACE_JANITOR_INTERVAL: Seconds between janitor sweeps (default 60).
+    """
+    global _workspace_manager
+    with _workspace_manager_lock:
+        if _workspace_manager is None:
+            _workspace_manager = WorkspaceManager(
+                root=os.environ.get(
+                    "GAME_GENERATOR_WORKSPACE_DIR",
+                    os.path.join(tempfile.gettempdir(), "game-generator-workspaces"),
+                ),
+                pool_size=int(os.environ.get("GAME_GENERATOR_WORKSPACE_POOL_SIZE", "4")),
+                max_bytes=int(os.environ.get("GAME_GENERATOR_WORKSPACE_MAX_BYTES", str(512 * 1024 ** 2))),
+                max_files=int(os.environ.get("GAME_GENERATOR_WORKSPACE_MAX_FILES", "10000")),
+                total_max_bytes=int(os.environ.get("GAME_GENERATOR_WORKSPACES_MAX_BYTES", str(8 * 1024 ** 3))),
+                total_max_files=int(os.environ.get("GAME_GENERATOR_WORKSPACES_MAX_FILES", "200000")),
+                max_age=float(os.environ.get("GAME_GENERATOR_WORKSPACE_MAX_AGE", "7200")),
+                janitor_interval=float(os.environ.get("GAME_GENERATOR_WORKSPACE_JANITOR_INTERVAL", "60")),
+            )
+        return _workspace_manager
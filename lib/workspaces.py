@@ -1,69 +1,53 @@
-import tempfile
 import os
 import shutil
-import zipfile
 import base64
 import json
-from typing import Dict, Optional
+import logging
+from typing import Dict, Iterator, Optional
 from werkzeug.datastructures import FileStorage
 
-def _extract_and_prepare_game_content(bundle_zip_path: str, target_workspace_dir: str) -> None:
+from lib import progress
+from lib.archives import extract_bundle, write_directory_zip, iter_directory_zip
+from lib.result_cache import ResultRecorder
+from lib.workspace_pool import get_workspace_manager
+from lib.telemetry import span, count_bytes
+
+logger = logging.getLogger(__name__)
+
+def _extract_and_prepare_game_content(game_bundle: FileStorage, target_workspace_dir: str) -> None:
     """
-    Extracts game content from a zip bundle, finds the root based on index.html,
-    and moves the content to the target workspace directory.
+    Extracts game content from an uploaded zip bundle straight into the target
+    workspace directory, re-rooted at the directory containing index.html.
     """
-    extraction_tempdir = tempfile.mkdtemp()
-    print(f"Created temporary directory for bundle extraction: {extraction_tempdir}")
-    try:
-        try:
-            with zipfile.ZipFile(bundle_zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extraction_tempdir)
-            print(f"Bundle temporarily extracted from {bundle_zip_path} to: {extraction_tempdir}")
-        except zipfile.BadZipFile:
-            # This error will be caught by the caller (prepare_workspace)
-            print(f"Error: Bundle at {bundle_zip_path} is not a valid zip file.")
-            raise ValueError("Invalid game bundle format: Not a valid zip file.")
-
-        index_html_path = None
-        for root, _, files in os.walk(extraction_tempdir):
-            if "index.html" in files:
-                index_html_path = os.path.join(root, "index.html")
-                break
-
-        if not index_html_path:
-            # This error will be caught by the caller (prepare_workspace)
-            raise ValueError("Game bundle does not contain an 'index.html' file.")
-
-        content_root_dir = os.path.dirname(index_html_path)
-        print(f"Identified game content root: {content_root_dir}")
-
-        # Move items from content_root_dir to target_workspace_dir
-        for item_name in os.listdir(content_root_dir):
-            source_item_path = os.path.join(content_root_dir, item_name)
-            # shutil.move(src, dst_dir) moves src into dst_dir.
-            # If an item with the same name exists in dst_dir,
-            # behavior depends on whether it's a file or directory.
-            # Files will be overwritten. Directories will have src moved inside them if names clash.
-            # Given target_workspace_dir might contain 'external', this behavior is acceptable.
-            shutil.move(source_item_path, target_workspace_dir)
-        
-        print(f"Moved game content from {content_root_dir} to {target_workspace_dir}")
-
-    finally:
-        if os.path.exists(extraction_tempdir):
-            shutil.rmtree(extraction_tempdir)
-            print(f"Cleaned up temporary extraction directory: {extraction_tempdir}")
+    with span("bundle.extract"):
+        extracted = extract_bundle(game_bundle.stream, target_workspace_dir)
+    logger.info("Extracted game bundle", extra={"files": len(extracted), "workspace": target_workspace_dir})
+    progress.report("bundle.extracted", files=len(extracted))
 
 def initialize_workspace() -> str:
-    """Creates a temporary directory for processing.
+    """Takes an empty workspace directory from the workspace manager.
 
     Returns:
-        The absolute path to the created temporary directory.
+        The absolute path to the workspace directory.
+
+    Raises:
+        WorkspaceCapacityError: If all workspaces together are at their quota.
     """
-    tempdir = tempfile.mkdtemp()
-    print(f"Initialized workspace: {tempdir}")
+    with span("workspace.init"):
+        tempdir = get_workspace_manager().acquire()
+    logger.info("Initialized workspace", extra={"workspace": tempdir})
+    progress.report("workspace.ready")
     return tempdir
 
+def renew_workspace(tempdir: str) -> None:
+    """Restarts the maximum age of a workspace, e.g. one that waited in the job queue.
+
+    Args:
+        tempdir: The path to the temporary workspace directory.
+    """
+    get_workspace_manager().renew(tempdir)
+
+
 def prepare_workspace(
     tempdir: str,
     game_bundle: FileStorage,
@@ -83,49 +67,169 @@ def prepare_workspace(
     """
     external_path = os.path.join(tempdir, "external")
     os.makedirs(external_path, exist_ok=True)
-    print(f"Created external assets directory: {external_path}")
+    logger.debug("Created external assets directory", extra={"path": external_path})
 
-    # Unzip the bundle
-    bundle_zip_path = os.path.join(tempdir, "_bundle.zip")
-    game_bundle.save(bundle_zip_path)
+    # Unzip the bundle straight from the upload stream
     try:
-        _extract_and_prepare_game_content(bundle_zip_path, tempdir)
-        print(f"Successfully processed and placed game content into: {tempdir}")
+        _extract_and_prepare_game_content(game_bundle, tempdir)
     except ValueError as e: # Catches ValueErrors from _extract_and_prepare_game_content
-        print(f"Error processing game bundle: {e}")
+        logger.warning("Error processing game bundle: %s", e, extra={"workspace": tempdir})
         # Re-raise the exception for the calling route to handle and return a proper response
         raise
-    finally:
-        if os.path.exists(bundle_zip_path): # Ensure it exists before removing
-            os.remove(bundle_zip_path) # Clean up the temporary zip file
 
     # Copy icon if provided
     if game_icon:
         icon_path = os.path.join(external_path, "icon.png")
-        game_icon.save(icon_path)
-        print(f"Saved game icon to: {icon_path}")
+        with span("upload.save"):
+            game_icon.save(icon_path)
+        count_bytes("upload.save", os.path.getsize(icon_path))
+        logger.debug("Saved game icon", extra={"path": icon_path})
 
     # Copy splash if provided
     if game_splash:
         splash_path = os.path.join(external_path, "splash.png")
-        game_splash.save(splash_path)
-        print(f"Saved game splash to: {splash_path}")
+        with span("upload.save"):
+            game_splash.save(splash_path)
+        count_bytes("upload.save", os.path.getsize(splash_path))
+        logger.debug("Saved game splash", extra={"path": splash_path})
 
+    # Raises WorkspaceQuotaError, a ValueError, for oversized uploads
+    get_workspace_manager().check_quota(tempdir)
     return tempdir
 
-def finalize_workspace(tempdir: str) -> Dict[str, Optional[str]]:
-    """Finalizes the workspace by collecting assets, zipping, and cleaning up.
+def clone_workspace(tempdir: str) -> str:
+    """Copies a workspace into a new one, e.g. to run several stages from the same starting point.
+
+    Returns:
+        The path to the new workspace directory.
+
+    Raises:
+        WorkspaceCapacityError: If all workspaces together are at their quota.
+    """
+    clone = initialize_workspace()
+    try:
+        with span("workspace.clone"):
+            shutil.copytree(tempdir, clone, dirs_exist_ok=True)
+        get_workspace_manager().check_quota(clone)
+    except Exception:
+        cleanup_workspace(clone)
+        raise
+    return clone
+
+# Keys of collect_workspace results that hold artifact file paths.
+ARTIFACT_PATH_KEYS = ("icon_path", "splash_path", "bundle_path")
+
+def _read_and_encode(file_path: str) -> Optional[str]:
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+    except Exception as e:
+        logger.error("Error reading/encoding file %s: %s", file_path, e)
+        return None
+
+def _encode_chunks(chunks: Iterator[bytes]) -> str:
+    """Base64 encodes a stream of byte chunks without joining them first."""
+    encoded = bytearray()
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        usable = len(pending) - len(pending) % 3
+        encoded += base64.b64encode(pending[:usable])
+        pending = pending[usable:]
+    encoded += base64.b64encode(pending)
+    count_bytes("base64.encode", len(encoded))
+    return encoded.decode('ascii')
+
+def _iter_file_chunks(file_path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def encode_collected_results(results: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    """Turns collect_workspace results into finalize_workspace results.
+
+    The collected files are base64 encoded chunk by chunk and left in place.
 
     Args:
-        tempdir: The path to the temporary workspace directory.
+        results: collect_workspace results whose artifact paths still exist.
 
     Returns:
         A dictionary containing base64 encoded assets, status, and message.
     """
+    encoded = {key: value for key, value in results.items() if key not in ARTIFACT_PATH_KEYS}
+    for path_key, data_key in (("icon_path", "icon_base64Data"),
+                               ("splash_path", "splash_base64Data"),
+                               ("bundle_path", "bundle_base64Data")):
+        file_path = results.get(path_key)
+        with span("base64.encode"):
+            encoded[data_key] = _encode_chunks(_iter_file_chunks(file_path)) if file_path else None
+    return encoded
+
+def _parse_result_file(file_path: str) -> Dict[str, Optional[str]]:
+    status = "FAILURE"
+    message = f"Result file found ({file_path}) but could not be parsed."
+    if not os.path.exists(file_path):
+        return {"status": status, "message": f"Result file not found: {file_path}"}
+    try:
+        with open(file_path, "r", encoding='utf-8') as f:
+            lines = f.readlines()
+            if len(lines) >= 1:
+                parsed_status = lines[0].strip().upper()
+                valid_statuses = ["SUCCESS", "PARTIAL_SUCCESS", "FAILURE"]
+                if parsed_status in valid_statuses:
+                    status = parsed_status
+                    if len(lines) >= 2:
+                        message = lines[1].strip()
+                    else:
+                         message = "Status read successfully, but no message provided."
+                    if status != "FAILURE" and len(lines) < 2:
+                         message = f"Status '{status}' read successfully, no specific message provided."
+                    elif status == "FAILURE" and len(lines) < 2:
+                         message = f"Status 'FAILURE' read, but no specific error message provided."
+
+                else:
+                    message = f"Invalid status found in result file: {lines[0].strip()}"
+            else:
+                message = "Result file is empty."
+    except Exception as e:
+        message = f"Error reading result file {file_path}: {e}"
+        logger.error(message)
+    return {"status": status, "message": message}
+
+def _parse_metadata_file(file_path: str) -> Dict[str, Optional[str]]:
+    metadata = {}
+    if not os.path.exists(file_path):
+        logger.debug("Metadata file not found", extra={"path": file_path})
+        return metadata
+    try:
+        with open(file_path, "r", encoding='utf-8') as f:
+            metadata = json.load(f)
+            logger.debug("Loaded metadata", extra={"path": file_path})
+        if not isinstance(metadata, dict):
+            logger.warning("Ignoring metadata file %s: expected a JSON object.", file_path)
+            metadata = {}
+    except Exception as e:
+        logger.error("Error reading metadata file %s: %s", file_path, e)
+    return metadata
+
+def read_workspace_results(tempdir: str) -> Dict[str, Optional[str]]:
+    """Reads the outcome of a processed workspace without modifying it.
+
+    Args:
+        tempdir: The path to the temporary workspace directory.
+
+    Returns:
+        A dictionary containing the icon and splash paths (None when missing),
+        status, message, and any metadata.
+    """
     results = {
-        "icon_base64Data": None,
-        "splash_base64Data": None,
-        "bundle_base64Data": None,
+        "icon_path": None,
+        "splash_path": None,
         "status": "FAILURE", # Default to failure
         "message": "Processing script did not produce a result file.", # Default message
         "suggested_name": None, # Default suggested name
@@ -134,105 +238,128 @@ def finalize_workspace(tempdir: str) -> Dict[str, Optional[str]]:
     result_file_path = os.path.join(external_path, "result")
     metadata_file_path = os.path.join(external_path, "metadata.json")
 
-    def read_and_encode(file_path: str) -> Optional[str]:
-        if not os.path.exists(file_path):
-            return None
-        try:
-            with open(file_path, "rb") as f:
-                return base64.b64encode(f.read()).decode('utf-8')
-        except Exception as e:
-            print(f"Error reading/encoding file {file_path}: {e}")
-            return None
-
-    def parse_result_file(file_path: str) -> Dict[str, Optional[str]]:
-        status = "FAILURE"
-        message = f"Result file found ({file_path}) but could not be parsed."
-        if not os.path.exists(file_path):
-            return {"status": status, "message": f"Result file not found: {file_path}"}
-        try:
-            with open(file_path, "r", encoding='utf-8') as f:
-                lines = f.readlines()
-                if len(lines) >= 1:
-                    parsed_status = lines[0].strip().upper()
-                    valid_statuses = ["SUCCESS", "PARTIAL_SUCCESS", "FAILURE"]
-                    if parsed_status in valid_statuses:
-                        status = parsed_status
-                        if len(lines) >= 2:
-                            message = lines[1].strip()
-                        else:
-                             message = "Status read successfully, but no message provided."
-                        if status != "FAILURE" and len(lines) < 2:
-                             message = f"Status '{status}' read successfully, no specific message provided."
-                        elif status == "FAILURE" and len(lines) < 2:
-                             message = f"Status 'FAILURE' read, but no specific error message provided."
-
-                    else:
-                        message = f"Invalid status found in result file: {lines[0].strip()}"
-                else:
-                    message = "Result file is empty."
-        except Exception as e:
-            message = f"Error reading result file {file_path}: {e}"
-            print(message)
-        return {"status": status, "message": message}
-    
-    def parse_metadata_file(file_path: str) -> Dict[str, Optional[str]]:
-        metadata = {}
-        if not os.path.exists(file_path):
-            print(f"Metadata file not found: {file_path}")
-            return metadata
-        try:
-            with open(file_path, "r", encoding='utf-8') as f:
-                metadata = json.load(f)
-                print(f"Loaded metadata from {file_path}")
-        except Exception as e:
-            print(f"Error reading metadata file {file_path}: {e}")
-        return metadata
-
-    # Load external assets if they exist
+    # Locate external assets if they exist
     if os.path.exists(external_path):
-        results["icon_base64Data"] = read_and_encode(os.path.join(external_path, "icon.png"))
-        results["splash_base64Data"] = read_and_encode(os.path.join(external_path, "splash.png"))
-        
+        for asset_name, result_key in (("icon.png", "icon_path"), ("splash.png", "splash_path")):
+            asset_path = os.path.join(external_path, asset_name)
+            if os.path.isfile(asset_path):
+                results[result_key] = asset_path
+
         # Parse the result file
-        parsed_result = parse_result_file(result_file_path)
+        parsed_result = _parse_result_file(result_file_path)
         results["status"] = parsed_result["status"]
         results["message"] = parsed_result["message"]
-        
-        # Parse the metadata file and merge with results
-        metadata = parse_metadata_file(metadata_file_path)
+
+        # Parse the metadata file and merge with results; it must not
+        # redirect the artifact paths located above.
+        metadata = _parse_metadata_file(metadata_file_path)
+        for key in ARTIFACT_PATH_KEYS:
+            metadata.pop(key, None)
         results.update(metadata)
-        
-        # Remove the external folder before zipping the main content
-        shutil.rmtree(external_path)
-        print(f"Processed and removed external assets directory: {external_path}")
     else:
         results["message"] = "External assets directory not found after processing."
 
-    # Zip the remaining contents of the tempdir
-    output_zip_path = os.path.join(tempfile.gettempdir(), f"{os.path.basename(tempdir)}_bundle.zip")
+    return results
+
+def iter_workspace_bundle(tempdir: str) -> Iterator[bytes]:
+    """Yields the game bundle zip (the workspace without `external/`) as it is compressed."""
+    return iter_directory_zip(tempdir, exclude=("external",))
+
+def _remove_workspace(tempdir: str) -> None:
     try:
-        with zipfile.ZipFile(output_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(tempdir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # Arcname determines the path inside the zip file
-                    arcname = os.path.relpath(file_path, tempdir)
-                    zipf.write(file_path, arcname)
-        print(f"Zipped workspace contents to: {output_zip_path}")
-        
-        # Encode the generated zip file
-        results["bundle_base64Data"] = read_and_encode(output_zip_path)
+        get_workspace_manager().release(tempdir)
+        logger.info("Cleaned up workspace", extra={"workspace": tempdir})
     except Exception as e:
-        print(f"Error zipping workspace {tempdir}: {e}")
-    finally:
+        logger.error("Error cleaning up workspace %s: %s", tempdir, e)
+
+def collect_workspace(tempdir: str, output_dir: str) -> Dict[str, Optional[str]]:
+    """Collects the workspace artifacts as files in `output_dir` and cleans up.
+
+    The icon and splash are moved to `output_dir/icon.png` and
+    `output_dir/splash.png` and the remaining workspace content is zipped to
+    `output_dir/bundle.zip`, so callers can stream them from disk.
+
+    Args:
+        tempdir: The path to the temporary workspace directory.
+        output_dir: An existing directory that receives the artifacts.
+
+    Returns:
+        A dictionary containing artifact paths (None when missing), status, and message.
+    """
+    results = read_workspace_results(tempdir)
+    results["bundle_path"] = None
+    for asset_name, result_key in (("icon.png", "icon_path"), ("splash.png", "splash_path")):
+        if results[result_key]:
+            results[result_key] = shutil.move(results[result_key], os.path.join(output_dir, asset_name))
+
+    # Zip the game content (everything but external/) of the tempdir
+    output_zip_path = os.path.join(output_dir, "bundle.zip")
+    progress.report("bundle.zipping")
+    try:
+        with span("bundle.zip"), open(output_zip_path, "wb") as f:
+            write_directory_zip(tempdir, f, exclude=("external",))
+        count_bytes("bundle.zip", os.path.getsize(output_zip_path))
+        progress.report("bundle.zipped", bytes=os.path.getsize(output_zip_path))
+        logger.info("Zipped workspace contents", extra={"workspace": tempdir, "path": output_zip_path})
+        results["bundle_path"] = output_zip_path
+    except Exception as e:
+        logger.error("Error zipping workspace %s: %s", tempdir, e)
         if os.path.exists(output_zip_path):
-            os.remove(output_zip_path) # Clean up the final zip file
+            os.remove(output_zip_path)
+
+    _remove_workspace(tempdir)
+    return results
+
+def finalize_workspace(tempdir: str, recorder: Optional[ResultRecorder] = None) -> Dict[str, Optional[str]]:
+    """Finalizes the workspace by collecting assets, zipping, and cleaning up.
+
+    The bundle is base64 encoded chunk by chunk while it is being zipped, so
+    neither an intermediate file nor the raw zip is ever held in full.
+
+    Args:
+        tempdir: The path to the temporary workspace directory.
+        recorder: Also records the icon, splash and bundle for the result
+            cache; the caller commits or discards it.
+
+    Returns:
+        A dictionary containing base64 encoded assets, status, and message.
+    """
+    results = read_workspace_results(tempdir)
+    icon_path = results.pop("icon_path")
+    splash_path = results.pop("splash_path")
+    results["icon_base64Data"] = _read_and_encode(icon_path) if icon_path else None
+    results["splash_base64Data"] = _read_and_encode(splash_path) if splash_path else None
+    results["bundle_base64Data"] = None
+    if recorder is not None:
+        for stored_name, file_path in (("icon.png", icon_path), ("splash.png", splash_path)):
+            if file_path:
+                recorder.add_file(stored_name, file_path)
 
-    # Clean up the entire temporary workspace directory
+    # Zip the game content (everything but external/) of the tempdir
+    progress.report("bundle.zipping")
     try:
-        shutil.rmtree(tempdir)
-        print(f"Cleaned up workspace: {tempdir}")
+        chunks = iter_workspace_bundle(tempdir)
+        if recorder is not None:
+            chunks = recorder.tee("bundle.zip", chunks)
+        with span("bundle.zip_base64"):
+            results["bundle_base64Data"] = _encode_chunks(chunks)
+        progress.report("bundle.zipped")
+        logger.info("Zipped and encoded workspace contents", extra={"workspace": tempdir})
     except Exception as e:
-        print(f"Error cleaning up workspace {tempdir}: {e}")
+        logger.error("Error zipping workspace %s: %s", tempdir, e)
+
+    _remove_workspace(tempdir)
+    return results
 
-    return results 
\ No newline at end of file
+def cleanup_workspace(tempdir: Optional[str]) -> None:
+    """Removes a workspace that was not consumed by finalize_workspace.
+
+    Args:
+        tempdir: The path to the temporary workspace directory, or None.
+    """
+    if tempdir and os.path.exists(tempdir):
+        try:
+            get_workspace_manager().release(tempdir)
+            logger.info("Cleaned up workspace due to error or incomplete finalization", extra={"workspace": tempdir})
+        except Exception as e:
+            logger.error("Error during final workspace cleanup: %s", e)
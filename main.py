@@ -1,11 +1,12 @@
 import datetime
-from google.cloud import storage
-import requests
+import os
 
-project_id
+project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
 # Part 1: Generate a pre-signed URL for uploading
 def generate_upload_signed_url(bucket_name, object_name):
     """Generates a pre-signed URL for uploading a file to GCS."""
+    # Imported here: the GCS client is slow to import and optional for the server
+    from google.cloud import storage
     
     # Initialize the storage client
     storage_client = storage.Client(project=project_id)
@@ -0,0 +1,60 @@
+import pytest
+
+from benchmarks.fake_crew import FakeCrew, FakeCrewConfig
+from lib import artifacts, call_cache, checkpoints, jobs, result_cache, storage, techiecrews, workspace_pool
+
+# Where the app keeps its stores, by the variable that moves them.
+STORE_PATHS = {
+    "GAME_GENERATOR_WORKSPACE_DIR": "workspaces",
+    "GAME_GENERATOR_ARTIFACT_DIR": "artifacts",
+    "GAME_GENERATOR_RESULT_CACHE_DIR": "result-cache",
+    "GAME_GENERATOR_CHECKPOINT_DIR": "checkpoints",
+    "GAME_GENERATOR_STORAGE_DIR": "storage",
+    "GAME_GENERATOR_CALL_CACHE_PATH": "call-cache.sqlite3",
+}
+
+# Process-wide singletons, created again from the environment by each test.
+SINGLETONS = [
+    (workspace_pool, "_workspace_manager"),
+    (artifacts, "_artifact_store"),
+    (result_cache, "_result_cache"),
+    (checkpoints, "_checkpoint_store"),
+    (storage, "_storage_backend"),
+    (call_cache, "_call_cache"),
+    (jobs, "_job_queue"),
+]
+
+
+@pytest.fixture
+def fake_crews(monkeypatch):
+    """Replaces every crew with the benchmark fake, without delays and with small files.
+
+    Returns the FakeCrewConfig, which a test may change before running crews.
+    """
+    config = FakeCrewConfig(
+        hierarchy_delay=0, outline_delay=0, component_delay=0, review_delay=0, html5_delay=0,
+        hierarchy_patch_delay=0, html5_patch_delay=0,
+        hierarchy_bytes=2048, html_bytes=4096, image_bytes=256,
+    )
+    monkeypatch.setattr(
+        techiecrews, "get_crew", lambda crew_name, workspace_path: FakeCrew(crew_name, workspace_path, config),
+    )
+    return config
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, fake_crews):
+    """A test client of the app whose stores all live under tmp_path and whose crews are fakes."""
+    for variable, name in STORE_PATHS.items():
+        monkeypatch.setenv(variable, str(tmp_path / name))
+    monkeypatch.setenv("GAME_GENERATOR_WORKSPACE_JANITOR_INTERVAL", "0")
+    monkeypatch.delenv("GAME_GENERATOR_CALL_CACHE", raising=False)
+    monkeypatch.delenv("GAME_GENERATOR_STORAGE", raising=False)
+    for module, name in SINGLETONS:
+        monkeypatch.setattr(module, name, None)
+    from app import app
+    yield app.test_client()
+    if jobs._job_queue is not None:
+        jobs._job_queue.shutdown()
+    if workspace_pool._workspace_manager is not None:
+        workspace_pool._workspace_manager.shutdown()
@@ -0,0 +1,256 @@
+import io
+import os
+import random
+import zipfile
+import zlib
+
+import pytest
+
+from lib import archives
+from lib.archives import (
+    SEGMENT_SIZE,
+    ZIP_DATE_TIME,
+    BundleLimits,
+    CompressionPolicy,
+    bundle_limits,
+    extract_bundle,
+    find_content_root,
+    iter_directory_zip,
+)
+
+INDEX = b"<html><body>game</body></html>"
+
+
+def _bundle(tmp_path, members, compression=zipfile.ZIP_DEFLATED, name="bundle.zip"):
+    """Writes a zip of `members` (archive name to bytes) into tmp_path; returns its path."""
+    path = tmp_path / name
+    with zipfile.ZipFile(path, "w", compression) as zipf:
+        for arcname, content in members.items():
+            zipf.writestr(zipfile.ZipInfo(arcname), content, compress_type=compression)
+    return path
+
+
+def _extract(tmp_path, bundle_path, limits=None):
+    target = tmp_path / "target"
+    target.mkdir(exist_ok=True)
+    with open(bundle_path, "rb") as stream:
+        return sorted(extract_bundle(stream, str(target), limits or BundleLimits())), target
+
+
+def _tree(target):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), target).replace(os.sep, "/")
+        for root, _, files in os.walk(target) for name in files
+    )
+
+
+def test_extracts_the_content_root_of_the_shallowest_index(tmp_path):
+    bundle = _bundle(tmp_path, {
+        "export/game/index.html": INDEX,
+        "export/game/js/app.js": b"start();",
+        "export/game/levels/index.html": b"<html>level</html>",
+        "export/notes.txt": b"outside the root",
+    })
+    extracted, target = _extract(tmp_path, bundle)
+    assert extracted == ["index.html", "js/app.js", "levels/index.html"]
+    assert _tree(target) == extracted
+    assert (target / "js" / "app.js").read_bytes() == b"start();"
+
+
+def test_extracts_from_an_unseekable_stream(tmp_path):
+    data = _bundle(tmp_path, {"index.html": INDEX}).read_bytes()
+
+    class Unseekable(io.RawIOBase):
+        def __init__(self):
+            self._source = io.BytesIO(data)
+
+        def readable(self):
+            return True
+
+        def seekable(self):
+            return False
+
+        def readinto(self, buffer):
+            chunk = self._source.read(len(buffer))
+            buffer[:len(chunk)] = chunk
+            return len(chunk)
+
+    assert extract_bundle(Unseekable(), str(tmp_path), BundleLimits()) == ["index.html"]
+    assert (tmp_path / "index.html").read_bytes() == INDEX
+
+
+def test_find_content_root_prefers_the_shallowest_then_first_name():
+    assert find_content_root(["b/index.html", "a/index.html", "a/b/c/index.html"]) == "a/"
+    assert find_content_root(["index.html", "game/index.html"]) == ""
+    with pytest.raises(ValueError, match="does not contain an 'index.html'"):
+        find_content_root(["game.html"])
+
+
+def test_rejects_a_bundle_without_index(tmp_path):
+    with pytest.raises(ValueError, match="does not contain an 'index.html'"):
+        _extract(tmp_path, _bundle(tmp_path, {"game.html": INDEX}))
+
+
+def test_rejects_data_that_is_not_a_zip(tmp_path):
+    path = tmp_path / "bundle.zip"
+    path.write_bytes(b"not a zip at all")
+    with pytest.raises(ValueError, match="Not a valid zip file"):
+        _extract(tmp_path, path)
+
+
+@pytest.mark.parametrize("arcname", ["../escape.js", "js/../../escape.js", "C:/escape.js"])
+def test_rejects_member_paths_that_escape_the_target(tmp_path, arcname):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, arcname: b"evil"})
+    with pytest.raises(ValueError, match="unsafe member path"):
+        _extract(tmp_path, bundle)
+    assert _tree(tmp_path / "target") == []
+    assert not (tmp_path / "escape.js").exists()
+
+
+def test_keeps_absolute_member_paths_inside_the_target(tmp_path):
+    _, target = _extract(tmp_path, _bundle(tmp_path, {"index.html": INDEX, "/js/app.js": b"start();"}))
+    assert _tree(target) == ["index.html", "js/app.js"]
+
+
+def test_rejects_a_file_that_another_member_uses_as_a_directory(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, "assets": b"a file", "assets/sprite.png": b"png"})
+    with pytest.raises(ValueError, match="'assets' is both a file and the directory of 'assets/sprite.png'"):
+        _extract(tmp_path, bundle)
+    assert _tree(tmp_path / "target") == []
+
+
+def test_rejects_too_many_entries(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, **{f"js/{index}.js": b"x" for index in range(4)}})
+    with pytest.raises(ValueError, match="too many entries: 5, the limit is 4"):
+        _extract(tmp_path, bundle, BundleLimits(max_entries=4))
+    assert len(_extract(tmp_path, bundle, BundleLimits(max_entries=5))[0]) == 5
+
+
+def test_rejects_an_archive_larger_than_the_limit(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX})
+    size = bundle.stat().st_size
+    with pytest.raises(ValueError, match=f"too large: {size} bytes"):
+        _extract(tmp_path, bundle, BundleLimits(max_archive_bytes=size - 1))
+
+
+def test_rejects_a_bundle_that_expands_past_the_limit(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, "data.bin": os.urandom(4096)})
+    with pytest.raises(ValueError, match=f"expands to {4096 + len(INDEX)} bytes"):
+        _extract(tmp_path, bundle, BundleLimits(max_uncompressed_bytes=4096))
+
+
+def test_rejects_a_member_with_a_zip_bomb_ratio(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, "bomb.txt": bytes(2 * 1024 ** 2)})
+    with pytest.raises(ValueError, match="member 'bomb.txt' has a suspicious compression ratio"):
+        _extract(tmp_path, bundle)
+    assert _tree(tmp_path / "target") == []
+
+
+def test_rejects_many_small_members_with_a_zip_bomb_ratio(tmp_path):
+    members = {f"part{index}.txt": bytes(512 * 1024) for index in range(4)}
+    bundle = _bundle(tmp_path, {"index.html": INDEX, **members})
+    with pytest.raises(ValueError, match="Game bundle has a suspicious compression ratio"):
+        _extract(tmp_path, bundle)
+
+
+def test_small_members_may_compress_past_the_ratio(tmp_path):
+    extracted, _ = _extract(tmp_path, _bundle(tmp_path, {"index.html": INDEX, "padding.txt": bytes(64 * 1024)}))
+    assert extracted == ["index.html", "padding.txt"]
+
+
+def test_zero_limits_disable_their_checks(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, "bomb.txt": bytes(2 * 1024 ** 2)})
+    limits = BundleLimits(max_archive_bytes=0, max_uncompressed_bytes=0, max_entries=0, max_ratio=0)
+    assert _extract(tmp_path, bundle, limits)[0] == ["bomb.txt", "index.html"]
+
+
+def test_rejects_a_corrupt_member(tmp_path):
+    bundle = _bundle(tmp_path, {"index.html": INDEX, "app.js": b"start the game"}, zipfile.ZIP_STORED)
+    bundle.write_bytes(bundle.read_bytes().replace(b"start the game", b"start the gamf"))
+    with pytest.raises(ValueError, match="cannot extract 'app.js'"):
+        _extract(tmp_path, bundle)
+
+
+def test_bundle_limits_read_the_environment(monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_BUNDLE_MAX_BYTES", "10")
+    monkeypatch.setenv("GAME_GENERATOR_BUNDLE_MAX_UNCOMPRESSED_BYTES", "20")
+    monkeypatch.setenv("GAME_GENERATOR_BUNDLE_MAX_ENTRIES", "30")
+    monkeypatch.setenv("GAME_GENERATOR_BUNDLE_MAX_RATIO", "40.5")
+    limits = bundle_limits()
+    assert (limits.max_archive_bytes, limits.max_uncompressed_bytes, limits.max_entries, limits.max_ratio) == \
+        (10, 20, 30, 40.5)
+
+
+def _game_dir(tmp_path):
+    """Writes a game directory whose files compress differently at each level; returns its path and files."""
+    rng = random.Random(0)
+    words = [bytes(rng.choice(b"abcdefghij") for _ in range(rng.randint(2, 9))) for _ in range(500)]
+    text = b" ".join(rng.choice(words) for _ in range(SEGMENT_SIZE // 3))
+    files = {
+        "index.html": INDEX,
+        "js/game.js": text[:SEGMENT_SIZE * 2 // 3] * 4,
+        "js/tiny.js": b"x()",
+        "assets/sprite.png": os.urandom(4096),
+        "levels/one.json": text[:200000],
+        "external/icon.png": b"excluded",
+    }
+    for name, content in files.items():
+        path = tmp_path / "game" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    del files["external/icon.png"]
+    return tmp_path / "game", files
+
+
+def _zip(source_dir, policy):
+    return b"".join(iter_directory_zip(str(source_dir), exclude=("external",), policy=policy))
+
+
+def _read_zip(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.testzip() is None
+        return zipf.infolist(), {info.filename: zipf.read(info) for info in zipf.infolist()}
+
+
+def test_the_policy_picks_a_method_and_level_per_file():
+    policy = CompressionPolicy(levels={".html": 9, ".wav": 0}, min_deflate_bytes=128, large_file_bytes=1000)
+    assert policy.method_for("sprite.PNG", 500) == (zipfile.ZIP_STORED, 0)
+    assert policy.method_for("tiny.js", 127) == (zipfile.ZIP_STORED, 0)
+    assert policy.method_for("index.html", 5000) == (zipfile.ZIP_DEFLATED, 9)
+    assert policy.method_for("sound.wav", 500) == (zipfile.ZIP_STORED, 0)
+    assert policy.method_for("game.js", 500) == (zipfile.ZIP_DEFLATED, 6)
+    assert policy.method_for("game.js", 1000) == (zipfile.ZIP_DEFLATED, 1)
+
+
+def test_a_directory_zip_round_trips_with_fixed_metadata(tmp_path):
+    source_dir, files = _game_dir(tmp_path)
+    infos, contents = _read_zip(_zip(source_dir, CompressionPolicy()))
+    assert contents == files
+    assert [info.filename for info in infos] == sorted(files)
+    assert {info.date_time for info in infos} == {ZIP_DATE_TIME}
+    methods = {info.filename: info.compress_type for info in infos}
+    assert methods["assets/sprite.png"] == methods["js/tiny.js"] == zipfile.ZIP_STORED
+    assert methods["js/game.js"] == zipfile.ZIP_DEFLATED
+
+
+def test_parallel_compression_gives_the_same_bytes(tmp_path):
+    source_dir, files = _game_dir(tmp_path)
+    single = _zip(source_dir, CompressionPolicy(threads=1))
+    parallel = _zip(source_dir, CompressionPolicy(threads=4, parallel_min_bytes=0))
+    assert parallel == single
+    assert _read_zip(parallel)[1] == files
+
+
+def test_zip64_bundles_apply_the_level_of_each_member(tmp_path, monkeypatch):
+    monkeypatch.setattr(archives, "_ZIP32_MAX_ENTRIES", 0)
+    source_dir, files = _game_dir(tmp_path)
+    policy = CompressionPolicy(default_level=1, levels={".json": 9})
+    infos, contents = _read_zip(_zip(source_dir, policy))
+    assert contents == files
+    by_name = {info.filename: info for info in infos}
+    assert by_name["assets/sprite.png"].compress_type == zipfile.ZIP_STORED
+    for name, level in (("js/game.js", 1), ("levels/one.json", 9)):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        expected = len(compressor.compress(files[name]) + compressor.flush())
+        assert by_name[name].compress_type == zipfile.ZIP_DEFLATED
+        assert by_name[name].compress_size == expected, name
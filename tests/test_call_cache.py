@@ -0,0 +1,195 @@
+from types import SimpleNamespace
+
+import pytest
+
+from lib import call_cache, techiecrews
+from lib.call_cache import (
+    KIND_LLM,
+    CallCache,
+    CallCacheMiss,
+    CallCacheUnsupported,
+    call_key,
+    install,
+)
+
+MESSAGES = [{"role": "user", "content": "Write the game hierarchy."}]
+
+
+class FakeLLM:
+    """An LLM client answering from a counter, so every live call gives a new answer."""
+
+    def __init__(self, model="gpt-test"):
+        self.model = model
+        self.temperature = 0.2
+        self.stop = None
+        self.live = []
+
+    def call(self, messages, callbacks=None, **kwargs):
+        self.live.append(messages)
+        return f"answer {len(self.live)}"
+
+
+class FakeTool:
+    def __init__(self, name):
+        self.name = name
+        self.live = []
+
+    def _run(self, *args, **kwargs):
+        self.live.append((args, kwargs))
+        return f"{self.name} result {len(self.live)}"
+
+
+class SealedLLM:
+    """An LLM client that refuses new attributes, like a frozen model object."""
+
+    __slots__ = ()
+
+    def call(self, messages, callbacks=None):
+        raise AssertionError("called the model")
+
+
+def _agents(llm, *tools):
+    return {"designer": SimpleNamespace(llm=llm, tools=list(tools))}
+
+
+@pytest.fixture
+def use_cache(tmp_path, monkeypatch):
+    """Sets the call cache mode and returns a fresh CallCache on one database file for it."""
+    path = str(tmp_path / "calls.sqlite3")
+
+    def use(mode, max_bytes=1024 ** 2):
+        monkeypatch.setenv("GAME_GENERATOR_CALL_CACHE", mode)
+        cache = CallCache(path, max_bytes, replay=mode == call_cache.MODE_REPLAY)
+        monkeypatch.setattr(call_cache, "_call_cache", cache)
+        return cache
+    return use
+
+
+def test_cache_mode_records_calls_and_answers_repeats_from_the_store(use_cache):
+    cache = use_cache(call_cache.MODE_CACHE)
+    llm, examples, writer = FakeLLM(), FakeTool("read_examples_html"), FakeTool("write_file")
+    install(_agents(llm, examples, writer))
+    assert llm.call(MESSAGES) == llm.call(MESSAGES) == "answer 1"
+    assert llm.call(MESSAGES + [{"role": "user", "content": "Again."}]) == "answer 2"
+    assert examples._run("platformer") == examples._run("platformer") == "read_examples_html result 1"
+    # Workspace tools always run
+    writer._run("game.html", "<html>")
+    writer._run("game.html", "<html>")
+    assert len(llm.live) == 2 and len(examples.live) == 1 and len(writer.live) == 2
+    assert cache.stats() == {"hits": 2, "misses": 3, "stores": 3, "evictions": 0}
+
+
+def test_cache_mode_runs_calls_that_pass_tools_without_recording_them(use_cache):
+    cache = use_cache(call_cache.MODE_CACHE)
+    llm = FakeLLM()
+    install(_agents(llm))
+    assert llm.call(MESSAGES, tools=[{"name": "search"}]) == "answer 1"
+    assert llm.call(MESSAGES, tools=[{"name": "search"}]) == "answer 2"
+    assert cache.stats()["stores"] == 0
+
+
+def test_the_key_covers_the_model_and_its_settings(use_cache):
+    use_cache(call_cache.MODE_CACHE)
+    first, other_model, warmer = FakeLLM(), FakeLLM("gpt-other"), FakeLLM()
+    warmer.temperature = 0.9
+    install({"a": SimpleNamespace(llm=first), "b": SimpleNamespace(llm=other_model), "c": SimpleNamespace(llm=warmer)})
+    for llm in (first, other_model, warmer):
+        llm.call(MESSAGES)
+    assert [len(llm.live) for llm in (first, other_model, warmer)] == [1, 1, 1]
+
+
+def test_replay_mode_answers_recorded_calls_and_never_calls_live(use_cache):
+    use_cache(call_cache.MODE_CACHE)
+    agents = _agents(FakeLLM(), FakeTool("search_sound"))
+    install(agents)
+    agents["designer"].llm.call(MESSAGES)
+    agents["designer"].tools[0]._run(query="jump")
+
+    # A new process replaying the same database
+    cache = use_cache(call_cache.MODE_REPLAY)
+    llm, sounds = FakeLLM(), FakeTool("search_sound")
+    install(_agents(llm, sounds))
+    assert llm.call(MESSAGES) == "answer 1"
+    assert sounds._run(query="jump") == "search_sound result 1"
+    with pytest.raises(CallCacheMiss, match="No recorded llm call of gpt-test"):
+        llm.call([{"role": "user", "content": "Something new."}])
+    with pytest.raises(CallCacheMiss, match="No recorded tool call of search_sound"):
+        sounds._run(query="coin")
+    with pytest.raises(CallCacheMiss, match="pass tools or functions cannot be replayed"):
+        llm.call(MESSAGES, tools=[{"name": "search"}])
+    assert llm.live == [] and sounds.live == []
+    assert cache.stats()["stores"] == 0
+
+
+@pytest.mark.parametrize("llm", ["gpt-test", SealedLLM(), SimpleNamespace(model="gpt-test")])
+def test_replay_mode_refuses_llm_clients_it_cannot_wrap(use_cache, llm):
+    use_cache(call_cache.MODE_REPLAY)
+    with pytest.raises(CallCacheUnsupported, match="LLM client of agent designer"):
+        install(_agents(llm))
+
+
+def test_cache_mode_leaves_llm_clients_it_cannot_wrap_calling_the_model(use_cache):
+    use_cache(call_cache.MODE_CACHE)
+    install(_agents("gpt-test"))
+    sealed = SealedLLM()
+    install(_agents(sealed))
+    with pytest.raises(AssertionError, match="called the model"):
+        sealed.call(MESSAGES)
+
+
+def test_replay_mode_refuses_cacheable_tools_it_cannot_wrap(use_cache):
+    use_cache(call_cache.MODE_REPLAY)
+    sealed = SimpleNamespace(name="search_sound")
+    with pytest.raises(CallCacheUnsupported, match="search_sound tool of agent designer"):
+        install(_agents(FakeLLM(), sealed))
+
+
+def test_a_client_shared_by_several_agents_is_wrapped_once(use_cache):
+    cache = use_cache(call_cache.MODE_CACHE)
+    llm = FakeLLM()
+    install({"designer": SimpleNamespace(llm=llm), "tester": SimpleNamespace(llm=llm)})
+    install({"reviewer": SimpleNamespace(llm=llm)})
+    llm.call(MESSAGES)
+    llm.call(MESSAGES)
+    assert cache.stats() == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+
+def test_install_does_nothing_when_the_cache_is_off(monkeypatch):
+    monkeypatch.delenv("GAME_GENERATOR_CALL_CACHE", raising=False)
+    llm = FakeLLM()
+    install(_agents(llm))
+    llm.call(MESSAGES)
+    llm.call(MESSAGES)
+    assert len(llm.live) == 2 and call_cache.get_call_cache() is None
+
+
+def test_only_text_results_are_recorded(tmp_path):
+    cache = CallCache(str(tmp_path / "calls.sqlite3"), 1024)
+    assert cache.call("tool", "search_sound", {}, lambda: ["not", "text"]) == ["not", "text"]
+    assert cache.stats()["stores"] == 0
+
+
+def test_the_least_recently_used_results_are_evicted(tmp_path):
+    cache = CallCache(str(tmp_path / "calls.sqlite3"), max_bytes=2)
+    keys = [call_key(KIND_LLM, "gpt-test", name) for name in "abc"]
+    cache.put(keys[0], KIND_LLM, "gpt-test", "a")
+    cache.put(keys[1], KIND_LLM, "gpt-test", "b")
+    assert cache.get(keys[0]) == "a"
+    cache.put(keys[2], KIND_LLM, "gpt-test", "c")
+    assert [cache.get(key) for key in keys] == ["a", None, "c"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_an_unknown_mode_is_refused(monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_CALL_CACHE", "record")
+    with pytest.raises(ValueError, match="Unsupported GAME_GENERATOR_CALL_CACHE: record"):
+        call_cache.call_cache_mode()
+
+
+def test_a_request_replay_cannot_serve_answers_503(client, monkeypatch):
+    def get_crew(crew_name, workspace_path):
+        raise CallCacheUnsupported("The LLM client of agent designer (str) cannot be replayed")
+    monkeypatch.setattr(techiecrews, "get_crew", get_crew)
+    response = client.post("/v1/generate_game", json={"request": "a runner"})
+    assert response.status_code == 503
+    assert response.json["error"].startswith("The call cache cannot replay this request:")
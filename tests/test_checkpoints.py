@@ -0,0 +1,201 @@
+import os
+import shutil
+import time
+import uuid
+
+import pytest
+
+from lib import checkpoints, jobs, techiecrews
+from lib.checkpoints import CheckpointStore
+from lib.jobs import TERMINAL_STATUSES
+
+# Seconds a test waits for a job to finish.
+WAIT = 5
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints"), ttl=60)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    workspace_path = tmp_path / "workspace"
+    (workspace_path / "external").mkdir(parents=True)
+    (workspace_path / "game_hierarchy.xml").write_text("<Game/>", encoding="utf-8")
+    (workspace_path / "external" / "icon.png").write_bytes(b"png")
+    return workspace_path
+
+
+def _files(path):
+    return {
+        os.path.relpath(os.path.join(root, name), path): open(os.path.join(root, name), "rb").read()
+        for root, _, names in os.walk(path) for name in names
+    }
+
+
+def test_a_saved_stage_restores_into_an_empty_workspace(store, workspace, tmp_path):
+    checkpoint_id = str(uuid.uuid4())
+    store.save(checkpoint_id, "prepared", str(workspace), kind="generate_game", request="a runner")
+    (workspace / "game_hierarchy.xml").write_text("<Game><Player/></Game>", encoding="utf-8")
+    store.save(checkpoint_id, "hierarchy", str(workspace))
+    info = store.info(checkpoint_id)
+    assert info["stages"] == ["prepared", "hierarchy"]
+    assert (info["kind"], info["request"]) == ("generate_game", "a runner")
+
+    restored = tmp_path / "restored"
+    restored.mkdir()
+    store.restore(checkpoint_id, "prepared", str(restored))
+    assert _files(restored) == {"game_hierarchy.xml": b"<Game/>", os.path.join("external", "icon.png"): b"png"}
+    store.restore(checkpoint_id, "hierarchy", str(restored))
+    assert (restored / "game_hierarchy.xml").read_text(encoding="utf-8") == "<Game><Player/></Game>"
+
+
+def test_saving_a_stage_again_replaces_it_and_moves_it_last(store, workspace, tmp_path):
+    checkpoint_id = str(uuid.uuid4())
+    for stage in ("prepared", "hierarchy", "html5"):
+        store.save(checkpoint_id, stage, str(workspace))
+    (workspace / "game.html").write_text("rebuilt", encoding="utf-8")
+    store.save(checkpoint_id, "hierarchy", str(workspace))
+    assert store.stages(checkpoint_id) == ["prepared", "html5", "hierarchy"]
+    restored = tmp_path / "restored"
+    restored.mkdir()
+    store.restore(checkpoint_id, "hierarchy", str(restored))
+    assert (restored / "game.html").read_text(encoding="utf-8") == "rebuilt"
+
+
+def test_a_failed_copy_keeps_the_previous_checkpoint_of_the_stage(store, workspace, monkeypatch, tmp_path):
+    checkpoint_id = str(uuid.uuid4())
+    store.save(checkpoint_id, "hierarchy", str(workspace))
+    copytree = shutil.copytree
+
+    def interrupted(source, target, *args, **kwargs):
+        copytree(source, target, *args, **kwargs)
+        if source == str(workspace): # Not the copies of subdirectories
+            os.remove(os.path.join(target, "game_hierarchy.xml"))
+            raise OSError("disk full")
+    monkeypatch.setattr(checkpoints.shutil, "copytree", interrupted)
+    (workspace / "game_hierarchy.xml").write_text("<Game><Player/></Game>", encoding="utf-8")
+    with pytest.raises(OSError, match="disk full"):
+        store.save(checkpoint_id, "hierarchy", str(workspace))
+    monkeypatch.setattr(checkpoints.shutil, "copytree", copytree)
+
+    # No staging copy is left and the stage still holds the first save, whole
+    assert sorted(os.listdir(os.path.join(store.root, checkpoint_id))) == ["checkpoint.json", "hierarchy"]
+    restored = tmp_path / "restored"
+    restored.mkdir()
+    store.restore(checkpoint_id, "hierarchy", str(restored))
+    assert (restored / "game_hierarchy.xml").read_text(encoding="utf-8") == "<Game/>"
+
+
+def test_unknown_stages_and_ids(store, workspace, tmp_path):
+    checkpoint_id = str(uuid.uuid4())
+    store.save(checkpoint_id, "prepared", str(workspace))
+    with pytest.raises(KeyError, match="No checkpoint for stage 'hierarchy'"):
+        store.restore(checkpoint_id, "hierarchy", str(tmp_path))
+    # Ids are UUIDs, so they cannot name a path outside the root
+    assert store.info("../checkpoints") is None and store.stages(str(uuid.uuid4())) == []
+    with pytest.raises(ValueError, match="Invalid checkpoint id"):
+        store.save("../escape", "prepared", str(workspace))
+
+
+def test_discard_removes_every_stage(store, workspace):
+    checkpoint_id = str(uuid.uuid4())
+    store.save(checkpoint_id, "prepared", str(workspace))
+    store.discard(checkpoint_id)
+    assert store.info(checkpoint_id) is None and os.listdir(store.root) == []
+    store.discard(checkpoint_id)
+    store.discard("not-a-uuid")
+
+
+def test_checkpoints_unsaved_for_the_ttl_are_purged(store, workspace):
+    expired, kept = str(uuid.uuid4()), str(uuid.uuid4())
+    store.save(expired, "prepared", str(workspace))
+    store.save(kept, "prepared", str(workspace))
+    old = time.time() - store.ttl - 1
+    os.utime(os.path.join(store.root, expired), (old, old))
+    store.purge_expired()
+    assert os.listdir(store.root) == [kept]
+
+
+def test_the_store_is_configured_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, "_checkpoint_store", None)
+    monkeypatch.setenv("GAME_GENERATOR_CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setenv("GAME_GENERATOR_CHECKPOINT_TTL", "30")
+    store = checkpoints.get_checkpoint_store()
+    assert (store.root, store.ttl) == (str(tmp_path), 30)
+
+
+def _finished(client, job_id):
+    deadline = time.time() + WAIT
+    while True:
+        body = client.get(f"/v1/jobs/{job_id}").json
+        if body["status"] in TERMINAL_STATUSES:
+            return body
+        assert time.time() < deadline, f"job stayed {body['status']}"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def crews(monkeypatch, fake_crews):
+    """Records the crews run by the fake; html5_crew fails while `failing` holds True."""
+    fake_get_crew = techiecrews.get_crew
+    runs, failing = [], [True]
+
+    def get_crew(crew_name, workspace_path):
+        runs.append(crew_name)
+        if crew_name == "html5_crew" and failing[0]:
+            raise RuntimeError("html5 crew failed")
+        return fake_get_crew(crew_name, workspace_path)
+    monkeypatch.setattr(techiecrews, "get_crew", get_crew)
+    return runs, failing
+
+
+def test_a_retry_resumes_from_the_stored_stage(client, crews):
+    runs, failing = crews
+    job_id = client.post("/v1/jobs/generate_game", json={"request": "a runner"}).json["job_id"]
+    failed = _finished(client, job_id)
+    assert failed["status"] == "failed" and failed["error"] == "html5 crew failed"
+    assert failed["checkpoint_stages"] == ["prepared", "hierarchy"]
+
+    failing[0] = False
+    del runs[:]
+    response = client.post(f"/v1/jobs/{job_id}/retry")
+    assert response.status_code == 202 and response.json["checkpoint_id"] == job_id
+    retried = _finished(client, response.json["job_id"])
+    assert retried["status"] == "succeeded"
+    assert runs == ["html5_crew"]
+    assert retried["checkpoint_stages"] == ["prepared", "hierarchy", "html5"]
+    result = client.get(f"/v1/jobs/{retried['job_id']}/result")
+    assert result.status_code == 200 and result.json["status"] == "success"
+    assert "X-Cache" not in result.headers
+
+    # Every stage is stored now, so a retry has to name the stage to run again
+    response = client.post(f"/v1/jobs/{retried['job_id']}/retry")
+    assert response.status_code == 409 and response.json["stages"] == ["hierarchy", "html5"]
+    del runs[:]
+    response = client.post(f"/v1/jobs/{retried['job_id']}/retry", json={"from_stage": "hierarchy"})
+    assert _finished(client, response.json["job_id"])["status"] == "succeeded"
+    assert runs == ["hierarchy_crew_v2", "html5_crew"]
+
+
+def test_a_retry_needs_a_finished_job_with_a_usable_checkpoint(client, crews):
+    assert client.post(f"/v1/jobs/{uuid.uuid4()}/retry").status_code == 404
+    job_id = client.post("/v1/jobs/generate_game", json={"request": "a runner"}).json["job_id"]
+    _finished(client, job_id)
+    response = client.post(f"/v1/jobs/{job_id}/retry", json={"from_stage": "polish"})
+    assert response.status_code == 400 and "Unknown stage 'polish'" in response.json["error"]
+
+    job = jobs.get_job_queue().get(job_id)
+    checkpoints.get_checkpoint_store().discard(job.checkpoint_id)
+    response = client.post(f"/v1/jobs/{job_id}/retry")
+    assert response.status_code == 404 and "No checkpoint stored" in response.json["error"]
+
+
+def test_a_running_job_cannot_be_retried(client):
+    running = jobs.get_job_queue().submit("generate_game", lambda job: time.sleep(0.2))
+    try:
+        response = client.post(f"/v1/jobs/{running.id}/retry")
+        assert response.status_code == 409 and "is still" in response.json["error"]
+    finally:
+        _finished(client, running.id)
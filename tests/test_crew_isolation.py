@@ -0,0 +1,135 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import lib.techiecrews as techiecrews
+
+CREWS = 16
+
+DEFINITIONS = {
+    "crews.yml": "isolation_crew:\n  agents: [writer, reviewer]\n  tasks: [write, review]\n",
+    "agents.yml": "writer:\n  tools: [write_file, read_file]\nreviewer:\n  tools: [read_file]\n",
+    "tasks.yml": "write:\n  agent: writer\nreview:\n  agent: reviewer\n",
+}
+
+
+class FakeTool:
+    """Stands in for a techies file tool, which resolves paths against `base_dir`."""
+
+    def __init__(self, name):
+        self.name = name
+        self.base_dir = None
+
+
+# techies hands out one shared set of tool instances per process.
+SHARED_TOOLS = {"write_file": FakeTool("write_file"), "read_file": FakeTool("read_file")}
+
+
+class FakeAgent:
+    def __init__(self, name, tools):
+        self.name = name
+        self.tools = tools
+
+
+class FakeTask:
+    def __init__(self, name, agent):
+        self.name = name
+        self.agent = agent
+
+
+class UncopyableAgent(FakeAgent):
+    def __deepcopy__(self, memo):
+        raise TypeError("cannot copy an LLM client")
+
+
+class FakeCrew:
+    def __init__(self, crew_name, agent_pool, task_pool, introduce_only=False):
+        self.crew_name = crew_name
+        self.agent_pool = agent_pool
+        self.task_pool = task_pool
+
+
+def _load_agents(agent_class):
+    def eager_load_all(tools):
+        definitions = techiecrews.load_definitions(techiecrews.get_registry().runtime_dir)["agents"]
+        return {
+            name: agent_class(name, [tools[tool_name] for tool_name in definition["tools"]])
+            for name, definition in definitions.items()
+        }
+    return staticmethod(eager_load_all)
+
+
+def _load_tasks(agent_pool):
+    return {"write": FakeTask("write", agent_pool["writer"]), "review": FakeTask("review", agent_pool["reviewer"])}
+
+
+@pytest.fixture
+def fake_runtime(tmp_path, monkeypatch):
+    runtime_dir = tmp_path / "runtime"
+    (runtime_dir / "isolation_crew").mkdir(parents=True)
+    for file_name, content in DEFINITIONS.items():
+        (runtime_dir / "isolation_crew" / file_name).write_text(content, encoding="utf-8")
+    monkeypatch.delenv("GAME_GENERATOR_CALL_CACHE", raising=False)
+    monkeypatch.setattr(techiecrews, "get_all_tools", lambda: SHARED_TOOLS)
+    monkeypatch.setattr(techiecrews, "get_context_tools", lambda: {})
+    monkeypatch.setattr(techiecrews, "Agent", type("Agent", (), {"eager_load_all": _load_agents(FakeAgent)}))
+    monkeypatch.setattr(techiecrews, "Task", type("Task", (), {"eager_load_all": staticmethod(_load_tasks)}))
+    monkeypatch.setattr(techiecrews, "Crew", FakeCrew)
+    monkeypatch.setattr(techiecrews, "_registry", techiecrews.CrewRegistry(runtime_dir=str(runtime_dir)))
+    return tmp_path
+
+
+def _build_concurrently(workspace_root):
+    """Builds CREWS crews at once, each for its own workspace; returns (workspace, crew) pairs."""
+    workspaces = [str(workspace_root / f"workspace{index}") for index in range(CREWS)]
+    for workspace_path in workspaces:
+        os.makedirs(workspace_path)
+    barrier = threading.Barrier(CREWS)
+
+    def build(workspace_path):
+        barrier.wait()
+        return workspace_path, techiecrews.get_crew("isolation_crew", workspace_path)
+
+    with ThreadPoolExecutor(max_workers=CREWS) as pool:
+        return list(pool.map(build, workspaces))
+
+
+def _assert_isolated(crews):
+    seen_tools = set()
+    for workspace_path, crew in crews:
+        for agent in crew.agent_pool.values():
+            for tool in agent.tools:
+                assert tool.base_dir == workspace_path, f"{agent.name}.{tool.name} is bound to {tool.base_dir}"
+        tools = _crew_tools(crew)
+        assert not {id(tool) for tool in tools} & seen_tools, "a tool is shared between crews"
+        seen_tools |= {id(tool) for tool in tools}
+        for task in crew.task_pool.values():
+            assert task.agent is crew.agent_pool[task.agent.name], f"task {task.name} points at another crew's agent"
+    for tool in SHARED_TOOLS.values():
+        assert tool.base_dir is None, "a crew rebound the shared techies tools"
+
+
+def _crew_tools(crew):
+    return {tool for agent in crew.agent_pool.values() for tool in agent.tools}
+
+
+def test_concurrent_crews_bind_every_tool_to_their_own_workspace(fake_runtime):
+    _assert_isolated(_build_concurrently(fake_runtime))
+
+
+def test_agents_of_one_crew_share_its_tool_copies(fake_runtime):
+    workspace_path, crew = _build_concurrently(fake_runtime)[0]
+    writer_read = next(tool for tool in crew.agent_pool["writer"].tools if tool.name == "read_file")
+    reviewer_read = crew.agent_pool["reviewer"].tools[0]
+    assert writer_read is reviewer_read
+    assert writer_read.base_dir == workspace_path
+
+
+def test_crews_built_without_copying_are_isolated_too(fake_runtime, monkeypatch):
+    monkeypatch.setattr(techiecrews, "Agent", type("Agent", (), {"eager_load_all": _load_agents(UncopyableAgent)}))
+    before = techiecrews.CREW_INSTANTIATIONS_TOTAL.value(method="build")
+    crews = _build_concurrently(fake_runtime)
+    _assert_isolated(crews)
+    assert techiecrews.CREW_INSTANTIATIONS_TOTAL.value(method="build") - before == CREWS
@@ -0,0 +1,191 @@
+import os
+import uuid
+
+import pytest
+
+from app.usecases import customize_game as customize_usecase
+from app.usecases import pipeline
+from app.usecases.customize_game import MODE_FULL, MODE_INCREMENTAL, customize_game, default_customize_mode
+from app.usecases.hierarchy_expansion import SINGLE_CREW
+from lib import checkpoints, workspace_pool
+from lib.checkpoints import CheckpointStore
+from lib.hierarchy import HIERARCHY_FILE, changed_components, parse_hierarchy, select_components
+
+HIERARCHY = """<Game>
+  <Description>A runner on rooftops.</Description>
+  <Player><Description>Runs and jumps.</Description><Movement speed="slow"/></Player>
+  <Enemy><Description>A drone that chases the player.</Description></Enemy>
+  <Screen><Description>Main menu with a start button.</Description></Screen>
+  <Screen><Description>Game over with the final score.</Description></Screen>
+</Game>
+"""
+GAME = "<html><body><script>run();</script></body></html>"
+
+
+def test_select_components_picks_the_best_matching_components():
+    root = parse_hierarchy(HIERARCHY)
+    assert select_components(root, "make the player movement faster") == ["Player"]
+    assert select_components(root, "add a pause button to the screens") == ["Screen[1]", "Screen[2]"]
+    # Terms of the descriptions count too: "drone" is only in the Enemy's
+    assert select_components(root, "a faster drone") == ["Enemy"]
+
+
+def test_select_components_refuses_requests_it_cannot_scope():
+    root = parse_hierarchy(HIERARCHY)
+    assert select_components(root, "make it better") == []
+    assert select_components(root, "") == []
+    # Touches every component, more than half of them
+    assert select_components(root, "recolor the player, the enemy, the menu screen and the score screen") == []
+    assert select_components(root, "recolor the player and the enemy", max_share=0.25) == []
+
+
+def test_changed_components_ignores_whitespace():
+    before = parse_hierarchy(HIERARCHY)
+    reformatted = parse_hierarchy(HIERARCHY.replace("\n  ", "\n        "))
+    assert changed_components(before, reformatted) == []
+    enemy = "<Enemy><Description>A drone that chases the player.</Description></Enemy>"
+    patched = parse_hierarchy(HIERARCHY.replace('speed="slow"', 'speed="fast"').replace(enemy, ""))
+    assert changed_components(before, patched) == ["Player", "Enemy"]
+
+
+def test_the_full_pipeline_is_the_default_mode(monkeypatch):
+    monkeypatch.delenv("GAME_GENERATOR_CUSTOMIZE_MODE", raising=False)
+    assert default_customize_mode() == MODE_FULL
+    monkeypatch.setenv("GAME_GENERATOR_CUSTOMIZE_MODE", MODE_INCREMENTAL)
+    assert default_customize_mode() == MODE_INCREMENTAL
+
+
+class ScriptedCrews:
+    """Stands in for pipeline.run_crew, recording each crew with the files it found.
+
+    Args:
+        patched_hierarchy: What hierarchy_patch_crew writes, or None to leave
+            game_hierarchy.xml as it is.
+        patched_game: What html5_patch_crew writes to game.html.
+        store: A CheckpointStore whose stages are recorded with each crew.
+    """
+
+    def __init__(self, patched_hierarchy=None, patched_game="<html>patched</html>", store=None):
+        self.patched_hierarchy = patched_hierarchy
+        self.patched_game = patched_game
+        self.store = store
+        self.checkpoint_id = None
+        self.runs = []
+
+    def __call__(self, crew_name, workspace_path, crew_inputs):
+        with open(os.path.join(workspace_path, customize_usecase.GAME_FILE), "r", encoding="utf-8") as f:
+            game = f.read()
+        stages = self.store.stages(self.checkpoint_id) if self.store else None
+        self.runs.append((crew_name, crew_inputs.get("components"), game, stages))
+        if crew_name == "hierarchy_patch_crew" and self.patched_hierarchy is not None:
+            self._write(workspace_path, HIERARCHY_FILE, self.patched_hierarchy)
+        elif crew_name == "html5_patch_crew":
+            self._write(workspace_path, customize_usecase.GAME_FILE, self.patched_game)
+        elif crew_name == SINGLE_CREW:
+            self._write(workspace_path, HIERARCHY_FILE, HIERARCHY)
+        elif crew_name == "html5_crew":
+            self._write(workspace_path, customize_usecase.GAME_FILE, "<html>regenerated</html>")
+
+    @staticmethod
+    def _write(workspace_path, name, content):
+        with open(os.path.join(workspace_path, name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def crews(self):
+        return [run[0] for run in self.runs]
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A workspace holding an uploaded game, with the workspace and checkpoint stores under tmp_path."""
+    monkeypatch.delenv("GAME_GENERATOR_HIERARCHY_EXPANSION", raising=False)
+    manager = workspace_pool.WorkspaceManager(str(tmp_path / "workspaces"), pool_size=0, janitor_interval=0)
+    monkeypatch.setattr(workspace_pool, "_workspace_manager", manager)
+    monkeypatch.setattr(checkpoints, "_checkpoint_store", CheckpointStore(str(tmp_path / "checkpoints")))
+    workspace_path = tmp_path / "workspace"
+    workspace_path.mkdir()
+    (workspace_path / HIERARCHY_FILE).write_text(HIERARCHY, encoding="utf-8")
+    (workspace_path / customize_usecase.GAME_FILE).write_text(GAME, encoding="utf-8")
+    yield str(workspace_path)
+    manager.shutdown()
+
+
+def _install(monkeypatch, crews):
+    monkeypatch.setattr(pipeline, "run_crew", crews)
+    return crews
+
+
+def test_an_incremental_run_patches_the_selected_components(workspace, monkeypatch):
+    crews = _install(monkeypatch, ScriptedCrews())
+    mode = customize_game(workspace, "make the player movement faster", mode=MODE_INCREMENTAL)
+    assert mode == MODE_INCREMENTAL
+    assert crews.crews() == ["hierarchy_patch_crew", "html5_patch_crew"]
+    assert crews.runs[0][1] == "Player"
+
+
+def test_a_full_run_ignores_the_hierarchy(workspace, monkeypatch):
+    monkeypatch.delenv("GAME_GENERATOR_CUSTOMIZE_MODE", raising=False)
+    crews = _install(monkeypatch, ScriptedCrews())
+    assert customize_game(workspace, "make the player movement faster") == MODE_FULL
+    assert crews.crews() == [SINGLE_CREW, "html5_crew"]
+
+
+def test_a_request_that_cannot_be_scoped_runs_the_full_pipeline(workspace, monkeypatch):
+    crews = _install(monkeypatch, ScriptedCrews())
+    assert customize_game(workspace, "make it better", mode=MODE_INCREMENTAL) == MODE_FULL
+    assert crews.crews() == [SINGLE_CREW, "html5_crew"]
+
+
+@pytest.mark.parametrize("patched_hierarchy, patched_game, patch_crews", [
+    # Changed the Enemy, which the request is not about
+    (HIERARCHY.replace("A drone", "A bird"), "<html>patched</html>", ["hierarchy_patch_crew"]),
+    ("<Game><Player>", "<html>patched</html>", ["hierarchy_patch_crew"]),
+    (None, "", ["hierarchy_patch_crew", "html5_patch_crew"]),
+])
+def test_a_rejected_patch_restores_the_upload_and_runs_the_full_pipeline(
+    workspace, monkeypatch, patched_hierarchy, patched_game, patch_crews,
+):
+    crews = _install(monkeypatch, ScriptedCrews(patched_hierarchy, patched_game))
+    assert customize_game(workspace, "make the player movement faster", mode=MODE_INCREMENTAL) == MODE_FULL
+    assert crews.crews() == patch_crews + [SINGLE_CREW, "html5_crew"]
+    # The full run starts from the uploaded game, not the rejected patch
+    assert crews.runs[-2][2] == GAME
+
+
+def test_a_rejected_patch_discards_its_checkpoint_before_the_full_run(workspace, monkeypatch):
+    store = checkpoints.get_checkpoint_store()
+    crews = _install(monkeypatch, ScriptedCrews(HIERARCHY.replace("A drone", "A bird"), store=store))
+    crews.checkpoint_id = checkpoint_id = str(uuid.uuid4())
+    customize_game(workspace, "make the player movement faster", checkpoint_id=checkpoint_id, mode=MODE_INCREMENTAL)
+    assert crews.runs[0][3] == ["prepared"]
+    # The full run's first crew sees only its own prepared stage, not the patch's hierarchy stage
+    assert crews.runs[-2][0] == SINGLE_CREW and crews.runs[-2][3] == ["prepared"]
+    info = store.info(checkpoint_id)
+    assert info["stages"] == ["prepared", "hierarchy", "html5"]
+    assert (info["mode"], info["components"]) == (MODE_FULL, [])
+
+
+def test_a_resumed_incremental_run_keeps_its_components(workspace, monkeypatch, tmp_path):
+    store = checkpoints.get_checkpoint_store()
+    checkpoint_id = str(uuid.uuid4())
+
+    class Interrupted(Exception):
+        pass
+
+    def interrupt(stage):
+        if stage == "html5":
+            raise Interrupted()
+
+    crews = _install(monkeypatch, ScriptedCrews())
+    with pytest.raises(Interrupted):
+        customize_game(
+            workspace, "make the player movement faster", checkpoint_id=checkpoint_id, before_stage=interrupt,
+            mode=MODE_INCREMENTAL,
+        )
+    resumed = tmp_path / "resumed"
+    resumed.mkdir()
+    mode = customize_game(str(resumed), "make the player movement faster", checkpoint_id=checkpoint_id, start_stage="html5")
+    assert mode == MODE_INCREMENTAL
+    assert crews.crews() == ["hierarchy_patch_crew", "html5_patch_crew"]
+    assert crews.runs[-1][1] == "Player"
+    assert store.stages(checkpoint_id) == ["prepared", "hierarchy", "html5"]
@@ -0,0 +1,144 @@
+import os
+import threading
+
+import pytest
+
+from lib.game_sections import (
+    EMPTY_DOCUMENT,
+    GAME_FILE,
+    KIND_HTML,
+    KIND_STYLE,
+    find_sections,
+    outline,
+    read_game,
+    read_section,
+    replace_section,
+    write_section,
+)
+
+GAME = """<!DOCTYPE html>
+<html>
+<head>
+<style>
+body { margin: 0; }
+</style>
+<script src="lib.js"></script>
+</head>
+<body>
+<!-- section: hud -->
+<div id="score">0</div>
+<!-- /section: hud -->
+<script id="main">
+/* section: physics */
+function step() {}
+/* /section: physics */
+start();
+</script>
+<script>
+console.log("second");
+</script>
+</body>
+</html>
+"""
+
+
+def _names(html):
+    return [(section.name, section.kind) for section in find_sections(html)]
+
+
+def test_inline_elements_and_markers_are_sections_in_document_order():
+    assert _names(GAME) == [
+        ("style[1]", "style"), ("hud", "html"), ("script#main", "script"), ("physics", "script"),
+        ("script[2]", "script"),
+    ]
+
+
+def test_unclosed_markers_and_external_scripts_are_not_sections():
+    html = GAME.replace("<!-- /section: hud -->", "")
+    assert "hud" not in [name for name, _ in _names(html)]
+    assert "lib.js" not in "".join(GAME[section.start:section.end] for section in find_sections(GAME))
+
+
+def test_read_section_returns_the_content_between_the_markers():
+    assert read_section(GAME, "physics") == "\nfunction step() {}\n"
+    assert read_section(GAME, "script[2]") == '\nconsole.log("second");\n'
+    assert read_section(GAME, "missing") is None
+
+
+def test_the_outline_lists_lines_sizes_and_first_lines():
+    assert outline(GAME).splitlines() == [
+        "style[1] (style, lines 4-6, 21 chars): body { margin: 0; }",
+        "hud (html, lines 10-12, 25 chars): <div id=\"score\">0</div>",
+        "script#main (script, lines 13-18, 76 chars): /* section: physics */",
+        "physics (script, lines 14-16, 20 chars): function step() {}",
+        "script[2] (script, lines 19-21, 24 chars): console.log(\"second\");",
+    ]
+
+
+def test_replacing_a_section_keeps_the_rest_of_the_document():
+    html = replace_section(GAME, "physics", "\n\nfunction step() { move(); }\n")
+    assert html == GAME.replace("function step() {}", "function step() { move(); }")
+    html = replace_section(GAME, "style[1]", "body { margin: 1px; }")
+    assert html == GAME.replace("margin: 0", "margin: 1px")
+
+
+def test_a_new_script_section_goes_into_the_last_inline_script():
+    html = replace_section(GAME, "audio", "play();")
+    assert read_section(html, "audio") == "\nplay();\n"
+    assert html.index("/* section: audio */") > html.index('console.log("second");')
+    assert html.index("/* /section: audio */") < html.rindex("</script>")
+    assert [name for name, _ in _names(html)][-1] == "audio"
+
+
+def test_a_new_markup_section_goes_before_the_first_body_script():
+    html = replace_section(GAME, "menu", "<div id=\"menu\"></div>", KIND_HTML)
+    assert html.index("<!-- /section: menu -->") < html.index('<script id="main">')
+    assert html.index("<!-- section: menu -->") > html.index("<body>")
+
+
+def test_new_sections_of_an_empty_document_get_their_own_elements():
+    html = replace_section("", "theme", "body {}", KIND_STYLE)
+    assert html.startswith(EMPTY_DOCUMENT.split("</head>")[0])
+    assert "<style>\n/* section: theme */\nbody {}\n/* /section: theme */\n</style>\n</head>" in html
+    html = replace_section(html, "loop", "run();")
+    assert "<script>\n/* section: loop */\nrun();\n/* /section: loop */\n</script>\n</body>" in html
+    assert _names(html) == [("style[1]", "style"), ("theme", "style"), ("script[1]", "script"), ("loop", "script")]
+
+
+@pytest.mark.parametrize("name, kind, message", [
+    ("2fast", "script", "Invalid section name '2fast'"),
+    ("hud -->", "html", "Invalid section name"),
+    ("audio", "json", "Invalid section kind 'json'"),
+])
+def test_new_sections_need_a_valid_name_and_kind(name, kind, message):
+    with pytest.raises(ValueError, match=message):
+        replace_section(GAME, name, "content", kind)
+
+
+def test_an_existing_section_is_replaced_whatever_the_kind():
+    assert replace_section(GAME, "script[2]", "done();", "json") == GAME.replace('console.log("second");', "done();")
+
+
+def test_write_section_replaces_game_html_and_returns_the_outline(tmp_path):
+    assert read_game(str(tmp_path)) == ""
+    result = write_section(str(tmp_path), "loop", "run();")
+    assert result == "script[1] (script, lines 7-11, 49 chars): /* section: loop */\nloop (script, lines 8-10, 8 chars): run();"
+    written = (tmp_path / GAME_FILE).read_text(encoding="utf-8")
+    assert written == read_game(str(tmp_path))
+    assert read_section(written, "loop") == "\nrun();\n"
+    assert os.listdir(tmp_path) == [GAME_FILE]
+
+
+def test_concurrent_writes_keep_every_section(tmp_path):
+    (tmp_path / GAME_FILE).write_text(GAME, encoding="utf-8")
+    threads = [
+        threading.Thread(target=write_section, args=(str(tmp_path), f"part{number}", f"part{number}();"))
+        for number in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    html = read_game(str(tmp_path))
+    for number in range(8):
+        assert read_section(html, f"part{number}") == f"\npart{number}();\n"
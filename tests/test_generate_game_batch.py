@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.api.v1.generate_game_batch import parse_batch
+from app.usecases import generate_game_batch as batch_usecase
+from benchmarks.fake_crew import FakeCrew
+from lib import workspace_pool
+from lib.hierarchy import HIERARCHY_FILE
+
+# Seconds a test waits for a crew to start.
+WAIT = 5
+
+
+def test_parse_batch_tags_each_game():
+    games = parse_batch({"request": "a runner", "variants": ["red", "blue"], "requests": ["a maze", {"request": "a quiz"}]})
+    assert [(game.request, game.variant, game.tag) for game in games] == [
+        ("a runner", "red", (0, 0)), ("a runner", "blue", (0, 1)), ("a maze", None, (1, None)), ("a quiz", None, (2, None)),
+    ]
+
+
+@pytest.mark.parametrize("body, message", [
+    ([], "must be a JSON object"),
+    ({}, "Missing 'request' or 'requests'"),
+    ({"variants": ["red"]}, "'variants' requires a 'request'"),
+    ({"requests": "a runner"}, "'requests' must be a list"),
+    ({"requests": [{"variants": ["red"]}]}, "Request 0 has no 'request' text"),
+    ({"request": "a runner", "variants": ["red", ""]}, "'variants' must be a list of non-empty strings"),
+    ({"requests": ["a runner"] * 17}, "at most 16 games, got 17"),
+])
+def test_parse_batch_rejects_malformed_bodies(body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_batch(body)
+
+
+class Kickoffs:
+    """Records every fake crew kickoff: crew name, workspace, inputs and whether the hierarchy was there."""
+
+    def __init__(self, monkeypatch):
+        self.runs = []
+        self._lock = threading.Lock()
+        # Called with the crew and its inputs before it runs; may raise or block
+        self.before = None
+        kickoff = FakeCrew.kickoff
+        recorder = self
+
+        def recording_kickoff(crew, inputs):
+            with recorder._lock:
+                recorder.runs.append((
+                    crew.crew_name, crew.workspace_path, dict(inputs),
+                    os.path.exists(os.path.join(crew.workspace_path, HIERARCHY_FILE)),
+                ))
+            if recorder.before:
+                recorder.before(crew, inputs)
+            return kickoff(crew, inputs)
+        monkeypatch.setattr(FakeCrew, "kickoff", recording_kickoff)
+
+    def crews(self, request=None):
+        return [run[0] for run in self.runs if request is None or run[2]["request"] == request]
+
+
+@pytest.fixture
+def kickoffs(monkeypatch, fake_crews):
+    return Kickoffs(monkeypatch)
+
+
+@pytest.fixture
+def batch_executor(monkeypatch):
+    """Runs the batch stages on one thread, so games run in submission order."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="test-batch")
+    monkeypatch.setattr(batch_usecase, "_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data().splitlines()]
+
+
+def _batch(client, body, response_mode="manifest", **kwargs):
+    return client.post(f"/v1/generate_game/batch?response_mode={response_mode}", json=body, **kwargs)
+
+
+def test_cached_games_come_first_and_the_summary_last(client, kickoffs, batch_executor):
+    assert _lines(_batch(client, {"request": "a maze"}))[0]["cache_status"] == "MISS"
+    response = _batch(client, {"requests": ["a runner", "a maze"]})
+    assert response.content_type == "application/x-ndjson"
+    lines = _lines(response)
+    assert [(line.get("index"), line.get("cache_status")) for line in lines[:2]] == [(1, "HIT"), (0, "MISS")]
+    assert lines[-1] == {"done": True, "games": 2, "success": 2, "partial_success": 0, "failed": 0}
+    assert kickoffs.crews("a maze") == ["hierarchy_crew_v2", "html5_crew"]
+
+
+def test_variants_share_one_hierarchy_stage_in_cloned_workspaces(client, kickoffs, batch_executor):
+    lines = _lines(_batch(client, {"request": "a runner", "variants": ["red", "blue"]}))
+    assert sorted((line["variant"], line["variant_index"], line["status"]) for line in lines[:-1]) == [
+        ("blue", 1, "success"), ("red", 0, "success"),
+    ]
+    assert kickoffs.crews() == ["hierarchy_crew_v2", "html5_variant_crew", "html5_variant_crew"]
+    hierarchy, *variants = kickoffs.runs
+    assert {run[2]["variant"] for run in variants} == {"red", "blue"}
+    # Each variant starts from its own copy of the shared workspace, hierarchy included
+    workspaces = {hierarchy[1]} | {run[1] for run in variants}
+    assert len(workspaces) == 3 and all(run[3] for run in variants)
+    assert workspace_pool.get_workspace_manager().stats()["active"] == 0
+
+
+def test_a_failed_variant_gets_its_own_error_line(client, kickoffs, batch_executor):
+    def fail_blue(crew, inputs):
+        if inputs.get("variant") == "blue":
+            raise RuntimeError("blue crew failed")
+    kickoffs.before = fail_blue
+    lines = _lines(_batch(client, {"request": "a runner", "variants": ["red", "blue"]}))
+    by_variant = {line.get("variant"): line for line in lines[:-1]}
+    assert by_variant["blue"] == {
+        "index": 0, "variant_index": 1, "request": "a runner", "variant": "blue",
+        "status": "failed", "message": "Server error during game generation.",
+    }
+    assert by_variant["red"]["status"] == "success"
+    assert lines[-1]["failed"] == 1 and lines[-1]["success"] == 1
+
+
+def test_a_failed_shared_hierarchy_fails_every_variant(client, kickoffs, batch_executor):
+    def fail_hierarchy(crew, inputs):
+        if crew.crew_name == "hierarchy_crew_v2":
+            raise RuntimeError("hierarchy crew failed")
+    kickoffs.before = fail_hierarchy
+    lines = _lines(_batch(client, {"request": "a runner", "variants": ["red", "blue"]}))
+    assert [line["status"] for line in lines[:-1]] == ["failed", "failed"]
+    assert "html5_variant_crew" not in kickoffs.crews()
+
+
+def test_a_disconnect_cancels_the_games_not_yet_sent(client, kickoffs, batch_executor, tmp_path):
+    started, closed = threading.Event(), threading.Event()
+
+    def hold_third(crew, inputs):
+        if inputs["request"] == "third":
+            started.set()
+            closed.wait(WAIT)
+    kickoffs.before = hold_third
+
+    response = _batch(
+        client, {"requests": ["first", "second", "third", "fourth"]}, buffered=False,
+        headers={"X-Cache-Bypass": "1"},
+    )
+    body = iter(response.response)
+    assert json.loads(next(body))["request"] == "first"
+    # The second game finished too, but its line was never read
+    assert started.wait(WAIT)
+    response.close()
+    closed.set()
+    batch_executor.shutdown(wait=True)
+
+    # The third game stopped at its next stage and the fourth never started
+    assert kickoffs.crews("third") == ["hierarchy_crew_v2"]
+    assert kickoffs.crews("fourth") == []
+    # Only the artifacts of the game that was sent are kept
+    assert len(os.listdir(tmp_path / "artifacts")) == 1
+    assert workspace_pool.get_workspace_manager().stats()["active"] == 0
@@ -0,0 +1,238 @@
+import io
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.api.v1 import customize_game as customize_route
+from app.usecases import hierarchy_expansion
+from app.usecases.hierarchy_expansion import (
+    COMPONENT_CREW,
+    COMPONENT_FILE,
+    INNER_LAYERS_CREW,
+    OUTLINE_CREW,
+    REVIEW_CREW,
+    SINGLE_CREW,
+    ExpansionModeError,
+    expand_hierarchy,
+    expansion_mode,
+)
+from lib import workspace_pool
+from lib.hierarchy import (
+    HIERARCHY_FILE,
+    component_tag,
+    game_components,
+    merge_components,
+    parse_hierarchy,
+    serialize_hierarchy,
+)
+
+OUTLINE = """<Metadata><Title>Runner</Title></Metadata>
+<Game>
+  <Description>A runner.</Description>
+  <Player><Description>Runs.</Description></Player>
+  <Screen><Description>Menu.</Description></Screen>
+  <Screen><Description>Game over.</Description></Screen>
+</Game>
+"""
+
+
+def _expanded(tag, text):
+    return parse_hierarchy(f"<Game><{tag}><Description>{text}</Description><Layer/></{tag}></Game>").find("Game")[0]
+
+
+def test_merge_components_replaces_components_in_place():
+    root = parse_hierarchy(OUTLINE)
+    replaced = merge_components(root, {"Screen[2]": _expanded("Screen", "Over"), "Player": _expanded("Player", "Jumps")})
+    assert replaced == ["Player", "Screen[2]"]
+    components = game_components(root)
+    assert list(components) == ["Player", "Screen[1]", "Screen[2]"]
+    assert components["Player"].find("Description").text == "Jumps"
+    assert components["Screen[1]"].find("Description").text == "Menu."
+    assert components["Screen[2]"].find("Layer") is not None
+    assert root.find("Game/Description").text == "A runner."
+
+
+def test_merge_components_ignores_unknown_keys():
+    root = parse_hierarchy(OUTLINE)
+    assert merge_components(root, {"Enemy": _expanded("Enemy", "Chases")}) == []
+    assert list(game_components(root)) == ["Player", "Screen[1]", "Screen[2]"]
+
+
+def test_serialize_hierarchy_writes_metadata_and_game_as_siblings():
+    root = parse_hierarchy(OUTLINE)
+    merge_components(root, {"Player": _expanded("Player", "Jumps")})
+    text = serialize_hierarchy(root)
+    assert text.startswith("<Metadata>") and text.endswith("</Game>\n")
+    assert "<Hierarchy>" not in text
+    reparsed = parse_hierarchy(text)
+    assert list(game_components(reparsed)) == ["Player", "Screen[1]", "Screen[2]"]
+    assert reparsed.find("Metadata/Title").text == "Runner"
+    assert serialize_hierarchy(reparsed) == text
+
+
+def test_the_single_crew_is_the_default(monkeypatch):
+    monkeypatch.delenv("GAME_GENERATOR_HIERARCHY_EXPANSION", raising=False)
+    assert expansion_mode() == "crew"
+    monkeypatch.setenv("GAME_GENERATOR_HIERARCHY_EXPANSION", "Parallel")
+    assert expansion_mode() == "parallel"
+
+
+def test_an_unknown_mode_is_a_server_error_not_an_input_error(monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_HIERARCHY_EXPANSION", "fast")
+    with pytest.raises(ExpansionModeError, match="fast") as raised:
+        expansion_mode()
+    assert not isinstance(raised.value, ValueError)
+
+
+class ScriptedCrews:
+    """Stands in for pipeline.run_crew, writing what each hierarchy crew is scripted to write.
+
+    Args:
+        outline: game_hierarchy.xml as written by the outline crew.
+        components: What each component crew writes, by component key: the
+            element's XML, None to write nothing, or an exception to raise.
+        delays: Seconds each component crew takes, by component key.
+    """
+
+    def __init__(self, outline, components=None, delays=None):
+        self.outline = outline
+        self.components = components or {}
+        self.delays = delays or {}
+        self.runs = []
+        self.finished_components = []
+        self._lock = threading.Lock()
+
+    def __call__(self, crew_name, workspace_path, crew_inputs):
+        key = crew_inputs.get("component") if crew_name == COMPONENT_CREW else None
+        with self._lock:
+            self.runs.append((crew_name, key) if key else crew_name)
+        if crew_name == OUTLINE_CREW:
+            with open(os.path.join(workspace_path, HIERARCHY_FILE), "w", encoding="utf-8") as f:
+                f.write(self.outline)
+        elif crew_name == COMPONENT_CREW:
+            time.sleep(self.delays.get(key, 0))
+            tag = component_tag(key)
+            content = self.components.get(key, f"<{tag}><Description>{key} expanded</Description></{tag}>")
+            if isinstance(content, Exception):
+                raise content
+            if content is not None:
+                with open(os.path.join(workspace_path, COMPONENT_FILE), "w", encoding="utf-8") as f:
+                    f.write(content)
+            with self._lock:
+                self.finished_components.append(key)
+
+    def crews(self):
+        return [run if isinstance(run, str) else run[0] for run in self.runs]
+
+
+@pytest.fixture
+def parallel(tmp_path, monkeypatch):
+    """Enables parallel expansion with scratch workspaces under tmp_path; returns the workspace."""
+    monkeypatch.setenv("GAME_GENERATOR_HIERARCHY_EXPANSION", "parallel")
+    manager = workspace_pool.WorkspaceManager(str(tmp_path / "workspaces"), pool_size=0, janitor_interval=0)
+    monkeypatch.setattr(workspace_pool, "_workspace_manager", manager)
+    workspace_path = tmp_path / "workspace"
+    workspace_path.mkdir()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        monkeypatch.setattr(hierarchy_expansion, "get_expansion_executor", lambda: executor)
+        yield str(workspace_path)
+    assert os.listdir(manager.active_dir) == [], "a scratch workspace was not released"
+
+
+def _components(workspace_path):
+    with open(os.path.join(workspace_path, HIERARCHY_FILE), "r", encoding="utf-8") as f:
+        root = parse_hierarchy(f.read())
+    return {key: element.find("Description").text for key, element in game_components(root).items()}
+
+
+def test_crew_mode_runs_the_single_crew(monkeypatch, tmp_path):
+    monkeypatch.delenv("GAME_GENERATOR_HIERARCHY_EXPANSION", raising=False)
+    crews = ScriptedCrews(OUTLINE)
+    expand_hierarchy(str(tmp_path), {"request": "a runner"}, crews)
+    assert crews.runs == [SINGLE_CREW]
+
+
+def test_components_are_merged_in_document_order_then_reviewed(parallel):
+    # The first component finishes last
+    crews = ScriptedCrews(OUTLINE, delays={"Player": 0.2})
+    expand_hierarchy(parallel, {"request": "a runner"}, crews)
+    assert crews.crews() == [OUTLINE_CREW, COMPONENT_CREW, COMPONENT_CREW, COMPONENT_CREW, REVIEW_CREW]
+    assert crews.finished_components[-1] == "Player"
+    assert _components(parallel) == {
+        "Player": "Player expanded", "Screen[1]": "Screen[1] expanded", "Screen[2]": "Screen[2] expanded",
+    }
+
+
+def test_an_outline_with_one_component_falls_back_to_the_inner_layers_crew(parallel):
+    crews = ScriptedCrews("<Game><Player/></Game>")
+    expand_hierarchy(parallel, {"request": "a runner"}, crews)
+    assert crews.runs == [OUTLINE_CREW, INNER_LAYERS_CREW]
+
+
+def test_an_unparsable_outline_falls_back_to_the_inner_layers_crew(parallel):
+    crews = ScriptedCrews("<Game><Player></Game>")
+    expand_hierarchy(parallel, {"request": "a runner"}, crews)
+    assert crews.runs == [OUTLINE_CREW, INNER_LAYERS_CREW]
+
+
+@pytest.mark.parametrize("failure", [None, "<Screen><Unclosed></Screen>", RuntimeError("crew failed")])
+def test_a_failed_component_falls_back_to_the_inner_layers_crew(parallel, failure):
+    crews = ScriptedCrews(OUTLINE, components={"Screen[1]": failure})
+    expand_hierarchy(parallel, {"request": "a runner"}, crews)
+    assert crews.crews()[-1] == INNER_LAYERS_CREW
+    assert REVIEW_CREW not in crews.crews()
+    # The other components are merged before the inner layers crew runs
+    assert _components(parallel) == {"Player": "Player expanded", "Screen[1]": "Menu.", "Screen[2]": "Screen[2] expanded"}
+
+
+def test_a_stopped_pipeline_ends_the_stage_without_falling_back(parallel):
+    class Stopped(Exception):
+        pass
+
+    crews = ScriptedCrews(OUTLINE)
+
+    def before_crew():
+        if crews.runs:
+            raise Stopped()
+
+    with pytest.raises(Stopped):
+        expand_hierarchy(parallel, {"request": "a runner"}, crews, before_crew=before_crew)
+    assert crews.runs == [OUTLINE_CREW]
+
+
+def test_parallel_expansion_runs_through_the_generate_route(client, monkeypatch, fake_crews):
+    monkeypatch.setenv("GAME_GENERATOR_HIERARCHY_EXPANSION", "parallel")
+    response = client.post("/v1/generate_game", json={"request": "a runner"}, headers={"X-Cache-Bypass": "1"})
+    assert response.status_code == 200 and response.json["status"] == "success"
+
+
+def _bundle():
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as zipf:
+        zipf.writestr("index.html", "<html></html>")
+    return data.getvalue()
+
+
+def _customize(client, bundle):
+    return client.post("/v1/customize_game", data={
+        "request": "faster player", "mode": "full", "game_bundle": (io.BytesIO(bundle), "game.zip"),
+    }, content_type="multipart/form-data")
+
+
+def test_customize_answers_500_for_a_value_error_of_the_run(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("broken server setting")
+    monkeypatch.setattr(customize_route, "customize_game_use_case", broken)
+    response = _customize(client, _bundle())
+    assert response.status_code == 500
+    assert "broken server setting" not in response.json["error"]
+
+
+def test_customize_answers_400_for_an_invalid_bundle(client):
+    response = _customize(client, b"not a zip")
+    assert response.status_code == 400
+    assert "Not a valid zip file" in response.json["error"]
@@ -0,0 +1,115 @@
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from lib import hierarchy_index
+from lib.hierarchy import HIERARCHY_FILE, parse_hierarchy, select_components
+from lib.hierarchy_index import HierarchyIndex, load_index
+
+HIERARCHY = """<Metadata><Title>Runner</Title></Metadata>
+<Game>
+  <Description>A runner on rooftops.</Description>
+  <Player><Description>Runs and jumps.</Description><Movement speed="fast"/><Collision/></Player>
+  <Screen><Description>Main menu with a start button.</Description></Screen>
+  <Screen><Description>Game over.</Description><ScoreDisplay/></Screen>
+  <BackgroundMusic><Description>A loop.</Description></BackgroundMusic>
+</Game>
+"""
+
+
+@pytest.fixture
+def index():
+    return HierarchyIndex.from_text(HIERARCHY)
+
+
+def _write(workspace_path, text):
+    with open(os.path.join(workspace_path, HIERARCHY_FILE), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_elements_are_addressed_by_path_key_and_type(index):
+    assert index.find("Game/Player/Movement") == ["Game/Player/Movement"]
+    assert index.find(" /Game/Player/Movement/ ") == ["Game/Player/Movement"]
+    assert index.find("Player") == ["Game/Player"]
+    assert index.find("Screen[2]") == ["Game/Screen[2]"]
+    assert index.find("Screen") == ["Game/Screen[1]", "Game/Screen[2]"]
+    assert index.find("Enemy") == []
+    assert index.section("Game/Player/Movement") == '<Movement speed="fast" />'
+
+
+def test_each_role_gets_the_components_its_terms_match(index):
+    assert index.role_components("ui") == ["Screen[1]", "Screen[2]", "BackgroundMusic"]
+    assert index.role_components("logic") == ["Screen[2]"]
+    assert index.role_components("mechanics") == ["Player"]
+    assert index.role_components("sound") == ["BackgroundMusic"]
+    assert index.role_components("rules") == []
+    with pytest.raises(KeyError):
+        index.role_components("architect")
+
+
+def test_a_role_context_holds_its_components_and_summarizes_the_others(index):
+    context = index.role_context("sound")
+    assert context.startswith("<!-- game_hierarchy.xml sections for the sound role")
+    assert "<Title>Runner</Title>" in context
+    assert "<Description>A runner on rooftops.</Description>" in context
+    assert "<BackgroundMusic>\n  <Description>A loop.</Description>\n</BackgroundMusic>" in context
+    assert "Player [Movement, Collision]: Runs and jumps.\n" in context
+    assert "Screen[2] [ScoreDisplay]: Game over.\n" in context
+    assert "BackgroundMusic:" not in context
+    # Comments and all, the context is well-formed XML
+    ET.fromstring(f"<Context>{context}</Context>")
+
+
+def test_a_role_without_components_has_no_context(index):
+    assert index.role_context("rules") is None
+
+
+def test_the_summary_shortens_long_descriptions_and_child_lists():
+    children = "".join(f"<Part{number}/>" for number in range(10))
+    index = HierarchyIndex.from_text(f"<Game><Level><Description>{'long ' * 40}</Description>{children}</Level></Game>")
+    line = index.summary()
+    assert line.startswith("Level [Part0, Part1, Part2, Part3, Part4, Part5, Part6, Part7, +2]: long long")
+    assert line.endswith("...")
+    assert index.summary(exclude=["Level"]) == ""
+
+
+def test_summaries_cannot_close_the_context_comment():
+    index = HierarchyIndex.from_text("<Game><Player><Description>Jumps -- twice</Description></Player><Enemy/></Game>")
+    context = index.context(["Enemy"], "a test")
+    assert "Player: Jumps - twice" in context
+    assert context.count("-->") == 2
+
+
+def test_role_scoring_matches_select_components(index):
+    # Both score components with the public term helpers of lib.hierarchy
+    root = parse_hierarchy(HIERARCHY)
+    assert select_components(root, "louder background music") == index.role_components("sound")
+
+
+def test_an_unparsable_hierarchy_has_no_index(tmp_path):
+    assert HierarchyIndex.from_text("<Game><Player></Game>") is None
+    assert load_index(str(tmp_path)) is None
+    _write(str(tmp_path), "<Game><Player></Game>")
+    assert load_index(str(tmp_path)) is None
+
+
+def test_load_index_parses_each_version_once(tmp_path, monkeypatch):
+    parsed = []
+    from_text = HierarchyIndex.from_text.__func__
+    monkeypatch.setattr(HierarchyIndex, "from_text", classmethod(lambda cls, text: parsed.append(text) or from_text(cls, text)))
+    monkeypatch.setattr(hierarchy_index, "_index_cache", type(hierarchy_index._index_cache)())
+    _write(str(tmp_path), HIERARCHY)
+    first = load_index(str(tmp_path))
+    assert load_index(str(tmp_path)) is first
+    assert len(parsed) == 1
+    _write(str(tmp_path), HIERARCHY.replace("A loop.", "A longer loop."))
+    assert load_index(str(tmp_path)).summary().endswith("BackgroundMusic: A longer loop.")
+    assert len(parsed) == 2
+
+
+def test_context_pruning_is_on_unless_disabled(monkeypatch):
+    monkeypatch.delenv("GAME_GENERATOR_CONTEXT_PRUNING", raising=False)
+    assert hierarchy_index.context_pruning_enabled()
+    monkeypatch.setenv("GAME_GENERATOR_CONTEXT_PRUNING", "0")
+    assert not hierarchy_index.context_pruning_enabled()
@@ -0,0 +1,196 @@
+import threading
+import time
+
+import pytest
+
+from lib import jobs, techiecrews
+from lib.jobs import (
+    JOB_CANCELLED,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JOB_TIMED_OUT,
+    JobQueue,
+    QueueFullError,
+)
+
+# Seconds a test waits for a job to reach a status.
+WAIT = 5
+
+
+@pytest.fixture
+def job_queue():
+    """Builds JobQueues that are shut down after the test."""
+    queues = []
+
+    def build(**kwargs):
+        queues.append(JobQueue(**kwargs))
+        return queues[-1]
+
+    yield build
+    for built in queues:
+        built.shutdown()
+
+
+def _wait_for(job, *statuses):
+    deadline = time.time() + WAIT
+    while job.status not in statuses:
+        assert time.time() < deadline, f"job stayed {job.status}"
+        time.sleep(0.01)
+
+
+def _blocker():
+    """Returns a job function that runs until the returned event is set, and that event."""
+    release = threading.Event()
+
+    def func(job):
+        release.wait(WAIT)
+        return "released"
+    return func, release
+
+
+def _until_cancelled(job):
+    while True:
+        job.raise_if_cancelled()
+        time.sleep(0.01)
+
+
+def test_a_job_runs_and_keeps_its_result(job_queue):
+    queue = job_queue(max_workers=1)
+    job = queue.submit("test", lambda job: 42)
+    _wait_for(job, JOB_SUCCEEDED)
+    assert job.result == 42 and job.finished_at >= job.started_at >= job.created_at
+    events, closed = job.progress.events_after(0, 0)
+    assert [event.event for event in events] == ["job.queued", "job.running", "job.succeeded"] and closed
+    assert queue.get(job.id) is job
+
+
+def test_a_failing_job_records_the_error(job_queue):
+    def fail(job):
+        raise RuntimeError("crew exploded")
+    job = job_queue(max_workers=1).submit("test", fail)
+    _wait_for(job, JOB_FAILED)
+    assert job.error == "crew exploded" and job.result is None
+
+
+def test_a_full_queue_refuses_jobs(job_queue):
+    queue = job_queue(max_workers=1, max_queue_size=1)
+    func, release = _blocker()
+    running = queue.submit("test", func)
+    _wait_for(running, JOB_RUNNING)
+    waiting = queue.submit("test", lambda job: "done")
+    with pytest.raises(QueueFullError, match=r"full \(1 pending jobs\)"):
+        queue.submit("test", lambda job: "refused")
+    assert queue.pending_count() == 1
+    release.set()
+    _wait_for(waiting, JOB_SUCCEEDED)
+    assert queue.pending_count() == 0
+
+
+def test_a_cancelled_queued_job_frees_its_slot_and_never_runs(job_queue):
+    queue = job_queue(max_workers=1, max_queue_size=1)
+    func, release = _blocker()
+    running = queue.submit("test", func)
+    _wait_for(running, JOB_RUNNING)
+    ran, discarded = [], []
+    cancelled = queue.submit("test", lambda job: ran.append(job.id), on_discard=lambda: discarded.append(True))
+    queue.cancel(cancelled.id)
+    assert cancelled.status == JOB_CANCELLED and discarded == [True]
+    # The cancelled job still sits in the worker queue, but no longer counts
+    assert queue.pending_count() == 0
+    replacement = queue.submit("test", lambda job: "replaced")
+    release.set()
+    _wait_for(replacement, JOB_SUCCEEDED)
+    assert ran == [] and cancelled.status == JOB_CANCELLED
+
+
+def test_a_cancelled_running_job_stops_at_its_next_check(job_queue):
+    queue = job_queue(max_workers=1)
+    job = queue.submit("test", _until_cancelled)
+    _wait_for(job, JOB_RUNNING)
+    queue.cancel(job.id)
+    assert job.status == JOB_CANCELLED and job.error == "Job was cancelled."
+    # A second cancel changes nothing
+    assert queue.cancel(job.id).status == JOB_CANCELLED
+    assert queue.cancel("unknown") is None
+
+
+def test_the_watchdog_times_out_a_running_job(job_queue):
+    job = job_queue(max_workers=1, job_timeout=0.1).submit("test", _until_cancelled)
+    _wait_for(job, JOB_TIMED_OUT)
+    assert job.error == "Job exceeded the 0.1s timeout."
+    assert job.is_cancelled()
+
+
+def test_finished_jobs_are_dropped_after_the_retention(job_queue):
+    queue = job_queue(max_workers=1, retention=60)
+    old, recent = queue.submit("test", lambda job: 1), queue.submit("test", lambda job: 2)
+    _wait_for(old, JOB_SUCCEEDED)
+    _wait_for(recent, JOB_SUCCEEDED)
+    old.finished_at -= 61
+    # Pruned when the next job is submitted
+    queue.submit("test", lambda job: 3)
+    assert queue.get(old.id) is None and queue.get(recent.id) is recent
+
+
+def test_the_queue_is_configured_from_the_environment(monkeypatch):
+    monkeypatch.setattr(jobs, "_job_queue", None)
+    monkeypatch.setenv("GAME_GENERATOR_JOB_WORKERS", "3")
+    monkeypatch.setenv("GAME_GENERATOR_JOB_QUEUE_SIZE", "5")
+    monkeypatch.setenv("GAME_GENERATOR_JOB_TIMEOUT", "0")
+    monkeypatch.setenv("GAME_GENERATOR_JOB_RETENTION", "120")
+    queue = jobs.get_job_queue()
+    try:
+        assert (queue.max_workers, queue.max_queue_size, queue.job_timeout, queue.retention) == (3, 5, None, 120)
+    finally:
+        queue.shutdown()
+
+
+def _fill_queue(monkeypatch):
+    """Occupies the only worker and queue slot of the app's queue; returns the queued job and the release event."""
+    monkeypatch.setenv("GAME_GENERATOR_JOB_WORKERS", "1")
+    monkeypatch.setenv("GAME_GENERATOR_JOB_QUEUE_SIZE", "1")
+    func, release = _blocker()
+    running = jobs.get_job_queue().submit("test", func)
+    _wait_for(running, JOB_RUNNING)
+    return jobs.get_job_queue().submit("test", lambda job: None), release
+
+
+def test_a_full_queue_answers_429_with_retry_after(client, monkeypatch):
+    queued, release = _fill_queue(monkeypatch)
+    try:
+        response = client.post("/v1/jobs/generate_game", json={"request": "a runner"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "30" and response.json["retry_after"] == 30
+        # Cancelling the queued job frees the slot at once
+        assert client.delete(f"/v1/jobs/{queued.id}").json["status"] == JOB_CANCELLED
+        response = client.post("/v1/jobs/generate_game", json={"request": "a runner"})
+        assert response.status_code == 202 and response.json["status"] == JOB_QUEUED
+        client.delete(f"/v1/jobs/{response.json['job_id']}")
+    finally:
+        release.set()
+
+
+def test_a_job_cancelled_during_a_stage_stops_before_the_next(client, monkeypatch):
+    started, cancelled, crews = threading.Event(), threading.Event(), []
+    fake_get_crew = techiecrews.get_crew
+
+    def get_crew(crew_name, workspace_path):
+        crews.append(crew_name)
+        started.set()
+        cancelled.wait(WAIT)
+        return fake_get_crew(crew_name, workspace_path)
+    monkeypatch.setattr(techiecrews, "get_crew", get_crew)
+
+    job_id = client.post("/v1/jobs/generate_game", json={"request": "a runner"}).json["job_id"]
+    assert started.wait(WAIT)
+    assert client.delete(f"/v1/jobs/{job_id}").json["status"] == JOB_CANCELLED
+    cancelled.set()
+    jobs.get_job_queue()._queue.join()
+
+    assert crews == ["hierarchy_crew_v2"]
+    response = client.get(f"/v1/jobs/{job_id}/result")
+    assert response.status_code == 409 and response.json["status"] == JOB_CANCELLED
+    # The stage that was running finished and was checkpointed
+    assert client.get(f"/v1/jobs/{job_id}").json["checkpoint_stages"] == ["prepared", "hierarchy"]
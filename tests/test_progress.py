@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.v1 import jobs as jobs_api
+from lib import jobs
+from lib.jobs import TERMINAL_STATUSES
+from lib.progress import ProgressStream, instrument_crew, report, reporting_to
+
+# Seconds a test waits for a job or an event.
+WAIT = 5
+
+
+def _published(*events):
+    stream = ProgressStream()
+    for event in events:
+        stream.publish(event)
+    return stream
+
+
+def test_events_after_replays_the_events_a_reader_missed():
+    stream = _published("job.queued", "job.running", "stage.started")
+    events, closed = stream.events_after(0, 0)
+    assert [(event.id, event.event) for event in events] == [(1, "job.queued"), (2, "job.running"), (3, "stage.started")]
+    assert not closed
+    # A reconnecting reader passes the last id it saw
+    events, _ = stream.events_after(2, 0)
+    assert [event.id for event in events] == [3]
+    assert stream.events_after(3, 0) == ([], False)
+
+
+def test_only_the_newest_events_are_kept():
+    stream = ProgressStream(max_events=2)
+    for event in ("a", "b", "c"):
+        stream.publish(event)
+    events, _ = stream.events_after(0, 0)
+    assert [(event.id, event.event) for event in events] == [(2, "b"), (3, "c")]
+
+
+def test_events_after_wakes_up_on_publish():
+    stream = ProgressStream()
+    timer = threading.Timer(0.05, stream.publish, ("stage.started",), {"stage": "hierarchy"})
+    timer.start()
+    started = time.time()
+    events, closed = stream.events_after(0, WAIT)
+    timer.join()
+    assert [(event.event, event.data) for event in events] == [("stage.started", {"stage": "hierarchy"})]
+    assert not closed and time.time() - started < WAIT
+
+
+def test_a_closed_stream_keeps_its_events_and_ignores_new_ones():
+    stream = _published("job.queued")
+    threading.Timer(0.05, stream.close).start()
+    # A waiting reader is woken by the close, not by its timeout
+    assert stream.events_after(1, WAIT) == ([], True)
+    stream.publish("job.running")
+    events, closed = stream.events_after(0, WAIT)
+    assert [event.event for event in events] == ["job.queued"] and closed
+    assert stream.closed
+
+
+def test_to_sse_formats_one_message():
+    stream = ProgressStream()
+    stream.publish("stage.started", stage="html5")
+    event = stream.events_after(0, 0)[0][0]
+    head, payload = event.to_sse().split("data: ")
+    assert head == "id: 1\nevent: stage.started\n" and payload.endswith("\n\n")
+    assert json.loads(payload) == {"stage": "html5", "time": event.time}
+
+
+def test_report_publishes_only_inside_reporting_to():
+    stream = ProgressStream()
+    report("ignored")
+    with reporting_to(stream):
+        report("stage.started", stage="hierarchy")
+    report("ignored")
+    assert [event.event for event in stream.events_after(0, 0)[0]] == ["stage.started"]
+
+
+def test_instrument_crew_reports_delegations_and_the_tester_verdict():
+    stream, steps = ProgressStream(), []
+    crew = SimpleNamespace(step_callback=steps.append, task_callback=None)
+    instrument_crew("html5_crew", crew)
+    assert crew.step_callback == steps.append # Not tracked: left as it is
+    with reporting_to(stream):
+        instrument_crew("html5_crew", crew)
+    tool_input = json.dumps({"coworker": "Game Tester", "task": "Play the game"})
+    crew.step_callback(SimpleNamespace(tool="Delegate work to coworker", tool_input=tool_input, result=None))
+    crew.step_callback(SimpleNamespace(
+        tool="Delegate work to coworker", tool_input=tool_input, result="The game is complete and playable.",
+    ))
+    crew.step_callback(SimpleNamespace(tool="read_file", tool_input="{}", result="..."))
+    crew.task_callback(SimpleNamespace(name="build_game", agent=SimpleNamespace(role="Developer")))
+    assert len(steps) == 3
+    events = stream.events_after(0, 0)[0]
+    assert [event.event for event in events] == [
+        "delegation.started", "delegation.completed", "tester.verdict", "task.completed",
+    ]
+    assert events[0].data == {"crew": "html5_crew", "coworker": "Game Tester", "task": "Play the game"}
+    assert events[2].data["approved"] is True
+    assert events[3].data == {"crew": "html5_crew", "task": "build_game", "agent": "Developer"}
+
+
+def _sse(body):
+    """Parses an SSE body into (id, event, data) tuples, skipping comments and the retry field."""
+    messages = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith((":", "retry:")))
+        if fields:
+            messages.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return messages
+
+
+def _finished_job(client):
+    job_id = client.post("/v1/jobs/generate_game", json={"request": "a runner"}).json["job_id"]
+    deadline = time.time() + WAIT
+    while client.get(f"/v1/jobs/{job_id}").json["status"] not in TERMINAL_STATUSES:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return job_id
+
+
+def test_the_event_stream_replays_a_finished_job_and_ends_with_its_result(client, fake_crews):
+    job_id = _finished_job(client)
+    response = client.get(f"/v1/jobs/{job_id}/events")
+    assert response.mimetype == "text/event-stream" and response.headers["Cache-Control"] == "no-cache"
+    messages = _sse(response.get_data(as_text=True))
+    events = [message[1] for message in messages]
+    assert events[:2] == ["job.queued", "job.running"] and events[-2:] == ["job.succeeded", "result"]
+    assert events.count("stage.started") == events.count("stage.completed") == 2
+    # Numbered from 1; the result has no id
+    assert [message[0] for message in messages] == [str(i) for i in range(1, len(messages))] + [None]
+    result = messages[-1][2]
+    assert result["status"] == "succeeded" and result["result"]["status"] == "success"
+
+
+def test_a_reconnecting_client_gets_only_the_events_after_last_event_id(client, fake_crews):
+    job_id = _finished_job(client)
+    last_id = len(_sse(client.get(f"/v1/jobs/{job_id}/events").get_data(as_text=True))) - 1
+    url = f"/v1/jobs/{job_id}/events"
+    messages = _sse(client.get(url, headers={"Last-Event-ID": str(last_id - 1)}).get_data(as_text=True))
+    assert [message[:2] for message in messages] == [(str(last_id), "job.succeeded"), (None, "result")]
+    messages = _sse(client.get(f"{url}?last_event_id={last_id}").get_data(as_text=True))
+    assert [message[1] for message in messages] == ["result"]
+    assert client.get("/v1/jobs/unknown/events").status_code == 404
+
+
+def test_a_running_job_streams_heartbeats_until_it_finishes(client, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_EVENTS_HEARTBEAT", "0.01")
+    release = threading.Event()
+    job = jobs.get_job_queue().submit("test", lambda job: release.wait(WAIT) and 1 / 0)
+    response = client.get(f"/v1/jobs/{job.id}/events", buffered=False)
+    body = iter(response.response)
+    chunks = [next(body) for _ in range(4)]
+    release.set()
+    chunks.extend(body)
+    response.close()
+    body = b"".join(chunks).decode()
+    assert ": keep-alive" in body
+    assert [message[1] for message in _sse(body)] == ["job.queued", "job.running", "job.failed", "result"]
+
+
+def test_streams_beyond_the_limit_answer_503(client, fake_crews, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_EVENTS_MAX_STREAMS", "1")
+    job_id = _finished_job(client)
+    held = client.get(f"/v1/jobs/{job_id}/events", buffered=False)
+    try:
+        refused = client.get(f"/v1/jobs/{job_id}/events")
+        assert refused.status_code == 503
+        assert refused.headers["Retry-After"] == str(jobs_api.EVENTS_RETRY_AFTER_SECONDS)
+        assert refused.json["status_url"] == f"/v1/jobs/{job_id}"
+    finally:
+        # Closing before the body was read still frees the slot
+        held.close()
+    assert jobs_api._event_streams == 0
+    assert client.get(f"/v1/jobs/{job_id}/events").status_code == 200
+
+
+@pytest.mark.parametrize("threads, expected", [(None, 4), ("2", 1), ("1", 1)])
+def test_the_stream_limit_defaults_to_half_the_server_threads(monkeypatch, threads, expected):
+    monkeypatch.delenv("GAME_GENERATOR_EVENTS_MAX_STREAMS", raising=False)
+    if threads is None:
+        monkeypatch.delenv("GAME_GENERATOR_THREADS", raising=False)
+    else:
+        monkeypatch.setenv("GAME_GENERATOR_THREADS", threads)
+    assert jobs_api.max_event_streams() == expected
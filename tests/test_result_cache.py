@@ -0,0 +1,226 @@
+import json
+import os
+import time
+
+import pytest
+
+from lib import result_cache, techiecrews
+from lib.result_cache import ResultCache, ResultRecorder, make_cache_key
+
+RESULTS = {"status": "SUCCESS", "message": "done", "suggested_name": "Game"}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_bytes=1024 ** 2, ttl=3600)
+
+
+def _source(tmp_path, name, files):
+    source_dir = tmp_path / name
+    source_dir.mkdir()
+    for file_name, content in files.items():
+        (source_dir / file_name).write_bytes(content)
+    return str(source_dir)
+
+
+def _entries(cache):
+    return sorted(entry.name for entry in os.scandir(cache.root))
+
+
+def _set_last_use(cache, key, seconds_ago):
+    last_use = time.time() - seconds_ago
+    os.utime(os.path.join(cache.root, key), (last_use, last_use))
+
+
+def test_cache_keys_ignore_whitespace_and_unicode_forms():
+    key = make_cache_key("generate_game", "a jumping gam\u00e9", {}, "crews")
+    assert make_cache_key("generate_game", " a  jumping\tgame\u0301 ", {}, "crews") == key
+    assert make_cache_key("generate_game", "a jumping game", {}, "crews") != key
+
+
+def test_cache_keys_separate_kinds_uploads_and_definitions():
+    key = make_cache_key("customize_game", "faster", {"game_bundle": "aa"}, "crews")
+    assert make_cache_key("generate_game", "faster", {"game_bundle": "aa"}, "crews") != key
+    assert make_cache_key("customize_game", "faster", {"game_bundle": "bb"}, "crews") != key
+    assert make_cache_key("customize_game", "faster", {"game_bundle": "aa"}, "edited crews") != key
+
+
+def test_a_hit_links_the_entry_files_into_the_target(tmp_path, cache):
+    cache.put("key", _source(tmp_path, "run", {"bundle.zip": b"zip", "icon.png": b"png"}), RESULTS)
+    target = tmp_path / "target"
+    target.mkdir()
+    assert cache.get("key", str(target)) == RESULTS
+    assert sorted(os.listdir(target)) == ["bundle.zip", "icon.png"]
+    assert os.stat(target / "bundle.zip").st_ino == os.stat(os.path.join(cache.root, "key", "bundle.zip")).st_ino
+    assert cache.stats() == {"hits": 1, "misses": 0, "stores": 1, "evictions": 0, "bypasses": 0}
+
+
+def test_a_miss_leaves_the_target_empty(tmp_path, cache):
+    assert cache.get("key", str(tmp_path)) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_put_replaces_an_entry(tmp_path, cache):
+    cache.put("key", _source(tmp_path, "first", {"bundle.zip": b"first"}), RESULTS)
+    cache.put("key", _source(tmp_path, "second", {"bundle.zip": b"second"}), {**RESULTS, "message": "again"})
+    target = tmp_path / "target"
+    target.mkdir()
+    assert cache.get("key", str(target))["message"] == "again"
+    assert (target / "bundle.zip").read_bytes() == b"second"
+    assert _entries(cache) == ["key"]
+
+
+def test_an_entry_older_than_the_ttl_misses_and_is_removed(tmp_path, cache):
+    cache.put("key", _source(tmp_path, "run", {"bundle.zip": b"zip"}), RESULTS)
+    results_path = os.path.join(cache.root, "key", "results.json")
+    with open(results_path, "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    stored["created_at"] -= cache.ttl + 1
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+    assert cache.get("key", str(tmp_path)) is None
+    assert _entries(cache) == []
+    assert cache.stats()["evictions"] == 1
+
+
+def test_the_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=2500, ttl=3600)
+    for age, key in ((30, "old"), (20, "older_use"), (10, "recent")):
+        cache.put(key, _source(tmp_path, key, {"bundle.zip": bytes(1000)}), RESULTS)
+        _set_last_use(cache, key, age)
+    # Entries keep ~1 KB each, so the third put evicted the least recently used one
+    assert _entries(cache) == ["older_use", "recent"]
+    target = tmp_path / "target"
+    target.mkdir()
+    assert cache.get("older_use", str(target)) is not None # Now the most recently used
+    cache.put("new", _source(tmp_path, "new", {"bundle.zip": bytes(1000)}), RESULTS)
+    assert _entries(cache) == ["new", "older_use"]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_entries_unused_for_the_ttl_are_evicted_on_put(tmp_path, cache):
+    cache.put("stale", _source(tmp_path, "stale", {"bundle.zip": b"zip"}), RESULTS)
+    _set_last_use(cache, "stale", cache.ttl + 1)
+    cache.put("fresh", _source(tmp_path, "fresh", {"bundle.zip": b"zip"}), RESULTS)
+    assert _entries(cache) == ["fresh"]
+
+
+def test_a_committed_recording_becomes_an_entry(tmp_path, cache):
+    recorder = ResultRecorder(cache, "key")
+    assert b"".join(recorder.tee("bundle.zip", iter([b"z", b"i", b"p"]))) == b"zip"
+    recorder.commit(RESULTS)
+    target = tmp_path / "target"
+    target.mkdir()
+    assert cache.get("key", str(target)) == RESULTS
+    assert (target / "bundle.zip").read_bytes() == b"zip"
+    assert _entries(cache) == ["key"]
+
+
+def test_an_abandoned_recording_leaves_nothing(tmp_path, cache):
+    recorder = ResultRecorder(cache, "key")
+    stream = recorder.tee("bundle.zip", iter([b"z", b"i", b"p"]))
+    next(stream)
+    stream.close()
+    recorder.discard()
+    assert _entries(cache) == []
+    assert cache.get("key", str(tmp_path)) is None
+
+
+def _generate(client, request_text="a jumping game", response_mode="base64", **headers):
+    return client.post(
+        f"/v1/generate_game?response_mode={response_mode}", json={"request": request_text}, headers=headers,
+    )
+
+
+def _refuse_crews(monkeypatch):
+    def refuse(crew_name, workspace_path):
+        raise AssertionError(f"{crew_name} ran for a cached result")
+    monkeypatch.setattr(techiecrews, "get_crew", refuse)
+
+
+def test_a_repeated_request_is_served_from_the_cache(client, monkeypatch):
+    first = _generate(client)
+    assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+    _refuse_crews(monkeypatch)
+    second = _generate(client, "  a jumping   game ")
+    assert second.status_code == 200 and second.headers["X-Cache"] == "HIT"
+    assert second.json["generated_bundle"] == first.json["generated_bundle"]
+    assert second.json["status"] == "success"
+    stats = client.get("/v1/cache/stats").json
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["hit_ratio"]) == (1, 1, 1, 0.5)
+
+
+@pytest.mark.parametrize("headers", [{"X-Cache-Bypass": "1"}, {"Cache-Control": "no-cache"}])
+def test_a_bypass_runs_the_crews_and_refreshes_the_entry(client, headers):
+    assert _generate(client).headers["X-Cache"] == "MISS"
+    response = _generate(client, **headers)
+    assert response.status_code == 200 and response.headers["X-Cache"] == "BYPASS"
+    stats = client.get("/v1/cache/stats").json
+    assert (stats["bypasses"], stats["stores"]) == (1, 2)
+    assert _generate(client).headers["X-Cache"] == "HIT"
+
+
+def test_a_streamed_result_is_cached_once_the_stream_completes(client, monkeypatch):
+    response = _generate(client, response_mode="multipart")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.get_data().endswith(b"--\r\n")
+    _refuse_crews(monkeypatch)
+    assert _generate(client, response_mode="multipart").headers["X-Cache"] == "HIT"
+
+
+def test_a_partially_streamed_result_is_never_cached(client, tmp_path):
+    response = client.post(
+        "/v1/generate_game?response_mode=multipart", json={"request": "a jumping game"}, buffered=False,
+    )
+    body = iter(response.response)
+    # Through the icon and splash parts, which are recorded by then
+    streamed = b"".join(next(body) for _ in range(7))
+    assert b'filename="generated_splash.png"' in streamed
+    response.close()
+    cache_root = tmp_path / "result-cache"
+    assert os.listdir(cache_root) == []
+    assert client.get("/v1/cache/stats").json["stores"] == 0
+    assert _generate(client).headers["X-Cache"] == "MISS"
+
+
+def test_a_disabled_cache_sends_no_cache_header(client, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_RESULT_CACHE_BYTES", "0")
+    response = _generate(client)
+    assert response.status_code == 200 and "X-Cache" not in response.headers
+    assert client.get("/v1/cache/stats").json == {"enabled": False}
+
+
+def test_the_definitions_fingerprint_is_hashed_once(tmp_path, monkeypatch):
+    (tmp_path / "crew").mkdir()
+    definition = tmp_path / "crew" / "crews.yml"
+    definition.write_text("game_crew: {}\n", encoding="utf-8")
+    hashed = []
+    monkeypatch.setattr(techiecrews, "definitions_fingerprint", lambda runtime_dir: hashed.append(runtime_dir) or "f")
+    registry = techiecrews.CrewRegistry(runtime_dir=str(tmp_path))
+    assert [registry.fingerprint() for _ in range(3)] == ["f"] * 3
+    assert len(hashed) == 1
+
+    reloading = techiecrews.CrewRegistry(runtime_dir=str(tmp_path), reload_on_change=True)
+    reloading.fingerprint()
+    reloading.fingerprint()
+    os.utime(definition, (time.time() + 10, time.time() + 10))
+    reloading.fingerprint()
+    assert len(hashed) == 3
+
+
+def test_the_fingerprint_changes_with_the_definitions(tmp_path):
+    (tmp_path / "crew").mkdir()
+    definition = tmp_path / "crew" / "crews.yml"
+    definition.write_text("game_crew: {}\n", encoding="utf-8")
+    fingerprint = techiecrews.definitions_fingerprint(str(tmp_path))
+    definition.write_text("game_crew: {agents: [writer]}\n", encoding="utf-8")
+    assert techiecrews.definitions_fingerprint(str(tmp_path)) != fingerprint
+
+
+def test_the_cache_is_configured_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "_result_cache", None)
+    monkeypatch.setenv("GAME_GENERATOR_RESULT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("GAME_GENERATOR_RESULT_CACHE_BYTES", "1000")
+    monkeypatch.setenv("GAME_GENERATOR_RESULT_CACHE_TTL", "60")
+    cache = result_cache.get_result_cache()
+    assert (cache.root, cache.max_bytes, cache.ttl) == (str(tmp_path), 1000, 60)
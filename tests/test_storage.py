@@ -0,0 +1,182 @@
+import io
+import os
+import time
+
+import pytest
+
+from lib import storage
+from lib.storage import LocalStorageBackend, local_secret, upload_name
+
+SECRET = b"test-secret"
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path / "objects"), SECRET)
+
+
+class BucketBackend(LocalStorageBackend):
+    """A local backend whose references look like those of a bucket."""
+
+    def reference(self, name):
+        return f"gs://games/{name}"
+
+
+@pytest.mark.parametrize("reference", [
+    "uploads/0a1b/game.zip", "artifacts/42/game_bundle.zip", " uploads/0a1b/game.zip ",
+])
+def test_object_name_accepts_uploads_and_artifacts(backend, reference):
+    assert backend.object_name(reference) == reference.strip()
+
+
+@pytest.mark.parametrize("reference", [
+    "", None, "game.zip", "uploads", "checkpoints/0a1b/stage", ".signing-key", "/uploads/0a1b/game.zip",
+    "uploads/../.signing-key", "uploads/./game.zip", "uploads//game.zip", "uploads/0a1b\\game.zip",
+])
+def test_object_name_refuses_references_outside_uploads_and_artifacts(backend, reference):
+    with pytest.raises(ValueError, match="Invalid storage object reference"):
+        backend.object_name(reference)
+
+
+def test_object_name_strips_the_backends_reference_prefix(tmp_path):
+    backend = BucketBackend(str(tmp_path), SECRET)
+    assert backend.object_name("gs://games/uploads/0a1b/game.zip") == "uploads/0a1b/game.zip"
+    with pytest.raises(ValueError):
+        backend.object_name("gs://other/uploads/0a1b/game.zip")
+
+
+def test_verify_accepts_only_an_unexpired_signature_of_the_same_method_and_object(backend):
+    name, expires = "uploads/0a1b/game.zip", int(time.time()) + 60
+    signature = backend.signature(name, "PUT", expires)
+    assert backend.verify(name, "PUT", str(expires), signature)
+    assert not backend.verify(name, "GET", str(expires), signature)
+    assert not backend.verify("uploads/0a1b/other.zip", "PUT", str(expires), signature)
+    assert not backend.verify(name, "PUT", str(expires + 1), signature)
+    assert not backend.verify(name, "PUT", str(expires), "")
+    assert not backend.verify(name, "PUT", "soon", signature)
+    expired = int(time.time()) - 1
+    assert not backend.verify(name, "PUT", str(expired), backend.signature(name, "PUT", expired))
+    # Another key signs differently
+    other = LocalStorageBackend(backend.root, b"other-secret")
+    assert not other.verify(name, "PUT", str(expires), signature)
+
+
+def test_write_stops_at_max_bytes_and_leaves_nothing_behind(backend):
+    name = "uploads/0a1b/game.zip"
+    assert backend.write(name, io.BytesIO(b"x" * 10), max_bytes=10) == 10
+    with pytest.raises(ValueError, match="larger than 10 bytes"):
+        backend.write(name, io.BytesIO(b"y" * 11), max_bytes=10)
+    # The previous object is untouched and no partial file is left
+    assert os.listdir(os.path.dirname(backend.path_for(name))) == ["game.zip"]
+    output = io.BytesIO()
+    backend.download(name, output)
+    assert output.getvalue() == b"x" * 10
+
+
+def test_purge_expired_deletes_old_uploads_and_artifacts(backend):
+    old, recent = "uploads/0a1b/old.zip", "artifacts/42/game.html"
+    for name in (old, recent):
+        backend.write(name, io.BytesIO(b"data"))
+    past = time.time() - 120
+    os.utime(backend.path_for(old), (past, past))
+    assert backend.purge_expired(60) == 1
+    assert backend.size(old) is None and backend.size(recent) == 4
+    # The emptied upload directory goes too
+    assert os.listdir(os.path.join(backend.root, "uploads")) == []
+
+
+def test_upload_name_keeps_a_safe_basename():
+    name = upload_name("..\\..\\my game!.zip")
+    prefix, token, filename = name.split("/")
+    assert (prefix, filename) == ("uploads", "my_game_.zip") and len(token) == 32
+    assert upload_name(".hidden").endswith("/hidden") and upload_name("").endswith("/upload")
+
+
+def test_the_local_signing_key_is_generated_once_per_root(tmp_path, monkeypatch):
+    monkeypatch.delenv("GAME_GENERATOR_STORAGE_SECRET", raising=False)
+    key = local_secret(str(tmp_path))
+    assert local_secret(str(tmp_path)) == key and len(key) == 64
+    assert os.stat(tmp_path / storage.LOCAL_SECRET_FILE).st_mode & 0o777 == 0o600
+    monkeypatch.setenv("GAME_GENERATOR_STORAGE_SECRET", "configured")
+    assert local_secret(str(tmp_path)) == b"configured"
+
+
+@pytest.fixture
+def local_storage(client, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_STORAGE", "local")
+    monkeypatch.setenv("GAME_GENERATOR_STORAGE_OBJECT_TTL", "0")
+    return storage.get_storage_backend()
+
+
+def _reserve(client, filename="game.zip"):
+    body = client.post("/v1/storage/uploads", json={"filename": filename}).json
+    return body["object"], body["upload_url"]
+
+
+def test_an_upload_round_trips_through_signed_urls(client, local_storage):
+    name, upload_url = _reserve(client)
+    assert name.startswith("uploads/") and name.endswith("/game.zip")
+    assert client.put(upload_url, data=b"bundle").status_code == 200
+    response = client.get(local_storage.signed_url(name))
+    assert response.status_code == 200 and response.data == b"bundle"
+    assert response.headers["Content-Disposition"] == "attachment; filename=game.zip"
+    missing = client.get(local_storage.signed_url("uploads/0a1b/missing.zip"))
+    assert missing.status_code == 404
+
+
+def test_uploads_need_object_storage(client):
+    response = client.post("/v1/storage/uploads", json={"filename": "game.zip"})
+    assert response.status_code == 404 and "GAME_GENERATOR_STORAGE" in response.json["error"]
+
+
+def test_an_expired_signature_is_refused(client, local_storage):
+    name, _ = _reserve(client)
+    assert client.put(local_storage.signed_url(name, "PUT", expires_in=-1), data=b"bundle").status_code == 403
+    assert local_storage.size(name) is None
+
+
+def test_a_signature_grants_only_its_method(client, local_storage):
+    name, upload_url = _reserve(client)
+    # A download URL cannot upload and an upload URL cannot download
+    assert client.put(local_storage.signed_url(name), data=b"bundle").status_code == 403
+    assert client.put(upload_url, data=b"bundle").status_code == 200
+    assert client.get(upload_url).status_code == 403
+    # Nor does editing the method in the URL
+    assert client.get(upload_url.replace("method=PUT", "method=GET")).status_code == 403
+
+
+@pytest.mark.parametrize("name", ["checkpoints/0a1b/stage.zip", ".signing-key"])
+def test_objects_outside_uploads_and_artifacts_are_never_served(client, local_storage, name):
+    expires = int(time.time()) + 60
+    query = f"expires={expires}&signature={local_storage.signature(name, 'GET', expires)}"
+    assert client.get(f"/v1/storage/objects/{name}?method=GET&{query}").status_code == 403
+    put_query = f"expires={expires}&signature={local_storage.signature(name, 'PUT', expires)}"
+    assert client.put(f"/v1/storage/objects/{name}?method=PUT&{put_query}", data=b"x").status_code == 403
+    assert not os.path.exists(os.path.join(local_storage.root, "checkpoints"))
+
+
+def test_an_upload_over_the_bundle_limit_answers_413(client, local_storage, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_BUNDLE_MAX_BYTES", "1024")
+    name, upload_url = _reserve(client)
+    response = client.put(upload_url, data=os.urandom(2048))
+    assert response.status_code == 413 and "larger than 1024 bytes" in response.json["error"]
+    assert local_storage.size(name) is None
+    assert client.put(upload_url, data=os.urandom(1024)).status_code == 200
+
+
+@pytest.mark.parametrize("reference, message", [
+    ("checkpoints/0a1b/stage.zip", "Invalid storage object reference"),
+    ("uploads/0a1b/missing.zip", "Storage object not found"),
+])
+def test_a_bad_bundle_reference_answers_400(client, local_storage, reference, message):
+    response = client.post("/v1/customize_game", json={"request": "faster", "game_bundle_ref": reference})
+    assert response.status_code == 400 and message in response.json["error"]
+
+
+def test_a_bundle_cannot_be_sent_both_ways(client, local_storage):
+    name, upload_url = _reserve(client)
+    client.put(upload_url, data=b"bundle")
+    response = client.post("/v1/customize_game", data={
+        "request": "faster", "game_bundle_ref": name, "game_bundle": (io.BytesIO(b"bundle"), "game.zip"),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 400 and "not both" in response.json["error"]
@@ -0,0 +1,226 @@
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+
+import pytest
+
+from lib import workspace_pool
+from lib.workspace_pool import WorkspaceCapacityError, WorkspaceManager, WorkspaceQuotaError
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), pool_size=0, janitor_interval=0)
+    yield manager
+    manager.shutdown()
+
+
+def _owner(path):
+    with open(path + ".owner", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _set_owner(path, **owner):
+    owner = {**_owner(path), **owner}
+    with open(path + ".owner", "w", encoding="utf-8") as f:
+        json.dump(owner, f)
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_acquire_marks_the_workspace_and_release_trashes_it(manager):
+    path = manager.acquire()
+    assert os.path.dirname(path) == manager.active_dir and os.listdir(path) == []
+    assert _owner(path)["pid"] == os.getpid()
+    assert manager.stats()["active"] == 1
+    manager.release(path)
+    assert not os.path.exists(path) and not os.path.exists(path + ".owner")
+    assert len(os.listdir(manager.trash_dir)) == 1 and manager.stats()["active"] == 0
+    assert manager.sweep() == {"released": 1, "abandoned": 0, "pooled": 0}
+    assert os.listdir(manager.trash_dir) == []
+
+
+def test_release_deletes_a_directory_outside_the_root(manager, tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    manager.release(str(outside))
+    assert not outside.exists()
+
+
+def test_ready_workspaces_are_handed_out_and_refilled(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), pool_size=2, janitor_interval=0)
+    assert manager.sweep()["pooled"] == 2
+    ready = set(os.listdir(manager.ready_dir))
+    path = manager.acquire()
+    assert os.path.basename(path) in ready
+    assert manager.stats()["ready"] == 1
+    assert manager.sweep()["pooled"] == 1
+    assert manager.stats()["ready"] == 2
+
+
+def test_the_janitor_refills_the_pool(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), pool_size=2, janitor_interval=60)
+    try:
+        deadline = time.time() + 5
+        while manager.stats()["ready"] < 2:
+            assert time.time() < deadline
+            time.sleep(0.01)
+    finally:
+        manager.shutdown()
+
+
+def test_a_workspace_of_a_dead_process_is_reclaimed(manager):
+    orphan, kept = manager.acquire(), manager.acquire()
+    open(os.path.join(orphan, "game.html"), "w").close()
+    _set_owner(orphan, pid=_dead_pid())
+    assert manager.sweep()["abandoned"] == 1
+    assert not os.path.exists(orphan) and not os.path.exists(orphan + ".owner")
+    assert os.path.isdir(kept)
+    assert manager.stats()["active"] == 1
+
+
+def test_a_workspace_older_than_the_max_age_is_reclaimed(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), pool_size=0, max_age=60, janitor_interval=0)
+    old, renewed = manager.acquire(), manager.acquire()
+    _set_owner(old, created_at=time.time() - 61)
+    _set_owner(renewed, created_at=time.time() - 61)
+    manager.renew(renewed)
+    assert manager.sweep()["abandoned"] == 1
+    assert not os.path.exists(old) and os.path.isdir(renewed)
+
+
+def test_an_unmarked_workspace_is_judged_by_its_age(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), pool_size=0, max_age=60, janitor_interval=0)
+    fresh, stale = os.path.join(manager.active_dir, "fresh"), os.path.join(manager.active_dir, "stale")
+    os.mkdir(fresh)
+    os.mkdir(stale)
+    os.utime(stale, (time.time() - 61, time.time() - 61))
+    open(os.path.join(manager.active_dir, "gone.owner"), "w").close()
+    assert manager.sweep()["abandoned"] == 1
+    assert sorted(os.listdir(manager.active_dir)) == ["fresh"]
+
+
+def test_check_quota_measures_and_enforces_the_workspace_limits(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), max_bytes=100, max_files=2, janitor_interval=0)
+    path = manager.acquire()
+    with open(os.path.join(path, "a.bin"), "wb") as f:
+        f.write(bytes(60))
+    assert manager.check_quota(path) == (60, 1)
+    assert manager.totals() == (60, 1)
+    with open(os.path.join(path, "b.bin"), "wb") as f:
+        f.write(bytes(60))
+    with pytest.raises(WorkspaceQuotaError, match="120 bytes, more than the limit of 100"):
+        manager.check_quota(path)
+    os.truncate(os.path.join(path, "b.bin"), 0)
+    open(os.path.join(path, "c.bin"), "w").close()
+    with pytest.raises(WorkspaceQuotaError, match="3 files, more than the limit of 2"):
+        manager.check_quota(path)
+
+
+def test_acquire_refuses_while_all_workspaces_are_at_the_global_quota(tmp_path):
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), total_max_bytes=100, janitor_interval=0)
+    path = manager.acquire()
+    with open(os.path.join(path, "a.bin"), "wb") as f:
+        f.write(bytes(100))
+    manager.check_quota(path)
+    with pytest.raises(WorkspaceCapacityError, match="100 bytes in 1 files"):
+        manager.acquire()
+    manager.release(path)
+    manager.release(manager.acquire())
+
+
+def test_a_sweep_keeps_workspaces_acquired_and_drops_those_released_while_it_runs(manager, monkeypatch):
+    scanned = manager.acquire()
+    released = manager.acquire()
+    during = []
+    directory_usage = workspace_pool.directory_usage
+
+    def measure(path):
+        if not during:
+            # Another request takes a workspace and one is handed back mid-sweep
+            during.append(manager.acquire())
+            manager.release(released)
+        return directory_usage(path)
+    monkeypatch.setattr(workspace_pool, "directory_usage", measure)
+
+    manager.sweep()
+    with manager._lock:
+        tracked = set(manager._usage)
+    assert tracked == {scanned, during[0]}
+    # The next sweep measures what this one missed
+    monkeypatch.setattr(workspace_pool, "directory_usage", directory_usage)
+    manager.sweep()
+    assert manager.stats()["active"] == 2
+
+
+def test_a_sweep_counts_the_workspaces_of_other_processes(manager):
+    other = os.path.join(manager.active_dir, "other")
+    os.mkdir(other)
+    with open(os.path.join(other, "game.html"), "wb") as f:
+        f.write(bytes(10))
+    with open(other + ".owner", "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getppid(), "created_at": time.time()}, f)
+    manager.sweep()
+    assert manager.totals() == (10, 1)
+
+
+def _bundle(size):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_STORED) as zipf:
+        zipf.writestr("index.html", "<html></html>")
+        zipf.writestr("data.bin", os.urandom(size))
+    return data.getvalue()
+
+
+def test_an_upload_over_the_workspace_quota_answers_413(client, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_WORKSPACE_MAX_BYTES", "1024")
+    response = client.post("/v1/customize_game", data={
+        "request": "faster", "game_bundle": (io.BytesIO(_bundle(2048)), "game.zip"),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 413 and "more than the limit of 1024" in response.json["error"]
+    assert workspace_pool.get_workspace_manager().stats()["active"] == 0
+
+
+def test_a_run_outgrowing_the_workspace_quota_answers_507(client, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_WORKSPACE_MAX_BYTES", "1024")
+    response = client.post("/v1/generate_game", json={"request": "a runner"})
+    assert response.status_code == 507
+    assert response.json["error"].startswith("The generated game exceeds the workspace quota.")
+    assert workspace_pool.get_workspace_manager().stats()["active"] == 0
+
+
+def test_workspaces_at_the_global_quota_answer_503(client, monkeypatch):
+    monkeypatch.setenv("GAME_GENERATOR_WORKSPACES_MAX_BYTES", "1")
+    manager = workspace_pool.get_workspace_manager()
+    with open(os.path.join(manager.acquire(), "game.html"), "wb") as f:
+        f.write(b"<html></html>")
+    manager.sweep()
+    response = client.post("/v1/generate_game", json={"request": "a runner"})
+    assert response.status_code == 503 and response.headers["Retry-After"]
+
+
+def test_the_manager_is_configured_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace_pool, "_workspace_manager", None)
+    settings = {
+        "GAME_GENERATOR_WORKSPACE_DIR": str(tmp_path),
+        "GAME_GENERATOR_WORKSPACE_POOL_SIZE": "1",
+        "GAME_GENERATOR_WORKSPACE_MAX_BYTES": "2",
+        "GAME_GENERATOR_WORKSPACE_MAX_FILES": "3",
+        "GAME_GENERATOR_WORKSPACES_MAX_BYTES": "4",
+        "GAME_GENERATOR_WORKSPACES_MAX_FILES": "5",
+        "GAME_GENERATOR_WORKSPACE_MAX_AGE": "6",
+        "GAME_GENERATOR_WORKSPACE_JANITOR_INTERVAL": "0",
+    }
+    for variable, value in settings.items():
+        monkeypatch.setenv(variable, value)
+    manager = workspace_pool.get_workspace_manager()
+    assert (manager.root, manager.pool_size, manager.max_bytes, manager.max_files) == (str(tmp_path), 1, 2, 3)
+    assert (manager.total_max_bytes, manager.total_max_files, manager.max_age) == (4, 5, 6)